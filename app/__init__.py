@@ -4,8 +4,6 @@ import os
 import re
 import datetime
 import time
-import sentry_sdk
-from sentry_sdk.integrations.flask import FlaskIntegration
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
@@ -25,21 +23,15 @@ csrf = CSRFProtect()
 socketio = SocketIO()
 
 def create_app(config_class: Config = DevelopmentConfig):
-    
-    # --- Инициализация Sentry для мониторинга ошибок ---
-    sentry_dsn = os.environ.get('SENTRY_DSN')
-    if sentry_dsn:
-        sentry_sdk.init(
-            dsn=sentry_dsn,
-            integrations=[FlaskIntegration()],
-            # Установите sample rates в production на меньшие значения (например, 0.1)
-            traces_sample_rate=1.0,
-            profiles_sample_rate=1.0
-        )
 
     app = Flask(__name__, instance_relative_config=True)
     app.config.from_object(config_class)
 
+    # --- Инициализация Sentry для мониторинга ошибок ---
+    # Трассируется только выборка запросов (см. app/services/sampling.py)
+    from .services import sampling
+    sampling.init_sentry(app, os.environ.get('SENTRY_DSN'))
+
     # Оборачиваем приложение в WhiteNoise для обслуживания статических файлов
     # Это хорошая практика как для разработки, так и для production
     app.wsgi_app = WhiteNoise(app.wsgi_app, root='app/static/')
@@ -51,6 +43,14 @@ def create_app(config_class: Config = DevelopmentConfig):
     csrf.init_app(app)
     socketio.init_app(app)
 
+    # Учет SQL-запросов на каждый HTTP-запрос (заголовки X-Query-*)
+    from .services import query_stats
+    query_stats.init_app(app)
+
+    # Метрики на /metrics (время запросов, БД, Socket.IO, фоновые задачи)
+    from .services import metrics
+    metrics.init_app(app)
+
     # Настраиваем login manager
     login_manager.login_view = 'admin.user.login'
     login_manager.login_message = "Пожалуйста, войдите в систему для доступа к этой странице."
@@ -83,7 +83,7 @@ def create_app(config_class: Config = DevelopmentConfig):
 
         # --- Контекстные процессоры и фильтры ---
         from .utils import to_safe_key
-        from .admin.forms import get_stages as get_stages_query
+        from .services import reference_cache
         from .models.models import Permission
         
         @app.context_processor
@@ -91,8 +91,7 @@ def create_app(config_class: Config = DevelopmentConfig):
             version = int(time.time()) # Для "cache busting"
 
             def get_stages_for_template():
-                stages_objects = get_stages_query()
-                return [{'id': stage.id, 'name': stage.name} for stage in stages_objects]
+                return [{'id': stage['id'], 'name': stage['name']} for stage in reference_cache.rows('stages')]
             
             return dict(
                 to_safe_key=to_safe_key,
@@ -113,15 +112,32 @@ def create_app(config_class: Config = DevelopmentConfig):
             return result
 
         # --- Загрузчик пользователя ---
-        from .models.models import User
-        @login_manager.user_loader
-        def load_user(user_id):
-            return db.session.get(User, int(user_id))
+        from .services import identity_cache
+        identity_cache.init_app(app, login_manager)
 
         # --- Регистрация CLI команд ---
         from . import commands
         app.cli.add_command(commands.seed_command)
         app.cli.add_command(commands.seed_cypress_command)
+        app.cli.add_command(commands.export_analytics_command)
+        app.cli.add_command(commands.gc_drawings_command)
+        app.cli.add_command(commands.create_partitions_command)
+        app.cli.add_command(commands.archive_partitions_command)
+        app.cli.add_command(commands.archive_parts_command)
+        app.cli.add_command(commands.seed_bench_command)
+        app.cli.add_command(commands.seed_scale_command)
+
+        # --- Фоновый сборщик мусора хранилища чертежей ---
+        from .services import drawing_service
+        drawing_service.start_sweeper(app)
+
+        # --- Фоновая запись журнала аудита ---
+        from .services.audit_service import audit_writer
+        audit_writer.init_app(app)
+
+        # --- Обслуживание разделов журналов (PostgreSQL) ---
+        from .services import partition_service
+        partition_service.start_maintainer(app)
 
     # Возвращаем оба объекта для использования в wsgi.py
     return app, socketio
\ No newline at end of file
@@ -5,26 +5,30 @@ from wtforms import (StringField, PasswordField, BooleanField, SubmitField,
                      SelectMultipleField, SelectField, IntegerField, TextAreaField, HiddenField)
 from wtforms.validators import DataRequired, Optional, Length, ValidationError, NumberRange
 from flask_wtf.file import FileField, FileAllowed, FileRequired
-from app.models.models import RouteTemplate, Stage, Role, Permission, User
+from app.models.models import RouteTemplate, Permission
+from app.services import reference_cache
 from wtforms_sqlalchemy.fields import QuerySelectField
 
-# --- Фабрики для полей QuerySelectField ---
+# Допустимые форматы чертежей (многостраничные TIFF и PDF - сканы)
+DRAWING_EXTENSIONS = ['jpg', 'jpeg', 'png', 'gif', 'tif', 'tiff', 'pdf']
+
+# --- Фабрики для полей QuerySelectField (справочники из reference_cache) ---
 
 def get_route_templates():
     """Возвращает все шаблоны маршрутов для выпадающего списка."""
-    return RouteTemplate.query.order_by(RouteTemplate.name).all()
+    return reference_cache.route_templates()
 
 def get_stages():
     """Возвращает все этапы из справочника для выпадающего списка."""
-    return Stage.query.order_by(Stage.name).all()
+    return reference_cache.stages()
 
 def get_roles():
     """Возвращает все роли для выпадающего списка."""
-    return Role.query.order_by(Role.name).all()
+    return reference_cache.roles()
 
 def get_all_users():
     """Возвращает всех пользователей для выпадающего списка."""
-    return User.query.order_by(User.username).all()
+    return reference_cache.users()
 
 # --- Формы для деталей (Parts) ---
 
@@ -48,7 +52,7 @@ class PartForm(FlaskForm):
     route_template = SelectField('Технологический маршрут', coerce=int, validators=[DataRequired()])
     drawing = FileField('Чертеж (изображение, необязательно)', validators=[
         Optional(),
-        FileAllowed(['jpg', 'jpeg', 'png', 'gif'], 'Только изображения (jpg, png, gif)!')
+        FileAllowed(DRAWING_EXTENSIONS, 'Только изображения (jpg, png, gif, tiff) или PDF!')
     ])
     submit = SubmitField('Добавить деталь')
 
@@ -62,7 +66,7 @@ class EditPartForm(FlaskForm):
     
     drawing = FileField('Заменить чертеж (необязательно)', validators=[
         Optional(),
-        FileAllowed(['jpg', 'jpeg', 'png', 'gif'], 'Только изображения (jpg, png, gif)!')
+        FileAllowed(DRAWING_EXTENSIONS, 'Только изображения (jpg, png, gif, tiff) или PDF!')
     ])
     submit = SubmitField('Сохранить изменения')
 
@@ -109,6 +113,17 @@ class GenerateFromCloudForm(FlaskForm):
     submit = SubmitField('Сгенерировать документ')
 
 
+class GenerateBatchFromCloudForm(FlaskForm):
+    """Форма для пакетной генерации документов по нескольким строкам облачного файла."""
+    excel_path = StringField('Путь к Excel-файлу в OneDrive', validators=[DataRequired()])
+    rows = StringField('Номера строк', validators=[DataRequired(), Length(max=1000)])
+    word_template = FileField('Файл шаблона Word (.docx)', validators=[
+        FileRequired(),
+        FileAllowed(['docx'], 'Только файлы Word (.docx)!')
+    ])
+    submit = SubmitField('Сгенерировать архив')
+
+
 class ConfirmForm(FlaskForm):
     """Пустая форма для генерации CSRF-токена в простых POST-запросах."""
     pass
@@ -136,7 +151,7 @@ class RouteTemplateForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         self.obj = kwargs.get('obj')
         super(RouteTemplateForm, self).__init__(*args, **kwargs)
-        self.stages.choices = [(s.id, s.name) for s in Stage.query.order_by('name').all()]
+        self.stages.choices = [(s['id'], s['name']) for s in reference_cache.rows('stages')]
 
     def validate_name(self, name):
         query = RouteTemplate.query.filter(RouteTemplate.name == name.data)
@@ -235,4 +250,10 @@ class ChangeResponsibleForm(FlaskForm):
         allow_blank=True,
         blank_text='-- Не назначен --'
     )
-    submit = SubmitField('Сохранить')
\ No newline at end of file
+    submit = SubmitField('Сохранить')
+
+class ProfilerForm(FlaskForm):
+    """Форма запуска профилировщика процесса."""
+    seconds = IntegerField('Длительность, секунд', default=30,
+                           validators=[DataRequired(), NumberRange(min=1, max=300)])
+    submit = SubmitField('Запустить профилирование')
@@ -1,9 +1,13 @@
 # app/admin/routes/management_routes.py
 
-from flask import Blueprint, render_template, request, flash, redirect, url_for
+import os
+
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, send_from_directory
 from flask_login import login_required, current_user
 from app.models.models import db, Part, AuditLog, RouteTemplate, RouteStage, Stage, Permission
-from app.admin.forms import PartForm, FileUploadForm, StageDictionaryForm, RouteTemplateForm
+from app.admin.forms import PartForm, FileUploadForm, StageDictionaryForm, RouteTemplateForm, ProfilerForm
+from app.admin.utils import admin_required
+from app.services import profiler, reference_cache
 
 management_bp = Blueprint('management', __name__)
 
@@ -17,7 +21,7 @@ def admin_page():
     
     part_form = PartForm()
     part_form.route_template.choices = [
-        (rt.id, rt.name) for rt in RouteTemplate.query.order_by(RouteTemplate.name).all()
+        (rt['id'], rt['name']) for rt in reference_cache.rows('route_templates')
     ]
     
     upload_form = FileUploadForm()
@@ -41,6 +45,7 @@ def add_stage():
         else:
             new_stage = Stage(name=stage_name)
             db.session.add(new_stage)
+            reference_cache.invalidate()
             db.session.commit()
             flash(f'Этап "{stage_name}" успешно добавлен в справочник.', 'success')
     return redirect(url_for('admin.management.list_stages'))
@@ -54,6 +59,7 @@ def delete_stage(stage_id):
     else:
         stage_name = stage.name
         db.session.delete(stage)
+        reference_cache.invalidate()
         db.session.commit()
         flash(f'Этап "{stage_name}" удален из справочника.', 'success')
     return redirect(url_for('admin.management.list_stages'))
@@ -83,7 +89,8 @@ def add_route():
 
             log_entry = AuditLog(user_id=current_user.id, action="Управление маршрутами", details=f"Создан новый маршрут '{new_template.name}'.", category='management')
             db.session.add(log_entry)
-            
+            reference_cache.invalidate()
+
             db.session.commit()
             
             flash('Новый технологический маршрут успешно создан.', 'success')
@@ -118,7 +125,8 @@ def edit_route(route_id):
 
             log_entry = AuditLog(user_id=current_user.id, action="Управление маршрутами", details=f"Изменен маршрут '{template.name}'.", category='management')
             db.session.add(log_entry)
-            
+            reference_cache.invalidate()
+
             db.session.commit()
             
             flash('Маршрут успешно обновлен.', 'success')
@@ -141,6 +149,39 @@ def delete_route(route_id):
         db.session.delete(template)
         log_entry = AuditLog(user_id=current_user.id, action="Управление маршрутами", details=f"Удален маршрут '{template_name}'.", category='management')
         db.session.add(log_entry)
+        reference_cache.invalidate()
         db.session.commit()
         flash(f'Маршрут "{template_name}" успешно удален.', 'success')
-    return redirect(url_for('admin.management.list_routes'))
\ No newline at end of file
+    return redirect(url_for('admin.management.list_routes'))
+
+
+# --- Профилирование процесса ---
+
+@management_bp.route('/profiler')
+@admin_required
+def profiler_page():
+    """Список записанных профилей и форма запуска профилировщика."""
+    return render_template('profiler.html', form=ProfilerForm(),
+                           profiles=profiler.list_profiles(current_app),
+                           running=profiler.is_running())
+
+@management_bp.route('/profiler/start', methods=['POST'])
+@admin_required
+def start_profiler():
+    form = ProfilerForm()
+    if form.validate_on_submit():
+        try:
+            path = profiler.start(current_app._get_current_object(), form.seconds.data)
+            flash(f'Профилирование запущено на {form.seconds.data} с. Результат: {os.path.basename(path)}', 'success')
+        except RuntimeError as e:
+            flash(str(e), 'error')
+    else:
+        flash('Укажите длительность от 1 до 300 секунд.', 'error')
+    return redirect(url_for('admin.management.profiler_page'))
+
+@management_bp.route('/profiler/<path:filename>')
+@admin_required
+def download_profile(filename):
+    # send_from_directory не выпускает за пределы каталога профилей
+    return send_from_directory(profiler.profiles_dir(current_app), filename, as_attachment=True,
+                               mimetype='text/plain')
@@ -1,7 +1,10 @@
 # app/admin/routes/part_routes.py
 
+import mimetypes
+
 from flask import (Blueprint, render_template, request, flash, redirect, url_for,
-                   current_app, send_file, send_from_directory)
+                   current_app, send_file, send_from_directory, abort, Response)
+from werkzeug.security import safe_join
 from flask_login import login_required, current_user
 from sqlalchemy.exc import IntegrityError
 
@@ -10,7 +13,7 @@ from app.models.models import Part, RouteTemplate, Permission
 from app.utils import generate_qr_code, create_safe_file_name
 from app.admin.forms import (PartForm, EditPartForm, FileUploadForm, ChangeRouteForm,
                              ConfirmForm, ChangeResponsibleForm, AddChildPartForm)
-from app.services import part_service
+from app.services import part_service, drawing_service, drawing_storage, metrics, reference_cache
 from app.admin.utils import permission_required
 
 part_bp = Blueprint('part', __name__)
@@ -19,10 +22,74 @@ part_bp = Blueprint('part', __name__)
 @part_bp.route('/drawings/<path:filename>')
 @login_required
 def serve_drawing(filename):
-    """Отдает файл чертежа из защищенной папки."""
-    return send_from_directory(
-        current_app.config['DRAWING_UPLOAD_FOLDER'], filename
-    )
+    """
+    Отдает файл чертежа из защищенной папки.
+
+    С параметром `size` (sm, md, lg) и необязательным `page` отдается готовое
+    превью (WebP, если браузер его принимает). Пока превью не построено,
+    отдается оригинал с требованием перепроверки. Оригиналы поддерживают запросы Range; из S3-хранилища
+    они передаются потоком без сохранения на диск.
+    """
+    folder = current_app.config['DRAWING_UPLOAD_FOLDER']
+    if safe_join(folder, filename) is None:
+        abort(404)
+
+    size = request.args.get('size')
+    if size:
+        accept_webp = request.accept_mimetypes.quality('image/webp') > 0
+        thumbnail = drawing_service.find_thumbnail(filename, current_app.config, size,
+                                                   page=request.args.get('page', 1, type=int),
+                                                   accept_webp=accept_webp)
+        if thumbnail:
+            path, mimetype = thumbnail
+            response = send_file(path, mimetype=mimetype, conditional=True,
+                                 max_age=current_app.config['DRAWING_THUMBNAIL_MAX_AGE'])
+            # Имя чертежа уникально, поэтому превью по этому адресу не меняется
+            response.cache_control.private = True
+            response.cache_control.immutable = True
+            response.vary.add('Accept')
+            return response
+
+    key = drawing_storage.parse_blob_filename(filename)
+    if key is None:
+        response = send_from_directory(folder, filename, conditional=True,
+                                       max_age=current_app.config['DRAWING_ORIGINAL_MAX_AGE'])
+    else:
+        response = _send_blob(key, filename)
+    if size:
+        # Превью еще не построено: оригинал по адресу превью браузер должен перепроверять
+        response.cache_control.no_cache = True
+        response.cache_control.max_age = 0
+        response.expires = None
+    elif key is not None:
+        # Содержимое по адресу с хэшем не меняется
+        response.cache_control.immutable = True
+    response.cache_control.private = True
+    return response
+
+
+def _send_blob(key, filename):
+    """Отдает оригинал чертежа из хранилища."""
+    backend = drawing_storage.get_backend(current_app.config)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    max_age = current_app.config['DRAWING_ORIGINAL_MAX_AGE']
+    path = backend.local_path(key)
+    if path:
+        return send_file(path, mimetype=mimetype, conditional=True, max_age=max_age)
+    if backend.name == 'local':
+        abort(404)
+    try:
+        upstream = backend.stream(key, request.headers.get('Range'))
+    except FileNotFoundError:
+        abort(404)
+    response = Response(upstream.iter_content(drawing_storage.CHUNK_SIZE),
+                        status=upstream.status_code, mimetype=mimetype)
+    for header in ('Content-Length', 'Content-Range', 'Accept-Ranges', 'ETag', 'Last-Modified'):
+        if header in upstream.headers:
+            response.headers[header] = upstream.headers[header]
+    response.cache_control.max_age = max_age
+    response.call_on_close(upstream.close)
+    return response
 
 
 @part_bp.route('/add_single_part', methods=['POST'])
@@ -31,7 +98,7 @@ def add_single_part():
     """Обрабатывает добавление одной детали через форму."""
     form = PartForm()
     form.route_template.choices = [
-        (rt.id, rt.name) for rt in RouteTemplate.query.order_by(RouteTemplate.name).all()
+        (rt['id'], rt['name']) for rt in reference_cache.rows('route_templates')
     ]
 
     if form.validate_on_submit():
@@ -41,6 +108,9 @@ def add_single_part():
         except IntegrityError:
             db.session.rollback()
             flash(f"Ошибка: Деталь {form.part_id.data} уже существует!", 'error')
+        except ValueError as e:
+            db.session.rollback()
+            flash(f"Ошибка: {e}", 'error')
         except Exception as e:
             db.session.rollback()
             flash(f"Произошла непредвиденная ошибка: {e}", 'error')
@@ -60,9 +130,10 @@ def upload_excel():
     form = FileUploadForm()
     if form.validate_on_submit():
         try:
-            added, skipped = part_service.import_parts_from_excel(
-                form.file.data, current_user, current_app.config
-            )
+            with metrics.import_duration.time(source='excel'):
+                added, skipped = part_service.import_parts_from_excel(
+                    form.file.data, current_user, current_app.config
+                )
             flash(f"Импорт завершен. Добавлено: {added}, пропущено дубликатов: {skipped}.", 'success')
         except ValueError as e:
             flash(f"Ошибка валидации: {e}", 'error')
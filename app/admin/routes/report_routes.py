@@ -1,15 +1,19 @@
 # app/admin/routes/report_routes.py
 
+import io
+
 from flask import (Blueprint, render_template, request, jsonify, flash,
-                   redirect, url_for, send_file, current_app)
+                   redirect, url_for, send_file, current_app, Response, abort)
 from flask_login import login_required
-from datetime import datetime
-from sqlalchemy import func, case
+import pandas as pd
 
-from app.models.models import db, StatusHistory, Part, Permission, StatusType
+from app.models.models import Permission
 from app.admin.utils import permission_required
-from app.admin.forms import GenerateFromCloudForm
-from app.services import graph_service, document_service
+from app.admin.forms import GenerateFromCloudForm, GenerateBatchFromCloudForm
+from app.services import graph_service, document_service, report_service
+from app.services.onedrive_cache import fetch_onedrive_file
+from app.services.report_cache import cached_report, report_cache
+from app.services.analytics_service import get_history_analytics
 
 report_bp = Blueprint('report', __name__)
 
@@ -21,38 +25,55 @@ def reports_index():
     return render_template('reports/index.html')
 
 
+def _report_filters():
+    """
+    Читает общие фильтры отчетов из строки запроса: период и изделие.
+    Дата не в формате 'YYYY-MM-DD' - ошибка запроса (400).
+    """
+    try:
+        date_from = report_service.parse_report_date(request.args.get('date_from'))
+        date_to = report_service.parse_report_date(request.args.get('date_to'))
+    except ValueError:
+        abort(400, description="Дата периода должна быть в формате ГГГГ-ММ-ДД.")
+    return date_from, date_to, request.args.get('product', '').strip() or None
+
+
+def _render_report_page(template_name):
+    """Отображает страницу отчета с текущими значениями фильтров."""
+    return render_template(
+        template_name,
+        date_from=request.args.get('date_from', ''),
+        date_to=request.args.get('date_to', ''),
+        product=request.args.get('product', '')
+    )
+
+
 @report_bp.route('/operator_performance')
 @permission_required(Permission.VIEW_REPORTS)
 def report_operator_performance():
     """Отображает страницу отчета по производительности операторов."""
-    date_from_str = request.args.get('date_from', '')
-    date_to_str = request.args.get('date_to', '')
-    return render_template(
-        'reports/operator_performance.html',
-        date_from=date_from_str,
-        date_to=date_to_str
-    )
+    return _render_report_page('reports/operator_performance.html')
 
 
 @report_bp.route('/stage_duration')
 @permission_required(Permission.VIEW_REPORTS)
 def report_stage_duration():
     """Отображает страницу отчета по средней длительности этапов."""
-    return render_template('reports/stage_duration.html')
+    return _render_report_page('reports/stage_duration.html')
 
 
 @report_bp.route('/order_completion')
 @permission_required(Permission.VIEW_REPORTS)
 def report_order_completion():
     """Отображает страницу отчета по времени выполнения заказа."""
-    return render_template('reports/order_completion.html')
+    return _render_report_page('reports/order_completion.html')
 
 
 @report_bp.route('/defect_analysis')
 @permission_required(Permission.VIEW_REPORTS)
 def report_defect_analysis():
     """Отображает страницу отчета по анализу брака."""
-    return render_template('reports/defect_analysis.html')
+    return _render_report_page('reports/defect_analysis.html')
 
 
 @report_bp.route('/generate_from_cloud', methods=['GET', 'POST'])
@@ -69,20 +90,16 @@ def generate_from_cloud():
         word_template_file = form.word_template.data
 
         try:
-            excel_bytes = graph_service.download_file_from_onedrive(excel_path)
+            excel_bytes = fetch_onedrive_file(excel_path)
             placeholders = graph_service.read_row_from_excel_bytes(excel_bytes, row_number)
             document_stream = document_service.generate_word_from_data(
                 word_template_file.stream, placeholders
             )
             
-            birka_name = placeholders.get('{{№ бирки}}', f'report_{row_number}')
-            safe_filename = "".join(c for c in str(birka_name) if c.isalnum() or c in "._- ").strip()
-            final_filename = f"{safe_filename}.docx"
-            
             return send_file(
                 document_stream,
                 as_attachment=True,
-                download_name=final_filename,
+                download_name=document_service.document_filename(placeholders, row_number),
                 mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
             )
         except (FileNotFoundError, ValueError, IndexError, graph_service.GraphAPIError) as e:
@@ -98,101 +115,174 @@ def generate_from_cloud():
     return render_template('reports/generate_from_cloud.html', form=form)
 
 
+@report_bp.route('/generate_from_cloud/batch', methods=['GET', 'POST'])
+@permission_required(Permission.VIEW_REPORTS)
+def generate_batch_from_cloud():
+    """
+    Генерирует Word-документы сразу для нескольких строк Excel-файла из OneDrive
+    и отдает их одним ZIP-архивом, который формируется по мере готовности документов.
+    """
+    form = GenerateBatchFromCloudForm()
+    if form.validate_on_submit():
+        try:
+            row_numbers = document_service.parse_row_numbers(form.rows.data)
+            excel_bytes = fetch_onedrive_file(form.excel_path.data)
+            # Все строки проверяются до начала отправки архива: после нее сообщить об ошибке уже нельзя
+            rows = [(row_number, graph_service.read_row_from_excel_bytes(excel_bytes, row_number))
+                    for row_number in row_numbers]
+            template_bytes = form.word_template.data.read()
+            # Шаблон только разбирается: рендерят его потоки generate_word_zip
+            document_service.CompiledTemplate(io.BytesIO(template_bytes))
+        except (FileNotFoundError, ValueError, IndexError, graph_service.GraphAPIError) as e:
+            error_message = f"Ошибка генерации отчета: {e}"
+            flash(error_message, "error")
+            current_app.logger.error(f"Error in generate_batch_from_cloud: {error_message}", exc_info=True)
+            return redirect(url_for('admin.report.generate_batch_from_cloud'))
+
+        archive_name = f"documents_{row_numbers[0]}-{row_numbers[-1]}.zip"
+        return Response(
+            document_service.generate_word_zip(template_bytes, rows),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{archive_name}"'}
+        )
+
+    return render_template('reports/generate_batch_from_cloud.html', form=form)
+
+
 # --- API Эндпоинты для графиков ---
+# Все отчеты принимают фильтры date_from, date_to (включительно) и product.
+# Результаты кэшируются через report_cache: ключ учитывает имя отчета и фильтры.
 
 @report_bp.route('/api/reports/operator_performance')
 @login_required
 def api_report_operator_performance():
-    date_from_str = request.args.get('date_from')
-    date_to_str = request.args.get('date_to')
-    query = db.session.query(
-        StatusHistory.operator_name,
-        func.count(StatusHistory.id).label('stages_completed')
-    ).group_by(StatusHistory.operator_name).order_by(func.count(StatusHistory.id).desc())
-    if date_from_str:
-        date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
-        query = query.filter(StatusHistory.timestamp >= date_from)
-    if date_to_str:
-        date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date()
-        query = query.filter(StatusHistory.timestamp <= date_to)
-    
-    data = query.all()
-    
-    chart_data = {
-        'labels': [row.operator_name for row in data],
-        'datasets': [{'label': 'Выполнено этапов', 'data': [row.stages_completed for row in data],
-                      'backgroundColor': 'rgba(40, 167, 69, 0.7)', 'borderColor': 'rgba(40, 167, 69, 1)',
-                      'borderWidth': 1}]
-    }
-    return jsonify(chart_data)
+    date_from, date_to, product = _report_filters()
+
+    def build_report():
+        data = report_service.get_operator_performance(date_from, date_to, product)
+        return {
+            'labels': [row.operator_name for row in data],
+            'datasets': [{'label': 'Выполнено этапов', 'data': [row.stages_completed for row in data],
+                          'backgroundColor': 'rgba(40, 167, 69, 0.7)', 'borderColor': 'rgba(40, 167, 69, 1)',
+                          'borderWidth': 1}]
+        }
+
+    return jsonify(cached_report('operator_performance', build_report, date_from, date_to, product=product))
 
 
 @report_bp.route('/api/reports/stage_duration')
 @login_required
 def api_report_stage_duration():
-    engine_name = db.engine.name
-    duration_expr = ((func.julianday(StatusHistory.timestamp) - func.coalesce(func.lag(func.julianday(StatusHistory.timestamp)).over(
-        partition_by=StatusHistory.part_id, order_by=StatusHistory.timestamp), func.julianday(Part.date_added))) * 86400.0
-    ) if engine_name == 'sqlite' else func.extract('epoch', StatusHistory.timestamp - func.coalesce(func.lag(
-        StatusHistory.timestamp).over(partition_by=StatusHistory.part_id, order_by=StatusHistory.timestamp), Part.date_added))
-    
-    cte = db.session.query(StatusHistory.status.label('stage_name'), duration_expr.label('duration_seconds')
-                          ).join(Part, Part.part_id == StatusHistory.part_id).subquery()
-    
-    report_data = db.session.query(cte.c.stage_name, func.avg(cte.c.duration_seconds).label('avg_duration_seconds')
-                                  ).group_by(cte.c.stage_name).order_by(func.avg(cte.c.duration_seconds).desc()).all()
-
-    chart_data = {
-        'labels': [row.stage_name for row in report_data],
-        'datasets': [{'label': 'Среднее время (в часах)', 'data': [(row.avg_duration_seconds / 3600) if row.avg_duration_seconds else 0 for row in report_data],
-                      'backgroundColor': 'rgba(0, 123, 255, 0.7)', 'borderColor': 'rgba(0, 123, 255, 1)',
-                      'borderWidth': 1}]
-    }
-    return jsonify(chart_data)
+    date_from, date_to, product = _report_filters()
+
+    def build_report():
+        report_data = report_service.get_stage_duration_stats(date_from, date_to, product)
+        return {
+            'labels': [row['stage_name'] for row in report_data],
+            'datasets': [{'label': 'Среднее время (в часах)', 'data': [row['avg_seconds'] / 3600 for row in report_data],
+                          'backgroundColor': 'rgba(0, 123, 255, 0.7)', 'borderColor': 'rgba(0, 123, 255, 1)',
+                          'borderWidth': 1},
+                         {'label': 'Медиана, p50 (в часах)', 'data': [row['p50_seconds'] / 3600 for row in report_data],
+                          'backgroundColor': 'rgba(16, 185, 129, 0.7)', 'borderColor': 'rgba(16, 185, 129, 1)',
+                          'borderWidth': 1},
+                         {'label': 'p90 (в часах)', 'data': [row['p90_seconds'] / 3600 for row in report_data],
+                          'backgroundColor': 'rgba(245, 158, 11, 0.7)', 'borderColor': 'rgba(245, 158, 11, 1)',
+                          'borderWidth': 1}]
+        }
+
+    return jsonify(cached_report('stage_duration', build_report, date_from, date_to, product=product))
 
 
 @report_bp.route('/api/reports/order_completion')
 @login_required
 def api_report_order_completion():
-    last_stage_time = db.session.query(
-        StatusHistory.part_id,
-        func.max(StatusHistory.timestamp).label('completion_time')
-    ).group_by(StatusHistory.part_id).subquery()
-    
-    time_diff_expr = (func.julianday(last_stage_time.c.completion_time) - func.julianday(Part.date_added)
-    ) if db.engine.name == 'sqlite' else func.extract('epoch', last_stage_time.c.completion_time - Part.date_added) / 86400.0
-    
-    completion_data = db.session.query(
-        Part.part_id,
-        time_diff_expr.label('days_taken')
-    ).join(
-        last_stage_time, Part.part_id == last_stage_time.c.part_id
-    ).filter(
-        Part.quantity_completed >= Part.quantity_total
-    ).order_by(Part.date_added.desc()).limit(30).all()
-
-    chart_data = {
-        'labels': [row.part_id for row in completion_data],
-        'datasets': [{'label': 'Дней на выполнение', 'data': [row.days_taken for row in completion_data],
-                      'backgroundColor': 'rgba(75, 192, 192, 0.7)'}]
-    }
-    return jsonify(chart_data)
+    date_from, date_to, product = _report_filters()
+
+    def build_report():
+        completion_data = report_service.get_order_completion(date_from, date_to, product)
+        return {
+            'labels': [row.part_id for row in completion_data],
+            'datasets': [{'label': 'Дней на выполнение', 'data': [row.days_taken for row in completion_data],
+                          'backgroundColor': 'rgba(75, 192, 192, 0.7)'}]
+        }
+
+    return jsonify(cached_report('order_completion', build_report, date_from, date_to, product=product))
 
 
 @report_bp.route('/api/reports/defect_analysis')
 @login_required
 def api_report_defect_analysis():
-    data = db.session.query(
-        StatusHistory.status,
-        func.sum(StatusHistory.quantity).label('scrapped_qty')
-    ).filter(
-        StatusHistory.status_type == StatusType.SCRAPPED
-    ).group_by(StatusHistory.status).order_by(func.sum(StatusHistory.quantity).desc()).all()
-    
-    chart_data = {
-        'labels': [row.status for row in data],
-        'datasets': [{'label': 'Количество брака (шт.)', 'data': [row.scrapped_qty for row in data],
-                      'backgroundColor': 'rgba(239, 68, 68, 0.7)', 'borderColor': 'rgba(220, 38, 38, 1)',
-                      'borderWidth': 1}]
-    }
-    return jsonify(chart_data)
\ No newline at end of file
+    date_from, date_to, product = _report_filters()
+
+    def build_report():
+        data = report_service.get_defect_analysis(date_from, date_to, product)
+        return {
+            'labels': [row.status for row in data],
+            'datasets': [{'label': 'Количество брака (шт.)', 'data': [row.scrapped_qty for row in data],
+                          'backgroundColor': 'rgba(239, 68, 68, 0.7)', 'borderColor': 'rgba(220, 38, 38, 1)',
+                          'borderWidth': 1}]
+        }
+
+    return jsonify(cached_report('defect_analysis', build_report, date_from, date_to, product=product))
+
+
+# --- Отчеты аналитического движка (вычисляются в памяти, см. analytics_service) ---
+
+@report_bp.route('/api/reports/shift_throughput')
+@login_required
+def api_report_shift_throughput():
+    date_from, date_to, product = _report_filters()
+
+    def build_report():
+        data = get_history_analytics().throughput_by_shift(date_from, date_to, product=product)
+        days = sorted(data['shift_day'].unique())
+        labels = [pd.Timestamp(day).strftime('%Y-%m-%d') for day in days]
+        datasets = []
+        for shift_number, shift_rows in data.groupby('shift'):
+            by_day = dict(zip(shift_rows['shift_day'], shift_rows['quantity']))
+            datasets.append({'label': f'Смена {shift_number}', 'data': [int(by_day.get(day, 0)) for day in days]})
+        return {'labels': labels, 'datasets': datasets}
+
+    return jsonify(cached_report('shift_throughput', build_report, date_from, date_to, product=product))
+
+
+@report_bp.route('/api/reports/wip')
+@login_required
+def api_report_wip():
+    date_from, date_to, product = _report_filters()
+    freq = 'W' if request.args.get('freq') == 'week' else 'D'
+
+    def build_report():
+        wip = get_history_analytics().wip_over_time(freq, date_from, date_to, product)
+        return {
+            'labels': [timestamp.strftime('%Y-%m-%d') for timestamp in wip.index],
+            'datasets': [{'label': 'Детали в работе', 'data': [int(value) for value in wip.to_numpy()],
+                          'borderColor': 'rgba(99, 102, 241, 1)', 'backgroundColor': 'rgba(99, 102, 241, 0.3)'}]
+        }
+
+    return jsonify(cached_report('wip', build_report, date_from, date_to, freq=freq, product=product))
+
+
+@report_bp.route('/api/reports/bottlenecks')
+@login_required
+def api_report_bottlenecks():
+    date_from, date_to, product = _report_filters()
+
+    def build_report():
+        data = get_history_analytics().bottlenecks(date_from=date_from, date_to=date_to, product=product)
+        return {
+            'labels': [str(stage_name) for stage_name in data.index],
+            'datasets': [{'label': 'Медиана, p50 (в часах)', 'data': [float(v) / 3600 for v in data['p50_seconds']],
+                          'backgroundColor': 'rgba(245, 158, 11, 0.7)'},
+                         {'label': 'Доля общего времени, %', 'data': [float(v) * 100 for v in data['share_of_total_time']],
+                          'backgroundColor': 'rgba(107, 114, 128, 0.7)'}]
+        }
+
+    return jsonify(cached_report('bottlenecks', build_report, date_from, date_to, product=product))
+
+
+@report_bp.route('/api/reports/cache_stats')
+@permission_required(Permission.VIEW_REPORTS)
+def api_report_cache_stats():
+    """Возвращает метрики кэша отчетов (попадания, промахи, доля попаданий)."""
+    return jsonify(report_cache.stats())
@@ -7,6 +7,7 @@ from sqlalchemy.orm import joinedload
 from app.models.models import db, User, AuditLog, Role, Permission
 from app.admin.forms import LoginForm, AddUserForm, EditUserForm, RoleForm
 from app.admin.utils import admin_required, permission_required
+from app.services import audit_service, reference_cache
 
 user_bp = Blueprint('user', __name__)
 
@@ -23,8 +24,8 @@ def login():
         user = User.query.filter_by(username=form.username.data).first()
         if user and user.check_password(form.password.data):
             login_user(user)
-            log_entry = AuditLog(user_id=user.id, action="Вход в систему", details=f"Пользователь '{user.username}' вошел в систему.", category='auth')
-            db.session.add(log_entry)
+            audit_service.record("Вход в систему", f"Пользователь '{user.username}' вошел в систему.",
+                                 user_id=user.id, category='auth')
             db.session.commit()
             flash('Вы успешно вошли в систему!', 'success')
             return redirect(url_for('main.dashboard'))
@@ -36,8 +37,8 @@ def login():
 @login_required
 def logout():
     """Обрабатывает выход пользователя из системы."""
-    log_entry = AuditLog(user_id=current_user.id, action="Выход из системы", details=f"Пользователь '{current_user.username}' вышел из системы.", category='auth')
-    db.session.add(log_entry)
+    audit_service.record("Выход из системы", f"Пользователь '{current_user.username}' вышел из системы.",
+                         user_id=current_user.id, category='auth')
     db.session.commit()
     logout_user()
     flash('Вы вышли из системы.', 'success')
@@ -48,19 +49,17 @@ def logout():
 @user_bp.route('/audit_log')
 @permission_required(Permission.VIEW_AUDIT_LOG)
 def audit_log():
-    """Отображает журнал аудита, связанный с деталями."""
-    page = request.args.get('page', 1, type=int)
-    logs = AuditLog.query.options(joinedload(AuditLog.user)).filter_by(category='part').order_by(AuditLog.timestamp.desc()).paginate(page=page, per_page=25)
+    """Отображает журнал аудита, связанный с деталями (навигация по курсору, см. audit_service)."""
+    logs = audit_service.paginate_audit_log(AuditLog.category == 'part',
+                                            after=request.args.get('after'), before=request.args.get('before'))
     return render_template('audit_log.html', logs=logs)
 
 @user_bp.route('/user_log')
 @permission_required(Permission.VIEW_AUDIT_LOG)
 def user_log():
     """Отображает журнал аудита, связанный с пользователями и управлением."""
-    page = request.args.get('page', 1, type=int)
-    user_logs = AuditLog.query.options(joinedload(AuditLog.user)).filter(
-        AuditLog.category.in_(['auth', 'management'])
-    ).order_by(AuditLog.timestamp.desc()).paginate(page=page, per_page=25)
+    user_logs = audit_service.paginate_audit_log(AuditLog.category.in_(['auth', 'management']),
+                                                 after=request.args.get('after'), before=request.args.get('before'))
     return render_template('user_log.html', logs=user_logs)
 
 # --- Маршруты для управления ролями ---
@@ -83,6 +82,7 @@ def add_role():
         db.session.add(new_role)
         log_entry = AuditLog(user_id=current_user.id, action="Управление ролями", details=f"Создана новая роль '{new_role.name}'.", category='management')
         db.session.add(log_entry)
+        reference_cache.invalidate()
         db.session.commit()
         flash(f'Роль "{new_role.name}" успешно создана.', 'success')
         return redirect(url_for('admin.user.list_roles'))
@@ -101,6 +101,7 @@ def edit_role(role_id):
         role.permissions = sum(form.permissions.data)
         log_entry = AuditLog(user_id=current_user.id, action="Управление ролями", details=f"Изменена роль '{role.name}'.", category='management')
         db.session.add(log_entry)
+        reference_cache.invalidate()
         db.session.commit()
         flash(f'Роль "{role.name}" успешно обновлена.', 'success')
         return redirect(url_for('admin.user.list_roles'))
@@ -122,6 +123,7 @@ def delete_role(role_id):
         db.session.delete(role)
         log_entry = AuditLog(user_id=current_user.id, action="Управление ролями", details=f"Удалена роль '{role_name}'.", category='management')
         db.session.add(log_entry)
+        reference_cache.invalidate()
         db.session.commit()
         flash(f'Роль "{role_name}" успешно удалена.', 'success')
     return redirect(url_for('admin.user.list_roles'))
@@ -151,6 +153,7 @@ def add_user():
         )
         new_user.set_password(form.password.data)
         db.session.add(new_user)
+        reference_cache.invalidate()
         db.session.commit()
         
         log_entry = AuditLog(user_id=current_user.id, action="Управление пользователями", details=f"Создан новый пользователь '{new_user.username}'.", category='management')
@@ -177,6 +180,7 @@ def edit_user(user_id):
                 user.set_password(form.password.data)
             log_entry = AuditLog(user_id=current_user.id, action="Управление пользователями", details=f"Изменены данные пользователя '{user.username}'.", category='management')
             db.session.add(log_entry)
+            reference_cache.invalidate()
             db.session.commit()
             flash(f'Данные пользователя {user.username} обновлены.', 'success')
             return redirect(url_for('admin.user.list_users'))
@@ -209,6 +213,7 @@ def delete_user(user_id):
     log_entry = AuditLog(user_id=current_user.id, action="Управление пользователями", details=f"Удален пользователь '{username_deleted}'.", category='management')
     db.session.add(log_entry)
     db.session.delete(user_to_delete)
+    reference_cache.invalidate()
     db.session.commit()
     flash(f'Пользователь {username_deleted} удален.', 'success')
     return redirect(url_for('admin.user.list_users'))
\ No newline at end of file
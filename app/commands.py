@@ -16,8 +16,11 @@ def seed_command():
     Заполняет базу данных начальными данными:
     создает роли и первого администратора.
     """
+    from .services import reference_cache
+
     if Role.query.count() == 0:
         click.echo("Создание ролей пользователей...")
+        reference_cache.invalidate()
         Role.insert_roles()
         click.secho("Роли успешно созданы.", fg="green")
 
@@ -39,6 +42,7 @@ def seed_command():
         )
         admin_user.set_password(admin_password)
         db.session.add(admin_user)
+        reference_cache.invalidate()
         db.session.commit()
         
         click.secho("\n✅ Администратор успешно создан.", fg="green")
@@ -57,18 +61,22 @@ def seed_cypress_command():
     Очищает и заполняет базу данных тестовыми данными,
     необходимыми для прогона E2E-тестов Cypress.
     """
+    from .services import analytics_service, reference_cache
+
     click.echo("Очистка старых данных...")
     # Правильный порядок удаления для соблюдения внешних ключей
     db.session.query(AuditLog).delete()
     db.session.query(PartNote).delete()
     db.session.query(ResponsibleHistory).delete()
     db.session.query(StatusHistory).delete()
+    analytics_service.record_history_changes(db.session)
     db.session.query(Part).delete() 
     db.session.query(RouteStage).delete()
     db.session.query(User).delete() 
     db.session.query(Role).delete()
     db.session.query(RouteTemplate).delete()
     db.session.query(Stage).delete()
+    reference_cache.invalidate()
     db.session.commit()
 
     click.echo("Создание ролей и пользователей для тестов...")
@@ -93,6 +101,7 @@ def seed_cypress_command():
     route1 = RouteTemplate(name='Стандартный тестовый маршрут', is_default=True)
 
     db.session.add_all([admin, manager, operator, stage1, stage2, route1])
+    reference_cache.invalidate()
     db.session.commit()
 
     rs1 = RouteStage(template_id=route1.id, stage_id=stage1.id, order=0)
@@ -117,4 +126,179 @@ def seed_cypress_command():
     db.session.add_all([rs1, rs2, part1, part2])
     db.session.commit()
 
-    click.secho("✅ База данных готова для Cypress-тестов.", fg="green")
\ No newline at end of file
+    click.secho("✅ База данных готова для Cypress-тестов.", fg="green")
+
+@click.command('export-analytics')
+@click.option('--output', 'output_dir', default=None,
+              help="Каталог для Parquet-файлов (по умолчанию instance/analytics).")
+@click.option('--full', is_flag=True, help="Выгрузить все данные заново, игнорируя водяные знаки.")
+@click.option('--batch-size', default=50000, show_default=True, help="Размер пачки при чтении из БД.")
+@with_appcontext
+def export_analytics_command(output_dir, full, batch_size):
+    """
+    Выгружает историю, детали и журнал аудита в Parquet-файлы,
+    разбитые по месяцам, для офлайн-анализа.
+
+    Повторный запуск дописывает только новые строки истории и аудита.
+    Отмененные этапы, архивированные детали и разделы, а также пересчитанная
+    при отмене этапа длительность следующей записи остаются в файлах в прежнем
+    виде; чтобы их учесть, запускайте выгрузку с --full.
+    """
+    from .services import export_service
+
+    output_dir = output_dir or os.path.join(current_app.instance_path, 'analytics')
+    click.echo(f"Выгрузка аналитических данных в {output_dir}...")
+    summary = export_service.export_analytics(output_dir, full=full, batch_size=batch_size)
+    for name, rows in summary.items():
+        click.echo(f"   {name}: {rows} строк")
+    click.secho("✅ Выгрузка завершена.", fg="green")
+
+
+@click.command('gc-drawings')
+@click.option('--grace', 'grace_period', type=int, default=None,
+              help="Сколько секунд файл должен пробыть без ссылок (по умолчанию DRAWING_GC_GRACE_PERIOD).")
+@with_appcontext
+def gc_drawings_command(grace_period):
+    """Удаляет из хранилища чертежи, на которые не ссылается ни одна деталь."""
+    from .services import drawing_service
+
+    removed = drawing_service.collect_garbage(current_app.config, grace_period)
+    click.secho(f"✅ Удалено файлов чертежей: {removed}", fg="green")
+
+
+@click.command('create-partitions')
+@click.option('--months-ahead', type=int, default=None,
+              help="На сколько месяцев вперед создать разделы (по умолчанию PARTITION_MONTHS_AHEAD).")
+@with_appcontext
+def create_partitions_command(months_ahead):
+    """Создает недостающие месячные разделы AuditLogs и StatusHistory (PostgreSQL)."""
+    from .services import partition_service
+
+    if not partition_service.is_supported():
+        click.secho("Секционирование поддерживается только в PostgreSQL.", fg="yellow")
+        return
+    created = partition_service.ensure_future_partitions(months_ahead)
+    for name in created:
+        click.echo(f"   {name}")
+    click.secho(f"✅ Создано разделов: {len(created)}", fg="green")
+
+
+@click.command('archive-partitions')
+@click.option('--table', type=click.Choice(['AuditLogs', 'StatusHistory']), default='AuditLogs',
+              show_default=True, help="Секционированная таблица.")
+@click.option('--keep-months', type=int, default=None,
+              help="Сколько последних месяцев оставить (по умолчанию PARTITION_RETENTION_MONTHS).")
+@click.option('--output', 'output_dir', default=None,
+              help="Каталог архивов (по умолчанию PARTITION_ARCHIVE_DIR или instance/archive).")
+@with_appcontext
+def archive_partitions_command(table, keep_months, output_dir):
+    """
+    Отключает разделы старше срока хранения, выгружает их
+    в сжатые CSV-файлы и удаляет из базы (PostgreSQL).
+    """
+    from .services import partition_service
+
+    if not partition_service.is_supported():
+        click.secho("Секционирование поддерживается только в PostgreSQL.", fg="yellow")
+        return
+    if keep_months is None:
+        keep_months = current_app.config.get('PARTITION_RETENTION_MONTHS', {}).get(table)
+    if not keep_months:
+        raise click.UsageError(f"Срок хранения для {table} не задан: укажите --keep-months.")
+    output_dir = output_dir or current_app.config.get('PARTITION_ARCHIVE_DIR') or \
+        os.path.join(current_app.instance_path, 'archive')
+    archived = partition_service.archive_partitions(table, keep_months, output_dir)
+    for path in archived:
+        click.echo(f"   {path}")
+    click.secho(f"✅ Архивировано разделов: {len(archived)}", fg="green")
+
+
+@click.command('archive-parts')
+@click.option('--days', 'older_than_days', type=int, default=None,
+              help="Сколько дней завершенная деталь не должна меняться (по умолчанию PART_ARCHIVE_AFTER_DAYS).")
+@with_appcontext
+def archive_parts_command(older_than_days):
+    """
+    Переносит завершенные детали вместе с историей, примечаниями и связями
+    сборок в архив. Архивная деталь восстанавливается при открытии ее истории.
+    """
+    from .services import archive_service
+
+    archived = archive_service.archive_completed_parts(older_than_days)
+    click.secho(f"✅ Перенесено в архив деталей: {archived}", fg="green")
+
+
+@click.command('seed-bench')
+@click.option('--products', type=int, default=20, show_default=True, help="Число изделий.")
+@click.option('--depth', 'bom_depth', type=int, default=3, show_default=True, help="Глубина дерева состава.")
+@click.option('--fanout', type=int, default=4, show_default=True, help="Узлов в каждой сборке.")
+@click.option('--history', 'history_per_part', type=int, default=6, show_default=True,
+              help="Среднее число записей истории на деталь.")
+@click.option('--seed', type=int, default=42, show_default=True, help="Начальное значение генератора.")
+@click.option('--clear', is_flag=True, help="Удалить ранее загруженные синтетические данные.")
+@with_appcontext
+def seed_bench_command(products, bom_depth, fanout, history_per_part, seed, clear):
+    """
+    Заполняет базу синтетическими изделиями (SYN-0000, ...) с деревом состава
+    и историей этапов для бенчмарков (benchmarks/bench_pipeline.py).
+    """
+    from .services import synthetic_data
+
+    if clear:
+        click.echo("Удаление синтетических данных...")
+        synthetic_data.clear()
+    try:
+        summary = synthetic_data.generate(products, bom_depth, fanout, history_per_part, seed)
+    except ValueError as e:
+        raise click.ClickException(f"{e} Запустите команду с --clear.")
+    for name, rows in summary.items():
+        click.echo(f"   {name}: {rows} строк")
+    click.secho("✅ Синтетические данные загружены.", fg="green")
+
+
+@click.command('seed-scale')
+@click.option('--parts', type=int, default=1_000_000, show_default=True, help="Число деталей.")
+@click.option('--depth', 'bom_depth', type=int, default=3, show_default=True, help="Наибольшая глубина дерева состава.")
+@click.option('--fanout', type=int, default=6, show_default=True, help="Среднее число узлов в сборке.")
+@click.option('--stages', type=int, default=20, show_default=True, help="Этапов в справочнике.")
+@click.option('--routes', type=int, default=40, show_default=True, help="Маршрутов.")
+@click.option('--users', type=int, default=100, show_default=True, help="Пользователей.")
+@click.option('--days', type=int, default=365, show_default=True, help="Длина периода истории (дней).")
+@click.option('--history', 'history_per_part', type=int, default=6, show_default=True,
+              help="Среднее число записей истории на деталь.")
+@click.option('--audit', 'audit_per_part', type=float, default=2.0, show_default=True,
+              help="Среднее число записей журнала на деталь.")
+@click.option('--until', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help="Конец периода (по умолчанию сегодня); вместе с --seed делает данные воспроизводимыми.")
+@click.option('--seed', type=int, default=42, show_default=True, help="Начальное значение генератора.")
+@click.option('--chunk-size', type=int, default=50_000, show_default=True, help="Строк в одной пачке записи.")
+@click.option('--no-copy', is_flag=True, help="Вставлять через INSERT даже в PostgreSQL.")
+@click.option('--clear', is_flag=True, help="Удалить ранее загруженные синтетические данные.")
+@with_appcontext
+def seed_scale_command(parts, bom_depth, fanout, stages, routes, users, days, history_per_part, audit_per_part,
+                       until, seed, chunk_size, no_copy, clear):
+    """
+    Заполняет базу данными производственного масштаба (изделия SYN-...,
+    маршруты, этапы, история и журнал аудита) для нагрузочных тестов
+    и проверки планов запросов. В PostgreSQL строки загружаются через COPY.
+    """
+    from .services import synthetic_data
+
+    if clear:
+        click.echo("Удаление синтетических данных...")
+        synthetic_data.clear()
+
+    def progress(summary):
+        click.echo(f"\r   деталей {summary['parts']}, истории {summary['history']}, журнала {summary['audit']}",
+                   nl=False)
+
+    try:
+        summary = synthetic_data.generate_scale(
+            parts, bom_depth, fanout, stages, routes, users, days, history_per_part, audit_per_part,
+            seed=seed, until=until, chunk_size=chunk_size, use_copy=False if no_copy else None, progress=progress)
+    except ValueError as e:
+        raise click.ClickException(f"{e} Запустите команду с --clear.")
+    click.echo()
+    for name, rows in summary.items():
+        click.echo(f"   {name}: {rows} строк")
+    click.secho("✅ Данные производственного масштаба загружены.", fg="green")
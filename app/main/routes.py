@@ -1,19 +1,20 @@
 ## app/main/routes.py
 
 from flask import (Blueprint, render_template, jsonify, request, redirect,
-                   url_for, flash, current_app)
+                   url_for, flash, current_app, abort)
 from sqlalchemy import func
 from sqlalchemy.orm import joinedload 
 
 from datetime import datetime, timezone
 from collections import defaultdict
 
-from app import db, socketio
+from app import db
 from flask_login import current_user, login_required
-from app.models.models import (Part, StatusHistory, AuditLog, RouteTemplate,
-                               RouteStage, Stage, PartNote, Permission, StatusType)
+from app.models.models import (Part, StatusHistory, RouteTemplate,
+                               RouteStage, Stage, PartNote, Permission, StatusType,
+                               AssemblyComponent)
 from app.admin.forms import ConfirmStageQuantityForm, AddNoteForm, AddChildPartForm
-from app.services import query_service
+from app.services import archive_service, audit_service, metrics, query_service
 from app.utils import to_safe_key
 
 main = Blueprint('main', __name__)
@@ -27,7 +28,7 @@ def _send_websocket_notification(event_type: str, message: str, part_id: str = N
             data['part_id'] = part_id
             # Генерируем URL, чтобы уведомление было кликабельным
             data['url'] = url_for('main.history', part_id=part_id, _external=False)
-        socketio.emit('notification', data)
+        metrics.emit('notification', data)
     except RuntimeError:
         current_app.logger.info("WebSocket emit skipped: Not in a Socket.IO server context.")
 
@@ -87,14 +88,15 @@ def api_parts_for_product(product_designation):
 
     parts_from_query = query.order_by(Part.part_id.asc()).all()
 
+    completed_by_part = query_service.get_completed_quantities(
+        [part.part_id for part in parts_from_query if part.route_template]
+    )
+
     parts_list = []
     for part in parts_from_query:
         route_stages_data = []
         if part.route_template:
-            completed_quantities = defaultdict(int)
-            for h in part.history:
-                if h.status_type == StatusType.COMPLETED:
-                    completed_quantities[h.status] += h.quantity
+            completed_quantities = completed_by_part[part.part_id]
 
             ordered_stages = sorted(part.route_template.stages, key=lambda s: s.order)
             
@@ -131,9 +133,20 @@ def api_parts_for_product(product_designation):
 
 @main.route('/history/<path:part_id>')
 def history(part_id):
-    """Страница с полной историей одной детали."""
-    part = db.get_or_404(Part, part_id)
+    """
+    Страница с полной историей одной детали.
+    Архивная деталь восстанавливается только для вошедшего пользователя.
+    """
+    part = db.session.get(Part, part_id)
+    if part is None:
+        if not archive_service.is_archived(part_id):
+            abort(404)
+        if not current_user.is_authenticated:
+            return current_app.login_manager.unauthorized()
+        part = archive_service.rehydrate_part(part_id)
     combined_history = query_service.get_combined_history(part)
+    component_tree = query_service.get_component_tree(part)
+    parent_links = part.parent_associations.options(joinedload(AssemblyComponent.parent)).all()
     note_form = AddNoteForm()
     child_form = AddChildPartForm()
 
@@ -146,6 +159,7 @@ def history(part_id):
 
     return render_template(
         'history.html', part=part, combined_history=combined_history,
+        component_tree=component_tree, parent_links=parent_links,
         note_form=note_form, child_form=child_form
     )
 
@@ -234,7 +248,7 @@ def confirm_stage(part_id, stage_id):
 
         db.session.commit()
 
-        socketio.emit('update_dashboard', {
+        metrics.emit('update_dashboard', {
             'part_id': part.part_id, 'new_status': part.current_status,
             'quantity_completed': part.quantity_completed, 'quantity_total': part.quantity_total,
             'product_designation': part.product_designation,
@@ -267,9 +281,8 @@ def add_note(part_id):
         db.session.add(new_note)
 
         log_details = f"К детали '{part.part_id}' добавлено примечание."
-        log_entry = AuditLog(user_id=current_user.id, action="Добавлено примечание",
-                             details=log_details, category='part', part_id=part.part_id)
-        db.session.add(log_entry)
+        audit_service.record("Добавлено примечание", log_details, user_id=current_user.id,
+                             part_id=part.part_id, category='part', durability=audit_service.SYNC)
         db.session.commit()
         flash('Примечание успешно добавлено.', 'success')
     else:
@@ -289,9 +302,8 @@ def edit_note(note_id):
     if new_text and new_text.strip():
         note.text = new_text
         log_details = f"В детали '{note.part_id}' изменено примечание (ID: {note.id})."
-        log_entry = AuditLog(user_id=current_user.id, action="Изменено примечание",
-                             details=log_details, category='management', part_id=note.part_id)
-        db.session.add(log_entry)
+        audit_service.record("Изменено примечание", log_details, user_id=current_user.id, part_id=note.part_id,
+                             category='management', durability=audit_service.SYNC)
         db.session.commit()
         return jsonify({'status': 'success', 'message': 'Примечание обновлено.', 'new_text': new_text})
     else:
@@ -308,9 +320,8 @@ def delete_note(note_id):
 
     part_id = note.part_id
     log_details = f"В детали '{part_id}' удалено примечание (ID: {note.id})."
-    log_entry = AuditLog(user_id=current_user.id, action="Удалено примечание",
-                         details=log_details, category='management', part_id=part_id)
-    db.session.add(log_entry)
+    audit_service.record("Удалено примечание", log_details, user_id=current_user.id, part_id=part_id,
+                         category='management', durability=audit_service.SYNC)
 
     db.session.delete(note)
     db.session.commit()
@@ -158,6 +158,37 @@ class Part(db.Model):
     history = db.relationship('StatusHistory', backref='part', lazy=True, cascade="all, delete-orphan")
     notes = db.relationship('PartNote', backref='part', lazy=True, cascade="all, delete-orphan")
 
+class DrawingBlob(db.Model):
+    """Файл чертежа в контентно-адресуемом хранилище (см. drawing_storage)."""
+    __tablename__ = 'DrawingBlobs'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    # Число деталей, ссылающихся на файл; файл без ссылок удаляет сборщик мусора
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    orphaned_at = db.Column(db.DateTime, nullable=True, index=True)
+
+class PartArchive(db.Model):
+    """
+    Завершенная деталь в архиве (см. archive_service): строка детали вместе
+    с историей, примечаниями, сменами ответственных и связями сборок хранится
+    одним сжатым JSON-документом и возвращается в рабочие таблицы при открытии.
+    """
+    __tablename__ = 'PartArchives'
+    part_id = db.Column(db.String, primary_key=True)
+    product_designation = db.Column(db.String, nullable=False, index=True)
+    archived_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    payload = db.Column(db.LargeBinary, nullable=False)
+
+class CacheVersion(db.Model):
+    """
+    Версия закэшированных в процессах данных (см. cache_versions): при изменении
+    данных версия увеличивается, и кэши всех процессов сбрасываются.
+    """
+    __tablename__ = 'CacheVersions'
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
 # --- Исторические/Логовые сущности ---
 
 class StatusType(enum.Enum):
@@ -167,8 +198,17 @@ class StatusType(enum.Enum):
     SCRAPPED = 'scrapped'
 
 class StatusHistory(db.Model):
-    """Модель для истории прохождения этапов."""
+    """
+    Модель для истории прохождения этапов.
+    В PostgreSQL таблица секционирована по месяцам (см. partition_service).
+    """
     __tablename__ = 'StatusHistory'
+    __table_args__ = (
+        # Составные индексы под отчеты: период по типу статуса (брак, выполнение)
+        # и история конкретных деталей за период
+        db.Index('ix_StatusHistory_status_type_timestamp', 'status_type', 'timestamp'),
+        db.Index('ix_StatusHistory_part_id_timestamp', 'part_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     part_id = db.Column(db.String, db.ForeignKey('Parts.part_id'), nullable=False, index=True)
     status = db.Column(db.String, nullable=False)
@@ -176,9 +216,69 @@ class StatusHistory(db.Model):
     timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
     quantity = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     status_type = db.Column(db.Enum(StatusType), nullable=False, default=StatusType.COMPLETED) # НОВОЕ ПОЛЕ
+    # Длительность этапа в секундах: время от предыдущей записи истории детали
+    # (или от создания детали) до этой записи. Вычисляется один раз при вставке.
+    duration_seconds = db.Column(db.Float, nullable=True)
+
+
+class HistoryChange(db.Model):
+    """
+    Журнал изменений уже записанной истории (удаления, правки, вставки задним числом)
+    для инкрементального обновления аналитического движка (см. analytics_service).
+    Запись относится к детали, к периоду или, если оба не заданы, ко всей истории.
+    """
+    __tablename__ = 'HistoryChanges'
+    id = db.Column(db.Integer, primary_key=True)
+    part_id = db.Column(db.String, nullable=True)
+    period_start = db.Column(db.DateTime, nullable=True)
+    period_end = db.Column(db.DateTime, nullable=True)
+    timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+def _to_naive_utc(value):
+    """Приводит datetime к "наивному" UTC, в котором даты хранятся в БД."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def calculate_stage_duration(connection, part_id, timestamp):
+    """
+    Вычисляет длительность этапа для записи истории с меткой времени `timestamp`:
+    разницу с предыдущей записью этой же детали или, если ее нет, с датой создания детали.
+    Использует индекс по `part_id` и не требует оконных функций.
+    """
+    history_table = StatusHistory.__table__
+    parts_table = Part.__table__
+    previous = connection.execute(
+        db.select(db.func.max(history_table.c.timestamp)).where(
+            history_table.c.part_id == part_id,
+            history_table.c.timestamp < _to_naive_utc(timestamp)
+        )
+    ).scalar()
+    if previous is None:
+        previous = connection.execute(
+            db.select(parts_table.c.date_added).where(parts_table.c.part_id == part_id)
+        ).scalar()
+    if previous is None:
+        return None
+    return (_to_naive_utc(timestamp) - _to_naive_utc(previous)).total_seconds()
+
+
+@db.event.listens_for(StatusHistory, 'before_insert')
+def _set_stage_duration(mapper, connection, target):
+    """Заполняет `duration_seconds` при вставке новой записи истории."""
+    if target.timestamp is None:
+        target.timestamp = datetime.now(timezone.utc)
+    if target.duration_seconds is None:
+        target.duration_seconds = calculate_stage_duration(connection, target.part_id, target.timestamp)
+
 
 class AuditLog(db.Model):
-    """Модель для журнала всех действий в системе."""
+    """
+    Модель для журнала всех действий в системе.
+    В PostgreSQL таблица секционирована по месяцам (см. partition_service).
+    """
     __tablename__ = 'AuditLogs'
     id = db.Column(db.Integer, primary_key=True)
     part_id = db.Column(db.String, nullable=True, index=True)
@@ -188,6 +288,11 @@ class AuditLog(db.Model):
     details = db.Column(db.Text, nullable=True)
     category = db.Column(db.String(50), nullable=False, default='general', server_default='general', index=True)
 
+    __table_args__ = (
+        # Журналы в админ-панели листаются по категории от новых записей к старым
+        db.Index('ix_AuditLogs_category_timestamp', 'category', 'timestamp'),
+    )
+
 class PartNote(db.Model):
     """Модель для примечаний к деталям."""
     __tablename__ = 'PartNotes'
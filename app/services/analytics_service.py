@@ -0,0 +1,392 @@
+# app/services/analytics_service.py
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import event, func, insert, inspect, select
+from sqlalchemy.orm import object_session
+
+from app.models.models import db, StatusHistory, HistoryChange, Part, StatusType
+from app.services import export_service
+
+HISTORY_COLUMNS = ['id', 'part_id', 'status', 'operator_name', 'timestamp',
+                   'quantity', 'status_type', 'duration_seconds']
+PARTS_COLUMNS = ['part_id', 'product_designation', 'date_added', 'last_update',
+                 'quantity_total', 'quantity_completed']
+CATEGORY_COLUMNS = ['part_id', 'status', 'operator_name', 'status_type']
+
+# Размер пачки деталей при перечитывании измененной истории (ограничение числа параметров в IN)
+CHANGED_PARTS_CHUNK = 500
+
+# Начала смен (час суток). Смена, начавшаяся вечером, относится к дню своего начала.
+DEFAULT_SHIFT_STARTS = (6, 14, 22)
+
+
+def _normalize_history(df: pd.DataFrame) -> pd.DataFrame:
+    """Приводит колонки истории к компактным типам: категории, int32, datetime64."""
+    df = df.reindex(columns=HISTORY_COLUMNS)
+    df['id'] = df['id'].astype('int64')
+    df['quantity'] = df['quantity'].fillna(1).astype('int32')
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df['duration_seconds'] = df['duration_seconds'].astype('float64')
+    for column in CATEGORY_COLUMNS:
+        df[column] = df[column].astype('category')
+    # Из БД приходят члены StatusType: переименовываем категории, а не каждую строку
+    df['status_type'] = df['status_type'].cat.rename_categories(lambda v: getattr(v, 'value', v))
+    return df
+
+
+def _concat_history(left: pd.DataFrame, right: pd.DataFrame) -> pd.DataFrame:
+    """Объединяет фреймы истории с сохранением категориальных колонок."""
+    if left.empty:
+        return right
+    if right.empty:
+        return left
+    # Исходные фреймы не меняются: их могут читать отчеты в других потоках
+    dtypes = {column: pd.CategoricalDtype(left[column].cat.categories.union(right[column].cat.categories))
+              for column in CATEGORY_COLUMNS}
+    return pd.concat([left.astype(dtypes, copy=False), right.astype(dtypes, copy=False)], ignore_index=True)
+
+
+def _period_criteria(period_start, period_end) -> list:
+    criteria = []
+    if period_start is not None:
+        criteria.append(StatusHistory.timestamp >= period_start)
+    if period_end is not None:
+        criteria.append(StatusHistory.timestamp < period_end)
+    return criteria
+
+
+def _period_mask(timestamps: pd.Series, period_start, period_end) -> np.ndarray:
+    mask = np.ones(len(timestamps), dtype=bool)
+    if period_start is not None:
+        mask &= (timestamps >= pd.Timestamp(period_start)).to_numpy()
+    if period_end is not None:
+        mask &= (timestamps < pd.Timestamp(period_end)).to_numpy()
+    return mask
+
+
+class HistoryAnalytics:
+    """
+    Аналитический движок над историей производства, хранящейся в памяти
+    в виде колонок NumPy/pandas.
+
+    История загружается один раз (из БД или из Parquet-выгрузки
+    `flask export-analytics`), а затем дополняется инкрементально: новые строки
+    дочитываются по `id`, а строки деталей и периодов из журнала HistoryChanges
+    (отмена этапа, пересчет длительности, архив) перечитываются заново.
+    Все отчеты вычисляются векторными группировками без обращения к БД.
+    """
+
+    def __init__(self, batch_size: int = 100000):
+        self.batch_size = batch_size
+        # _lock защищает замену фреймов, _refresh_lock - чтение изменений из БД
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        """Сбрасывает загруженные данные; следующее обращение загрузит их заново."""
+        with self._lock:
+            self.history = _normalize_history(pd.DataFrame(columns=HISTORY_COLUMNS))
+            self.parts = pd.DataFrame(columns=PARTS_COLUMNS).set_index('part_id')
+            self._parts_watermark = None
+            self._changes_watermark = 0
+            self.loaded = False
+
+    # --- Загрузка и обновление данных ---
+
+    @property
+    def last_id(self) -> int:
+        return int(self.history['id'].max()) if not self.history.empty else 0
+
+    def _read_history(self, *criteria) -> pd.DataFrame:
+        stmt = select(*[getattr(StatusHistory, column) for column in HISTORY_COLUMNS]).where(
+            *criteria
+        ).order_by(StatusHistory.id)
+        result = db.session.execute(stmt.execution_options(stream_results=True, yield_per=self.batch_size))
+        frames = [pd.DataFrame.from_records(batch, columns=HISTORY_COLUMNS)
+                  for batch in result.partitions(self.batch_size)]
+        if not frames:
+            return _normalize_history(pd.DataFrame(columns=HISTORY_COLUMNS))
+        return _normalize_history(pd.concat(frames, ignore_index=True))
+
+    def _read_parts(self, watermark):
+        """Детали, измененные после водяного знака `watermark`, и новый водяной знак."""
+        stmt = select(*[getattr(Part, column) for column in PARTS_COLUMNS])
+        if watermark is not None:
+            stmt = stmt.where(Part.last_update > watermark)
+        changed = pd.DataFrame.from_records(db.session.execute(stmt).all(), columns=PARTS_COLUMNS)
+        if changed.empty:
+            return changed, watermark
+        changed['date_added'] = pd.to_datetime(changed['date_added'])
+        changed['last_update'] = pd.to_datetime(changed['last_update'])
+        return changed.set_index('part_id'), changed['last_update'].max().to_pydatetime()
+
+    def _apply_parts(self, changed, watermark):
+        if changed.empty:
+            return
+        unchanged = self.parts.drop(changed.index, errors='ignore')
+        self.parts = pd.concat([unchanged, changed]) if not unchanged.empty else changed
+        self._parts_watermark = watermark
+
+    def _replace(self, history, parts, parts_watermark, changes_watermark):
+        """Подменяет все данные движка разом: отчеты в других потоках видят старую или новую версию."""
+        if parts.empty:
+            parts = pd.DataFrame(columns=PARTS_COLUMNS).set_index('part_id')
+        with self._lock:
+            self.history = history
+            self.parts = parts
+            self._parts_watermark = parts_watermark
+            self._changes_watermark = changes_watermark
+            self.loaded = True
+
+    def _read_changes(self):
+        """Новые записи журнала HistoryChanges: (детали, периоды, нужна ли полная перезагрузка, водяной знак)."""
+        rows = db.session.execute(
+            select(HistoryChange.id, HistoryChange.part_id, HistoryChange.period_start, HistoryChange.period_end)
+            .where(HistoryChange.id > self._changes_watermark).order_by(HistoryChange.id)
+        ).all()
+        part_ids, periods, full = set(), [], False
+        for row in rows:
+            if row.part_id is not None:
+                part_ids.add(row.part_id)
+            elif row.period_start is not None or row.period_end is not None:
+                periods.append((row.period_start, row.period_end))
+            else:
+                full = True
+        return part_ids, periods, full, rows[-1].id if rows else self._changes_watermark
+
+    def _current_changes_watermark(self) -> int:
+        return db.session.execute(select(func.max(HistoryChange.id))).scalar() or 0
+
+    def load_from_db(self):
+        """Полностью загружает историю и детали из БД."""
+        with self._refresh_lock:
+            # Водяной знак журнала читается до истории: изменения во время чтения применятся позже
+            changes_watermark = self._current_changes_watermark()
+            history = self._read_history()
+            self._replace(history, *self._read_parts(None), changes_watermark)
+        return self
+
+    def load_from_parquet(self, export_dir: str):
+        """
+        Загружает историю из Parquet-выгрузки и дочитывает из БД то,
+        что появилось или изменилось после нее. Для выгрузки без водяного
+        знака журнала изменений история загружается из БД.
+        """
+        changes_watermark = export_service.read_watermarks(export_dir).get(export_service.CHANGES_WATERMARK)
+        history_dir = os.path.join(export_dir, 'status_history')
+        if changes_watermark is None or not os.path.isdir(history_dir):
+            return self.load_from_db()
+        with self._refresh_lock:
+            snapshot = pd.read_parquet(history_dir, columns=HISTORY_COLUMNS)
+            history = _normalize_history(snapshot.sort_values('id', ignore_index=True))
+            self._replace(history, *self._read_parts(None), changes_watermark)
+            self._refresh()
+        return self
+
+    def refresh(self):
+        """
+        Дочитывает новые строки истории, перечитывает строки из журнала изменений
+        и обновляет измененные детали. Если обновление уже идет в другом потоке,
+        сразу возвращает текущие данные, а не ждет его.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return self
+        try:
+            self._refresh()
+        finally:
+            self._refresh_lock.release()
+        return self
+
+    def _refresh(self):
+        part_ids, periods, full, changes_watermark = self._read_changes()
+        if full:
+            self.load_from_db()
+            return
+        last_id = self.last_id
+        fresh = [self._read_history(StatusHistory.id > last_id)]
+        part_list = sorted(part_ids)
+        for start in range(0, len(part_list), CHANGED_PARTS_CHUNK):
+            fresh.append(self._read_history(StatusHistory.part_id.in_(part_list[start:start + CHANGED_PARTS_CHUNK])))
+        for period_start, period_end in periods:
+            fresh.append(self._read_history(*_period_criteria(period_start, period_end)))
+        parts, parts_watermark = self._read_parts(self._parts_watermark)
+
+        with self._lock:
+            history = self.history
+            if part_ids or periods:
+                stale = history['part_id'].isin(part_ids).to_numpy()
+                for period_start, period_end in periods:
+                    stale |= _period_mask(history['timestamp'], period_start, period_end)
+                history = history[~stale]
+            for frame in fresh:
+                history = _concat_history(history, frame)
+            if part_ids or periods:
+                history = history.drop_duplicates('id').sort_values('id', ignore_index=True)
+            self.history = history
+            self._apply_parts(parts, parts_watermark)
+            self._changes_watermark = changes_watermark
+            self.loaded = True
+
+    # --- Отчеты ---
+
+    def _select(self, date_from=None, date_to=None, completed_only=False, product=None) -> pd.DataFrame:
+        """
+        Векторный отбор строк истории по периоду, изделию
+        (и, при необходимости, только выполненных).
+        """
+        history = self.history
+        mask = np.ones(len(history), dtype=bool)
+        if product:
+            product_parts = self.parts.index[self.parts['product_designation'] == product]
+            mask &= history['part_id'].isin(product_parts).to_numpy()
+        if completed_only:
+            mask &= (history['status_type'] == StatusType.COMPLETED.value).to_numpy()
+        if date_from is not None:
+            mask &= (history['timestamp'] >= pd.Timestamp(date_from)).to_numpy()
+        if date_to is not None:
+            mask &= (history['timestamp'] < pd.Timestamp(date_to) + pd.Timedelta(days=1)).to_numpy()
+        return history[mask]
+
+    def operator_performance(self, date_from=None, date_to=None, product=None) -> pd.Series:
+        """Количество записей истории по операторам, по убыванию (как в SQL-отчете)."""
+        history = self._select(date_from, date_to, product=product)
+        return history.groupby('operator_name', observed=True).size().sort_values(ascending=False)
+
+    def stage_duration_stats(self, date_from=None, date_to=None, product=None) -> pd.DataFrame:
+        """Среднее, p50 и p90 длительности этапов (в секундах) по сохраненной колонке."""
+        history = self._select(date_from, date_to, product=product).dropna(subset=['duration_seconds'])
+        grouped = history.groupby('status', observed=True)['duration_seconds']
+        stats = pd.DataFrame({
+            'avg_seconds': grouped.mean(),
+            'p50_seconds': grouped.quantile(0.5),
+            'p90_seconds': grouped.quantile(0.9),
+            'count': grouped.size()
+        })
+        return stats.sort_values('avg_seconds', ascending=False)
+
+    def throughput_by_shift(self, date_from=None, date_to=None, shift_starts=DEFAULT_SHIFT_STARTS,
+                            product=None) -> pd.DataFrame:
+        """
+        Выработка (сумма выполненных штук) по производственным сменам.
+
+        :param shift_starts: Часы начала смен по порядку, например (6, 14, 22).
+        :return: DataFrame с колонками shift_day, shift (номер с 1), quantity, stages.
+        """
+        history = self._select(date_from, date_to, completed_only=True, product=product)
+        first_start = shift_starts[0]
+        relative_starts = np.array(sorted((start - first_start) % 24 for start in shift_starts))
+        shifted = history['timestamp'] - pd.Timedelta(hours=first_start)
+        shift_index = np.searchsorted(relative_starts, shifted.dt.hour.to_numpy(), side='right')
+        frame = pd.DataFrame({
+            'shift_day': shifted.dt.normalize().to_numpy(),
+            'shift': shift_index,
+            'quantity': history['quantity'].to_numpy()
+        })
+        result = frame.groupby(['shift_day', 'shift']).agg(
+            quantity=('quantity', 'sum'), stages=('quantity', 'size')
+        )
+        return result.reset_index()
+
+    def wip_over_time(self, freq: str = 'D', date_from=None, date_to=None, product=None) -> pd.Series:
+        """
+        Незавершенное производство (WIP): число деталей, по которым начата работа,
+        но которые еще не готовы, на конец каждого периода `freq`.
+        Период ограничивает только выводимые точки: WIP на начало периода
+        учитывает всю предыдущую историю.
+        """
+        history = self._select(product=product)
+        if history.empty:
+            return pd.Series(dtype='int64', name='wip')
+        spans = history.groupby('part_id', observed=True)['timestamp'].agg(['min', 'max'])
+        parts = self.parts.reindex(spans.index)
+        finished = (parts['quantity_completed'] >= parts['quantity_total']).fillna(False).to_numpy(dtype=bool)
+
+        starts = pd.Series(1, index=spans['min'].to_numpy())
+        finishes = pd.Series(-1, index=spans['max'].to_numpy()[finished])
+        events = pd.concat([starts, finishes]).sort_index()
+        wip = events.resample(freq).sum().cumsum().rename('wip')
+        if date_from is not None:
+            wip = wip[wip.index >= pd.Timestamp(date_from)]
+        if date_to is not None:
+            wip = wip[wip.index < pd.Timestamp(date_to) + pd.Timedelta(days=1)]
+        return wip
+
+    def bottlenecks(self, top: int = 5, date_from=None, date_to=None, product=None) -> pd.DataFrame:
+        """
+        Кандидаты в "узкие места": этапы с наибольшей медианной длительностью
+        и их доля в суммарном времени прохождения маршрута.
+        """
+        history = self._select(date_from, date_to, completed_only=True, product=product).dropna(subset=['duration_seconds'])
+        grouped = history.groupby('status', observed=True)['duration_seconds']
+        total_time = grouped.sum()
+        stats = pd.DataFrame({
+            'p50_seconds': grouped.median(),
+            'p90_seconds': grouped.quantile(0.9),
+            'count': grouped.size(),
+            'share_of_total_time': total_time / total_time.sum() if len(total_time) else total_time
+        })
+        return stats.sort_values('p50_seconds', ascending=False).head(top)
+
+
+history_analytics = HistoryAnalytics()
+
+
+def get_history_analytics() -> HistoryAnalytics:
+    """
+    Возвращает общий экземпляр движка, предварительно обновив данные.
+    При первом обращении загружает снимок из `ANALYTICS_PARQUET_DIR` (если задан) или из БД.
+    """
+    from flask import current_app
+
+    if not history_analytics.loaded:
+        with history_analytics._refresh_lock:
+            if not history_analytics.loaded:
+                export_dir = current_app.config.get('ANALYTICS_PARQUET_DIR')
+                if export_dir and os.path.isdir(export_dir):
+                    return history_analytics.load_from_parquet(export_dir)
+                return history_analytics.load_from_db()
+    return history_analytics.refresh()
+
+
+# --- Журнал изменений истории ---
+# Вставки новых строк движок находит по id сам; удаления и правки уже
+# записанных строк отмечаются в HistoryChanges в той же транзакции, поэтому
+# при откате они пропадают вместе с изменением.
+
+def record_history_changes(session, part_ids=None, period=None):
+    """
+    Отмечает изменение истории в обход ORM (массовые DELETE/UPDATE, вставка
+    с исходными id): для деталей `part_ids`, для периода `period` = (начало, конец)
+    или, если не задано ни то ни другое, для всей истории.
+    """
+    table = HistoryChange.__table__
+    if part_ids is not None:
+        rows = [{'part_id': part_id} for part_id in dict.fromkeys(part_ids)]
+        if rows:
+            session.execute(insert(table), rows)
+        return
+    period_start, period_end = period or (None, None)
+    session.execute(insert(table).values(period_start=period_start, period_end=period_end))
+
+
+def _record_orm_change(connection, target):
+    part_ids = {target.part_id, *inspect(target).attrs.part_id.history.deleted}
+    connection.execute(insert(HistoryChange.__table__), [{'part_id': part_id} for part_id in part_ids])
+
+
+@event.listens_for(StatusHistory, 'after_update')
+def _record_update(mapper, connection, target):
+    # Событие приходит и для объектов без изменений в колонках
+    session = object_session(target)
+    if session is None or session.is_modified(target, include_collections=False):
+        _record_orm_change(connection, target)
+
+
+@event.listens_for(StatusHistory, 'after_delete')
+def _record_delete(mapper, connection, target):
+    _record_orm_change(connection, target)
@@ -0,0 +1,254 @@
+# app/services/archive_service.py
+
+import json
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, or_, select
+from sqlalchemy.types import DateTime, Enum
+
+from app import db
+from app.models.models import (Part, PartArchive, StatusHistory, PartNote, ResponsibleHistory,
+                               AssemblyComponent, RouteTemplate, Stage, User)
+from app.services import analytics_service, metrics, report_cache
+
+# Размер пачки деталей при архивации (ограничение числа параметров в IN)
+ARCHIVE_CHUNK = 500
+# Зависимые таблицы детали: ключ в архивном документе и модель
+_DEPENDENT_MODELS = (
+    ('history', StatusHistory),
+    ('notes', PartNote),
+    ('responsible_history', ResponsibleHistory),
+)
+
+
+def _dump_row(table, row) -> dict:
+    """Строка таблицы как словарь JSON-совместимых значений."""
+    data = {}
+    for column in table.columns:
+        value = row._mapping[column]
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif value is not None and isinstance(column.type, Enum) and not isinstance(value, str):
+            value = value.name
+        data[column.name] = value
+    return data
+
+
+def _load_row(table, data: dict) -> dict:
+    """Обратное преобразование _dump_row: значения приводятся к типам колонок."""
+    values = {}
+    for column in table.columns:
+        if column.name not in data:
+            continue
+        value = data[column.name]
+        if value is not None and isinstance(column.type, DateTime):
+            value = datetime.fromisoformat(value)
+        elif value is not None and isinstance(column.type, Enum) and column.type.enum_class:
+            value = column.type.enum_class[value]
+        values[column.name] = value
+    return values
+
+
+def encode_payload(document: dict) -> bytes:
+    return zlib.compress(json.dumps(document, ensure_ascii=False).encode('utf-8'), 6)
+
+
+def decode_payload(payload: bytes) -> dict:
+    return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+
+def find_candidates(older_than_days: int) -> list:
+    """
+    Завершенные детали (quantity_completed >= quantity_total), не менявшиеся
+    `older_than_days` дней.
+
+    Деталь попадает в архив только вместе со всеми сборками и узлами, с которыми
+    она связана: иначе рабочая сборка потеряла бы узел в составе, а рабочий узел
+    показался бы на панели как отдельное изделие.
+    """
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=older_than_days)
+    candidates = set(db.session.execute(
+        select(Part.part_id).where(Part.quantity_completed >= Part.quantity_total, Part.last_update < cutoff)
+    ).scalars())
+    if not candidates:
+        return []
+    links = db.session.execute(select(AssemblyComponent.parent_id, AssemblyComponent.child_id)).all()
+    changed = True
+    while changed:
+        changed = False
+        for parent_id, child_id in links:
+            if (parent_id in candidates) != (child_id in candidates):
+                candidates.discard(parent_id)
+                candidates.discard(child_id)
+                changed = True
+    return sorted(candidates)
+
+
+def _archive_chunk(part_ids: list) -> int:
+    parts = db.session.execute(select(Part.__table__).where(Part.part_id.in_(part_ids))).all()
+    if not parts:
+        return 0
+    ids = [row.part_id for row in parts]
+    documents = {row.part_id: {'part': _dump_row(Part.__table__, row), 'components': []} for row in parts}
+    for key, model in _DEPENDENT_MODELS:
+        for document in documents.values():
+            document[key] = []
+        rows = db.session.execute(select(model.__table__).where(model.part_id.in_(ids))).all()
+        for row in rows:
+            documents[row.part_id][key].append(_dump_row(model.__table__, row))
+    links = db.session.execute(select(AssemblyComponent.__table__).where(
+        or_(AssemblyComponent.parent_id.in_(ids), AssemblyComponent.child_id.in_(ids)))).all()
+    for row in links:
+        # Связь хранится у обеих деталей и восстанавливается, когда в таблицах есть обе
+        for part_id in {row.parent_id, row.child_id} & documents.keys():
+            documents[part_id]['components'].append(_dump_row(AssemblyComponent.__table__, row))
+
+    # Массовый DELETE обходит события ORM, поэтому дни истории для кэша отчетов отмечаются явно
+    history_days = db.session.execute(
+        select(func.date(StatusHistory.timestamp)).where(StatusHistory.part_id.in_(ids)).distinct()
+    ).scalars().all()
+    report_cache.remember_history_days(db.session, history_days)
+    analytics_service.record_history_changes(db.session, part_ids=ids)
+
+    db.session.execute(insert(PartArchive), [
+        {'part_id': part_id, 'product_designation': document['part']['product_designation'],
+         'archived_at': datetime.now(timezone.utc), 'payload': encode_payload(document)}
+        for part_id, document in documents.items()
+    ])
+    db.session.execute(delete(StatusHistory).where(StatusHistory.part_id.in_(ids)))
+    db.session.execute(delete(PartNote).where(PartNote.part_id.in_(ids)))
+    db.session.execute(delete(ResponsibleHistory).where(ResponsibleHistory.part_id.in_(ids)))
+    db.session.execute(delete(AssemblyComponent).where(
+        or_(AssemblyComponent.parent_id.in_(ids), AssemblyComponent.child_id.in_(ids))))
+    db.session.execute(delete(Part).where(Part.part_id.in_(ids)))
+    # Ссылки на чертежи не освобождаются: чертеж понадобится после восстановления
+    db.session.commit()
+    return len(ids)
+
+
+@metrics.track_job('part_archive')
+def archive_completed_parts(older_than_days: int = None) -> int:
+    """
+    Переносит завершенные детали в архив (PartArchives) вместе с историей,
+    примечаниями, сменами ответственных и связями сборок. Пачки по ARCHIVE_CHUNK
+    деталей фиксируются отдельно, чтобы не держать длинную транзакцию.
+
+    :param older_than_days: Сколько дней деталь не должна меняться
+        (по умолчанию PART_ARCHIVE_AFTER_DAYS).
+    :return: Число перенесенных деталей.
+    """
+    if older_than_days is None:
+        older_than_days = current_app.config.get('PART_ARCHIVE_AFTER_DAYS', 365)
+    part_ids = find_candidates(older_than_days)
+    archived = 0
+    try:
+        for start in range(0, len(part_ids), ARCHIVE_CHUNK):
+            archived += _archive_chunk(part_ids[start:start + ARCHIVE_CHUNK])
+    except Exception:
+        db.session.rollback()
+        raise
+    return archived
+
+
+def is_archived(part_id: str) -> bool:
+    return db.session.get(PartArchive, part_id) is not None
+
+
+def _existing(column, values) -> set:
+    values = {value for value in values if value is not None}
+    if not values:
+        return set()
+    return set(db.session.execute(select(column).where(column.in_(values))).scalars())
+
+
+def _load_group(part_id: str) -> dict:
+    """
+    Архивные записи детали и всех связанных с ней архивных сборок и узлов:
+    они архивировались вместе и вместе возвращаются.
+    """
+    archives, pending = {}, [part_id]
+    while pending:
+        current = pending.pop()
+        if current in archives:
+            continue
+        archive = db.session.get(PartArchive, current)
+        if archive is None:
+            continue
+        archives[current] = (archive, decode_payload(archive.payload))
+        for link in archives[current][1]['components']:
+            pending += [link['parent_id'], link['child_id']]
+    return archives
+
+
+def rehydrate_part(part_id: str):
+    """
+    Возвращает деталь из архива в рабочие таблицы вместе со связанными архивными
+    сборками и узлами и удаляет их архивные записи.
+
+    Ссылки на удаленные с тех пор маршруты, этапы и пользователей обнуляются,
+    примечания удаленных пользователей пропускаются. Связи сборок
+    восстанавливаются только с деталями, которые есть в рабочих таблицах.
+    `last_update` восстановленных деталей сбрасывается на текущее время, чтобы
+    следующий запуск archive-parts не вернул их в архив сразу же.
+
+    :return: Восстановленная деталь или None, если ее нет в архиве.
+    """
+    archives = _load_group(part_id)
+    if part_id not in archives:
+        return None
+    conflicts = _existing(Part.part_id, archives)
+    if conflicts:
+        raise ValueError(f"Детали {', '.join(sorted(conflicts))} уже есть в рабочих таблицах")
+    documents = [document for _, document in archives.values()]
+
+    parts = [_load_row(Part.__table__, document['part']) for document in documents]
+    rows = {key: [_load_row(model.__table__, row) for document in documents for row in document[key]]
+            for key, model in _DEPENDENT_MODELS}
+    notes, responsible = rows['notes'], rows['responsible_history']
+    user_ids = _existing(User.id, [part.get('responsible_id') for part in parts]
+                         + [row['user_id'] for row in notes + responsible])
+    route_ids = _existing(RouteTemplate.id, [part.get('route_template_id') for part in parts])
+    restored_at = datetime.now(timezone.utc)
+    for part in parts:
+        part['last_update'] = restored_at
+        if part.get('route_template_id') not in route_ids:
+            part['route_template_id'] = None
+        if part.get('responsible_id') not in user_ids:
+            part['responsible_id'] = None
+    stage_ids = _existing(Stage.id, [row.get('stage_id') for row in notes])
+    for row in notes:
+        if row.get('stage_id') not in stage_ids:
+            row['stage_id'] = None
+    rows['notes'] = [row for row in notes if row['user_id'] in user_ids]
+    for row in responsible:
+        if row['user_id'] not in user_ids:
+            row['user_id'] = None
+
+    components = {}
+    for document in documents:
+        for row in document['components']:
+            components[(row['parent_id'], row['child_id'])] = _load_row(AssemblyComponent.__table__, row)
+    linked = _existing(Part.part_id, [part_id for key in components for part_id in key]) | archives.keys()
+    components = [row for key, row in components.items() if set(key) <= linked]
+
+    try:
+        # Core INSERT сохраняет исходные id и длительности этапов (события ORM не срабатывают)
+        db.session.execute(insert(Part), parts)
+        for key, model in _DEPENDENT_MODELS:
+            if rows[key]:
+                db.session.execute(insert(model), rows[key])
+        if components:
+            db.session.execute(insert(AssemblyComponent), components)
+        report_cache.remember_history_days(
+            db.session, [row['timestamp'] for row in rows['history'] if row.get('timestamp')])
+        # История вставлена с исходными (старыми) id, движок не найдет ее по водяному знаку
+        analytics_service.record_history_changes(db.session, part_ids=list(archives))
+        db.session.execute(delete(PartArchive).where(PartArchive.part_id.in_(list(archives))))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    current_app.logger.info(f"Из архива восстановлены детали: {', '.join(sorted(archives))}")
+    return db.session.get(Part, part_id)
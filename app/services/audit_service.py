@@ -0,0 +1,296 @@
+# app/services/audit_service.py
+
+import atexit
+import json
+import queue
+import threading
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import and_, event, insert, or_, select, text
+from sqlalchemy.orm import Session, joinedload
+
+from app import db
+from app.models.models import AuditLog
+from app.services import metrics
+
+# Записей журнала на странице
+AUDIT_PAGE_SIZE = 25
+CURSOR_TIMESTAMP_FORMAT = '%Y%m%dT%H%M%S.%f'
+# Режимы записи: в транзакции запроса или фоновой пачкой
+SYNC = 'sync'
+ASYNC = 'async'
+# Фоновые записи, ожидающие коммита транзакции (session.info)
+_PENDING_KEY = 'audit_pending'
+
+
+def encode_cursor(log: AuditLog) -> str:
+    """Курсор страницы: позиция записи в порядке (timestamp, id)."""
+    return f"{log.timestamp.strftime(CURSOR_TIMESTAMP_FORMAT)}_{log.id}"
+
+
+def decode_cursor(cursor: str):
+    """Разбирает курсор; некорректный курсор дает None (первая страница)."""
+    try:
+        timestamp, log_id = cursor.rsplit('_', 1)
+        return datetime.strptime(timestamp, CURSOR_TIMESTAMP_FORMAT), int(log_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+class AuditLogPage:
+    """
+    Страница журнала при постраничной навигации по курсору (keyset).
+
+    Вместо номера страницы хранится позиция соседних записей, поэтому
+    глубокие страницы не требуют OFFSET, а общий COUNT(*) не считается.
+    """
+
+    def __init__(self, items: list, has_prev: bool, has_next: bool, approximate_total=None):
+        self.items = items
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.approximate_total = approximate_total
+
+    @property
+    def prev_cursor(self):
+        return encode_cursor(self.items[0]) if self.has_prev and self.items else None
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.items[-1]) if self.has_next and self.items else None
+
+
+def approximate_count(stmt):
+    """
+    Оценка числа строк запроса без его выполнения.
+
+    В PostgreSQL берется оценка планировщика (EXPLAIN, по статистике pg_class/pg_stats);
+    для других СУБД оценки нет и возвращается None.
+    """
+    bind = db.session.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return None
+    compiled = stmt.compile(dialect=bind.dialect, compile_kwargs={'literal_binds': True})
+    plan = db.session.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _older_than(key):
+    """
+    Записи до позиции `key` в порядке (timestamp, id). Отдельное условие
+    `timestamp <= :ts` задает границу диапазона для индексов по (..., timestamp),
+    которую сравнение кортежей не дает.
+    """
+    timestamp, log_id = key
+    return and_(AuditLog.timestamp <= timestamp,
+                or_(AuditLog.timestamp < timestamp, AuditLog.id < log_id))
+
+
+def _newer_than(key):
+    """Записи после позиции `key` в порядке (timestamp, id) (см. _older_than)."""
+    timestamp, log_id = key
+    return and_(AuditLog.timestamp >= timestamp,
+                or_(AuditLog.timestamp > timestamp, AuditLog.id > log_id))
+
+
+def paginate_audit_log(*criteria, after: str = None, before: str = None,
+                       per_page: int = AUDIT_PAGE_SIZE) -> AuditLogPage:
+    """
+    Страница журнала аудита, от новых записей к старым.
+
+    :param criteria: Условия отбора записей (например, по категории).
+    :param after: Курсор: записи старше указанной (следующая страница).
+    :param before: Курсор: записи новее указанной (предыдущая страница).
+    """
+    stmt = select(AuditLog).options(joinedload(AuditLog.user)).where(*criteria)
+    after_key, before_key = decode_cursor(after), decode_cursor(before)
+
+    if before_key is not None:
+        # Назад идем в обратном порядке от курсора и разворачиваем результат
+        rows = db.session.execute(
+            stmt.where(_newer_than(before_key))
+            .order_by(AuditLog.timestamp.asc(), AuditLog.id.asc()).limit(per_page + 1)
+        ).scalars().all()
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_next = True
+    else:
+        if after_key is not None:
+            stmt = stmt.where(_older_than(after_key))
+        rows = db.session.execute(
+            stmt.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).limit(per_page + 1)
+        ).scalars().all()
+        has_next = len(rows) > per_page
+        items = rows[:per_page]
+        has_prev = after_key is not None
+
+    total = approximate_count(select(AuditLog.id).where(*criteria))
+    return AuditLogPage(items, has_prev=has_prev, has_next=has_next, approximate_total=total)
+
+
+# --- Запись в журнал ---
+
+class AuditWriter:
+    """
+    Фоновая запись журнала аудита пачками.
+
+    Записи кладутся в очередь и записываются фоновым потоком (под eventlet -
+    green-потоком) многострочными INSERT: пачка собирается до `batch_size`
+    записей или `flush_interval` секунд. Время записи фиксируется при постановке
+    в очередь. Если пачка не записалась, записи повторяются по одной, чтобы
+    ошибочная запись не потянула за собой остальные. При переполнении очереди
+    запись выполняется сразу в вызывающем потоке. Очередь дописывается
+    при остановке процесса (atexit).
+    """
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 1.0, max_queue: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._app = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._atexit_registered = False
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.overflows = 0
+
+    def init_app(self, app):
+        self._app = app
+        self.batch_size = app.config.get('AUDIT_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', self.flush_interval)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+                if not self._atexit_registered:
+                    atexit.register(self.stop)
+                    self._atexit_registered = True
+
+    def enqueue(self, entry: dict):
+        """Ставит запись (словарь колонок AuditLog) в очередь на запись."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.overflows += 1
+            self._write([entry])
+
+    def _next_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    @metrics.track_job('audit_batch')
+    def _write(self, batch: list):
+        with self._app.app_context():
+            try:
+                db.session.execute(insert(AuditLog), batch)
+                db.session.commit()
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.warning(f"Пачка журнала аудита не записана ({len(batch)} записей): {e}")
+            for entry in batch:
+                try:
+                    db.session.execute(insert(AuditLog), [entry])
+                    db.session.commit()
+                    self.written += 1
+                except Exception as e:
+                    db.session.rollback()
+                    self.dropped += 1
+                    current_app.logger.error(f"Запись журнала аудита потеряна: {entry}: {e}")
+
+    def flush(self):
+        """Ждет, пока все поставленные в очередь записи будут записаны."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def stop(self):
+        """Дописывает очередь и останавливает фоновый поток."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stopping.set()
+        thread.join()
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'batches': self.batches,
+            'dropped': self.dropped,
+            'overflows': self.overflows,
+        }
+
+
+audit_writer = AuditWriter()
+
+
+def record(action: str, details: str = None, *, user_id: int, part_id: str = None,
+           category: str = 'general', durability: str = None) -> bool:
+    """
+    Добавляет запись в журнал аудита.
+
+    В режиме SYNC запись добавляется в текущую сессию и фиксируется вместе
+    с транзакцией вызывающего кода. В режиме ASYNC она уходит в фоновую очередь
+    (audit_writer) после коммита текущей транзакции и не задерживает запрос;
+    при откате транзакции запись отбрасывается. По умолчанию режим выбирается
+    по категории: категории из AUDIT_SYNC_CATEGORIES (вход, управление
+    пользователями и ролями) пишутся синхронно. При AUDIT_ASYNC_ENABLED = False
+    все записи синхронные.
+
+    :return: True, если запись добавлена в сессию как строка AuditLog.
+    """
+    config = current_app.config
+    if durability is None:
+        durability = SYNC if category in config.get('AUDIT_SYNC_CATEGORIES', ()) else ASYNC
+    if durability == SYNC or not config.get('AUDIT_ASYNC_ENABLED', True):
+        db.session.add(AuditLog(user_id=user_id, part_id=part_id, action=action,
+                                details=details, category=category))
+        return True
+    db.session.info.setdefault(_PENDING_KEY, []).append({
+        'user_id': user_id, 'part_id': part_id, 'action': action, 'details': details,
+        'category': category, 'timestamp': datetime.now(timezone.utc),
+    })
+    return False
+
+
+@event.listens_for(Session, 'after_commit')
+def _enqueue_after_commit(session):
+    for entry in session.info.pop(_PENDING_KEY, ()):
+        audit_writer.enqueue(entry)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
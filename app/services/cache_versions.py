@@ -0,0 +1,83 @@
+# app/services/cache_versions.py
+
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.models import CacheVersion
+
+_SESSION_INFO_KEY = 'cache_versions_bumped'
+
+
+class VersionRegistry:
+    """
+    Копия версий из таблицы CacheVersions в памяти процесса.
+
+    Версии перечитываются одним запросом не чаще раза в `interval` секунд,
+    поэтому проверка актуальности кэша обычно не обращается к БД. Изменение
+    в этом же процессе видно сразу (после коммита копия сбрасывается), в других
+    процессах - не позже чем через `interval` секунд.
+    """
+
+    def __init__(self):
+        self._versions = {}
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self.refreshes = 0
+
+    def current(self, name: str, interval: float) -> int:
+        checked_at = self._checked_at
+        if checked_at is None or time.monotonic() - checked_at >= interval:
+            self.refresh()
+        return self._versions.get(name, 0)
+
+    def refresh(self):
+        rows = db.session.execute(select(CacheVersion.name, CacheVersion.version)).all()
+        with self._lock:
+            self._versions = dict(rows)
+            self._checked_at = time.monotonic()
+            self.refreshes += 1
+
+    def expire(self):
+        """Следующее обращение перечитает версии из БД."""
+        with self._lock:
+            self._checked_at = None
+
+
+versions = VersionRegistry()
+
+
+def current(name: str) -> int:
+    """Текущая версия данных `name` (интервал проверки - CACHE_VERSION_CHECK_INTERVAL)."""
+    return versions.current(name, current_app.config.get('CACHE_VERSION_CHECK_INTERVAL', 5))
+
+
+def bump(name: str, connection=None, session=None):
+    """
+    Увеличивает версию `name` в текущей транзакции. Из событий ORM (во время
+    flush) передаются `connection` и сессия объекта.
+    """
+    session = session or db.session
+    connection = connection or session.connection()
+    table = CacheVersion.__table__
+    updated = connection.execute(
+        update(table).where(table.c.name == name).values(version=table.c.version + 1)
+    ).rowcount
+    if not updated:
+        connection.execute(insert(table).values(name=name, version=1))
+    session.info.setdefault(_SESSION_INFO_KEY, set()).add(name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _expire_after_commit(session):
+    if session.info.pop(_SESSION_INFO_KEY, None):
+        versions.expire()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_after_rollback(session):
+    session.info.pop(_SESSION_INFO_KEY, None)
@@ -1,82 +1,270 @@
 # app/services/document_service.py
 
+import bisect
 import io
+import re
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from docx import Document
 from docx.text.paragraph import Paragraph
 
-def replace_text_in_paragraph(paragraph: Paragraph, placeholders: dict):
+# Ограничения пакетной генерации: число документов в одном архиве и параллельных потоков
+BATCH_MAX_ROWS = 500
+BATCH_WORKERS = 4
+
+# Плейсхолдер шаблона: {{Заголовок столбца}}
+PLACEHOLDER_RE = re.compile(r'\{\{[^{}]+?\}\}')
+
+class _Field:
+    """Плейсхолдер внутри фрагмента ("run") скомпилированного шаблона."""
+    __slots__ = ('token',)
+
+    def __init__(self, token: str):
+        self.token = token
+
+
+def _iter_block_paragraphs(container, seen: set):
+    """Обходит параграфы контейнера, включая вложенные таблицы; объединенные ячейки - один раз."""
+    for paragraph in container.paragraphs:
+        if id(paragraph._p) not in seen:
+            seen.add(id(paragraph._p))
+            yield paragraph
+    for table in container.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                yield from _iter_block_paragraphs(cell, seen)
+
+
+def _iter_document_paragraphs(doc):
+    """Все параграфы документа: основной текст, таблицы, колонтитулы всех разделов."""
+    seen = set()
+    yield from _iter_block_paragraphs(doc, seen)
+    for section in doc.sections:
+        for header_footer in (section.header, section.first_page_header, section.even_page_header,
+                              section.footer, section.first_page_footer, section.even_page_footer):
+            # Обращение к несвязанному колонтитулу создало бы его в документе
+            if not header_footer.is_linked_to_previous:
+                yield from _iter_block_paragraphs(header_footer, seen)
+
+
+def _compile_paragraph(paragraph: Paragraph):
     """
-    Находит и заменяет плейсхолдеры в одном параграфе Word-документа.
+    Строит план замены для параграфа: для каждого затронутого "run" - список
+    фрагментов (текст или плейсхолдер). Плейсхолдер, разбитый между несколькими
+    "runs", целиком переносится в "run", где он начинается; остальные "runs"
+    сохраняют свое форматирование.
+    """
+    runs = paragraph.runs
+    texts = [run.text for run in runs]
+    full_text = "".join(texts)
+    if '{{' not in full_text:
+        return []
+    matches = list(PLACEHOLDER_RE.finditer(full_text))
+    if not matches:
+        return []
+
+    run_starts = []
+    offset = 0
+    for text in texts:
+        run_starts.append(offset)
+        offset += len(text)
+    pieces = [[] for _ in runs]
+
+    def run_index(position):
+        # Последний "run", начинающийся не позже позиции; пустые "runs" с тем же началом пропускаются
+        return bisect.bisect_right(run_starts, position) - 1
+
+    def add_literal(start, stop):
+        position = start
+        while position < stop:
+            index = run_index(position)
+            piece_end = min(run_starts[index] + len(texts[index]), stop)
+            pieces[index].append(full_text[position:piece_end])
+            position = piece_end
+
+    position = 0
+    for match in matches:
+        add_literal(position, match.start())
+        pieces[run_index(match.start())].append(_Field(match.group()))
+        position = match.end()
+    add_literal(position, len(full_text))
+
+    plan = []
+    for run, text, run_pieces in zip(runs, texts, pieces):
+        if run_pieces == [text] or (not run_pieces and not text):
+            continue  # "run" без плейсхолдеров остается нетронутым
+        plan.append((run, tuple(run_pieces)))
+    return plan
 
-    Важное замечание: Эта функция объединяет текст из всех "runs" (фрагментов
-    текста с разным форматированием) в параграфе, выполняет замену, а затем
-    записывает весь измененный текст в первый "run", удаляя остальные.
-    Это может привести к потере сложного форматирования внутри параграфа.
-    Для простых текстовых замен этот подход работает надежно.
 
-    :param paragraph: Объект параграфа из библиотеки python-docx.
-    :param placeholders: Словарь, где ключ - это плейсхолдер (например, '{{Имя}}'),
-                         а значение - текст для замены.
+class CompiledTemplate:
     """
-    # Собираем весь текст из параграфа воедино
-    full_text = "".join(run.text for run in paragraph.runs)
+    Word-шаблон, разобранный один раз для многократного рендеринга.
 
-    # Если в тексте нет открывающей скобки, замена не требуется
-    if '{' not in full_text:
-        return
+    При компиляции документ просматривается целиком (основной текст, таблицы,
+    колонтитулы) и для каждого плейсхолдера `{{...}}` запоминается "run",
+    в который нужно подставить значение. Рендеринг только записывает текст
+    в эти "runs" и сохраняет документ, не просматривая шаблон заново.
+    Форматирование "runs" без плейсхолдеров сохраняется.
 
-    # Проходим по всем плейсхолдерам и заменяем их в собранном тексте
-    for placeholder, replacement_text in placeholders.items():
-        if placeholder in full_text:
-            # Убеждаемся, что текст для замены является строкой
-            full_text = full_text.replace(placeholder, str(replacement_text))
+    Экземпляр не потокобезопасен: рендеринг меняет общий документ,
+    поэтому для параллельной работы каждому потоку нужен свой экземпляр.
+    """
+
+    def __init__(self, template_path_or_stream):
+        # Загружаем документ-шаблон из файла или потока
+        try:
+            self._doc = Document(template_path_or_stream)
+        except Exception as e:
+            # Перехватываем возможные ошибки при чтении файла
+            raise ValueError(f"Не удалось прочитать шаблон Word. Ошибка: {e}")
+        self._plan = [item for paragraph in _iter_document_paragraphs(self._doc)
+                      for item in _compile_paragraph(paragraph)]
 
-    # Если в параграфе есть какие-либо "runs"
-    if paragraph.runs:
-        # Удаляем все "runs", кроме первого, чтобы очистить параграф
-        for i in range(len(paragraph.runs) - 1, 0, -1):
-            p = paragraph.runs[i]._element
-            if p.getparent() is not None:
-                p.getparent().remove(p)
+    @property
+    def placeholders(self) -> set:
+        """Плейсхолдеры, найденные в шаблоне."""
+        return {piece.token for _, pieces in self._plan for piece in pieces if isinstance(piece, _Field)}
 
-        # Записываем весь измененный текст в первый (и теперь единственный) "run"
-        paragraph.runs[0].text = full_text
+    def render(self, placeholders: dict) -> io.BytesIO:
+        """
+        Подставляет значения и возвращает готовый документ.
+        Плейсхолдеры, которых нет в `placeholders`, остаются в тексте как есть.
+        """
+        for run, pieces in self._plan:
+            run.text = "".join(
+                str(placeholders.get(piece.token, piece.token)) if isinstance(piece, _Field) else piece
+                for piece in pieces
+            )
+        # Сохраняем измененный документ в буфер в оперативной памяти
+        file_buffer = io.BytesIO()
+        self._doc.save(file_buffer)
+        # Перемещаем "курсор" в начало буфера, чтобы его можно было прочитать
+        file_buffer.seek(0)
+        return file_buffer
 
 
 def generate_word_from_data(template_path_or_stream, placeholders: dict) -> io.BytesIO:
     """
     Создает Word-документ на основе шаблона и данных для замены.
 
-    Функция проходит по всем параграфам и таблицам в документе-шаблоне
-    и заменяет указанные плейсхолдеры на предоставленные значения.
+    Плейсхолдеры заменяются в основном тексте, таблицах и колонтитулах.
+    Для генерации нескольких документов по одному шаблону используйте
+    `CompiledTemplate` напрямую, чтобы не разбирать шаблон каждый раз.
 
     :param template_path_or_stream: Путь к файлу шаблона (.docx) или
                                     потоковый объект (например, io.BytesIO).
     :param placeholders: Словарь с данными для замены.
     :return: Потоковый объект io.BytesIO, содержащий сгенерированный Word-документ.
     """
-    # Загружаем документ-шаблон из файла или потока
-    try:
-        doc = Document(template_path_or_stream)
-    except Exception as e:
-        # Перехватываем возможные ошибки при чтении файла
-        raise ValueError(f"Не удалось прочитать шаблон Word. Ошибка: {e}")
+    return CompiledTemplate(template_path_or_stream).render(placeholders)
 
-    # 1. Замена плейсхолдеров в таблицах
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    replace_text_in_paragraph(paragraph, placeholders)
 
-    # 2. Замена плейсхолдеров в основном тексте документа
-    for paragraph in doc.paragraphs:
-        replace_text_in_paragraph(paragraph, placeholders)
+def document_filename(placeholders: dict, row_number: int) -> str:
+    """Имя .docx-файла по номеру бирки из данных строки (или по номеру строки)."""
+    birka_name = placeholders.get('{{№ бирки}}', f'report_{row_number}')
+    safe_filename = "".join(c for c in str(birka_name) if c.isalnum() or c in "._- ").strip()
+    return f"{safe_filename or f'report_{row_number}'}.docx"
 
-    # Сохраняем измененный документ в буфер в оперативной памяти
-    file_buffer = io.BytesIO()
-    doc.save(file_buffer)
-    # Перемещаем "курсор" в начало буфера, чтобы его можно было прочитать
-    file_buffer.seek(0)
 
-    return file_buffer
\ No newline at end of file
+def parse_row_numbers(spec: str, max_rows: int = BATCH_MAX_ROWS) -> list:
+    """
+    Разбирает список строк вида "2-10, 15, 20-22" в отсортированный список номеров.
+
+    :raises ValueError: Если список пуст, содержит строки с номером меньше 2
+                        или больше `max_rows` номеров.
+    """
+    row_numbers = set()
+    for part in filter(None, (chunk.strip() for chunk in (spec or '').split(','))):
+        match = re.fullmatch(r'(\d+)\s*(?:-\s*(\d+))?', part)
+        if not match:
+            raise ValueError(f"Неверный формат строк: '{part}'. Используйте, например, 2-10, 15.")
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        if first > last:
+            first, last = last, first
+        if first < 2:
+            raise ValueError("Номер строки должен быть больше 1.")
+        if last - first + 1 + len(row_numbers) > max_rows:
+            raise ValueError(f"За один раз можно сгенерировать не более {max_rows} документов.")
+        row_numbers.update(range(first, last + 1))
+    if not row_numbers:
+        raise ValueError("Не указаны номера строк.")
+    return sorted(row_numbers)
+
+
+class _ZipStreamBuffer:
+    """
+    Файлоподобный буфер для zipfile без seek/tell: zipfile пишет в него
+    записи с дескрипторами данных, а генератор забирает накопленные байты.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def generate_word_zip(template_bytes: bytes, rows, workers: int = BATCH_WORKERS):
+    """
+    Генерирует Word-документы для нескольких строк и отдает ZIP-архив по частям.
+
+    Документы рендерятся в пуле потоков, но в архив записываются в исходном
+    порядке строк. Одновременно в памяти находится не больше `2 * workers`
+    готовых документов, поэтому расход памяти не зависит от числа строк.
+
+    :param template_bytes: Содержимое шаблона .docx.
+    :param rows: Последовательность пар (номер строки, словарь плейсхолдеров).
+    :return: Генератор байтовых фрагментов ZIP-архива.
+    """
+    buffer = _ZipStreamBuffer()
+    used_names = set()
+
+    # Шаблон компилируется один раз на поток пула, а не для каждой строки
+    local = threading.local()
+
+    def render(placeholders):
+        if not hasattr(local, 'template'):
+            local.template = CompiledTemplate(io.BytesIO(template_bytes))
+        return local.template.render(placeholders).getvalue()
+
+    def unique_name(placeholders, row_number):
+        name = document_filename(placeholders, row_number)
+        if name in used_names:
+            name = f"{name[:-len('.docx')]}_{row_number}.docx"
+        used_names.add(name)
+        return name
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='word-batch')
+    try:
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            pending = deque()
+            rows = iter(rows)
+            while True:
+                while len(pending) < 2 * workers:
+                    row = next(rows, None)
+                    if row is None:
+                        break
+                    row_number, placeholders = row
+                    pending.append((unique_name(placeholders, row_number), executor.submit(render, placeholders)))
+                if not pending:
+                    break
+                name, future = pending.popleft()
+                archive.writestr(name, future.result())
+                yield buffer.drain()
+        yield buffer.drain()
+    finally:
+        # Если клиент прервал загрузку, не рендерим оставшиеся документы
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,311 @@
+# app/services/drawing_service.py
+
+import glob
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from PIL import Image, ImageSequence, features
+
+from app.services import drawing_storage, metrics
+
+try:
+    # PyMuPDF необязателен: без него PDF-чертежи хранятся и отдаются без превью
+    import fitz
+except ImportError:  # pragma: no cover - зависит от окружения
+    fitz = None
+
+# Размеры превью: наибольшая сторона в пикселях
+THUMBNAIL_SIZES = {'sm': 160, 'md': 640, 'lg': 1600}
+THUMBNAILS_DIRNAME = '_thumbs'
+MANIFEST_FILENAME = 'manifest.json'
+# Разрешение, с которым страницы PDF растрируются для превью
+PDF_RENDER_DPI = 150
+# Ограничение на число страниц многостраничного скана, для которых строятся превью
+MAX_PREVIEW_PAGES = 50
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Фоновый пул для построения превью (создается при первом использовании)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='drawing-thumbs')
+        return _executor
+
+
+def thumbnails_dir(drawing_filename: str, config) -> str:
+    """Каталог превью конкретного чертежа."""
+    return os.path.join(config['DRAWING_UPLOAD_FOLDER'], THUMBNAILS_DIRNAME, drawing_filename)
+
+
+def thumbnail_filename(size: str, page: int, fmt: str) -> str:
+    return f"{size}-{page}.{fmt}"
+
+
+def _iter_pages(source, is_pdf: bool):
+    """Страницы чертежа (файловый объект) как изображения Pillow: кадры TIFF/GIF или страницы PDF."""
+    if is_pdf:
+        if fitz is None:
+            return
+        with fitz.open(stream=source.read(), filetype='pdf') as pdf:
+            for page in list(pdf)[:MAX_PREVIEW_PAGES]:
+                pixmap = page.get_pixmap(dpi=PDF_RENDER_DPI)
+                yield Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+        return
+    with Image.open(source) as image:
+        for index, frame in enumerate(ImageSequence.Iterator(image)):
+            if index >= MAX_PREVIEW_PAGES:
+                break
+            yield frame.copy()
+
+
+def _to_rgb(image: Image.Image) -> Image.Image:
+    """Приводит изображение к RGB; прозрачный фон заменяется белым, как на бумаге."""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+@metrics.track_job('drawing_thumbnails')
+def generate_thumbnails(drawing_filename: str, config) -> dict:
+    """
+    Строит превью всех размеров (JPEG и, если доступно, WebP) для каждой страницы
+    чертежа и записывает манифест. Превью пишутся во временный каталог,
+    который затем атомарно заменяет прежний.
+
+    :return: Манифест: {'pages': число страниц, 'sizes': [...], 'formats': [...]}.
+    """
+    target_dir = thumbnails_dir(drawing_filename, config)
+    tmp_dir = target_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    formats = ['jpg'] + (['webp'] if config.get('DRAWING_WEBP_ENABLED', True) and features.check('webp') else [])
+    pages = 0
+    is_pdf = drawing_filename.lower().endswith('.pdf')
+    try:
+        with drawing_storage.open_drawing(drawing_filename, config) as source:
+            for page, frame in enumerate(_iter_pages(source, is_pdf), start=1):
+                frame = _to_rgb(frame)
+                for size, max_side in THUMBNAIL_SIZES.items():
+                    thumbnail = frame.copy()
+                    thumbnail.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+                    thumbnail.save(os.path.join(tmp_dir, thumbnail_filename(size, page, 'jpg')),
+                                   'JPEG', quality=85, optimize=True, progressive=True)
+                    if 'webp' in formats:
+                        thumbnail.save(os.path.join(tmp_dir, thumbnail_filename(size, page, 'webp')),
+                                       'WEBP', quality=80, method=4)
+                pages = page
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    manifest = {'pages': pages, 'sizes': list(THUMBNAIL_SIZES), 'formats': formats}
+    with open(os.path.join(tmp_dir, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    shutil.rmtree(target_dir, ignore_errors=True)
+    os.replace(tmp_dir, target_dir)
+    return manifest
+
+
+def _generate_in_background(app, drawing_filename: str, config):
+    with app.app_context():
+        try:
+            generate_thumbnails(drawing_filename, config)
+        except Exception as e:
+            current_app.logger.warning(f"Не удалось построить превью чертежа {drawing_filename}: {e}")
+
+
+def schedule_thumbnails(drawing_filename: str, config):
+    """
+    Ставит построение превью в фоновую очередь, чтобы не задерживать запрос загрузки.
+    При DRAWING_THUMBNAILS_ASYNC = False превью строятся сразу (используется в тестах).
+    """
+    if not config.get('DRAWING_THUMBNAILS_ASYNC', True):
+        try:
+            generate_thumbnails(drawing_filename, config)
+        except Exception as e:
+            current_app.logger.warning(f"Не удалось построить превью чертежа {drawing_filename}: {e}")
+        return None
+    app = current_app._get_current_object()
+    return _get_executor().submit(_generate_in_background, app, drawing_filename, dict(config))
+
+
+def read_manifest(drawing_filename: str, config):
+    """Манифест превью или None, если превью еще не построены."""
+    path = os.path.join(thumbnails_dir(drawing_filename, config), MANIFEST_FILENAME)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def find_thumbnail(drawing_filename: str, config, size: str, page: int = 1, accept_webp: bool = False):
+    """
+    Путь к готовому превью нужного размера и страницы.
+    WebP выбирается, если клиент его принимает и превью в этом формате построено.
+
+    :return: Кортеж (путь, mimetype) или None.
+    """
+    if size not in THUMBNAIL_SIZES:
+        return None
+    manifest = read_manifest(drawing_filename, config)
+    if not manifest or not (1 <= page <= manifest['pages']):
+        return None
+    fmt = 'webp' if accept_webp and 'webp' in manifest['formats'] else 'jpg'
+    path = os.path.join(thumbnails_dir(drawing_filename, config), thumbnail_filename(size, page, fmt))
+    if not os.path.exists(path):
+        return None
+    return path, 'image/webp' if fmt == 'webp' else 'image/jpeg'
+
+
+def _remove_legacy_drawing(drawing_filename: str, config):
+    file_path = os.path.join(config['DRAWING_UPLOAD_FOLDER'], drawing_filename)
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    shutil.rmtree(thumbnails_dir(drawing_filename, config), ignore_errors=True)
+
+
+def release_drawing(drawing_filename: str, config):
+    """
+    Освобождает чертеж, на который больше не ссылается деталь.
+
+    Чертеж из хранилища только теряет ссылку: сам файл и превью удалит сборщик мусора,
+    когда ссылок не останется. Чертеж старого формата (`<время>_<имя>` в папке чертежей)
+    удаляется сразу вместе с превью.
+    """
+    if not drawing_filename or drawing_storage.release_drawing(drawing_filename):
+        return
+    _remove_legacy_drawing(drawing_filename, config)
+
+
+def release_drawings(drawing_filenames, config) -> list:
+    """
+    Освобождает чертежи сразу нескольких деталей (см. drawing_storage.release_drawings).
+    Файлы старого формата не трогаются: их нужно передать в schedule_removal после коммита.
+
+    :return: Имена чертежей старого формата.
+    """
+    return drawing_storage.release_drawings(drawing_filenames)
+
+
+def _remove_in_background(app, drawing_filenames, config):
+    with app.app_context():
+        for drawing_filename in drawing_filenames:
+            try:
+                _remove_legacy_drawing(drawing_filename, config)
+            except OSError as e:
+                current_app.logger.warning(f"Не удалось удалить чертеж {drawing_filename}: {e}")
+
+
+def schedule_removal(drawing_filenames, config):
+    """
+    Ставит удаление файлов чертежей старого формата в фоновую очередь,
+    чтобы массовое удаление деталей не ждало файловую систему.
+    При DRAWING_THUMBNAILS_ASYNC = False файлы удаляются сразу.
+    """
+    if not drawing_filenames:
+        return None
+    app = current_app._get_current_object()
+    if not config.get('DRAWING_THUMBNAILS_ASYNC', True):
+        return _remove_in_background(app, drawing_filenames, config)
+    return _get_executor().submit(_remove_in_background, app, list(drawing_filenames), dict(config))
+
+
+@metrics.track_job('drawing_gc')
+def collect_garbage(config, grace_period: int = None) -> int:
+    """
+    Удаляет из хранилища чертежи без ссылок вместе с их превью.
+
+    :param grace_period: Сколько секунд чертеж должен пробыть без ссылок
+        (по умолчанию DRAWING_GC_GRACE_PERIOD).
+    :return: Число удаленных файлов.
+    """
+    if grace_period is None:
+        grace_period = config.get('DRAWING_GC_GRACE_PERIOD', 24 * 3600)
+    removed = drawing_storage.collect_orphans(config, grace_period)
+    thumbs_root = os.path.join(config['DRAWING_UPLOAD_FOLDER'], THUMBNAILS_DIRNAME)
+    for key in removed:
+        # Превью хранятся по полному имени чертежа, т.е. с расширением
+        for path in glob.glob(os.path.join(thumbs_root, f"{key}*")):
+            shutil.rmtree(path, ignore_errors=True)
+    return len(removed)
+
+
+class DrawingSweeper:
+    """
+    Фоновый сборщик мусора хранилища чертежей: раз в `interval` секунд
+    вызывает collect_garbage в контексте приложения.
+    """
+
+    def __init__(self, app, interval: int):
+        self.app = app
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.removed = 0
+        self.failures = 0
+        self.last_run = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='drawing-gc', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def run_once(self) -> int:
+        with self.app.app_context():
+            try:
+                removed = collect_garbage(self.app.config)
+            except Exception as e:
+                self.failures += 1
+                current_app.logger.warning(f"Сборка мусора чертежей не удалась: {e}")
+                return 0
+            finally:
+                self.runs += 1
+                self.last_run = time.time()
+            self.removed += removed
+            if removed:
+                current_app.logger.info(f"Сборщик мусора удалил чертежей: {removed}")
+            return removed
+
+    def stats(self) -> dict:
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'removed': self.removed,
+            'failures': self.failures,
+            'last_run': self.last_run,
+        }
+
+
+sweeper = None
+
+
+def start_sweeper(app):
+    """Запускает фоновый сборщик мусора, если DRAWING_GC_INTERVAL больше нуля."""
+    global sweeper
+    interval = app.config.get('DRAWING_GC_INTERVAL', 0)
+    if interval and sweeper is None:
+        sweeper = DrawingSweeper(app, interval)
+        sweeper.start()
+    return sweeper
@@ -0,0 +1,368 @@
+# app/services/drawing_storage.py
+
+import hashlib
+import hmac
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote, urlsplit
+
+import requests
+from flask import current_app
+from sqlalchemy import bindparam, case, delete, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from werkzeug.utils import secure_filename
+
+from app import db
+from app.models.models import DrawingBlob, Part
+
+# Имя чертежа в контентно-адресуемом хранилище: SHA-256 содержимого + расширение
+BLOB_FILENAME_RE = re.compile(r'^([0-9a-f]{64})(\.[a-z0-9]+)?$')
+BLOBS_DIRNAME = '_blobs'
+CHUNK_SIZE = 1024 * 1024
+# Хэш пустого тела запроса для подписи AWS Signature V4
+EMPTY_PAYLOAD_SHA256 = hashlib.sha256(b'').hexdigest()
+
+
+class LocalStorageBackend:
+    """
+    Хранилище на локальном диске: объект `<ключ>` лежит в `<root>/<первые 2 символа>/<ключ>`,
+    чтобы в одном каталоге не скапливались десятки тысяч файлов.
+    """
+    name = 'local'
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def put(self, key: str, fileobj, size: int):
+        """Атомарно записывает объект; уже существующий объект не перезаписывается."""
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while chunk := fileobj.read(CHUNK_SIZE):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def open(self, key: str):
+        """Объект как бинарный файл; FileNotFoundError, если его нет."""
+        return open(self._path(key), 'rb')
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, key: str):
+        """Путь к файлу объекта (для отдачи с поддержкой Range) или None."""
+        path = self._path(key)
+        return path if os.path.exists(path) else None
+
+
+def sign_v4(method: str, url: str, headers: dict, payload_hash: str, access_key: str, secret_key: str,
+            region: str, service: str = 's3', now: datetime = None) -> dict:
+    """
+    Подписывает запрос по AWS Signature Version 4.
+
+    :param headers: Заголовки, которые нужно подписать (дополняются host, x-amz-date, x-amz-content-sha256).
+    :return: Заголовки запроса вместе с Authorization.
+    """
+    now = now or datetime.now(timezone.utc)
+    amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+    date_stamp = now.strftime('%Y%m%d')
+    parts = urlsplit(url)
+
+    signed = {name.lower(): str(value).strip() for name, value in headers.items()}
+    signed.update({'host': parts.netloc, 'x-amz-date': amz_date, 'x-amz-content-sha256': payload_hash})
+    names = sorted(signed)
+    canonical_query = '&'.join(sorted(parts.query.split('&'))) if parts.query else ''
+    canonical_request = '\n'.join([
+        method,
+        parts.path or '/',
+        canonical_query,
+        ''.join(f"{name}:{signed[name]}\n" for name in names),
+        ';'.join(names),
+        payload_hash,
+    ])
+    scope = f"{date_stamp}/{region}/{service}/aws4_request"
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256', amz_date, scope,
+        hashlib.sha256(canonical_request.encode('utf-8')).hexdigest(),
+    ])
+
+    key = ('AWS4' + secret_key).encode('utf-8')
+    for part in (date_stamp, region, service, 'aws4_request'):
+        key = hmac.new(key, part.encode('utf-8'), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    result = {name: value for name, value in signed.items() if name != 'host'}
+    result['Authorization'] = (f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+                               f"SignedHeaders={';'.join(names)}, Signature={signature}")
+    return result
+
+
+class S3StorageBackend:
+    """
+    Хранилище в S3-совместимом объектном хранилище (AWS S3, MinIO, Ceph RGW и т.п.).
+
+    Используется адресация path-style (`<endpoint>/<bucket>/<prefix><ключ>`)
+    и подпись AWS Signature V4; сторонний SDK не нужен. Ключ объекта совпадает
+    с SHA-256 содержимого, поэтому при загрузке тело подписывается этим же хэшем.
+    """
+    name = 's3'
+
+    def __init__(self, endpoint_url: str, bucket: str, access_key: str, secret_key: str,
+                 region: str = 'us-east-1', prefix: str = '', timeout=(5, 60), session=None):
+        self.endpoint_url = endpoint_url.rstrip('/')
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.prefix = prefix
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+    def _url(self, key: str) -> str:
+        return f"{self.endpoint_url}/{quote(self.bucket)}/{quote(self.prefix + key, safe='/~')}"
+
+    def _request(self, method: str, key: str, payload_hash: str = EMPTY_PAYLOAD_SHA256,
+                 headers: dict = None, **kwargs) -> requests.Response:
+        url = self._url(key)
+        signed_headers = sign_v4(method, url, headers or {}, payload_hash,
+                                 self.access_key, self.secret_key, self.region)
+        return self.session.request(method, url, headers=signed_headers, timeout=self.timeout, **kwargs)
+
+    def put(self, key: str, fileobj, size: int):
+        response = self._request('PUT', key, payload_hash=key, data=fileobj,
+                                 headers={'Content-Length': str(size)})
+        response.raise_for_status()
+
+    def exists(self, key: str) -> bool:
+        response = self._request('HEAD', key)
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+    def open(self, key: str):
+        """Скачивает объект во временный файл (в памяти, пока он небольшой) и возвращает его."""
+        spooled = tempfile.SpooledTemporaryFile(max_size=8 * CHUNK_SIZE)
+        with self.stream(key) as response:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                spooled.write(chunk)
+        spooled.seek(0)
+        return spooled
+
+    def stream(self, key: str, range_header: str = None) -> requests.Response:
+        """
+        Потоковый ответ хранилища для отдачи объекта клиенту.
+        Заголовок Range передается как есть, поэтому ответ может быть 206.
+        """
+        headers = {'Range': range_header} if range_header else {}
+        response = self._request('GET', key, headers=headers, stream=True)
+        if response.status_code == 404:
+            response.close()
+            raise FileNotFoundError(key)
+        response.raise_for_status()
+        return response
+
+    def delete(self, key: str):
+        response = self._request('DELETE', key)
+        if response.status_code != 404:
+            response.raise_for_status()
+
+    def local_path(self, key: str):
+        return None
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(config=None):
+    """Общий экземпляр хранилища, выбранного в DRAWING_STORAGE_BACKEND ('local' или 's3')."""
+    config = config or current_app.config
+    kind = config.get('DRAWING_STORAGE_BACKEND', 'local')
+    if kind == 'local':
+        root = config.get('DRAWING_BLOB_DIR') or os.path.join(config['DRAWING_UPLOAD_FOLDER'], BLOBS_DIRNAME)
+        cache_key = (kind, root)
+        factory = lambda: LocalStorageBackend(root)  # noqa: E731
+    elif kind == 's3':
+        cache_key = (kind, config['DRAWING_S3_ENDPOINT_URL'], config['DRAWING_S3_BUCKET'],
+                     config.get('DRAWING_S3_PREFIX', ''))
+        factory = lambda: S3StorageBackend(  # noqa: E731
+            config['DRAWING_S3_ENDPOINT_URL'], config['DRAWING_S3_BUCKET'],
+            config['DRAWING_S3_ACCESS_KEY'], config['DRAWING_S3_SECRET_KEY'],
+            region=config.get('DRAWING_S3_REGION', 'us-east-1'), prefix=config.get('DRAWING_S3_PREFIX', ''))
+    else:
+        raise ValueError(f"Неизвестное хранилище чертежей: {kind}")
+    with _backends_lock:
+        if cache_key not in _backends:
+            _backends[cache_key] = factory()
+        return _backends[cache_key]
+
+
+def parse_blob_filename(filename: str):
+    """SHA-256 из имени чертежа в хранилище или None для чертежей старого формата."""
+    match = BLOB_FILENAME_RE.match(filename or '')
+    return match.group(1) if match else None
+
+
+def _acquire_blob(key: str, size: int) -> int:
+    """
+    Создает строку объекта или увеличивает ее счетчик ссылок одним запросом
+    (INSERT ... ON CONFLICT DO UPDATE): параллельные загрузки одного файла
+    не конфликтуют по первичному ключу.
+
+    :return: Счетчик ссылок после изменения.
+    """
+    insert = postgresql_insert if db.session.get_bind().dialect.name == 'postgresql' else sqlite_insert
+    stmt = insert(DrawingBlob).values(sha256=key, size=size, ref_count=1).on_conflict_do_update(
+        index_elements=[DrawingBlob.sha256],
+        set_={'ref_count': DrawingBlob.ref_count + 1, 'orphaned_at': None},
+    ).returning(DrawingBlob.ref_count)
+    return db.session.execute(stmt).scalar_one()
+
+
+def store_drawing(file_storage, config) -> str:
+    """
+    Сохраняет загруженный чертеж в хранилище и возвращает его имя `<sha256><расширение>`.
+
+    Файл хешируется потоково. Одинаковое содержимое хранится один раз: повторная
+    загрузка только увеличивает счетчик ссылок. Изменения счетчика попадают
+    в текущую транзакцию и фиксируются вместе с деталью.
+
+    Строка объекта создается до записи файла и остается заблокированной
+    до коммита, а сборщик мусора удаляет файл, только заблокировав строку,
+    поэтому загрузка не может потерять файл, удаляемый сборщиком.
+    """
+    extension = os.path.splitext(secure_filename(file_storage.filename))[1].lower()
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.TemporaryFile() as tmp:
+        file_storage.seek(0)
+        while chunk := file_storage.stream.read(CHUNK_SIZE):
+            digest.update(chunk)
+            tmp.write(chunk)
+            size += len(chunk)
+        key = digest.hexdigest()
+
+        # Счетчик 1 - новый объект или объект, уже освобожденный всеми деталями
+        if _acquire_blob(key, size) == 1:
+            tmp.seek(0)
+            get_backend(config).put(key, tmp, size)
+    return f"{key}{extension}"
+
+
+def release_drawings(filenames) -> list:
+    """
+    Уменьшает счетчики ссылок сразу для нескольких чертежей: один UPDATE,
+    выполняемый пачкой параметров. Объект, на который больше никто не ссылается,
+    помечается временем освобождения и удаляется сборщиком мусора позже.
+
+    :return: Имена, не относящиеся к хранилищу (чертежи старого формата).
+    """
+    counts = Counter()
+    legacy = []
+    for filename in filenames:
+        if not filename:
+            continue
+        key = parse_blob_filename(filename)
+        if key is None:
+            legacy.append(filename)
+        else:
+            counts[key] += 1
+    if counts:
+        released = bindparam('released')
+        # Счетчик меняется в самом UPDATE, чтобы параллельные запросы не теряли изменения
+        stmt = update(DrawingBlob).where(DrawingBlob.sha256 == bindparam('key')).values(
+            ref_count=case((DrawingBlob.ref_count > released, DrawingBlob.ref_count - released), else_=0),
+            orphaned_at=case((DrawingBlob.ref_count <= released, datetime.now(timezone.utc)),
+                             else_=DrawingBlob.orphaned_at),
+        )
+        # executemany идет через Connection: ORM-режим пакетного UPDATE не допускает WHERE,
+        # поэтому ожидающие объекты (например, только что загруженный чертеж) сбрасываются явно
+        db.session.flush()
+        db.session.connection().execute(stmt, [{'key': key, 'released': n} for key, n in counts.items()])
+    return legacy
+
+
+def release_drawing(filename: str) -> bool:
+    """
+    Освобождает одну ссылку на чертеж (см. release_drawings).
+
+    :return: False, если имя не относится к хранилищу (чертеж старого формата).
+    """
+    return not release_drawings([filename])
+
+
+def open_drawing(filename: str, config):
+    """Содержимое чертежа как бинарный файл: из хранилища или из папки чертежей старого формата."""
+    key = parse_blob_filename(filename)
+    if key is None:
+        return open(os.path.join(config['DRAWING_UPLOAD_FOLDER'], filename), 'rb')
+    return get_backend(config).open(key)
+
+
+def collect_orphans(config, grace_period: int) -> list:
+    """
+    Удаляет объекты без ссылок, освобожденные раньше, чем `grace_period` секунд назад.
+
+    Перед удалением счетчик сверяется с фактическими ссылками деталей:
+    если он разошелся (например, после сбоя), он исправляется, а объект остается.
+
+    :return: Список удаленных ключей.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_period)
+    candidates = db.session.execute(
+        db.select(DrawingBlob.sha256)
+        .where(DrawingBlob.ref_count <= 0, DrawingBlob.orphaned_at <= cutoff)
+    ).scalars().all()
+
+    backend = get_backend(config)
+    removed = []
+    for key in candidates:
+        references = Part.query.filter(Part.drawing_filename.like(f"{key}%")).count()
+        if references:
+            db.session.execute(update(DrawingBlob).where(DrawingBlob.sha256 == key)
+                               .values(ref_count=references, orphaned_at=None))
+            db.session.commit()
+            current_app.logger.warning(f"Счетчик ссылок чертежа {key} исправлен: {references}")
+            continue
+        # Условие на счетчик повторяется: объект мог снова понадобиться после выборки кандидатов.
+        # Строка блокируется до коммита, и файл удаляется под этой блокировкой: загрузка того же
+        # файла ждет коммита и затем создает строку и файл заново.
+        locked = db.session.execute(
+            select(DrawingBlob.sha256).where(DrawingBlob.sha256 == key, DrawingBlob.ref_count <= 0)
+            .with_for_update()
+        ).first()
+        if locked is None:
+            db.session.commit()
+            continue
+        try:
+            backend.delete(key)
+            db.session.execute(delete(DrawingBlob).where(DrawingBlob.sha256 == key))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        removed.append(key)
+    return removed
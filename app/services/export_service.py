@@ -0,0 +1,173 @@
+# app/services/export_service.py
+
+import enum
+import json
+import os
+import shutil
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import func, select
+
+from app.models.models import db, StatusHistory, AuditLog, Part, HistoryChange
+
+WATERMARK_FILENAME = '_watermark.json'
+# Последняя запись журнала HistoryChanges на момент первой (полной) выгрузки:
+# изменения после нее аналитический движок перечитывает из БД
+CHANGES_WATERMARK = 'history_changes'
+DEFAULT_BATCH_SIZE = 50000
+
+# Описание выгружаемых наборов данных: колонки, типы Arrow, колонка для разбиения
+# по месяцам и колонка-"водяной знак" для инкрементальной выгрузки.
+# История и аудит выгружаются по последнему id, поэтому инкрементальная выгрузка
+# видит только новые строки. Удаления (отмена этапа, архив деталей, архив
+# разделов) и пересчет `duration_seconds` следующей записи при отмене этапа в уже
+# выгруженные файлы не попадают: их исправляет только полная выгрузка (`--full`).
+# Детали изменяются, поэтому выгружаются по `last_update`: при чтении нужно
+# брать последнюю версию строки для каждого `part_id`.
+DATASETS = {
+    'status_history': {
+        'model': StatusHistory,
+        'columns': [
+            ('id', pa.int64()), ('part_id', pa.string()), ('status', pa.string()),
+            ('operator_name', pa.string()), ('timestamp', pa.timestamp('us')),
+            ('quantity', pa.int64()), ('status_type', pa.string()), ('duration_seconds', pa.float64())
+        ],
+        'partition_by': 'timestamp',
+        'watermark': 'id',
+    },
+    'audit_log': {
+        'model': AuditLog,
+        'columns': [
+            ('id', pa.int64()), ('part_id', pa.string()), ('user_id', pa.int64()),
+            ('timestamp', pa.timestamp('us')), ('action', pa.string()),
+            ('details', pa.string()), ('category', pa.string())
+        ],
+        'partition_by': 'timestamp',
+        'watermark': 'id',
+    },
+    'parts': {
+        'model': Part,
+        'columns': [
+            ('part_id', pa.string()), ('product_designation', pa.string()), ('name', pa.string()),
+            ('material', pa.string()), ('size', pa.string()), ('date_added', pa.timestamp('us')),
+            ('last_update', pa.timestamp('us')), ('current_status', pa.string()),
+            ('quantity_total', pa.int64()), ('quantity_completed', pa.int64()),
+            ('quantity_scrapped', pa.int64()), ('route_template_id', pa.int64()),
+            ('responsible_id', pa.int64())
+        ],
+        'partition_by': 'date_added',
+        'watermark': 'last_update',
+    },
+}
+
+
+def _month_key(value):
+    return value.strftime('%Y-%m') if value is not None else 'unknown'
+
+
+def _to_arrow_value(value):
+    """Приводит значения из БД к типам, которые понимает Arrow."""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def read_watermarks(output_dir: str) -> dict:
+    """Читает сохраненные водяные знаки предыдущей выгрузки."""
+    path = os.path.join(output_dir, WATERMARK_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_watermarks(output_dir: str, watermarks: dict):
+    """Атомарно записывает водяные знаки, чтобы сбой не оставил файл наполовину."""
+    path = os.path.join(output_dir, WATERMARK_FILENAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(watermarks, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _export_dataset(name: str, spec: dict, output_dir: str, since, run_id: str, batch_size: int):
+    """
+    Выгружает один набор данных пачками из серверного курсора.
+    Каждая пачка раскладывается по месячным разделам `<набор>/month=YYYY-MM/`.
+
+    :return: Кортеж (число выгруженных строк, новый водяной знак).
+    """
+    model = spec['model']
+    column_names = [column_name for column_name, _ in spec['columns']]
+    schema = pa.schema(spec['columns'])
+    watermark_column = getattr(model, spec['watermark'])
+
+    stmt = select(*[getattr(model, column_name) for column_name in column_names])
+    if since is not None:
+        if spec['watermark'] == 'last_update':
+            since = datetime.fromisoformat(since)
+        stmt = stmt.where(watermark_column > since)
+    stmt = stmt.order_by(watermark_column)
+
+    result = db.session.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+    rows_written, new_watermark = 0, since
+    for batch_number, batch in enumerate(result.mappings().partitions(batch_size)):
+        by_month = defaultdict(list)
+        for row in batch:
+            by_month[_month_key(row[spec['partition_by']])].append(
+                {column_name: _to_arrow_value(row[column_name]) for column_name in column_names}
+            )
+        for month, rows in by_month.items():
+            partition_dir = os.path.join(output_dir, name, f'month={month}')
+            os.makedirs(partition_dir, exist_ok=True)
+            table = pa.Table.from_pylist(rows, schema=schema)
+            pq.write_table(table, os.path.join(partition_dir, f'part-{run_id}-{batch_number:05d}.parquet'),
+                           compression='zstd')
+        rows_written += len(batch)
+        last_value = batch[-1][spec['watermark']]
+        if last_value is not None:
+            new_watermark = last_value
+
+    if isinstance(new_watermark, datetime):
+        new_watermark = new_watermark.isoformat()
+    return rows_written, new_watermark
+
+
+def export_analytics(output_dir: str, full: bool = False, batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    """
+    Выгружает историю статусов, журнал аудита и детали в Parquet-файлы,
+    разбитые по месяцам. По умолчанию выгружаются только строки, появившиеся
+    после предыдущей выгрузки (по водяному знаку в `_watermark.json`); удаленные
+    и измененные с тех пор строки истории и аудита остаются в файлах в прежнем
+    виде до полной выгрузки.
+
+    :param output_dir: Каталог с набором Parquet-файлов.
+    :param full: Удалить прежние файлы и выгрузить все данные заново.
+    :param batch_size: Размер пачки, читаемой из серверного курсора.
+    :return: Словарь {имя набора: число выгруженных строк}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    watermarks = {} if full else read_watermarks(output_dir)
+    if full:
+        # Полная выгрузка заменяет прежние файлы, иначе строки задвоятся
+        for name in DATASETS:
+            shutil.rmtree(os.path.join(output_dir, name), ignore_errors=True)
+    run_id = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    if CHANGES_WATERMARK not in watermarks:
+        watermarks[CHANGES_WATERMARK] = db.session.execute(select(func.max(HistoryChange.id))).scalar() or 0
+
+    summary = {}
+    for name, spec in DATASETS.items():
+        since = watermarks.get(name)
+        rows_written, new_watermark = _export_dataset(name, spec, output_dir, since, run_id, batch_size)
+        summary[name] = rows_written
+        if new_watermark is not None:
+            watermarks[name] = new_watermark
+
+    _write_watermarks(output_dir, watermarks)
+    return summary
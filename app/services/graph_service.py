@@ -2,42 +2,184 @@
 
 import os
 import requests
-import openpyxl
 import io
-import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
+
+from app.services.workbook_cache import workbook_cache
 
 class GraphAPIError(Exception):
     """Пользовательское исключение для ошибок при работе с Graph API."""
     pass
 
 
-def _get_access_token():
+# Токен обновляется заранее, за столько секунд до истечения срока действия
+TOKEN_REFRESH_MARGIN = 300
+# Срок действия по умолчанию, если сервер не вернул expires_in
+DEFAULT_TOKEN_LIFETIME = 3600
+DEFAULT_AUTHORITY_HOST = "https://login.microsoftonline.com"
+DEFAULT_GRAPH_BASE_URL = "https://graph.microsoft.com/v1.0"
+
+# Параметры HTTP-клиента: таймауты (подключение, чтение) в секундах, повторы и пул соединений
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 60
+MAX_RETRIES = 4
+BACKOFF_FACTOR = 0.5
+# Дольше этого Retry-After не ждем: запрос завершается ошибкой, а не занимает воркер
+MAX_RETRY_AFTER = 60
+POOL_MAXSIZE = 10
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def _parse_retry_after(value):
+    """Разбирает заголовок Retry-After (секунды или HTTP-дата) в секунды ожидания."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class GraphClient:
     """
-    Выполняет аутентификацию в Microsoft Identity Platform для получения токена доступа.
-    Использует поток "client credentials" (учетные данные клиента).
+    HTTP-клиент Microsoft Graph с общим пулом соединений.
+
+    Все запросы идут через один `requests.Session` (keep-alive, ограниченный пул),
+    с таймаутами на подключение и чтение. Ответы 429/5xx и сетевые ошибки
+    повторяются с экспоненциальной задержкой; если сервер прислал Retry-After,
+    ждем указанное им время. Запросы к Graph API автоматически получают
+    токен из `token_provider`, после ответа 401 токен обновляется один раз.
     """
+
+    def __init__(self, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), max_retries: int = MAX_RETRIES,
+                 backoff_factor: float = BACKOFF_FACTOR, max_retry_after: float = MAX_RETRY_AFTER,
+                 pool_maxsize: int = POOL_MAXSIZE, sleep=time.sleep):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_retry_after = max_retry_after
+        self._sleep = sleep
+        self.session = requests.Session()
+        # pool_block: при исчерпании пула поток ждет соединение, а не открывает лишнее
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize, pool_block=True, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _retry_delay(self, attempt: int, response=None):
+        """Задержка перед повтором или None, если повторять не нужно."""
+        if attempt >= self.max_retries:
+            return None
+        retry_after = _parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_retry_after else None
+        return self.backoff_factor * (2 ** attempt)
+
+    def request(self, method: str, url: str, authenticate: bool = True, **kwargs) -> requests.Response:
+        """
+        Выполняет запрос с таймаутом и повторами.
+        Возвращает последний ответ; проверка статуса остается за вызывающим кодом.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        headers = dict(kwargs.pop('headers', None) or {})
+        token_refreshed = False
+        attempt = 0
+        while True:
+            if authenticate:
+                headers['Authorization'] = f'Bearer {_get_access_token()}'
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                delay = self._retry_delay(attempt)
+                if delay is None:
+                    raise
+            else:
+                if response.status_code == 401 and authenticate and not token_refreshed:
+                    # Токен мог быть отозван до истечения срока: получаем новый и повторяем один раз
+                    response.close()
+                    token_provider.invalidate()
+                    token_refreshed = True
+                    continue
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                delay = self._retry_delay(attempt, response)
+                if delay is None:
+                    return response
+                response.close()
+            self._sleep(delay)
+            attempt += 1
+
+    def download(self, url: str, destination=None, chunk_size: int = DOWNLOAD_CHUNK_SIZE):
+        """
+        Скачивает ресурс потоково, не держа в памяти весь ответ сразу.
+
+        :param destination: Файловый объект для записи; если не задан, возвращаются байты.
+        :return: Байты содержимого или число записанных байтов.
+        """
+        with self.request('GET', url, stream=True) as response:
+            response.raise_for_status()
+            target = destination if destination is not None else io.BytesIO()
+            written = 0
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                target.write(chunk)
+                written += len(chunk)
+        return target.getvalue() if destination is None else written
+
+    def close(self):
+        self.session.close()
+
+
+def _graph_base_url():
+    # MS_GRAPH_BASE_URL позволяет направить запросы на другой сервер (например, локальную заглушку)
+    return os.environ.get("MS_GRAPH_BASE_URL", DEFAULT_GRAPH_BASE_URL).rstrip('/')
+
+
+def _get_credentials():
+    """Читает учетные данные приложения из переменных окружения."""
     # Читаем переменные окружения внутри функции, чтобы тесты могли их подменять
     MS_CLIENT_ID = os.environ.get("MS_CLIENT_ID")
     MS_CLIENT_SECRET = os.environ.get("MS_CLIENT_SECRET")
     MS_TENANT_ID = os.environ.get("MS_TENANT_ID")
-    
+
     if not all([MS_CLIENT_ID, MS_CLIENT_SECRET, MS_TENANT_ID]):
         raise GraphAPIError(
             "В файле .env отсутствуют учетные данные Microsoft: "
             "MS_CLIENT_ID, MS_CLIENT_SECRET, MS_TENANT_ID."
         )
+    return MS_CLIENT_ID, MS_CLIENT_SECRET, MS_TENANT_ID
+
 
-    url = f"https://login.microsoftonline.com/{MS_TENANT_ID}/oauth2/v2.0/token"
+def _request_access_token(client_id: str, client_secret: str, tenant_id: str):
+    """
+    Выполняет аутентификацию в Microsoft Identity Platform для получения токена доступа.
+    Использует поток "client credentials" (учетные данные клиента).
+
+    :return: Кортеж (токен, срок действия в секундах).
+    """
+    # MS_AUTHORITY_HOST позволяет направить запрос на другой сервер (например, локальную заглушку)
+    authority_host = os.environ.get("MS_AUTHORITY_HOST", DEFAULT_AUTHORITY_HOST).rstrip('/')
+    url = f"{authority_host}/{tenant_id}/oauth2/v2.0/token"
     headers = {'Content-Type': 'application/x-www-form-urlencoded'}
     payload = {
-        'client_id': MS_CLIENT_ID,
+        'client_id': client_id,
         'scope': 'https://graph.microsoft.com/.default',
-        'client_secret': MS_CLIENT_SECRET,
+        'client_secret': client_secret,
         'grant_type': 'client_credentials'
     }
 
     try:
-        response = requests.post(url, headers=headers, data=payload)
+        response = graph_client.request('POST', url, authenticate=False, headers=headers, data=payload)
         response.raise_for_status()  # Вызовет исключение для кодов 4xx/5xx
     except requests.exceptions.RequestException as e:
         raise GraphAPIError(f"Ошибка сети при получении токена доступа: {e}")
@@ -49,42 +191,163 @@ def _get_access_token():
         error_details = token_data.get('error_description', 'Нет дополнительной информации.')
         raise GraphAPIError(f"Не удалось получить токен доступа. Ответ сервера: {error_details}")
 
-    return access_token
+    try:
+        expires_in = float(token_data.get('expires_in', DEFAULT_TOKEN_LIFETIME))
+    except (TypeError, ValueError):
+        expires_in = DEFAULT_TOKEN_LIFETIME
+    return access_token, expires_in
 
 
-def download_file_from_onedrive(file_path_in_onedrive: str) -> bytes:
+class TokenProvider:
     """
-    Скачивает файл из корневой папки OneDrive указанного пользователя.
+    Потокобезопасный кэш токена доступа Graph API.
 
-    :param file_path_in_onedrive: Путь к файлу от корневой папки,
-                                  например, '/Documents/Отчеты/data.xlsx'
-    :return: Содержимое файла в виде байтов.
+    Токен хранится до `expires_in` минус запас на обновление. Когда токен
+    устарел, его обновляет только один поток: остальные ждут на блокировке
+    и получают уже обновленный токен, а не отправляют параллельные запросы.
+    Токен привязан к учетным данным: при их смене он запрашивается заново.
     """
+
+    def __init__(self, refresh_margin: float = TOKEN_REFRESH_MARGIN, clock=time.monotonic):
+        self.refresh_margin = refresh_margin
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._token = None
+        self._credentials_key = None
+        self._refresh_at = 0.0
+        self._hits = 0
+        self._refreshes = 0
+        self._failures = 0
+        self._waits = 0
+
+    def _is_fresh(self, credentials_key) -> bool:
+        return (self._token is not None and self._credentials_key == credentials_key
+                and self._clock() < self._refresh_at)
+
+    def get_token(self) -> str:
+        """Возвращает действующий токен, при необходимости получая новый."""
+        client_id, client_secret, tenant_id = _get_credentials()
+        credentials_key = (tenant_id, client_id, client_secret)
+
+        # Быстрый путь без блокировки: чтение ссылок атомарно
+        token = self._token
+        if token is not None and self._is_fresh(credentials_key):
+            self._hits += 1
+            return token
+
+        if not self._lock.acquire(blocking=False):
+            # Токен уже обновляет другой поток - ждем его результата
+            self._lock.acquire()
+            self._waits += 1
+        try:
+            if self._is_fresh(credentials_key):
+                self._hits += 1
+                return self._token
+            try:
+                token, expires_in = _request_access_token(client_id, client_secret, tenant_id)
+            except GraphAPIError:
+                self._failures += 1
+                raise
+            # Запас не больше половины срока жизни, иначе короткие токены не кэшировались бы вовсе
+            margin = min(self.refresh_margin, expires_in / 2)
+            self._token = token
+            self._credentials_key = credentials_key
+            self._refresh_at = self._clock() + expires_in - margin
+            self._refreshes += 1
+            return token
+        finally:
+            self._lock.release()
+
+    def invalidate(self):
+        """Сбрасывает токен, например, после ответа 401 от Graph API."""
+        with self._lock:
+            self._token = None
+            self._refresh_at = 0.0
+
+    def clear(self):
+        """Сбрасывает токен и счетчики."""
+        with self._lock:
+            self._token = None
+            self._credentials_key = None
+            self._refresh_at = 0.0
+            self._hits = self._refreshes = self._failures = self._waits = 0
+
+    def stats(self) -> dict:
+        """Метрики кэша токена: попадания, обновления, ошибки, ожидания чужого обновления."""
+        with self._lock:
+            expires_in = max(self._refresh_at - self._clock(), 0.0) if self._token else 0.0
+            return {
+                'cached': self._token is not None,
+                'refresh_in_seconds': round(expires_in, 1),
+                'hits': self._hits,
+                'refreshes': self._refreshes,
+                'failures': self._failures,
+                'waits': self._waits,
+            }
+
+
+token_provider = TokenProvider()
+graph_client = GraphClient()
+
+
+def _get_access_token():
+    """Возвращает токен доступа Graph API из общего кэша токенов."""
+    return token_provider.get_token()
+
+
+def _onedrive_user_id():
     # Читаем переменную окружения внутри функции
     MS_ONEDRIVE_USER_ID = os.environ.get("MS_ONEDRIVE_USER_ID")
     if not MS_ONEDRIVE_USER_ID:
         raise GraphAPIError("В файле .env отсутствует ID пользователя OneDrive (MS_ONEDRIVE_USER_ID).")
+    return MS_ONEDRIVE_USER_ID
 
-    access_token = _get_access_token()
 
-    # Формат API для доступа к файлу в диске конкретного пользователя.
-    api_url = (
-        f"https://graph.microsoft.com/v1.0/users/{MS_ONEDRIVE_USER_ID}/drive/root:"
-        f"{file_path_in_onedrive}:/content"
-    )
+def _onedrive_item_url(file_path_in_onedrive: str) -> str:
+    """Адрес элемента диска пользователя по пути от корневой папки."""
+    return f"{_graph_base_url()}/users/{_onedrive_user_id()}/drive/root:{file_path_in_onedrive}"
 
-    headers = {'Authorization': f'Bearer {access_token}'}
 
+def get_onedrive_item_metadata(file_path_in_onedrive: str, etag: str = None):
+    """
+    Получает метаданные файла OneDrive (eTag, cTag, размер).
+
+    :param etag: eTag ранее полученной версии; передается в If-None-Match.
+    :return: Словарь метаданных или None, если элемент не изменился (ответ 304).
+    """
+    url = _onedrive_item_url(file_path_in_onedrive)
+    headers = {'If-None-Match': etag} if etag else {}
     try:
-        response = requests.get(api_url, headers=headers)
-        
+        response = graph_client.request('GET', url, headers=headers,
+                                        params={'$select': 'id,eTag,cTag,size,lastModifiedDateTime'})
+        if response.status_code == 304:
+            return None
         if response.status_code == 404:
             raise FileNotFoundError(f"Файл не найден в OneDrive по пути: {file_path_in_onedrive}")
-        
-        response.raise_for_status() # Проверка на другие ошибки HTTP
-        
-        return response.content
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        raise GraphAPIError(f"Ошибка сети при получении сведений о файле: {e}")
+
+
+def download_file_from_onedrive(file_path_in_onedrive: str, destination=None):
+    """
+    Скачивает файл из корневой папки OneDrive указанного пользователя.
+
+    :param file_path_in_onedrive: Путь к файлу от корневой папки,
+                                  например, '/Documents/Отчеты/data.xlsx'
+    :param destination: Файловый объект, в который потоково пишется содержимое.
+    :return: Содержимое файла в виде байтов (или число записанных байтов, если задан destination).
+    """
+    # Формат API для доступа к файлу в диске конкретного пользователя.
+    api_url = f"{_onedrive_item_url(file_path_in_onedrive)}:/content"
 
+    try:
+        return graph_client.download(api_url, destination=destination)
+    except requests.exceptions.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            raise FileNotFoundError(f"Файл не найден в OneDrive по пути: {file_path_in_onedrive}")
+        raise GraphAPIError(f"Ошибка сети при скачивании файла: {e}")
     except requests.exceptions.RequestException as e:
         raise GraphAPIError(f"Ошибка сети при скачивании файла: {e}")
 
@@ -94,34 +357,11 @@ def read_row_from_excel_bytes(excel_bytes: bytes, row_number: int) -> dict:
     Читает указанную строку из Excel-файла, переданного в виде байтов,
     и возвращает словарь вида {заголовок: значение}.
 
+    Книга разбирается один раз и хранится в `workbook_cache` по хэшу
+    содержимого, поэтому повторные обращения к той же книге не читают ее заново.
+
     :param excel_bytes: Содержимое .xlsx файла.
     :param row_number: Номер строки для чтения (нумерация с 1).
     :return: Словарь, сопоставляющий заголовки столбцов со значениями ячеек.
     """
-    try:
-        workbook = openpyxl.load_workbook(io.BytesIO(excel_bytes), data_only=True)
-        sheet = workbook.active
-    except Exception as e:
-        raise ValueError(f"Не удалось прочитать содержимое Excel-файла. Ошибка: {e}")
-
-    if not (2 <= row_number <= sheet.max_row):
-        raise IndexError(f"Номер строки {row_number} находится вне допустимого диапазона (от 2 до {sheet.max_row}).")
-
-    # Читаем и очищаем заголовки из первой строки
-    headers = []
-    for cell in sheet[1]:
-        if cell.value is not None:
-            header_text = str(cell.value).strip()
-            header_text = re.sub(r'\s+', ' ', header_text)  # Заменяем множественные пробелы на один
-            headers.append(header_text)
-    
-    if not headers:
-        raise ValueError("Не удалось прочитать заголовки из первой строки Excel-файла.")
-
-    # Читаем значения из указанной строки
-    row_values = [cell.value if cell.value is not None else "" for cell in sheet[row_number]]
-
-    # Создаем словарь для подстановки в шаблон Word
-    placeholders = {f"{{{{{headers[i]}}}}}": str(row_values[i]) for i in range(len(headers))}
-    
-    return placeholders
\ No newline at end of file
+    return workbook_cache.get(excel_bytes).row_placeholders(row_number)
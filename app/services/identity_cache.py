@@ -0,0 +1,114 @@
+# app/services/identity_cache.py
+
+from flask import session
+from flask_login import user_logged_in, user_logged_out
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import joinedload, object_session
+
+from app import db
+from app.models.models import Role, User
+from app.services import cache_versions
+from app.services.reference_cache import attach
+
+SESSION_KEY = '_identity'
+VERSION_NAME = 'identity'
+# Поля, от которых зависят имя пользователя и права в запросе
+_USER_FIELDS = ('username', 'role_id', 'role')
+_ROLE_FIELDS = ('name', 'permissions')
+
+
+def snapshot(user) -> dict:
+    """Снимок пользователя и его роли для подписанной cookie сессии."""
+    role = user.role
+    return {
+        'id': user.id,
+        'username': user.username,
+        'role_id': role.id if role is not None else None,
+        'role_name': role.name if role is not None else None,
+        'permissions': role.permissions if role is not None else None,
+        'version': cache_versions.current(VERSION_NAME),
+    }
+
+
+def remember(user):
+    session[SESSION_KEY] = snapshot(user)
+
+
+def forget():
+    session.pop(SESSION_KEY, None)
+
+
+def _from_snapshot(data: dict):
+    role = None
+    if data['role_id'] is not None:
+        role = attach(Role, {'id': data['role_id'], 'name': data['role_name'],
+                             'permissions': data['permissions']})
+    return attach(User, {'id': data['id'], 'username': data['username'],
+                         'role_id': data['role_id'], 'role': role})
+
+
+def load_user(user_id):
+    """
+    Загрузчик пользователя для Flask-Login.
+
+    Если снимок в сессии относится к этому пользователю и его версия совпадает
+    с текущей версией 'identity', пользователь и роль восстанавливаются без
+    запросов к БД. Иначе они загружаются одним запросом с JOIN, и снимок
+    обновляется.
+    """
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    data = session.get(SESSION_KEY)
+    if data and data.get('id') == user_id and data.get('version') == cache_versions.current(VERSION_NAME):
+        return _from_snapshot(data)
+    user = db.session.execute(
+        select(User).options(joinedload(User.role)).where(User.id == user_id)
+    ).scalar_one_or_none()
+    if user is None:
+        forget()
+    else:
+        remember(user)
+    return user
+
+
+def _has_changes(target, fields) -> bool:
+    state = inspect(target)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def _bump(connection, target):
+    cache_versions.bump(VERSION_NAME, connection=connection, session=object_session(target))
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    if _has_changes(target, _USER_FIELDS):
+        _bump(connection, target)
+
+
+@event.listens_for(Role, 'after_update')
+def _role_updated(mapper, connection, target):
+    if _has_changes(target, _ROLE_FIELDS):
+        _bump(connection, target)
+
+
+@event.listens_for(User, 'after_delete')
+@event.listens_for(Role, 'after_delete')
+def _deleted(mapper, connection, target):
+    _bump(connection, target)
+
+
+def _on_logged_in(sender, user, **extra):
+    remember(user)
+
+
+def _on_logged_out(sender, user, **extra):
+    forget()
+
+
+def init_app(app, login_manager):
+    login_manager.user_loader(load_user)
+    user_logged_in.connect(_on_logged_in, app)
+    user_logged_out.connect(_on_logged_out, app)
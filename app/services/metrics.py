@@ -0,0 +1,310 @@
+# app/services/metrics.py
+
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, abort, current_app, g, request
+from sqlalchemy import event
+
+from app import db, socketio
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Границы корзин гистограмм (секунды): от быстрых запросов до долгих импортов
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Основа метрик: значения по наборам меток хранятся в словаре под блокировкой.
+    Блокировка держится только на время изменения числа, поэтому под eventlet
+    (где threading.Lock - green-блокировка) сбор почти не добавляет задержек.
+    Значения, которые уже считает другой код, берутся при экспорте из `callback`:
+    он возвращает {значения меток (кортеж): значение}.
+    """
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames=(), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def samples(self):
+        """Строки (суффикс имени, значения меток, значение) для экспорта."""
+        if self.callback is not None:
+            try:
+                return [('', key, value) for key, value in self.callback().items()]
+            except Exception:
+                return []
+        with self._lock:
+            return [('', key, value) for key, value in self._values.items()]
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for suffix, (names, values), value in self._labelled_samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return lines
+
+    def _labelled_samples(self):
+        for suffix, key, value in self.samples():
+            yield suffix, (self.labelnames, key), value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Измеряет длительность блока `with histogram.time(...):`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _labelled_samples(self):
+        with self._lock:
+            states = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        names = self.labelnames + ('le',)
+        for key, counts, total, count in states:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield '_bucket', (names, key + (_format_value(bound),)), cumulative
+            yield '_sum', (self.labelnames, key), total
+            yield '_count', (self.labelnames, key), count
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus."""
+    lines = []
+    for metric in _registry:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
+
+
+# --- Метрики приложения ---
+
+http_requests = Counter('http_requests_total', 'HTTP-запросы по эндпоинтам и кодам ответа.',
+                        ('blueprint', 'endpoint', 'method', 'status'))
+http_request_duration = Histogram('http_request_duration_seconds', 'Время обработки HTTP-запросов.',
+                                  ('blueprint', 'endpoint'))
+db_query_duration = Histogram('db_query_duration_seconds', 'Время выполнения SQL-запросов.', buckets=DB_BUCKETS)
+socketio_connected = Gauge('socketio_connected_clients', 'Подключенные клиенты Socket.IO.')
+socketio_emits = Counter('socketio_emits_total', 'Отправленные события Socket.IO.', ('event',))
+import_duration = Histogram('import_duration_seconds', 'Длительность импорта деталей из файлов.', ('source',))
+job_duration = Histogram('job_duration_seconds', 'Длительность фоновых задач.', ('job',))
+job_failures = Counter('job_failures_total', 'Ошибки фоновых задач.', ('job',))
+
+
+def _pool_stats():
+    pool = db.engine.pool
+    stats = {}
+    for state in ('size', 'checkedout', 'overflow', 'checkedin'):
+        method = getattr(pool, state, None)
+        if callable(method):
+            stats[(state,)] = method()
+    return stats
+
+
+def _audit_queue():
+    from app.services.audit_service import audit_writer
+    return {(): audit_writer.stats()['queued']}
+
+
+def _qr_cache_stats():
+    from app.utils import qr_cache_info
+    info = qr_cache_info()
+    return {('hit',): info.hits, ('miss',): info.misses}
+
+
+db_pool = Gauge('db_pool_connections', 'Соединения пула БД по состоянию.', ('state',), callback=_pool_stats)
+audit_queue = Gauge('audit_queue_size', 'Записи журнала аудита в очереди на запись.', callback=_audit_queue)
+qr_cache = Counter('qr_cache_requests_total', 'Обращения к кэшу QR-кодов.', ('result',), callback=_qr_cache_stats)
+
+
+@contextmanager
+def track_job(job: str):
+    """Учитывает длительность и ошибки фоновой задачи."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        job_failures.inc(job=job)
+        raise
+    finally:
+        job_duration.observe(time.perf_counter() - start, job=job)
+
+
+def emit(event_name: str, data, **kwargs):
+    """socketio.emit с учетом числа отправленных событий."""
+    socketio.emit(event_name, data, **kwargs)
+    socketio_emits.inc(event=event_name)
+
+
+# --- Сбор в приложении ---
+
+_db_listening = set()
+_socketio_handlers_registered = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if starts:
+        db_query_duration.observe(time.perf_counter() - starts.pop())
+
+
+def _listen_engine(engine):
+    if id(engine) in _db_listening:
+        return
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    _db_listening.add(id(engine))
+
+
+def _on_connect(*args):
+    socketio_connected.inc()
+
+
+def _on_disconnect(*args):
+    socketio_connected.dec()
+
+
+def _start_timer():
+    g.metrics_start = time.perf_counter()
+
+
+def _record_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None or request.endpoint == 'metrics':
+        return response
+    # Несопоставленные адреса (404) сводятся к одной метке, чтобы не плодить ряды
+    endpoint = request.endpoint or 'unmatched'
+    blueprint = request.blueprint or ''
+    http_request_duration.observe(time.perf_counter() - start, blueprint=blueprint, endpoint=endpoint)
+    http_requests.inc(blueprint=blueprint, endpoint=endpoint, method=request.method,
+                      status=str(response.status_code))
+    return response
+
+
+def metrics_view():
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied, f"Bearer {token}"):
+            abort(401)
+    return Response(render(), mimetype=None, content_type=CONTENT_TYPE)
+
+
+def init_app(app):
+    """
+    Включает сбор метрик при METRICS_ENABLED и отдает их на /metrics
+    (при заданном METRICS_TOKEN - только с заголовком `Authorization: Bearer <токен>`).
+    Без METRICS_TOKEN метрики включаются только в режиме отладки или тестов,
+    чтобы /metrics не оказался открытым на рабочем сервере.
+    """
+    global _socketio_handlers_registered
+    if not app.config.get('METRICS_ENABLED'):
+        return
+    if not app.config.get('METRICS_TOKEN') and not (app.debug or app.testing):
+        app.logger.warning("METRICS_TOKEN не задан: метрики и /metrics отключены.")
+        return
+    with app.app_context():
+        _listen_engine(db.engine)
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    if not _socketio_handlers_registered:
+        socketio.on_event('connect', _on_connect)
+        socketio.on_event('disconnect', _on_disconnect)
+        _socketio_handlers_registered = True
@@ -0,0 +1,198 @@
+# app/services/onedrive_cache.py
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from app.services import graph_service
+
+INDEX_FILENAME = 'index.json'
+
+
+class OneDriveFileCache:
+    """
+    Локальный дисковый кэш файлов OneDrive.
+
+    Файл хранится по ключу "пользователь + путь". Перед выдачей из кэша
+    версия проверяется по метаданным элемента: запрос с If-None-Match
+    по сохраненному eTag (ответ 304 - файл не менялся), а при новом eTag
+    дополнительно сравнивается cTag, который меняется только вместе с содержимым.
+    Скачивание идет только при изменении файла.
+
+    Суммарный размер ограничен `max_bytes`: при превышении удаляются файлы,
+    к которым дольше всего не обращались (LRU). Индекс хранится в `index.json`,
+    поэтому кэш переживает перезапуск приложения.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._entries = self._load_index()
+
+    # --- Индекс ---
+
+    def _load_index(self) -> OrderedDict:
+        path = os.path.join(self.cache_dir, INDEX_FILENAME)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return OrderedDict()
+        # Записи без файла на диске (удален вручную) отбрасываем сразу
+        valid = [(key, entry) for key, entry in entries.items()
+                 if os.path.exists(self._file_path(entry['file']))]
+        return OrderedDict(sorted(valid, key=lambda item: item[1]['last_access']))
+
+    def _save_index(self):
+        """Атомарно записывает индекс, чтобы сбой не оставил файл наполовину."""
+        path = os.path.join(self.cache_dir, INDEX_FILENAME)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _file_path(self, filename: str) -> str:
+        return os.path.join(self.cache_dir, filename)
+
+    @staticmethod
+    def make_key(file_path_in_onedrive: str) -> str:
+        return f"{os.environ.get('MS_ONEDRIVE_USER_ID', '')}:{file_path_in_onedrive}"
+
+    # --- Работа с файлами ---
+
+    def _read(self, key: str):
+        entry = self._entries[key]
+        try:
+            with open(self._file_path(entry['file']), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _touch(self, key: str, **changes):
+        entry = self._entries[key]
+        entry.update(changes, last_access=time.time())
+        self._entries.move_to_end(key)
+        self._save_index()
+
+    def _store(self, key: str, metadata: dict, file_path_in_onedrive: str) -> bytes:
+        """Скачивает файл во временный файл и атомарно помещает его в кэш."""
+        filename = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                size = graph_service.download_file_from_onedrive(file_path_in_onedrive, destination=f)
+            with open(tmp_path, 'rb') as f:
+                content = f.read()
+            with self._lock:
+                os.replace(tmp_path, self._file_path(filename))
+                self._entries[key] = {
+                    'file': filename, 'size': size, 'etag': metadata.get('eTag'),
+                    'ctag': metadata.get('cTag'), 'last_access': time.time()
+                }
+                self._entries.move_to_end(key)
+                self._evict()
+                self._save_index()
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return content
+
+    def _evict(self):
+        """Удаляет давно не использованные файлы, пока размер кэша превышает лимит."""
+        total = sum(entry['size'] for entry in self._entries.values())
+        # Самый свежий файл не вытесняем, даже если он один больше лимита
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            total -= entry['size']
+            self.evictions += 1
+            try:
+                os.remove(self._file_path(entry['file']))
+            except OSError:
+                pass
+
+    # --- Публичный интерфейс ---
+
+    def get(self, file_path_in_onedrive: str) -> bytes:
+        """Возвращает содержимое файла, скачивая его только если он изменился."""
+        key = self.make_key(file_path_in_onedrive)
+        with self._lock:
+            cached = dict(self._entries[key]) if key in self._entries else None
+
+        if cached is not None:
+            metadata = graph_service.get_onedrive_item_metadata(file_path_in_onedrive, etag=cached['etag'])
+            unchanged = metadata is None or (cached['ctag'] and metadata.get('cTag') == cached['ctag'])
+            if unchanged:
+                with self._lock:
+                    content = self._read(key) if key in self._entries else None
+                    if content is not None:
+                        self.hits += 1
+                        changes = {'etag': metadata['eTag']} if metadata and metadata.get('eTag') else {}
+                        self._touch(key, **changes)
+                        return content
+                metadata = metadata or graph_service.get_onedrive_item_metadata(file_path_in_onedrive)
+        else:
+            metadata = graph_service.get_onedrive_item_metadata(file_path_in_onedrive)
+
+        with self._lock:
+            self.misses += 1
+        return self._store(key, metadata, file_path_in_onedrive)
+
+    def clear(self):
+        """Удаляет все файлы кэша."""
+        with self._lock:
+            for entry in self._entries.values():
+                try:
+                    os.remove(self._file_path(entry['file']))
+                except OSError:
+                    pass
+            self._entries.clear()
+            self._save_index()
+
+    def stats(self) -> dict:
+        """Метрики кэша: число и общий размер файлов, попадания, промахи, вытеснения."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': sum(entry['size'] for entry in self._entries.values()),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_onedrive_cache() -> OneDriveFileCache:
+    """Возвращает общий экземпляр кэша для каталога из конфигурации приложения."""
+    cache_dir = current_app.config.get('ONEDRIVE_CACHE_DIR') or os.path.join(current_app.instance_path,
+                                                                             'onedrive_cache')
+    with _caches_lock:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = OneDriveFileCache(cache_dir, current_app.config['ONEDRIVE_CACHE_MAX_BYTES'])
+        return _caches[cache_dir]
+
+
+def fetch_onedrive_file(file_path_in_onedrive: str) -> bytes:
+    """
+    Возвращает содержимое файла OneDrive: через дисковый кэш,
+    если `ONEDRIVE_CACHE_ENABLED`, иначе прямым скачиванием.
+    """
+    if not current_app.config.get('ONEDRIVE_CACHE_ENABLED', True):
+        return graph_service.download_file_from_onedrive(file_path_in_onedrive)
+    return get_onedrive_cache().get(file_path_in_onedrive)
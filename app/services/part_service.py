@@ -2,18 +2,22 @@
 
 import os
 import io
-from datetime import datetime, timezone
-from werkzeug.utils import secure_filename
-from PIL import Image
 import pandas as pd
 from flask import current_app
 from collections import defaultdict
+from sqlalchemy import delete, func, insert, or_
 from sqlalchemy.exc import IntegrityError
 
-from app import db, socketio
+from app import db
 from app.models.models import (Part, AuditLog, RouteTemplate, ResponsibleHistory,
-                               StatusHistory, Stage, RouteStage, AssemblyComponent)
+                               StatusHistory, Stage, RouteStage, AssemblyComponent, PartNote,
+                               PartArchive, calculate_stage_duration)
 from app.utils import generate_qr_code_as_base64
+from app.services import (analytics_service, archive_service, audit_service, drawing_service, drawing_storage,
+                          metrics, reference_cache, report_cache)
+
+# Размер пачки деталей при массовом удалении (ограничение числа параметров в IN)
+BULK_DELETE_CHUNK = 500
 
 
 def _send_websocket_notification(event_type: str, message: str, part_id: str = None):
@@ -25,33 +29,34 @@ def _send_websocket_notification(event_type: str, message: str, part_id: str = N
         data = {'event': event_type, 'message': message}
         if part_id:
             data['part_id'] = part_id
-        socketio.emit('notification', data)
+        metrics.emit('notification', data)
     except RuntimeError:
         current_app.logger.info("WebSocket emit skipped: Not in a Socket.IO server context.")
 
 
 def save_part_drawing(file_storage, config):
     """
-    Безопасно сохраняет файл чертежа, сжимая его, и возвращает уникальное имя.
+    Сохраняет файл чертежа без перекодирования в хранилище (см. drawing_storage)
+    и возвращает его имя. Одинаковые файлы хранятся один раз.
+    Превью для просмотра строятся в фоне, если их еще нет (см. drawing_service).
     """
-    filename = secure_filename(file_storage.filename)
-    unique_filename = f"{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}_{filename}"
-    file_path = os.path.join(config['DRAWING_UPLOAD_FOLDER'], unique_filename)
+    filename = drawing_storage.store_drawing(file_storage, config)
+    if drawing_service.read_manifest(filename, config) is None:
+        drawing_service.schedule_thumbnails(filename, config)
+    return filename
 
-    try:
-        img = Image.open(file_storage)
-        img.save(file_path, optimize=True, quality=85)
-        return unique_filename
-    except Exception:
-        file_storage.seek(0)
-        file_storage.save(file_path)
-        return unique_filename
+
+def _check_not_archived(part_id):
+    """Артикулы архивных деталей заняты: деталь вернется из архива при открытии."""
+    if archive_service.is_archived(part_id):
+        raise ValueError(f"Деталь {part_id} уже существует и находится в архиве.")
 
 
 def create_single_part(form, user, config):
     """
     Создает одну деталь на основе данных из формы.
     """
+    _check_not_archived(form.part_id.data)
     drawing_filename = None
     if form.drawing.data:
         drawing_filename = save_part_drawing(form.drawing.data, config)
@@ -68,8 +73,7 @@ def create_single_part(form, user, config):
     )
     db.session.add(new_part)
     
-    log_entry = AuditLog(part_id=new_part.part_id, user_id=user.id, action="Создание", details="Деталь создана вручную.", category='part')
-    db.session.add(log_entry)
+    audit_service.record("Создание", "Деталь создана вручную.", user_id=user.id, part_id=new_part.part_id, category='part')
     db.session.commit()
     
     _send_websocket_notification(
@@ -116,7 +120,7 @@ def import_parts_from_excel(file_storage, user, config):
     df.columns = [str(col).strip() for col in df.iloc[header_row_index]]
     df = df.iloc[header_row_index + 1:].reset_index(drop=True)
 
-    default_route = RouteTemplate.query.filter_by(is_default=True).first()
+    default_route = reference_cache.find_route_template(is_default=True)
     if not default_route:
         raise ValueError("Не найден маршрут по умолчанию. Пожалуйста, создайте его в 'Управлении маршрутами'.")
 
@@ -161,6 +165,7 @@ def import_parts_from_excel(file_storage, user, config):
                 parent_child_map[current_parent_id].append({'child_id': part_id, 'quantity': quantity})
     
     existing_part_ids = {p[0] for p in db.session.query(Part.part_id).filter(Part.part_id.in_(parts_to_create.keys()))}
+    existing_part_ids |= {p[0] for p in db.session.query(PartArchive.part_id).filter(PartArchive.part_id.in_(parts_to_create.keys()))}
     
     new_parts, new_components, audit_logs = [], [], []
     added_count, skipped_count = 0, 0
@@ -192,8 +197,12 @@ def import_parts_from_excel(file_storage, user, config):
 
 
 def _get_or_create_route_from_operations(operations_str: str) -> RouteTemplate:
+    """
+    Маршрут по списку операций из файла импорта. Маршруты и этапы ищутся в кэше
+    справочников; в БД - только созданные этим же импортом (еще не в кэше).
+    """
     if not operations_str or operations_str.lower() == 'nan':
-        default_route = RouteTemplate.query.filter_by(is_default=True).first()
+        default_route = reference_cache.find_route_template(is_default=True)
         if not default_route:
             raise ValueError("Не найден маршрут по умолчанию для деталей без указания операций.")
         return default_route
@@ -201,20 +210,22 @@ def _get_or_create_route_from_operations(operations_str: str) -> RouteTemplate:
     if not operations:
         return _get_or_create_route_from_operations("")
     route_name = " -> ".join(operations)
-    route = RouteTemplate.query.filter_by(name=route_name).first()
+    route = (reference_cache.find_route_template(name=route_name)
+             or RouteTemplate.query.filter_by(name=route_name).first())
     if route:
         return route
     new_route = RouteTemplate(name=route_name, is_default=False)
     db.session.add(new_route)
     db.session.flush()
     for i, op_name in enumerate(operations):
-        stage = Stage.query.filter(Stage.name.ilike(op_name)).first()
+        stage = reference_cache.find_stage(op_name) or Stage.query.filter(Stage.name.ilike(op_name)).first()
         if not stage:
             stage = Stage(name=op_name)
             db.session.add(stage)
             db.session.flush()
         route_stage = RouteStage(template_id=new_route.id, stage_id=stage.id, order=i)
         db.session.add(route_stage)
+    reference_cache.invalidate()
     return new_route
 
 
@@ -233,26 +244,22 @@ def update_part_from_form(part, form, user, config):
         changes.append(f"Размер: '{part.size}' -> '{form.size.data}'")
         part.size = form.size.data
     if form.drawing.data:
-        if part.drawing_filename:
-            old_file_path = os.path.join(config['DRAWING_UPLOAD_FOLDER'], part.drawing_filename)
-            if os.path.exists(old_file_path): os.remove(old_file_path)
+        old_drawing = part.drawing_filename
         part.drawing_filename = save_part_drawing(form.drawing.data, config)
+        drawing_service.release_drawing(old_drawing, config)
         changes.append("Обновлен чертеж.")
     if changes:
         log_details = "; ".join(changes)
-        log_entry = AuditLog(part_id=part.part_id, user_id=user.id, action="Редактирование", details=log_details, category='part')
-        db.session.add(log_entry)
+        audit_service.record("Редактирование", log_details, user_id=user.id, part_id=part.part_id, category='part')
         db.session.commit()
         _send_websocket_notification('part_updated', f"Пользователь {user.username} обновил данные детали {part.part_id}", part.part_id)
 
 
 def delete_single_part(part, user, config):
     part_id = part.part_id
-    if part.drawing_filename:
-        file_path = os.path.join(config['DRAWING_UPLOAD_FOLDER'], part.drawing_filename)
-        if os.path.exists(file_path): os.remove(file_path)
-    log_entry = AuditLog(part_id=part_id, user_id=user.id, action="Удаление", details=f"Деталь '{part_id}' и вся ее история были удалены.", category='part')
-    db.session.add(log_entry)
+    drawing_service.release_drawing(part.drawing_filename, config)
+    audit_service.record("Удаление", f"Деталь '{part_id}' и вся ее история были удалены.",
+                         user_id=user.id, part_id=part_id, category='part', durability=audit_service.SYNC)
     db.session.delete(part)
     db.session.commit()
     _send_websocket_notification('part_deleted', f"Пользователь {user.username} удалил деталь: {part_id}", part_id)
@@ -263,8 +270,7 @@ def change_part_route(part, new_route, user):
         old_route_name = part.route_template.name if part.route_template else "Не назначен"
         part.route_template_id = new_route.id
         log_details = f"Маршрут изменен с '{old_route_name}' на '{new_route.name}'."
-        log_entry = AuditLog(part_id=part.part_id, user_id=user.id, action="Редактирование", details=log_details, category='part')
-        db.session.add(log_entry)
+        audit_service.record("Редактирование", log_details, user_id=user.id, part_id=part.part_id, category='part')
         db.session.commit()
         _send_websocket_notification('part_updated', f"Для детали {part.part_id} изменен маршрут.", part.part_id)
         return True
@@ -280,8 +286,8 @@ def change_responsible_user(part, new_user, current_user):
         part.responsible_id = new_responsible_id
         db.session.add(ResponsibleHistory(part_id=part.part_id, user_id=new_responsible_id))
         log_details = f"Ответственный изменен с '{old_user_name}' на '{new_user_name}'."
-        log_entry = AuditLog(part_id=part.part_id, user_id=current_user.id, action="Смена ответственного", details=log_details, category='management')
-        db.session.add(log_entry)
+        audit_service.record("Смена ответственного", log_details, user_id=current_user.id, part_id=part.part_id,
+                             category='management', durability=audit_service.SYNC)
         db.session.commit()
         _send_websocket_notification('part_updated', f"Для детали {part.part_id} сменен ответственный.", part.part_id)
         return True
@@ -293,6 +299,7 @@ def create_child_part(form, parent_part_id, user):
     parent_part = db.session.get(Part, parent_part_id)
     if not parent_part:
         raise ValueError(f"Родительская деталь с ID {parent_part_id} не найдена.")
+    _check_not_archived(form.part_id.data)
     
     # Сначала создаем саму деталь
     new_part = Part(
@@ -314,7 +321,7 @@ def create_child_part(form, parent_part_id, user):
     db.session.add(component_link)
 
     log_details = f"В состав '{parent_part.name}' добавлен узел '{new_part.name}' ({form.quantity_total.data} шт.)."
-    db.session.add(AuditLog(part_id=parent_part_id, user_id=user.id, action="Обновление состава", details=log_details, category='part'))
+    audit_service.record("Обновление состава", log_details, user_id=user.id, part_id=parent_part_id, category='part')
     
     db.session.commit()
     
@@ -322,8 +329,9 @@ def create_child_part(form, parent_part_id, user):
 
 
 def log_qr_generation(part_id, user):
-    log_entry = AuditLog(part_id=part_id, user_id=user.id, action="Генерация QR", details=f"Создан QR-код для детали '{part_id}'.", category='part')
-    db.session.add(log_entry)
+    # Обычно запись уходит в фоновую очередь после коммита: транзакция запроса ничего не пишет
+    audit_service.record("Генерация QR", f"Создан QR-код для детали '{part_id}'.",
+                         user_id=user.id, part_id=part_id, category='part')
     db.session.commit()
 
 
@@ -336,10 +344,21 @@ def cancel_stage_by_history_id(history_id, user):
     history_entry = db.get_or_404(StatusHistory, history_id)
     part = history_entry.part
     stage_name = history_entry.status
+    cancelled_timestamp = history_entry.timestamp
     log_details = f"Отменен этап: '{stage_name}' ({history_entry.quantity} шт.)."
-    db.session.add(AuditLog(part_id=part.part_id, user_id=user.id, action="Отмена этапа", details=log_details, category='part'))
+    audit_service.record("Отмена этапа", log_details, user_id=user.id, part_id=part.part_id, category='part',
+                         durability=audit_service.SYNC)
     db.session.delete(history_entry)
     db.session.flush()
+    # Следующая запись истории теперь отсчитывает длительность от другой точки
+    next_entry = StatusHistory.query.filter(
+        StatusHistory.part_id == part.part_id,
+        StatusHistory.timestamp > cancelled_timestamp
+    ).order_by(StatusHistory.timestamp.asc()).first()
+    if next_entry:
+        next_entry.duration_seconds = calculate_stage_duration(
+            db.session.connection(), part.part_id, next_entry.timestamp
+        )
     if part.route_template:
         ordered_stages = sorted(part.route_template.stages, key=lambda s: s.order)
         stage_names = [rs.stage.name for rs in ordered_stages]
@@ -363,16 +382,50 @@ def cancel_stage_by_history_id(history_id, user):
 
 
 def delete_multiple_parts(part_ids, user, config):
-    parts_to_delete = Part.query.filter(Part.part_id.in_(part_ids)).all()
+    """
+    Удаляет детали множеством: для каждой пачки из BULK_DELETE_CHUNK деталей
+    выполняется постоянное число запросов независимо от объема их истории.
+
+    Зависимые записи удаляются массовыми DELETE ... WHERE part_id IN (...)
+    в порядке зависимостей, записи журнала вставляются одним пакетным INSERT.
+    Ссылки на чертежи освобождаются одним UPDATE, а файлы старого формата
+    удаляются в фоне после коммита.
+    """
+    part_ids = list(dict.fromkeys(part_ids))
+    user_id, username = user.id, user.username
     deleted_count = 0
-    for part in parts_to_delete:
-        if part.drawing_filename:
-            file_path = os.path.join(config['DRAWING_UPLOAD_FOLDER'], part.drawing_filename)
-            if os.path.exists(file_path): os.remove(file_path)
-        db.session.add(AuditLog(part_id=part.part_id, user_id=user.id, action="Массовое удаление", details=f"Деталь '{part.part_id}' удалена.", category='part'))
-        db.session.delete(part)
-        deleted_count += 1
+    legacy_drawings = []
+    for start in range(0, len(part_ids), BULK_DELETE_CHUNK):
+        rows = db.session.execute(
+            db.select(Part.part_id, Part.drawing_filename)
+            .where(Part.part_id.in_(part_ids[start:start + BULK_DELETE_CHUNK]))
+        ).all()
+        if not rows:
+            continue
+        ids = [row.part_id for row in rows]
+
+        # Массовый DELETE обходит события ORM, поэтому дни истории для кэша отчетов отмечаются явно
+        history_days = db.session.execute(
+            db.select(func.date(StatusHistory.timestamp)).where(StatusHistory.part_id.in_(ids)).distinct()
+        ).scalars().all()
+        report_cache.remember_history_days(db.session, history_days)
+        analytics_service.record_history_changes(db.session, part_ids=ids)
+
+        db.session.execute(delete(StatusHistory).where(StatusHistory.part_id.in_(ids)))
+        db.session.execute(delete(PartNote).where(PartNote.part_id.in_(ids)))
+        db.session.execute(delete(ResponsibleHistory).where(ResponsibleHistory.part_id.in_(ids)))
+        db.session.execute(delete(AssemblyComponent).where(
+            or_(AssemblyComponent.parent_id.in_(ids), AssemblyComponent.child_id.in_(ids))))
+        db.session.execute(delete(Part).where(Part.part_id.in_(ids)))
+        db.session.execute(insert(AuditLog), [
+            {'part_id': part_id, 'user_id': user_id, 'action': "Массовое удаление",
+             'details': f"Деталь '{part_id}' удалена.", 'category': 'part'}
+            for part_id in ids
+        ])
+        legacy_drawings += drawing_service.release_drawings([row.drawing_filename for row in rows], config)
+        deleted_count += len(ids)
     db.session.commit()
+    drawing_service.schedule_removal(legacy_drawings, config)
     if deleted_count > 0:
-        _send_websocket_notification('bulk_delete', f"Пользователь {user.username} удалил {deleted_count} деталей.")
-    return deleted_count
\ No newline at end of file
+        _send_websocket_notification('bulk_delete', f"Пользователь {username} удалил {deleted_count} деталей.")
+    return deleted_count
@@ -0,0 +1,302 @@
+# app/services/partition_service.py
+
+import gzip
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timezone
+
+from flask import current_app
+from sqlalchemy import text
+
+from app import db
+from app.services import analytics_service, metrics
+
+# Таблицы, секционированные по месяцам (миграция 5e8c4a7b2d90, только PostgreSQL)
+PARTITIONED_TABLES = ('AuditLogs', 'StatusHistory')
+# Ключ advisory-блокировки: разделы не создаются и не архивируются двумя процессами сразу
+ADVISORY_LOCK_KEY = 7042
+_BOUND_RE = re.compile(r"FOR VALUES FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def add_months(month: date, months: int) -> date:
+    """Первое число месяца, отстоящего от `month` на `months` месяцев."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    """Имя раздела таблицы за месяц: `<таблица>_pГГГГ_ММ`."""
+    return f"{table}_p{month:%Y_%m}"
+
+
+def parse_bound(expression: str):
+    """
+    Границы раздела из pg_get_expr(relpartbound): (начало, конец) как даты.
+    Для раздела по умолчанию (DEFAULT) возвращает None.
+    """
+    match = _BOUND_RE.search(expression or '')
+    if not match:
+        return None
+    return tuple(datetime.fromisoformat(value).date() for value in match.groups())
+
+
+def current_month() -> date:
+    return datetime.now(timezone.utc).date().replace(day=1)
+
+
+def is_supported() -> bool:
+    """Секционирование есть только в PostgreSQL."""
+    return db.session.get_bind().dialect.name == 'postgresql'
+
+
+def is_partitioned(table: str) -> bool:
+    return db.session.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table"
+    ), {'table': table}).first() is not None
+
+
+def list_partitions(table: str) -> list:
+    """
+    Разделы таблицы по месяцам, от старых к новым.
+
+    :return: Список кортежей (имя раздела, начало, конец); раздел по умолчанию не входит.
+    """
+    rows = db.session.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+        "FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table"
+    ), {'table': table}).all()
+    partitions = []
+    for name, expression in rows:
+        bound = parse_bound(expression)
+        if bound:
+            partitions.append((name, *bound))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def _lock():
+    db.session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': ADVISORY_LOCK_KEY})
+
+
+def create_month_partition(table: str, month: date) -> str:
+    """
+    Создает раздел таблицы за месяц.
+
+    Строки этого месяца, успевшие попасть в раздел по умолчанию, переносятся
+    в новый раздел: иначе PostgreSQL не даст его подключить.
+    """
+    name = partition_name(table, month)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    db.session.execute(text(
+        f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    ))
+    default = f"{table}_default"
+    moved = db.session.execute(text(
+        f'WITH moved AS (DELETE FROM "{default}" '
+        f'WHERE "timestamp" >= :start AND "timestamp" < :end RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved'
+    ), {'start': start, 'end': end}).rowcount
+    db.session.execute(text(
+        f"ALTER TABLE \"{table}\" ATTACH PARTITION \"{name}\" FOR VALUES FROM ('{start}') TO ('{end}')"
+    ))
+    if moved:
+        current_app.logger.info(f"В раздел {name} перенесено строк из {default}: {moved}")
+    return name
+
+
+def _create_missing(months) -> list:
+    """Создает разделы всех секционированных таблиц за месяцы `months`, которых еще нет."""
+    created = []
+    try:
+        _lock()
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(table):
+                continue
+            existing = {partition[1] for partition in list_partitions(table)}
+            for month in months:
+                if month not in existing:
+                    created.append(create_month_partition(table, month))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return created
+
+
+@metrics.track_job('partition_create')
+def ensure_future_partitions(months_ahead: int = None) -> list:
+    """
+    Создает недостающие разделы с текущего месяца на `months_ahead` месяцев вперед
+    (по умолчанию PARTITION_MONTHS_AHEAD). Вне PostgreSQL ничего не делает.
+
+    :return: Имена созданных разделов.
+    """
+    if not is_supported():
+        return []
+    if months_ahead is None:
+        months_ahead = current_app.config.get('PARTITION_MONTHS_AHEAD', 3)
+    first = current_month()
+    return _create_missing([add_months(first, offset) for offset in range(months_ahead + 1)])
+
+
+def ensure_partitions_between(start: date, end: date) -> list:
+    """
+    Создает недостающие разделы за месяцы с `start` по `end` включительно, например
+    перед массовой загрузкой исторических данных. Вне PostgreSQL ничего не делает.
+
+    :return: Имена созданных разделов.
+    """
+    if not is_supported():
+        return []
+    months, month = [], start.replace(day=1)
+    while month <= end:
+        months.append(month)
+        month = add_months(month, 1)
+    return _create_missing(months)
+
+
+def _copy_to_gzip(name: str, path: str):
+    """Выгружает таблицу в CSV, сжатый gzip (COPY через psycopg2); файл пишется атомарно."""
+    tmp_path = path + '.tmp'
+    cursor = db.session.connection().connection.cursor()
+    try:
+        with gzip.open(tmp_path, 'wb') as f:
+            cursor.copy_expert(f'COPY "{name}" TO STDOUT WITH (FORMAT csv, HEADER true)', f)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        cursor.close()
+    os.replace(tmp_path, path)
+
+
+@metrics.track_job('partition_archive')
+def archive_partitions(table: str, keep_months: int, output_dir: str) -> list:
+    """
+    Архивирует разделы старше `keep_months` месяцев: раздел отключается
+    от таблицы (DETACH), выгружается в `<output_dir>/<раздел>.csv.gz` и удаляется.
+    Вне PostgreSQL ничего не делает.
+
+    :return: Пути созданных архивов.
+    """
+    if table not in PARTITIONED_TABLES:
+        raise ValueError(f"Таблица {table} не секционирована")
+    if keep_months < 1:
+        raise ValueError("Нужно хранить хотя бы текущий месяц")
+    if not is_supported():
+        return []
+    os.makedirs(output_dir, exist_ok=True)
+    cutoff = add_months(current_month(), -(keep_months - 1))
+    archived = []
+    try:
+        _lock()
+        partitions = list_partitions(table) if is_partitioned(table) else []
+        for name, start, end in partitions:
+            if end > cutoff:
+                break
+            db.session.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"'))
+            if table == 'StatusHistory':
+                analytics_service.record_history_changes(
+                    db.session, period=(datetime.combine(start, datetime.min.time()),
+                                        datetime.combine(end, datetime.min.time())))
+            path = os.path.join(output_dir, f"{name}.csv.gz")
+            _copy_to_gzip(name, path)
+            db.session.execute(text(f'DROP TABLE "{name}"'))
+            # Каждый раздел фиксируется отдельно: архив уже на диске
+            db.session.commit()
+            archived.append(path)
+            _lock()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return archived
+
+
+class PartitionMaintainer:
+    """
+    Фоновое обслуживание разделов: раз в `interval` секунд создает разделы
+    на будущие месяцы. Старые разделы архивируются и удаляются по
+    PARTITION_RETENTION_MONTHS, только если включен PARTITION_AUTO_ARCHIVE.
+    """
+
+    def __init__(self, app, interval: int):
+        self.app = app
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.created = 0
+        self.archived = 0
+        self.failures = 0
+        self.last_run = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='partition-maintenance', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        # Первый проход сразу: после простоя раздела текущего месяца может не быть
+        self.run_once()
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def run_once(self):
+        with self.app.app_context():
+            config = self.app.config
+            try:
+                created = ensure_future_partitions()
+                archived = []
+                if config.get('PARTITION_AUTO_ARCHIVE', False):
+                    output_dir = config.get('PARTITION_ARCHIVE_DIR') or \
+                        os.path.join(self.app.instance_path, 'archive')
+                    for table, keep_months in config.get('PARTITION_RETENTION_MONTHS', {}).items():
+                        archived += archive_partitions(table, keep_months, output_dir)
+            except Exception as e:
+                self.failures += 1
+                current_app.logger.warning(f"Обслуживание разделов не удалось: {e}")
+                return
+            finally:
+                self.runs += 1
+                self.last_run = time.time()
+            self.created += len(created)
+            self.archived += len(archived)
+            if created or archived:
+                current_app.logger.info(f"Разделы: создано {len(created)}, архивировано {len(archived)}")
+
+    def stats(self) -> dict:
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'created': self.created,
+            'archived': self.archived,
+            'failures': self.failures,
+            'last_run': self.last_run,
+        }
+
+
+maintainer = None
+
+
+def start_maintainer(app):
+    """
+    Запускает фоновое обслуживание разделов, если PARTITION_MAINTENANCE_INTERVAL
+    больше нуля и база - PostgreSQL.
+    """
+    global maintainer
+    interval = app.config.get('PARTITION_MAINTENANCE_INTERVAL', 0)
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+    if interval and uri.startswith('postgresql') and maintainer is None:
+        maintainer = PartitionMaintainer(app, interval)
+        maintainer.start()
+    return maintainer
@@ -0,0 +1,150 @@
+# app/services/profiler.py
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+PROFILES_DIRNAME = 'profiles'
+PROFILE_SUFFIX = '.folded'
+# Верхняя граница длительности одного профилирования (секунды)
+MAX_DURATION = 300
+
+
+def _os_primitives():
+    """
+    Настоящие (не green) поток и sleep. Под eventlet все green-потоки работают
+    в одном потоке ОС, поэтому профилировщик в отдельном потоке ОС видит в его
+    стеке ровно тот green-поток, который сейчас занимает процессор.
+    """
+    try:
+        from eventlet import patcher
+    except ImportError:  # pragma: no cover - eventlet есть в зависимостях
+        return threading, time
+    if patcher.is_monkey_patched('thread'):
+        return patcher.original('threading'), patcher.original('time')
+    return threading, time
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame) -> str:
+    """Стек кадра в свернутом виде `внешний;...;внутренний` (формат flamegraph.pl/speedscope)."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    """
+    Выборочный профилировщик: каждые `interval` секунд снимает стеки всех потоков
+    процесса (sys._current_frames) и считает одинаковые стеки. Результат
+    записывается в свернутом формате: строка `стек число_выборок`, который
+    открывают flamegraph.pl, speedscope и другие просмотрщики flame graph.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+
+    def sample(self, exclude_thread_id: int = None):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == exclude_thread_id:
+                continue
+            self.stacks[collapse_stack(frame)] += 1
+        self.samples += 1
+
+    def run(self, duration: float, sleep=time.sleep, clock=time.monotonic, get_ident=threading.get_ident):
+        """
+        Снимает выборки `duration` секунд в текущем потоке. `get_ident` должен
+        возвращать идентификатор потока ОС (под eventlet - из исходного threading),
+        иначе профилировщик попадет в собственные выборки.
+        """
+        own_id = get_ident()
+        deadline = clock() + duration
+        while clock() < deadline:
+            self.sample(exclude_thread_id=own_id)
+            sleep(self.interval)
+
+    def dump(self, path: str):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        os.replace(tmp_path, path)
+
+
+_lock = threading.Lock()
+_running = None
+
+
+def profiles_dir(app) -> str:
+    return os.path.join(app.instance_path, PROFILES_DIRNAME)
+
+
+def is_running() -> bool:
+    return _running is not None
+
+
+def _run(app, profiler: SamplingProfiler, duration: float, path: str, sleep, get_ident):
+    global _running
+    try:
+        profiler.run(duration, sleep=sleep, get_ident=get_ident)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        profiler.dump(path)
+        app.logger.info(f"Профиль записан: {path} ({profiler.samples} выборок)")
+    except Exception as e:
+        app.logger.error(f"Профилирование не удалось: {e}", exc_info=True)
+    finally:
+        with _lock:
+            _running = None
+
+
+def start(app, duration: float, interval: float = None, wait: bool = False) -> str:
+    """
+    Запускает профилирование процесса на `duration` секунд в отдельном потоке ОС.
+    Одновременно идет только одно профилирование.
+
+    :param wait: Дождаться окончания (используется в тестах).
+    :return: Путь к будущему файлу профиля в instance/profiles.
+    :raises RuntimeError: Профилирование уже идет.
+    """
+    global _running
+    duration = max(0.1, min(float(duration), MAX_DURATION))
+    interval = interval or app.config.get('PROFILER_INTERVAL', 0.01)
+    os_threading, os_time = _os_primitives()
+    name = f"profile-{datetime.now():%Y%m%d-%H%M%S}{PROFILE_SUFFIX}"
+    path = os.path.join(profiles_dir(app), name)
+    with _lock:
+        if _running is not None:
+            raise RuntimeError("Профилирование уже выполняется")
+        profiler = SamplingProfiler(interval)
+        _running = os_threading.Thread(target=_run,
+                                       args=(app, profiler, duration, path, os_time.sleep, os_threading.get_ident),
+                                       name='sampling-profiler', daemon=True)
+        thread = _running
+    thread.start()
+    if wait:
+        thread.join()
+    return path
+
+
+def list_profiles(app) -> list:
+    """Записанные профили, новые первыми: список (имя файла, размер, время изменения)."""
+    directory = profiles_dir(app)
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if name.endswith(PROFILE_SUFFIX):
+            stat = os.stat(os.path.join(directory, name))
+            profiles.append((name, stat.st_size, datetime.fromtimestamp(stat.st_mtime)))
+    return sorted(profiles, key=lambda profile: profile[2], reverse=True)
@@ -1,7 +1,11 @@
 # app/services/query_service.py (ФИНАЛЬНАЯ ПОЛНАЯ ВЕРСИЯ С ЯВНЫМИ ИМЕНАМИ КОЛОНОК)
 
-from sqlalchemy import union_all, literal_column, cast, String
-from app.models.models import db, Part, StatusHistory, AuditLog, PartNote, User, Stage, ResponsibleHistory
+from collections import defaultdict
+
+from sqlalchemy import union_all, literal_column, cast, String, func
+from sqlalchemy.orm import joinedload
+from app.models.models import (db, Part, StatusHistory, AuditLog, PartNote, User, Stage, ResponsibleHistory,
+                               AssemblyComponent, StatusType)
 
 def get_combined_history(part):
     """
@@ -96,4 +100,47 @@ def get_combined_history(part):
         
         history_list.append(entry)
         
-    return history_list
\ No newline at end of file
+    return history_list
+
+
+def get_completed_quantities(part_ids):
+    """
+    Выполненное количество по этапам для набора деталей одним агрегирующим
+    запросом вместо загрузки `part.history` каждой детали.
+
+    :return: {part_id: {название этапа: количество}}.
+    """
+    quantities = defaultdict(dict)
+    if not part_ids:
+        return quantities
+    rows = db.session.query(
+        StatusHistory.part_id, StatusHistory.status, func.sum(StatusHistory.quantity)
+    ).filter(
+        StatusHistory.part_id.in_(part_ids),
+        StatusHistory.status_type == StatusType.COMPLETED
+    ).group_by(StatusHistory.part_id, StatusHistory.status)
+    for part_id, status, quantity in rows:
+        quantities[part_id][status] = quantity or 0
+    return quantities
+
+
+def get_component_tree(part):
+    """
+    Состав изделия на всю глубину: по одному запросу на уровень дерева
+    вместо запросов на каждый узел.
+
+    :return: {part_id сборки: [AssemblyComponent с загруженной child, по child_id]}.
+    """
+    tree = {}
+    level = [part.part_id]
+    while level:
+        links = db.session.query(AssemblyComponent).options(joinedload(AssemblyComponent.child)).filter(
+            AssemblyComponent.parent_id.in_(level)
+        ).order_by(AssemblyComponent.child_id).all()
+        for parent_id in level:
+            tree[parent_id] = []
+        for link in links:
+            tree[link.parent_id].append(link)
+        # Узел, уже встреченный выше, не разворачивается повторно (защита от циклов)
+        level = list(dict.fromkeys(link.child_id for link in links if link.child_id not in tree))
+    return tree
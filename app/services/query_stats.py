@@ -0,0 +1,207 @@
+# app/services/query_stats.py
+
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ContextDecorator
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from app import db
+
+# Сколько самых частых форм запросов показывать в отчете
+REPORT_TOP_SHAPES = 5
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+# Списки параметров IN разной длины (в т.ч. развернутые [POSTCOMPILE]) сводятся к одной форме
+_IN_LIST_RE = re.compile(r"\bIN \((?:\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*,?)+\)", re.IGNORECASE)
+_PARAM_RE = re.compile(r"%\(\w+\)s|%s|:\w+")
+_SPACE_RE = re.compile(r"\s+")
+
+_local = threading.local()
+_listening_engines = set()
+_listen_lock = threading.Lock()
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    Форма запроса: SQL без литералов и значений параметров. Запросы,
+    отличающиеся только значениями (типичный N+1), дают одинаковую форму.
+    """
+    shape = _STRING_RE.sub('?', statement)
+    shape = _PARAM_RE.sub('?', shape)
+    shape = _NUMBER_RE.sub('?', shape)
+    shape = _IN_LIST_RE.sub('IN (...)', shape)
+    return _SPACE_RE.sub(' ', shape).strip()
+
+
+class QueryStats:
+    """Счетчики SQL-запросов: число, суммарное время и повторы одинаковых форм."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes = Counter()
+
+    def add(self, statement: str, duration: float):
+        self.count += 1
+        self.total_time += duration
+        self.shapes[normalize_statement(statement)] += 1
+
+    @property
+    def max_repeats(self) -> int:
+        """Сколько раз выполнена самая частая форма запроса."""
+        return max(self.shapes.values(), default=0)
+
+    def repeated(self, threshold: int) -> list:
+        """Формы, выполненные не меньше `threshold` раз: список (форма, число), частые первыми."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    def report(self) -> str:
+        lines = [f"{self.count} запросов, {self.total_time * 1000:.1f} мс"]
+        for shape, n in self.shapes.most_common(REPORT_TOP_SHAPES):
+            lines.append(f"  {n} x {shape}")
+        return '\n'.join(lines)
+
+
+def _active() -> list:
+    if not hasattr(_local, 'collectors'):
+        _local.collectors = []
+    return _local.collectors
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active():
+        conn.info.setdefault('query_stats_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    collectors = _active()
+    starts = conn.info.get('query_stats_start')
+    if not collectors or not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    for stats in collectors:
+        stats.add(statement, duration)
+
+
+def listen(engine):
+    """Подключает счетчики к движку (один раз; без активных счетчиков почти без накладных расходов)."""
+    with _listen_lock:
+        if id(engine) in _listening_engines:
+            return
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        _listening_engines.add(id(engine))
+
+
+class collect(ContextDecorator):
+    """
+    Считает запросы, выполненные в текущем потоке (green-потоке под eventlet)
+    внутри блока `with collect() as stats:`.
+    """
+
+    def __enter__(self) -> QueryStats:
+        listen(db.engine)
+        self.stats = QueryStats()
+        _active().append(self.stats)
+        return self.stats
+
+    def __exit__(self, *exc):
+        _active().remove(self.stats)
+        return False
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Блок выполнил больше запросов или повторов одной формы, чем разрешено."""
+
+
+def check_budget(stats: QueryStats, max_queries: int = None, max_repeats: int = None):
+    """Проверяет счетчики на бюджет; при превышении бросает QueryBudgetExceeded с отчетом."""
+    problems = []
+    if max_queries is not None and stats.count > max_queries:
+        problems.append(f"запросов {stats.count} при бюджете {max_queries}")
+    if max_repeats is not None and stats.max_repeats > max_repeats:
+        problems.append(f"одна форма запроса повторена {stats.max_repeats} раз при допустимых {max_repeats} (N+1?)")
+    if problems:
+        raise QueryBudgetExceeded('; '.join(problems) + '\n' + stats.report())
+
+
+class query_budget(collect):
+    """
+    Бюджет запросов для блока или функции: при превышении бросает
+    QueryBudgetExceeded (подкласс AssertionError, поэтому в pytest это падение теста).
+
+        with query_budget(max_queries=5, max_repeats=1):
+            client.get('/api/parts/...')
+
+        @query_budget(max_queries=10)
+        def test_dashboard(...): ...
+    """
+
+    def __init__(self, max_queries: int = None, max_repeats: int = None):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+
+    def __exit__(self, exc_type, *exc):
+        super().__exit__(exc_type, *exc)
+        if exc_type is None:
+            check_budget(self.stats, self.max_queries, self.max_repeats)
+        return False
+
+
+def current_stats():
+    """Счетчики текущего запроса или None, если учет выключен."""
+    return g.get('query_stats') if has_request_context() else None
+
+
+def _start_request():
+    g.query_stats_collector = collect()
+    g.query_stats = g.query_stats_collector.__enter__()
+
+
+def _finish_request(response):
+    collector = g.pop('query_stats_collector', None)
+    if collector is None:
+        return response
+    collector.__exit__(None, None, None)
+    stats = g.query_stats
+    config = current_app.config
+    response.headers['X-Query-Count'] = str(stats.count)
+    response.headers['X-Query-Time-Ms'] = f"{stats.total_time * 1000:.1f}"
+    response.headers['X-Query-Max-Repeats'] = str(stats.max_repeats)
+    # Server-Timing показывается во вкладке Network инструментов разработчика браузера
+    response.headers.add('Server-Timing', f'db;dur={stats.total_time * 1000:.1f};desc="{stats.count} queries"')
+    budget = config.get('QUERY_BUDGET')
+    threshold = config.get('QUERY_REPEAT_THRESHOLD')
+    if (budget and stats.count > budget) or (threshold and stats.max_repeats >= threshold):
+        current_app.logger.warning(f"Много SQL-запросов на {g.get('query_stats_endpoint')}: {stats.report()}")
+    return response
+
+
+def _teardown_request(exc):
+    # Если after_request не вызывался (ошибка), счетчик все равно снимается
+    collector = g.pop('query_stats_collector', None)
+    if collector is not None:
+        collector.__exit__(None, None, None)
+
+
+def init_app(app):
+    """
+    Включает учет запросов на каждый HTTP-запрос при QUERY_STATS_ENABLED:
+    счетчики отдаются в заголовках X-Query-* и Server-Timing, превышение
+    QUERY_BUDGET или QUERY_REPEAT_THRESHOLD пишется в лог с самыми частыми формами.
+    """
+    if not app.config.get('QUERY_STATS_ENABLED'):
+        return
+
+    @app.before_request
+    def _query_stats_before():
+        g.query_stats_endpoint = request.endpoint
+        _start_request()
+
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,134 @@
+# app/services/reference_cache.py
+
+import threading
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import db
+from app.models.models import Role, RouteTemplate, Stage, User
+from app.services import cache_versions
+
+VERSION_NAME = 'reference'
+# Справочники: модель, кэшируемые поля (первое - первичный ключ) и порядок строк
+_DATASETS = {
+    'stages': (Stage, ('id', 'name'), Stage.name),
+    'route_templates': (RouteTemplate, ('id', 'name', 'is_default'), RouteTemplate.name),
+    'roles': (Role, ('id', 'name', 'default', 'permissions'), Role.name),
+    'users': (User, ('id', 'username', 'role_id'), User.username),
+}
+
+
+def attach(model, values: dict):
+    """
+    Экземпляр модели с известными значениями полей в текущей сессии без SELECT.
+    Если объект уже загружен в сессию, возвращается он, его поля не меняются.
+    Незагруженные поля догружаются из БД при обращении.
+    """
+    existing = db.session.identity_map.get(Session.identity_key(model, values['id']))
+    if existing is not None:
+        return existing
+    instance = model.__mapper__.class_manager.new_instance()
+    for key, value in values.items():
+        set_committed_value(instance, key, value)
+    make_transient_to_detached(instance)
+    db.session.add(instance)
+    return instance
+
+
+class ReferenceCache:
+    """
+    Строки справочников (этапы, маршруты, роли, пользователи) в памяти процесса.
+
+    Строки хранятся как словари полей и действуют, пока не изменилась версия
+    VERSION_NAME в CacheVersions. Код, меняющий справочники, вызывает
+    invalidate() в той же транзакции.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._rows = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def rows(self, name: str) -> tuple:
+        version = cache_versions.current(VERSION_NAME)
+        with self._lock:
+            if version != self._version:
+                self._rows, self._version = {}, version
+            rows = self._rows.get(name)
+        if rows is not None:
+            self.hits += 1
+            return rows
+        self.misses += 1
+        model, fields, order = _DATASETS[name]
+        result = db.session.execute(select(*[getattr(model, field) for field in fields]).order_by(order))
+        rows = tuple(dict(zip(fields, row)) for row in result)
+        with self._lock:
+            if self._version == version:
+                self._rows[name] = rows
+        return rows
+
+    def clear(self):
+        with self._lock:
+            self._rows, self._version = {}, None
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+cache = ReferenceCache()
+
+
+def rows(name: str) -> tuple:
+    """Строки справочника `name` как словари полей (изменять их нельзя)."""
+    return cache.rows(name)
+
+
+def instances(name: str) -> list:
+    """Объекты справочника `name` в текущей сессии, без запроса при попадании в кэш."""
+    model = _DATASETS[name][0]
+    return [attach(model, values) for values in cache.rows(name)]
+
+
+def stages() -> list:
+    return instances('stages')
+
+
+def route_templates() -> list:
+    return instances('route_templates')
+
+
+def roles() -> list:
+    return instances('roles')
+
+
+def users() -> list:
+    return instances('users')
+
+
+def find_stage(name: str):
+    """Этап по названию без учета регистра или None."""
+    name = name.lower()
+    for values in cache.rows('stages'):
+        if values['name'].lower() == name:
+            return attach(Stage, values)
+    return None
+
+
+def find_route_template(name: str = None, is_default: bool = None):
+    """Маршрут по названию или маршрут по умолчанию (is_default=True) или None."""
+    for values in cache.rows('route_templates'):
+        if (name is None or values['name'] == name) and (is_default is None or values['is_default'] == is_default):
+            return attach(RouteTemplate, values)
+    return None
+
+
+def invalidate(session=None):
+    """
+    Сбрасывает кэш справочников во всех процессах после коммита текущей
+    транзакции (при откате версия не меняется).
+    """
+    cache_versions.bump(VERSION_NAME, session=session)
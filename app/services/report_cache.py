@@ -0,0 +1,183 @@
+# app/services/report_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from app.models.models import StatusHistory
+
+_SESSION_INFO_KEY = 'report_cache_dates'
+
+
+def _to_day(value):
+    """Приводит datetime/date к дню (UTC), по которому группируются ключи кэша."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.date()
+    return value
+
+
+def _today():
+    return datetime.now(timezone.utc).date()
+
+
+class ReportCache:
+    """
+    Потокобезопасный кэш результатов отчетов в памяти процесса.
+
+    Ключ строится из имени отчета и нормализованных фильтров: границы периода
+    округляются до дня, остальные фильтры сортируются по имени.
+    Отчеты за закрытый период (последний день раньше сегодняшнего) хранятся
+    бессрочно и сбрасываются только при изменении истории за этот период.
+    Отчеты, затрагивающие текущий день, живут не дольше TTL.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(report_name: str, date_from=None, date_to=None, **filters) -> tuple:
+        """Формирует нормализованный ключ кэша."""
+        day_from, day_to = _to_day(date_from), _to_day(date_to)
+        normalized_filters = tuple(sorted((k, str(v)) for k, v in filters.items() if v not in (None, '')))
+        return (
+            report_name,
+            day_from.isoformat() if day_from else '',
+            day_to.isoformat() if day_to else '',
+            normalized_filters
+        )
+
+    def get_or_compute(self, report_name: str, compute, date_from=None, date_to=None, ttl: int = 60, **filters):
+        """
+        Возвращает закэшированный результат отчета или вычисляет его через `compute()`.
+        """
+        key = self.make_key(report_name, date_from, date_to, **filters)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry['expires_at'] is None or entry['expires_at'] > now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry['value']
+            self.misses += 1
+
+        value = compute()
+
+        day_from, day_to = _to_day(date_from), _to_day(date_to)
+        is_closed_period = day_to is not None and day_to < _today()
+        with self._lock:
+            self._entries[key] = {
+                'value': value,
+                'expires_at': None if is_closed_period else now + ttl,
+                'date_from': day_from,
+                'date_to': day_to
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate_days(self, days) -> int:
+        """Удаляет записи, чей период включает хотя бы один из указанных дней."""
+        days = {day for day in days if day is not None}
+        if not days:
+            return 0
+        with self._lock:
+            stale_keys = [
+                key for key, entry in self._entries.items()
+                if any((entry['date_from'] is None or entry['date_from'] <= day) and
+                       (entry['date_to'] is None or day <= entry['date_to']) for day in days)
+            ]
+            for key in stale_keys:
+                del self._entries[key]
+            self.invalidations += len(stale_keys)
+        return len(stale_keys)
+
+    def clear(self):
+        """Полностью очищает кэш (например, после массовых операций в обход ORM)."""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Возвращает метрики кэша, включая долю попаданий."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0
+            }
+
+
+report_cache = ReportCache()
+
+
+def cached_report(report_name: str, compute, date_from=None, date_to=None, **filters):
+    """
+    Обертка для эндпоинтов отчетов: учитывает настройки `REPORT_CACHE_ENABLED`
+    и `REPORT_CACHE_TTL` текущего приложения.
+    """
+    if not current_app.config.get('REPORT_CACHE_ENABLED', True):
+        return compute()
+    ttl = current_app.config.get('REPORT_CACHE_TTL', 60)
+    return report_cache.get_or_compute(report_name, compute, date_from, date_to, ttl=ttl, **filters)
+
+
+# --- Инвалидация при изменении истории ---
+# Дни измененных записей копятся в session.info и применяются только после
+# успешного коммита. Записи за текущий день не сбрасывают кэш: для них действует TTL.
+
+def _remember_history_change(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        return
+    days = session.info.setdefault(_SESSION_INFO_KEY, set())
+    days.add(_to_day(target.timestamp))
+    for old_timestamp in inspect(target).attrs.timestamp.history.deleted:
+        days.add(_to_day(old_timestamp))
+
+
+def remember_history_days(session, days):
+    """
+    Отмечает дни истории, измененные в обход ORM (массовые DELETE/UPDATE),
+    чтобы кэш за эти дни сбросился после коммита. Дни принимаются как
+    date/datetime или строки ISO (так SQLite возвращает func.date()).
+    """
+    pending = session.info.setdefault(_SESSION_INFO_KEY, set())
+    for day in days:
+        if isinstance(day, str):
+            day = datetime.fromisoformat(day)
+        pending.add(_to_day(day))
+
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(StatusHistory, _event_name, _remember_history_change)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    days = session.info.pop(_SESSION_INFO_KEY, None)
+    if days:
+        today = _today()
+        report_cache.invalidate_days(day for day in days if day is not None and day < today)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_after_rollback(session, previous_transaction):
+    session.info.pop(_SESSION_INFO_KEY, None)
@@ -0,0 +1,171 @@
+# app/services/report_service.py
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from app.models.models import db, StatusHistory, Part, StatusType
+
+# Сколько последних завершенных деталей показывает отчет о времени выполнения заказа
+ORDER_COMPLETION_LIMIT = 30
+
+
+def parse_report_date(value: str):
+    """
+    Преобразует строку вида 'YYYY-MM-DD' из параметров запроса в datetime.
+    Пустое значение означает отсутствие ограничения.
+
+    :raises ValueError: Строка не в формате 'YYYY-MM-DD'.
+    """
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def _history_filters(date_from=None, date_to=None, product=None):
+    """
+    Общие условия отчетов по истории: период по `timestamp` (конец периода
+    включительно) и изделие. Изделие фильтруется через подзапрос по `Parts`,
+    чтобы основной запрос по истории оставался диапазонным сканированием индекса.
+    """
+    filters = []
+    if date_from:
+        filters.append(StatusHistory.timestamp >= date_from)
+    if date_to:
+        filters.append(StatusHistory.timestamp < date_to + timedelta(days=1))
+    if product:
+        filters.append(StatusHistory.part_id.in_(
+            db.session.query(Part.part_id).filter(Part.product_designation == product)
+        ))
+    return filters
+
+
+def _seconds_between(later, earlier):
+    """SQL-выражение разницы двух меток времени в секундах для текущей СУБД."""
+    if db.engine.name == 'sqlite':
+        return (func.julianday(later) - func.julianday(earlier)) * 86400.0
+    return func.extract('epoch', later - earlier)
+
+
+def _percentile(sorted_values, fraction):
+    """
+    Перцентиль с линейной интерполяцией (аналог PostgreSQL `percentile_cont`)
+    для заранее отсортированного списка.
+    """
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def get_operator_performance(date_from=None, date_to=None, product=None):
+    """Количество записей истории по операторам за период, по убыванию."""
+    stages_completed = func.count(StatusHistory.id)
+    return db.session.query(
+        StatusHistory.operator_name,
+        stages_completed.label('stages_completed')
+    ).filter(
+        *_history_filters(date_from, date_to, product)
+    ).group_by(StatusHistory.operator_name).order_by(stages_completed.desc()).all()
+
+
+def get_stage_duration_stats(date_from=None, date_to=None, product=None):
+    """
+    Возвращает статистику длительности этапов по сохраненной колонке
+    `StatusHistory.duration_seconds`: среднее, p50 и p90 в секундах.
+
+    :param date_from: Начало периода (включительно) или None.
+    :param date_to: Последний день периода (включительно) или None.
+    :param product: Обозначение изделия или None.
+    :return: Список словарей, отсортированный по убыванию средней длительности.
+    """
+    filters = [StatusHistory.duration_seconds.isnot(None), *_history_filters(date_from, date_to, product)]
+
+    if db.engine.name == 'postgresql':
+        duration = StatusHistory.duration_seconds
+        rows = db.session.query(
+            StatusHistory.status.label('stage_name'),
+            func.avg(duration).label('avg_seconds'),
+            func.percentile_cont(0.5).within_group(duration.asc()).label('p50_seconds'),
+            func.percentile_cont(0.9).within_group(duration.asc()).label('p90_seconds')
+        ).filter(*filters).group_by(StatusHistory.status).all()
+        stats = [{
+            'stage_name': row.stage_name,
+            'avg_seconds': float(row.avg_seconds),
+            'p50_seconds': float(row.p50_seconds),
+            'p90_seconds': float(row.p90_seconds)
+        } for row in rows]
+    else:
+        # В SQLite нет percentile_cont: выбираем уже отсортированную колонку и считаем в Python
+        durations = defaultdict(list)
+        rows = db.session.query(StatusHistory.status, StatusHistory.duration_seconds).filter(
+            *filters
+        ).order_by(StatusHistory.status, StatusHistory.duration_seconds).all()
+        for status, seconds in rows:
+            durations[status].append(seconds)
+        stats = [{
+            'stage_name': status,
+            'avg_seconds': sum(values) / len(values),
+            'p50_seconds': _percentile(values, 0.5),
+            'p90_seconds': _percentile(values, 0.9)
+        } for status, values in durations.items()]
+
+    return sorted(stats, key=lambda item: item['avg_seconds'], reverse=True)
+
+
+def get_order_completion(date_from=None, date_to=None, product=None, limit=ORDER_COMPLETION_LIMIT):
+    """
+    Время выполнения (в днях) для последних завершенных деталей:
+    от создания детали до последней записи в ее истории.
+
+    Без периода сначала выбираются `limit` последних завершенных деталей,
+    и максимум времени считается только по их истории (индекс part_id, timestamp).
+    С периодом учитываются детали, последняя запись истории которых попала
+    в период: максимум считается по всей истории детали, а период проверяется
+    в HAVING. Кандидаты - детали с записями в периоде (диапазон по timestamp).
+    """
+    completed_parts = db.session.query(Part.part_id).filter(Part.quantity_completed >= Part.quantity_total)
+    if product:
+        completed_parts = completed_parts.filter(Part.product_designation == product)
+    if date_from or date_to:
+        completed_parts = completed_parts.filter(Part.part_id.in_(
+            db.session.query(StatusHistory.part_id).filter(*_history_filters(date_from, date_to))
+        ))
+    else:
+        completed_parts = completed_parts.order_by(Part.date_added.desc()).limit(limit)
+
+    completion_time = func.max(StatusHistory.timestamp)
+    period = []
+    if date_from:
+        period.append(completion_time >= date_from)
+    if date_to:
+        period.append(completion_time < date_to + timedelta(days=1))
+    last_stage_time = db.session.query(
+        StatusHistory.part_id,
+        completion_time.label('completion_time')
+    ).filter(
+        StatusHistory.part_id.in_(completed_parts.scalar_subquery())
+    ).group_by(StatusHistory.part_id).having(*period).subquery()
+
+    days_taken = _seconds_between(last_stage_time.c.completion_time, Part.date_added) / 86400.0
+    return db.session.query(
+        Part.part_id,
+        days_taken.label('days_taken')
+    ).join(
+        last_stage_time, Part.part_id == last_stage_time.c.part_id
+    ).order_by(Part.date_added.desc()).limit(limit).all()
+
+
+def get_defect_analysis(date_from=None, date_to=None, product=None):
+    """Количество забракованных штук по этапам за период, по убыванию."""
+    scrapped_qty = func.sum(StatusHistory.quantity)
+    return db.session.query(
+        StatusHistory.status,
+        scrapped_qty.label('scrapped_qty')
+    ).filter(
+        StatusHistory.status_type == StatusType.SCRAPPED,
+        *_history_filters(date_from, date_to, product)
+    ).group_by(StatusHistory.status).order_by(scrapped_qty.desc()).all()
@@ -0,0 +1,171 @@
+# app/services/sampling.py
+
+import random
+import threading
+import time
+
+import sentry_sdk
+from flask import g, request
+from sentry_sdk.integrations.flask import FlaskIntegration
+from werkzeug.exceptions import HTTPException
+
+
+class TokenBucket:
+    """Ограничитель частоты: не больше `rate` событий в секунду с запасом `burst`."""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.rate <= 0:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class SamplingPolicy:
+    """
+    Политика выборки трассировок Sentry.
+
+    Доля трассируемых запросов задается по эндпоинтам (SENTRY_TRACES_ENDPOINT_RATES,
+    для остальных - SENTRY_TRACES_SAMPLE_RATE), общее число трассировок ограничено
+    SENTRY_TRACES_MAX_PER_SECOND. Решение родительской трассировки (распределенный
+    трейс) соблюдается. Решение о трассировке принимается в начале запроса, поэтому
+    медленный (дольше SENTRY_SLOW_REQUEST_MS) или упавший запрос, не попавший
+    в выборку, отправляется отдельным событием с эндпоинтом и длительностью
+    (не чаще SENTRY_SLOW_EVENTS_PER_MINUTE в минуту).
+    """
+
+    def __init__(self, default_rate: float = 0.05, endpoint_rates: dict = None,
+                 max_per_second: float = 10, slow_threshold_ms: float = 2000,
+                 slow_events_per_minute: float = 30, url_map=None):
+        self.default_rate = default_rate
+        self.endpoint_rates = dict(endpoint_rates or {})
+        self.slow_threshold = slow_threshold_ms / 1000
+        self.url_map = url_map
+        self._traces = TokenBucket(max_per_second)
+        self._slow_events = TokenBucket(slow_events_per_minute / 60, burst=max(slow_events_per_minute / 6, 1))
+        self.sampled = 0
+        self.dropped = 0
+        self.rate_limited = 0
+        self.slow_reported = 0
+
+    @classmethod
+    def from_config(cls, config, url_map=None):
+        return cls(
+            default_rate=config.get('SENTRY_TRACES_SAMPLE_RATE', 0.05),
+            endpoint_rates=config.get('SENTRY_TRACES_ENDPOINT_RATES', {}),
+            max_per_second=config.get('SENTRY_TRACES_MAX_PER_SECOND', 10),
+            slow_threshold_ms=config.get('SENTRY_SLOW_REQUEST_MS', 2000),
+            slow_events_per_minute=config.get('SENTRY_SLOW_EVENTS_PER_MINUTE', 30),
+            url_map=url_map,
+        )
+
+    def endpoint_for(self, environ) -> str:
+        """Эндпоинт Flask по WSGI-окружению запроса (None, если адрес не сопоставлен)."""
+        if not environ or self.url_map is None:
+            return None
+        try:
+            endpoint, _ = self.url_map.bind_to_environ(environ).match()
+            return endpoint
+        except HTTPException:
+            return None
+
+    def rate_for(self, endpoint: str) -> float:
+        return self.endpoint_rates.get(endpoint, self.default_rate)
+
+    def traces_sampler(self, sampling_context: dict) -> float:
+        """Функция traces_sampler для sentry_sdk.init."""
+        parent_sampled = sampling_context.get('parent_sampled')
+        if parent_sampled is not None:
+            return 1.0 if parent_sampled else 0.0
+        rate = self.rate_for(self.endpoint_for(sampling_context.get('wsgi_environ')))
+        if rate <= 0 or random.random() >= rate:
+            self.dropped += 1
+            return 0.0
+        if not self._traces.allow():
+            self.rate_limited += 1
+            return 0.0
+        self.sampled += 1
+        return 1.0
+
+    def is_notable(self, duration: float, status_code: int) -> bool:
+        return status_code >= 500 or duration >= self.slow_threshold
+
+    def report_unsampled(self, endpoint: str, duration: float, status_code: int) -> bool:
+        """Отправляет событие о медленном или упавшем запросе вне выборки (с ограничением частоты)."""
+        if not self._slow_events.allow():
+            return False
+        with sentry_sdk.new_scope() as scope:
+            scope.set_tag('endpoint', endpoint or 'unmatched')
+            scope.set_tag('status_code', status_code)
+            scope.set_extra('duration_ms', round(duration * 1000, 1))
+            kind = 'Ошибка' if status_code >= 500 else 'Медленный запрос'
+            sentry_sdk.capture_message(f"{kind}: {endpoint} ({duration * 1000:.0f} мс, {status_code})",
+                                       level='warning')
+        self.slow_reported += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            'sampled': self.sampled,
+            'dropped': self.dropped,
+            'rate_limited': self.rate_limited,
+            'slow_reported': self.slow_reported,
+        }
+
+
+policy = None
+
+
+def _current_transaction_sampled() -> bool:
+    transaction = sentry_sdk.get_current_scope().transaction
+    return bool(transaction is not None and transaction.sampled)
+
+
+def _start_timer():
+    g.sampling_start = time.perf_counter()
+
+
+def _check_request(response):
+    start = g.pop('sampling_start', None)
+    if start is None or policy is None:
+        return response
+    duration = time.perf_counter() - start
+    if policy.is_notable(duration, response.status_code) and not _current_transaction_sampled():
+        policy.report_unsampled(request.endpoint, duration, response.status_code)
+    return response
+
+
+def init_sentry(app, dsn: str):
+    """
+    Инициализирует Sentry с политикой выборки из конфигурации. Профилируется
+    доля SENTRY_PROFILES_SAMPLE_RATE от трассируемых запросов.
+    """
+    global policy
+    if not dsn:
+        return None
+    policy = SamplingPolicy.from_config(app.config, url_map=app.url_map)
+    sentry_sdk.init(
+        dsn=dsn,
+        integrations=[FlaskIntegration()],
+        traces_sampler=policy.traces_sampler,
+        profiles_sample_rate=app.config.get('SENTRY_PROFILES_SAMPLE_RATE', 0.1),
+    )
+    app.before_request(_start_timer)
+    app.after_request(_check_request)
+    app.logger.info(
+        f"Sentry: трассировка {policy.default_rate:.0%} запросов, не больше "
+        f"{app.config.get('SENTRY_TRACES_MAX_PER_SECOND', 10)} в секунду"
+    )
+    return policy
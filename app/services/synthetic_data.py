@@ -0,0 +1,557 @@
+# app/services/synthetic_data.py
+
+import csv
+import enum
+import io
+import itertools
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, insert, or_, select
+
+from app import db
+from app.models.models import (AssemblyComponent, AuditLog, Part, PartNote, ResponsibleHistory, Role,
+                               RouteStage, RouteTemplate, Stage, StatusHistory, StatusType, User)
+from app.services import analytics_service, partition_service, reference_cache, report_cache
+
+# Префикс обозначений изделий и деталей: синтетические данные легко найти и удалить
+PREFIX = 'SYN'
+ROUTE_NAME = 'Синтетический маршрут'
+USERNAME = 'synthetic'
+STAGE_NAMES = ['Резка', 'Сверловка', 'Гибка', 'Сварка', 'Покраска', 'Сборка', 'ОТК']
+MATERIALS = ['Ст3', '09Г2С', 'АМг6', '12Х18Н10Т', 'Д16Т']
+OPERATORS = [f'Оператор {i}' for i in range(1, 31)]
+# Размер пачки строк в одном INSERT
+CHUNK_SIZE = 5000
+# Начало синтетической истории
+EPOCH = datetime(2025, 1, 1)
+# Обозначение NULL в CSV для COPY
+COPY_NULL = '\\N'
+
+
+def product_designation(index: int) -> str:
+    """Обозначение синтетического изделия: по нему бенчмарки находят данные без запросов к БД."""
+    return f"{PREFIX}-{index:04d}"
+
+
+def root_part_id(index: int) -> str:
+    """Обозначение корневой сборки синтетического изделия."""
+    return f"{product_designation(index)}-0"
+
+
+def leaf_part_ids(index: int, bom_depth: int, fanout: int) -> list:
+    """Обозначения деталей нижнего уровня изделия (те же, что создает generate)."""
+    return [root_part_id(index) + ''.join(f".{child}" for child in path)
+            for path in itertools.product(range(fanout), repeat=bom_depth)]
+
+
+def exists() -> bool:
+    return db.session.execute(
+        select(Part.part_id).where(Part.part_id.like(f'{PREFIX}-%')).limit(1)
+    ).first() is not None
+
+
+def clear():
+    """Удаляет синтетические детали со всеми зависимыми записями и входы синтетических пользователей."""
+    part_ids = select(Part.part_id).where(Part.part_id.like(f'{PREFIX}-%')).scalar_subquery()
+    report_cache.remember_history_days(db.session, db.session.execute(
+        select(func.date(StatusHistory.timestamp)).where(StatusHistory.part_id.in_(part_ids)).distinct()
+    ).scalars().all())
+    # Синтетических деталей может быть миллионы: аналитика перезагружает историю целиком
+    analytics_service.record_history_changes(db.session)
+    db.session.execute(delete(StatusHistory).where(StatusHistory.part_id.in_(part_ids)))
+    db.session.execute(delete(PartNote).where(PartNote.part_id.in_(part_ids)))
+    db.session.execute(delete(ResponsibleHistory).where(ResponsibleHistory.part_id.in_(part_ids)))
+    db.session.execute(delete(AssemblyComponent).where(
+        or_(AssemblyComponent.parent_id.in_(part_ids), AssemblyComponent.child_id.in_(part_ids))))
+    db.session.execute(delete(AuditLog).where(AuditLog.part_id.like(f'{PREFIX}-%')))
+    user_ids = select(User.id).where(User.username.like(f'{USERNAME}-%')).scalar_subquery()
+    db.session.execute(delete(AuditLog).where(AuditLog.part_id.is_(None), AuditLog.user_id.in_(user_ids)))
+    db.session.execute(delete(Part).where(Part.part_id.like(f'{PREFIX}-%')))
+    db.session.commit()
+
+
+def _ensure_reference_data():
+    """Этапы, маршрут через все этапы и пользователь для записей журнала."""
+    stages = {stage.name: stage for stage in Stage.query.filter(Stage.name.in_(STAGE_NAMES))}
+    for name in STAGE_NAMES:
+        if name not in stages:
+            stages[name] = Stage(name=name)
+            db.session.add(stages[name])
+    route = RouteTemplate.query.filter_by(name=ROUTE_NAME).first()
+    if route is None:
+        route = RouteTemplate(name=ROUTE_NAME, is_default=False)
+        db.session.add(route)
+        db.session.flush()
+        db.session.add_all([RouteStage(template_id=route.id, stage_id=stages[name].id, order=i)
+                            for i, name in enumerate(STAGE_NAMES)])
+    user = User.query.filter_by(username=USERNAME).first()
+    if user is None:
+        if Role.query.count() == 0:
+            Role.insert_roles()
+        user = User(username=USERNAME)
+        db.session.add(user)
+    reference_cache.invalidate()
+    db.session.commit()
+    return route, user
+
+
+def _part_history(rng: random.Random, part_id: str, date_added: datetime, quantity_total: int,
+                  history_per_part: int) -> tuple:
+    """
+    История детали: этапы маршрута по порядку, частями партии, с редким браком
+    и переделкой. Длительность этапа записывается сразу (Core INSERT обходит
+    событие before_insert, которое считает ее в приложении).
+
+    :return: (строки истории, выполнено по всем этапам, последний этап, время последней записи).
+    """
+    rows, completed = [], {name: 0 for name in STAGE_NAMES}
+    timestamp = date_added
+    stage_index = 0
+    for _ in range(rng.randint(0, 2 * history_per_part)):
+        if stage_index >= len(STAGE_NAMES):
+            break
+        stage = STAGE_NAMES[stage_index]
+        gap = rng.expovariate(1 / 3600) + 60
+        timestamp += timedelta(seconds=gap)
+        roll = rng.random()
+        status_type = StatusType.SCRAPPED if roll < 0.03 else StatusType.REWORK if roll < 0.05 else StatusType.COMPLETED
+        quantity = rng.randint(1, quantity_total - completed[stage])
+        if status_type == StatusType.COMPLETED:
+            completed[stage] += quantity
+            if completed[stage] >= quantity_total:
+                stage_index += 1
+        rows.append({'part_id': part_id, 'status': stage, 'operator_name': rng.choice(OPERATORS),
+                     'timestamp': timestamp, 'quantity': quantity, 'status_type': status_type,
+                     'duration_seconds': gap})
+    last_stage = STAGE_NAMES[stage_index - 1] if stage_index else None
+    return rows, min(completed.values()), last_stage, timestamp
+
+
+def _build_product(rng: random.Random, index: int, route_id: int, user_id: int, bom_depth: int,
+                   fanout: int, history_per_part: int) -> dict:
+    """Строки одного изделия: дерево состава глубины `bom_depth` с `fanout` узлами на уровень."""
+    designation = product_designation(index)
+    rows = {'parts': [], 'components': [], 'history': [], 'audit': []}
+    level = [root_part_id(index)]
+    for depth in range(bom_depth + 1):
+        next_level = []
+        for part_id in level:
+            is_assembly = depth < bom_depth
+            quantity_total = 1 if is_assembly else rng.randint(1, 10)
+            date_added = EPOCH + timedelta(seconds=rng.randint(0, 300 * 24 * 3600))
+            history, quantity_completed, last_stage, last_update = _part_history(
+                rng, part_id, date_added, quantity_total, history_per_part)
+            rows['parts'].append({
+                'part_id': part_id, 'product_designation': designation,
+                'name': f"Сборка {part_id}" if is_assembly else f"Деталь {part_id}",
+                'material': 'Сборка' if is_assembly else rng.choice(MATERIALS),
+                'size': '' if is_assembly else f"{rng.randint(10, 500)}x{rng.randint(10, 500)}",
+                'date_added': date_added, 'last_update': last_update,
+                'current_status': last_stage or 'На складе',
+                'quantity_total': quantity_total, 'quantity_completed': quantity_completed,
+                'quantity_scrapped': sum(h['quantity'] for h in history if h['status_type'] == StatusType.SCRAPPED),
+                'route_template_id': route_id,
+            })
+            rows['history'] += history
+            rows['audit'].append({'part_id': part_id, 'user_id': user_id, 'timestamp': date_added,
+                                  'action': 'Создание', 'details': 'Синтетические данные.', 'category': 'part'})
+            if is_assembly:
+                for child in range(fanout):
+                    child_id = f"{part_id}.{child}"
+                    next_level.append(child_id)
+                    rows['components'].append({'parent_id': part_id, 'child_id': child_id,
+                                               'quantity': rng.randint(1, 4)})
+        level = next_level
+    return rows
+
+
+def _copy_value(value):
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, enum.Enum):
+        return value.name
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+def _copy_rows(table, rows: list):
+    """Загружает строки в таблицу через COPY ... FROM STDIN (PostgreSQL, psycopg2)."""
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(row[column]) for column in columns])
+    buffer.seek(0)
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f'COPY "{table.name}" ({column_list}) FROM STDIN WITH (FORMAT csv, NULL \'{COPY_NULL}\')', buffer)
+    finally:
+        cursor.close()
+
+
+class BulkWriter:
+    """
+    Пачечная запись синтетических строк: в PostgreSQL через COPY, в остальных
+    СУБД - многострочным Core INSERT. Каждая пачка фиксируется отдельно.
+    Core INSERT и COPY обходят события ORM, поэтому дни истории для кэша
+    отчетов отмечаются явно.
+    """
+    TABLES = (('parts', Part), ('components', AssemblyComponent),
+              ('history', StatusHistory), ('audit', AuditLog))
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, use_copy: bool = None, progress=None):
+        if use_copy is None:
+            use_copy = db.session.get_bind().dialect.name == 'postgresql'
+        self.chunk_size = chunk_size
+        self.use_copy = use_copy
+        self.progress = progress
+        self.summary = {key: 0 for key, _ in self.TABLES}
+        self._batch = {key: [] for key, _ in self.TABLES}
+
+    def add(self, rows: dict):
+        for key, values in rows.items():
+            self._batch[key] += values
+        if sum(len(values) for values in self._batch.values()) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        report_cache.remember_history_days(db.session, {row['timestamp'] for row in self._batch['history']})
+        for key, model in self.TABLES:
+            rows = self._batch[key]
+            if not rows:
+                continue
+            if self.use_copy:
+                _copy_rows(model.__table__, rows)
+            else:
+                db.session.execute(insert(model), rows)
+            self.summary[key] += len(rows)
+            self._batch[key] = []
+        db.session.commit()
+        if self.progress:
+            self.progress(dict(self.summary))
+
+
+def generate(products: int = 20, bom_depth: int = 3, fanout: int = 4, history_per_part: int = 6,
+             seed: int = 42) -> dict:
+    """
+    Заполняет базу синтетическими изделиями: у каждого изделия дерево состава
+    (сборка, узлы, детали) и история прохождения этапов. При одном `seed`
+    данные одинаковы, поэтому замеры на них сравнимы между запусками.
+
+    :param products: Число изделий (`SYN-0000`, `SYN-0001`, ...).
+    :param bom_depth: Глубина дерева состава под корневой сборкой.
+    :param fanout: Число узлов в каждой сборке.
+    :param history_per_part: Среднее число записей истории на деталь.
+    :return: Число вставленных строк по видам.
+    :raises ValueError: Синтетические данные уже есть (удалите их через clear()).
+    """
+    if exists():
+        raise ValueError("Синтетические данные уже загружены.")
+    route, user = _ensure_reference_data()
+    rng = random.Random(seed)
+    writer = BulkWriter()
+    for index in range(products):
+        writer.add(_build_product(rng, index, route.id, user.id, bom_depth, fanout, history_per_part))
+    writer.flush()
+    return writer.summary
+
+
+# --- Данные производственного масштаба (flask seed-scale) ---
+
+# Рабочее время: записи истории и журнала попадают в смены с 7:00 до 23:00
+WORK_START_HOUR = 7
+WORK_END_HOUR = 23
+# Среднее ожидание детали перед очередным этапом (дни)
+QUEUE_DAYS = 2
+# Медиана длительности этапа, не созданного генератором (часы)
+DEFAULT_STAGE_HOURS = 4
+# Доли брака и переделки среди записей истории
+SCRAP_RATE = 0.02
+REWORK_RATE = 0.03
+# Действия журнала деталей после создания и их относительная частота
+PART_AUDIT_ACTIONS = (('Редактирование', 6), ('Генерация QR', 3), ('Смена ответственного', 1),
+                      ('Добавлено примечание', 1))
+
+
+def _zipf_weights(count: int, exponent: float = 1.1) -> list:
+    """Веса "немногие часто, многие редко" (маршруты, операторы, ответственные)."""
+    return [1 / (rank + 1) ** exponent for rank in range(count)]
+
+
+def _poisson(rng: random.Random, mean: float) -> int:
+    """Случайное число событий с распределением Пуассона (метод Кнута, для небольших средних)."""
+    limit, count, product = math.exp(-mean), 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def _to_work_hours(rng: random.Random, moment: datetime) -> datetime:
+    """Переносит момент вне смен (ночь, выходные) на начало ближайшей смены."""
+    if WORK_START_HOUR <= moment.hour < WORK_END_HOUR and moment.weekday() < 5:
+        return moment
+    if moment.hour >= WORK_END_HOUR:
+        moment += timedelta(days=1)
+    while moment.weekday() >= 5:
+        moment += timedelta(days=1)
+    return moment.replace(hour=WORK_START_HOUR, minute=0, second=0, microsecond=0) + \
+        timedelta(seconds=rng.randint(0, 3600))
+
+
+def _ensure_scale_reference_data(rng: random.Random, stages: int, routes: int, users: int) -> tuple:
+    """
+    Этапы (первые - из STAGE_NAMES), маршруты из случайных подмножеств этапов
+    в технологическом порядке и пользователи `synthetic-NNNN` (без пароля, войти
+    под ними нельзя). Существующие записи с теми же именами переиспользуются.
+
+    :return: (медианы длительности этапов в часах по именам, маршруты [(id, [имена этапов])], id пользователей).
+    """
+    # Дополнительные операции встают перед сборкой и ОТК, которыми маршруты заканчиваются
+    extra = [f"Операция {i}" for i in range(len(STAGE_NAMES) + 1, stages + 1)]
+    names = STAGE_NAMES[:stages] if not extra else STAGE_NAMES[:-2] + extra + STAGE_NAMES[-2:]
+    existing = {stage.name: stage for stage in Stage.query.filter(Stage.name.in_(names))}
+    stage_objects = [existing.get(name) or Stage(name=name) for name in names]
+    db.session.add_all(stage_objects)
+    db.session.flush()
+    # Медиана длительности этапа от получаса до суток: операции заметно различаются по времени
+    stage_medians = {name: rng.uniform(0.5, 24) for name in names}
+
+    route_list = []
+    for index in range(routes):
+        name = f"{ROUTE_NAME} {index:03d}"
+        # Этапы берутся в порядке справочника (резка раньше сварки), последний этап справочника (ОТК) замыкает маршрут
+        length = rng.randint(min(2, stages - 1), min(7, stages - 1))
+        chosen = sorted(rng.sample(range(stages - 1), length)) + [stages - 1]
+        route = RouteTemplate.query.filter_by(name=name).first()
+        if route is None:
+            route = RouteTemplate(name=name, is_default=False)
+            db.session.add(route)
+            db.session.flush()
+            db.session.add_all([RouteStage(template_id=route.id, stage_id=stage_objects[i].id, order=order)
+                                for order, i in enumerate(chosen)])
+            route_stages = [names[i] for i in chosen]
+        else:
+            # Маршрут прошлой генерации используется как есть
+            route_stages = [rs.stage.name for rs in sorted(route.stages, key=lambda rs: rs.order)]
+        route_list.append((route.id, route_stages))
+
+    if Role.query.count() == 0:
+        Role.insert_roles()
+    role = Role.query.filter_by(default=True).first()
+    usernames = [f"{USERNAME}-{i:04d}" for i in range(users)]
+    known = {user.username for user in User.query.filter(User.username.in_(usernames))}
+    missing = [{'username': name, 'role_id': role.id} for name in usernames if name not in known]
+    if missing:
+        db.session.execute(insert(User), missing)
+    user_ids = [user_id for _, user_id in sorted(db.session.execute(
+        select(User.username, User.id).where(User.username.in_(usernames))).all())]
+    reference_cache.invalidate()
+    db.session.commit()
+    return stage_medians, route_list, user_ids
+
+
+class _ScaleProfile:
+    """Параметры распределений, общие для всех изделий одной генерации."""
+
+    def __init__(self, rng, stage_medians, routes, user_ids, until, days, history_per_part, audit_per_part):
+        self.rng = rng
+        self.stage_medians = stage_medians
+        self.routes = routes
+        self.route_weights = _zipf_weights(len(routes))
+        self.user_ids = user_ids
+        self.user_weights = _zipf_weights(len(user_ids))
+        self.operators = [f"Оператор {i}" for i in range(1, max(len(user_ids), 1) + 1)]
+        self.operator_weights = _zipf_weights(len(self.operators), 0.8)
+        self.until = until
+        self.days = days
+        # Сколько записей в среднем уходит на этап, чтобы в сумме вышло history_per_part на деталь
+        self.records_per_stage = max(history_per_part / (sum(len(r[1]) for r in routes) / len(routes)), 1)
+        self.audit_per_part = audit_per_part
+
+    def history(self, part_id: str, date_added: datetime, stages: list, quantity_total: int) -> tuple:
+        """
+        История детали по маршруту: длительности этапов логнормальные вокруг
+        медианы этапа, партия выполняется частями, часть записей - брак или
+        переделка. Этапы, которые закончились бы позже `until`, не выполнены:
+        старые детали завершены, недавние в работе.
+
+        :return: (строки истории, выполнено по маршруту, последний этап, брак, время последней записи).
+        """
+        rng, rows = self.rng, []
+        timestamp, scrapped = date_added, 0
+        # Длительность считается как в calculate_stage_duration: от предыдущей записи или от создания
+        previous = date_added
+        last_stage = None
+        for stage in stages:
+            done = 0
+            # Ожидание в очереди перед этапом: из-за него недавние детали еще в работе
+            timestamp += timedelta(seconds=rng.expovariate(1 / (QUEUE_DAYS * 24 * 3600)))
+            parts_count = max(1, round(rng.expovariate(1 / self.records_per_stage)))
+            while done < quantity_total:
+                median = self.stage_medians.get(stage, DEFAULT_STAGE_HOURS) * 3600
+                duration = rng.lognormvariate(math.log(median), 0.8) / parts_count
+                moment = _to_work_hours(rng, timestamp + timedelta(seconds=duration))
+                if moment > self.until:
+                    # Выполнено по маршруту = минимум по этапам: ненулевой, только если идет последний этап
+                    quantity_completed = done if stage == stages[-1] else 0
+                    return rows, quantity_completed, last_stage, scrapped, timestamp
+                roll = rng.random()
+                status_type = StatusType.SCRAPPED if roll < SCRAP_RATE else \
+                    StatusType.REWORK if roll < SCRAP_RATE + REWORK_RATE else StatusType.COMPLETED
+                remaining = quantity_total - done
+                quantity = remaining if parts_count == 1 else rng.randint(1, remaining)
+                if status_type == StatusType.COMPLETED:
+                    done += quantity
+                elif status_type == StatusType.SCRAPPED:
+                    quantity = min(quantity, max(1, quantity_total // 10))
+                    scrapped += quantity
+                rows.append({'part_id': part_id, 'status': stage,
+                             'operator_name': rng.choices(self.operators, self.operator_weights)[0],
+                             'timestamp': moment, 'quantity': quantity, 'status_type': status_type,
+                             'duration_seconds': (moment - previous).total_seconds()})
+                timestamp = previous = moment
+            last_stage = stage
+        return rows, quantity_total, last_stage, scrapped, timestamp
+
+    def audit(self, part_id: str, date_added: datetime, last_update: datetime) -> list:
+        rng = self.rng
+        rows = [{'part_id': part_id, 'user_id': rng.choices(self.user_ids, self.user_weights)[0],
+                 'timestamp': date_added, 'action': 'Создание', 'details': 'Синтетические данные.',
+                 'category': 'part'}]
+        actions, weights = zip(*PART_AUDIT_ACTIONS)
+        span = max((last_update - date_added).total_seconds(), 60)
+        for _ in range(_poisson(rng, max(self.audit_per_part - 1, 0))):
+            rows.append({'part_id': part_id, 'user_id': rng.choices(self.user_ids, self.user_weights)[0],
+                         'timestamp': _to_work_hours(rng, date_added + timedelta(seconds=rng.uniform(0, span))),
+                         'action': rng.choices(actions, weights)[0], 'details': 'Синтетические данные.',
+                         'category': 'part'})
+        return rows
+
+    def date_added(self) -> datetime:
+        moment = self.until - timedelta(seconds=self.rng.uniform(0, self.days * 24 * 3600))
+        return _to_work_hours(self.rng, moment)
+
+
+def _build_scale_product(profile: _ScaleProfile, index: int, budget: int, bom_depth: int, fanout: int) -> tuple:
+    """
+    Изделие с деревом состава: у сборки от fanout/2 до 3*fanout/2 узлов, глубина
+    до `bom_depth`, всего не больше `budget` деталей. Сборки и узлы одного изделия
+    запускаются в работу в один день, детали выпускаются партиями.
+
+    :return: (строки по таблицам, число деталей).
+    """
+    rng = profile.rng
+    designation = product_designation(index)
+    rows = {'parts': [], 'components': [], 'history': [], 'audit': []}
+    product_start = profile.date_added()
+    level, planned = [root_part_id(index)], 1
+    for depth in range(bom_depth + 1):
+        next_level = []
+        for part_id in level:
+            is_assembly = depth < bom_depth and planned < budget
+            route_id, stages = rng.choices(profile.routes, profile.route_weights)[0]
+            quantity_total = 1 if is_assembly else min(int(rng.lognormvariate(1.5, 0.9)) + 1, 500)
+            date_added = _to_work_hours(rng, product_start + timedelta(seconds=rng.uniform(0, 8 * 3600)))
+            history, quantity_completed, last_stage, scrapped, last_update = profile.history(
+                part_id, date_added, stages, quantity_total)
+            rows['parts'].append({
+                'part_id': part_id, 'product_designation': designation,
+                'name': f"Сборка {part_id}" if is_assembly else f"Деталь {part_id}",
+                'material': 'Сборка' if is_assembly else rng.choice(MATERIALS),
+                'size': None if is_assembly else f"{rng.randint(10, 2000)}x{rng.randint(10, 2000)}",
+                'date_added': date_added, 'last_update': last_update,
+                'current_status': last_stage or 'На складе',
+                'quantity_total': quantity_total, 'quantity_completed': quantity_completed,
+                'quantity_scrapped': scrapped, 'route_template_id': route_id,
+                'responsible_id': rng.choices(profile.user_ids, profile.user_weights)[0]
+                if rng.random() < 0.7 else None,
+            })
+            rows['history'] += history
+            rows['audit'] += profile.audit(part_id, date_added, last_update)
+            if is_assembly:
+                for child in range(rng.randint(max(1, fanout // 2), max(1, fanout * 3 // 2))):
+                    if planned >= budget:
+                        break
+                    planned += 1
+                    child_id = f"{part_id}.{child}"
+                    next_level.append(child_id)
+                    rows['components'].append({'parent_id': part_id, 'child_id': child_id,
+                                               'quantity': rng.randint(1, 4)})
+        level = next_level
+        if not level:
+            break
+    return rows, planned
+
+
+def _login_audit(profile: _ScaleProfile) -> list:
+    """Входы пользователей: в рабочие дни около 60% пользователей входят в начале смены."""
+    rng, rows = profile.rng, []
+    day = (profile.until - timedelta(days=profile.days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    while day < profile.until:
+        if day.weekday() < 5:
+            for user_id in profile.user_ids:
+                if rng.random() < 0.6:
+                    moment = day.replace(hour=WORK_START_HOUR) + timedelta(seconds=rng.expovariate(1 / 1800))
+                    rows.append({'part_id': None, 'user_id': user_id, 'timestamp': moment,
+                                 'action': 'Вход в систему', 'details': 'Синтетические данные.',
+                                 'category': 'auth'})
+        day += timedelta(days=1)
+    return rows
+
+
+def generate_scale(parts: int = 1_000_000, bom_depth: int = 3, fanout: int = 6, stages: int = 20,
+                   routes: int = 40, users: int = 100, days: int = 365, history_per_part: int = 6,
+                   audit_per_part: float = 2.0, seed: int = 42, until: datetime = None,
+                   chunk_size: int = 50_000, use_copy: bool = None, progress=None) -> dict:
+    """
+    Заполняет базу данными производственного масштаба: изделия с деревьями
+    состава до набора `parts` деталей, маршруты и этапы, историю и журнал
+    аудита с реалистичными распределениями (см. _ScaleProfile). При одних
+    параметрах, `seed` и `until` данные совпадают строка в строку.
+
+    В PostgreSQL строки загружаются через COPY, а месячные разделы журналов
+    за весь период создаются заранее; в остальных СУБД - пачками Core INSERT.
+
+    :param parts: Сколько деталей создать.
+    :param bom_depth: Наибольшая глубина дерева состава.
+    :param fanout: Среднее число узлов в сборке.
+    :param stages: Этапов в справочнике.
+    :param routes: Маршрутов; детали распределены по ним неравномерно.
+    :param users: Пользователей (ответственные и авторы записей журнала).
+    :param days: Длина периода истории до `until` (дней).
+    :param history_per_part: Среднее число записей истории на деталь маршрута.
+    :param audit_per_part: Среднее число записей журнала на деталь.
+    :param until: Конец периода (по умолчанию начало текущего дня).
+    :param chunk_size: Строк в одной пачке записи.
+    :param use_copy: Принудительно включить/выключить COPY (по умолчанию - в PostgreSQL).
+    :param progress: Функция, получающая счетчики строк после каждой пачки.
+    :return: Число вставленных строк по видам.
+    :raises ValueError: Синтетические данные уже есть (удалите их через clear()).
+    """
+    if exists():
+        raise ValueError("Синтетические данные уже загружены.")
+    if until is None:
+        until = datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    rng = random.Random(seed)
+    stage_medians, route_list, user_ids = _ensure_scale_reference_data(rng, stages, routes, users)
+    # Запас в неделю: записи конца периода переносятся с выходных на рабочие дни
+    partition_service.ensure_partitions_between((until - timedelta(days=days)).date(),
+                                                (until + timedelta(days=7)).date())
+    profile = _ScaleProfile(rng, stage_medians, route_list, user_ids, until, days, history_per_part, audit_per_part)
+
+    writer = BulkWriter(chunk_size, use_copy, progress)
+    created, index = 0, 0
+    while created < parts:
+        rows, count = _build_scale_product(profile, index, parts - created, bom_depth, fanout)
+        writer.add(rows)
+        created += count
+        index += 1
+    writer.add({'audit': _login_audit(profile)})
+    writer.flush()
+    return writer.summary
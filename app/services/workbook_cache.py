@@ -0,0 +1,160 @@
+# app/services/workbook_cache.py
+
+import hashlib
+import io
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+import openpyxl
+
+# Бюджет памяти по умолчанию для всех закэшированных книг
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _normalize_header(value) -> str:
+    header_text = str(value).strip()
+    return re.sub(r'\s+', ' ', header_text)  # Заменяем множественные пробелы на один
+
+
+class WorkbookIndex:
+    """
+    Разобранная активная страница Excel-книги: нормализованные заголовки
+    и строки в компактном виде (кортежи строк только по колонкам с заголовками).
+    Строка по номеру выдается за O(1).
+    """
+
+    __slots__ = ('headers', 'rows', 'size_bytes')
+
+    def __init__(self, headers: list, rows: list):
+        self.headers = headers
+        self.rows = rows
+        self.size_bytes = self._estimate_size()
+
+    @property
+    def max_row(self) -> int:
+        """Номер последней строки листа (нумерация с 1, первая строка - заголовки)."""
+        return len(self.rows) + 1
+
+    def _estimate_size(self) -> int:
+        """Приблизительный объем памяти под строки и значения."""
+        size = sys.getsizeof(self.rows) + sum(sys.getsizeof(header) for header in self.headers)
+        for row in self.rows:
+            size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+        return size
+
+    @classmethod
+    def parse(cls, excel_bytes: bytes) -> 'WorkbookIndex':
+        """Читает книгу потоково (read_only) за один проход."""
+        try:
+            workbook = openpyxl.load_workbook(io.BytesIO(excel_bytes), read_only=True, data_only=True)
+        except Exception as e:
+            raise ValueError(f"Не удалось прочитать содержимое Excel-файла. Ошибка: {e}")
+
+        try:
+            rows_iter = workbook.active.iter_rows(values_only=True)
+            header_row = next(rows_iter, ())
+            # Как и раньше, пустые ячейки заголовка пропускаются, а значения берутся по позиции
+            headers = [_normalize_header(value) for value in header_row if value is not None]
+            width = len(headers)
+            rows = []
+            for values in rows_iter:
+                values = tuple('' if value is None else str(value) for value in values[:width])
+                if len(values) < width:
+                    # В режиме read_only строка может быть короче, если в конце пустые ячейки
+                    values += ('',) * (width - len(values))
+                rows.append(values)
+        finally:
+            workbook.close()
+        return cls(headers, rows)
+
+    def row_placeholders(self, row_number: int) -> dict:
+        """Словарь {"{{заголовок}}": значение} для строки с номером `row_number`."""
+        if not (2 <= row_number <= self.max_row):
+            raise IndexError(f"Номер строки {row_number} находится вне допустимого диапазона (от 2 до {self.max_row}).")
+        if not self.headers:
+            raise ValueError("Не удалось прочитать заголовки из первой строки Excel-файла.")
+        values = self.rows[row_number - 2]
+        return {f"{{{{{header}}}}}": value for header, value in zip(self.headers, values)}
+
+
+class WorkbookIndexCache:
+    """
+    Потокобезопасный кэш разобранных книг, ключ - SHA-256 содержимого файла.
+
+    Одна и та же книга (например, при генерации нескольких бирок подряд)
+    разбирается один раз. Суммарный размер ограничен бюджетом памяти:
+    при превышении вытесняются книги, к которым дольше всего не обращались.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._parse_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(excel_bytes: bytes) -> str:
+        return hashlib.sha256(excel_bytes).hexdigest()
+
+    def get(self, excel_bytes: bytes) -> WorkbookIndex:
+        """Возвращает разобранную книгу, при необходимости разбирая ее."""
+        key = self.make_key(excel_bytes)
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return index
+            parse_lock = self._parse_locks.setdefault(key, threading.Lock())
+
+        # Одну и ту же книгу разбирает один поток, остальные ждут результат
+        with parse_lock:
+            with self._lock:
+                index = self._entries.get(key)
+                if index is not None:
+                    self.hits += 1
+                    return index
+            try:
+                index = WorkbookIndex.parse(excel_bytes)
+                with self._lock:
+                    self.misses += 1
+                    # Книга больше бюджета не кэшируется, но результат все равно возвращается
+                    if index.size_bytes <= self.max_bytes:
+                        self._entries[key] = index
+                        self._evict()
+            finally:
+                # Блокировка удаляется и для книги, которую не удалось разобрать
+                with self._lock:
+                    self._parse_locks.pop(key, None)
+        return index
+
+    def _evict(self):
+        total = sum(index.size_bytes for index in self._entries.values())
+        while total > self.max_bytes and self._entries:
+            _, index = self._entries.popitem(last=False)
+            total -= index.size_bytes
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Метрики кэша: число книг, занятая память, попадания, промахи, вытеснения."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': sum(index.size_bytes for index in self._entries.values()),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+workbook_cache = WorkbookIndexCache()
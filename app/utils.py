@@ -3,10 +3,15 @@
 import os
 import re
 import qrcode
+from functools import lru_cache
 from io import BytesIO
 import base64
 import urllib.parse
 
+# Сколько последних QR-кодов держать в памяти: печать и повторные загрузки
+# одних и тех же деталей не перерисовывают изображение
+QR_CACHE_SIZE = 1024
+
 def create_safe_file_name(name):
     """
     Создает безопасное имя файла, заменяя недопустимые для Windows/Linux символы.
@@ -27,18 +32,24 @@ def generate_qr_code(part_id):
     url = f"http://{SERVER_PUBLIC_IP}:{SERVER_PORT}/scan/{safe_part_id}"
     
     try:
-        qr_img = qrcode.make(url)
-        
-        img_buffer = BytesIO()
-        qr_img.save(img_buffer, format='PNG')
-        img_buffer.seek(0)
-        
-        print(f"  -> QR-код для детали {part_id} сгенерирован в памяти. URL: {url}")
-        return img_buffer
+        return BytesIO(_render_qr_png(url))
     except Exception as e:
         print(f"  -> ОШИБКА создания QR-кода для {part_id}: {e}")
         return None
 
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def _render_qr_png(url):
+    """PNG-изображение QR-кода для URL (кэшируется по URL)."""
+    img_buffer = BytesIO()
+    qrcode.make(url).save(img_buffer, format='PNG')
+    return img_buffer.getvalue()
+
+
+def qr_cache_info():
+    """Статистика кэша QR-кодов (hits, misses, currsize), см. functools.lru_cache."""
+    return _render_qr_png.cache_info()
+
 def generate_qr_code_as_base64(part_id):
     """
     Генерирует QR-код и возвращает его как строку Base64 Data URI,
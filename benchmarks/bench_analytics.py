@@ -0,0 +1,136 @@
+# benchmarks/bench_analytics.py
+"""
+Сравнение аналитического движка в памяти (analytics_service) с подходом
+"SQL-запрос на каждый вызов отчета".
+
+Скрипт создает (или переиспользует) отдельную базу с синтетической историей
+нужного объема и замеряет:
+  * холодную загрузку движка и пустой инкрементальный refresh;
+  * отчеты "производительность операторов" и "длительность этапов"
+    через SQL и через векторные группировки.
+
+Запуск (по умолчанию 10 млн строк истории, генерация занимает заметное время):
+    python benchmarks/bench_analytics.py
+    python benchmarks/bench_analytics.py --rows 1000000 --database-uri postgresql://...
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import func, insert  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models.models import Part, StatusHistory, StatusType  # noqa: E402
+from app.services import report_service  # noqa: E402
+from app.services.analytics_service import HistoryAnalytics  # noqa: E402
+from config import Config  # noqa: E402
+
+STAGES = ['Резка', 'Сверловка', 'Гибка', 'Сварка', 'Покраска', 'Сборка', 'ОТК']
+OPERATORS = [f'Оператор {i}' for i in range(1, 41)]
+CHUNK_SIZE = 200000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000_000, help="Строк в StatusHistory.")
+    parser.add_argument('--database-uri', default='sqlite:///' + os.path.join(
+        os.path.dirname(__file__), 'bench_analytics.db'), help="База для бенчмарка (будет заполнена).")
+    parser.add_argument('--repeat', type=int, default=5, help="Повторов каждого замера.")
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def generate_history(rows: int, seed: int):
+    """Заполняет базу синтетическими деталями и историей пачками через Core insert."""
+    rng = np.random.default_rng(seed)
+    parts_count = max(rows // len(STAGES), 1)
+    start = np.datetime64('2024-01-01T00:00:00')
+    part_ids = np.array([f'BENCH-{i:08d}' for i in range(parts_count)])
+    part_starts = start + rng.integers(0, 365 * 24 * 3600, parts_count).astype('timedelta64[s]')
+
+    for offset in range(0, parts_count, CHUNK_SIZE):
+        db.session.execute(insert(Part), [
+            {'part_id': part_ids[i], 'product_designation': f'Изделие {i % 500}', 'name': 'Деталь',
+             'material': 'Ст3', 'date_added': part_starts[i].astype(object), 'last_update': part_starts[i].astype(object),
+             'quantity_total': 1, 'quantity_completed': 0, 'quantity_scrapped': 0}
+            for i in range(offset, min(offset + CHUNK_SIZE, parts_count))
+        ])
+        db.session.commit()
+
+    for offset in range(0, rows, CHUNK_SIZE):
+        indexes = np.arange(offset, min(offset + CHUNK_SIZE, rows))
+        part_index = indexes // len(STAGES) % parts_count
+        durations = rng.gamma(2.0, 3600.0, len(indexes))
+        # Время этапа = старт детали + накопленная длительность предыдущих этапов (приближенно)
+        timestamps = part_starts[part_index] + ((indexes % len(STAGES) + 1) * durations).astype('timedelta64[s]')
+        db.session.execute(insert(StatusHistory), [
+            {'part_id': part_ids[p], 'status': STAGES[i % len(STAGES)],
+             'operator_name': OPERATORS[o], 'timestamp': t.astype(object), 'quantity': 1,
+             'status_type': StatusType.COMPLETED, 'duration_seconds': float(d)}
+            for i, p, o, t, d in zip(indexes, part_index, rng.integers(0, len(OPERATORS), len(indexes)),
+                                     timestamps, durations)
+        ])
+        db.session.commit()
+        print(f"  сгенерировано {indexes[-1] + 1} / {rows}", end='\r', flush=True)
+    print()
+
+
+def sql_operator_performance():
+    return db.session.query(
+        StatusHistory.operator_name, func.count(StatusHistory.id)
+    ).group_by(StatusHistory.operator_name).order_by(func.count(StatusHistory.id).desc()).all()
+
+
+def measure(label, fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    print(f"{label:<50} median {statistics.median(timings) * 1000:10.1f} ms   min {min(timings) * 1000:10.1f} ms")
+    return statistics.median(timings)
+
+
+def main():
+    args = parse_args()
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database_uri
+        SECRET_KEY = 'benchmark'
+
+    app, _ = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        existing = db.session.query(func.count(StatusHistory.id)).scalar()
+        if existing != args.rows:
+            print(f"Генерация {args.rows} строк истории (в базе сейчас {existing})...")
+            db.session.query(StatusHistory).delete()
+            db.session.query(Part).delete()
+            db.session.commit()
+            generate_history(args.rows, args.seed)
+
+        engine = HistoryAnalytics()
+        measure("Движок: холодная загрузка из БД", engine.load_from_db, 1)
+        measure("Движок: инкрементальный refresh без новых строк", engine.refresh, args.repeat)
+        print()
+        sql_ops = measure("SQL: производительность операторов", sql_operator_performance, args.repeat)
+        mem_ops = measure("Движок: производительность операторов", engine.operator_performance, args.repeat)
+        sql_dur = measure("SQL: длительность этапов (avg/p50/p90)", report_service.get_stage_duration_stats, args.repeat)
+        mem_dur = measure("Движок: длительность этапов (avg/p50/p90)", engine.stage_duration_stats, args.repeat)
+        measure("Движок: выработка по сменам", engine.throughput_by_shift, args.repeat)
+        measure("Движок: WIP по дням", engine.wip_over_time, args.repeat)
+        measure("Движок: узкие места", engine.bottlenecks, args.repeat)
+        print()
+        print(f"Ускорение: операторы x{sql_ops / mem_ops:.1f}, длительность этапов x{sql_dur / mem_dur:.1f}")
+        print(f"Память под историю: {engine.history.memory_usage(deep=True).sum() / 2**20:.1f} МБ")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# benchmarks/bench_document_templates.py
+"""
+Сравнение скомпилированного Word-шаблона (document_service.CompiledTemplate)
+с прежним подходом: разбор шаблона для каждого документа и замена всех
+плейсхолдеров в каждом параграфе через str.replace.
+
+Скрипт строит в памяти большой шаблон (параграфы, таблица, колонтитулы)
+и замеряет генерацию серии документов обоими способами.
+
+Запуск:
+    python benchmarks/bench_document_templates.py
+    python benchmarks/bench_document_templates.py --paragraphs 5000 --placeholders 500 --documents 50
+"""
+
+import argparse
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+from docx import Document
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import document_service  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paragraphs', type=int, default=2000, help="Параграфов в основном тексте.")
+    parser.add_argument('--table-rows', type=int, default=300, help="Строк в таблице (3 колонки).")
+    parser.add_argument('--placeholders', type=int, default=200, help="Различных плейсхолдеров в данных.")
+    parser.add_argument('--documents', type=int, default=20, help="Документов в серии.")
+    parser.add_argument('--repeat', type=int, default=3, help="Повторов каждого замера.")
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def build_template(args) -> bytes:
+    rng = random.Random(args.seed)
+    names = [f'Поле {i}' for i in range(args.placeholders)]
+    doc = Document()
+    doc.sections[0].header.paragraphs[0].text = "Заказ {{Поле 0}}"
+    doc.sections[0].footer.paragraphs[0].text = "Изделие {{Поле 1}}"
+    for i in range(args.paragraphs):
+        if i % 4 == 0:
+            paragraph = doc.add_paragraph("Значение: ")
+            # Часть плейсхолдеров разбита между "runs", как это бывает после правок в Word
+            name = rng.choice(names)
+            paragraph.add_run("{{" + name[:3])
+            paragraph.add_run(name[3:] + "}}").bold = True
+        else:
+            doc.add_paragraph(f"Обычный текст параграфа {i} без подстановок.")
+    table = doc.add_table(rows=args.table_rows, cols=3)
+    for row in table.rows:
+        row.cells[0].text = "{{" + rng.choice(names) + "}}"
+        row.cells[1].text = "Текст ячейки"
+        row.cells[2].text = "{{" + rng.choice(names) + "}} / {{" + rng.choice(names) + "}}"
+    stream = io.BytesIO()
+    doc.save(stream)
+    return stream.getvalue()
+
+
+def legacy_replace_text_in_paragraph(paragraph, placeholders):
+    """Прежний алгоритм: склейка всех "runs" и str.replace по каждому плейсхолдеру."""
+    full_text = "".join(run.text for run in paragraph.runs)
+    if '{' not in full_text:
+        return
+    for placeholder, replacement_text in placeholders.items():
+        if placeholder in full_text:
+            full_text = full_text.replace(placeholder, str(replacement_text))
+    if paragraph.runs:
+        for i in range(len(paragraph.runs) - 1, 0, -1):
+            p = paragraph.runs[i]._element
+            if p.getparent() is not None:
+                p.getparent().remove(p)
+        paragraph.runs[0].text = full_text
+
+
+def legacy_generate(template_bytes, placeholders):
+    doc = Document(io.BytesIO(template_bytes))
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                for paragraph in cell.paragraphs:
+                    legacy_replace_text_in_paragraph(paragraph, placeholders)
+    for paragraph in doc.paragraphs:
+        legacy_replace_text_in_paragraph(paragraph, placeholders)
+    stream = io.BytesIO()
+    doc.save(stream)
+    return stream
+
+
+def measure(label, fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    print(f"{label:<55} median {statistics.median(timings) * 1000:10.1f} ms   min {min(timings) * 1000:10.1f} ms")
+    return statistics.median(timings)
+
+
+def main():
+    args = parse_args()
+    template_bytes = build_template(args)
+    datasets = [{f'{{{{Поле {i}}}}}': f'значение {i}-{n}' for i in range(args.placeholders)}
+                for n in range(args.documents)]
+    print(f"Шаблон: {len(template_bytes) / 1024:.0f} КБ, документов в серии: {args.documents}")
+
+    def run_legacy():
+        for data in datasets:
+            legacy_generate(template_bytes, data)
+
+    def run_compiled():
+        template = document_service.CompiledTemplate(io.BytesIO(template_bytes))
+        for data in datasets:
+            template.render(data)
+
+    compile_time = measure("Компиляция шаблона",
+                           lambda: document_service.CompiledTemplate(io.BytesIO(template_bytes)), args.repeat)
+    legacy = measure("Прежний подход: разбор + str.replace на документ", run_legacy, args.repeat)
+    compiled = measure("Скомпилированный шаблон: компиляция + рендер серии", run_compiled, args.repeat)
+    print()
+    print(f"Ускорение серии: x{legacy / compiled:.1f} "
+          f"(компиляция {compile_time / compiled * 100:.0f}% времени серии)")
+
+
+if __name__ == '__main__':
+    main()
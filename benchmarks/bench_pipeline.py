@@ -0,0 +1,477 @@
+# benchmarks/bench_pipeline.py
+"""
+Нагрузочный бенчмарк цепочки "сканирование -> подтверждение этапа -> панель".
+
+Сценарии:
+  scan              GET /scan/<деталь> (страница после сканирования QR-кода);
+  confirm_stage     POST /confirm_stage/<деталь>/<этап> (форма берется со страницы scan);
+  confirm_stage_ws  то же до получения события update_dashboard по Socket.IO;
+  api_parts         GET /api/parts/<изделие> (список деталей панели);
+  history           GET /history/<деталь> (сборка с деревом состава);
+  report_<имя>      GET /admin/report/api/reports/<имя> для каждого API отчетов;
+  import            POST /admin/part/upload_excel (Excel с --import-rows деталями).
+
+Для каждого сценария выводятся p50/p99 задержки и пропускная способность
+(запросов в секунду). Результаты сравниваются с сохраненной базовой линией
+(--baseline); рост p50/p99 или падение пропускной способности больше чем на
+--tolerance считается регрессией, и скрипт завершается с кодом 1. Ошибки
+запросов в любом сценарии - тоже регрессия, даже без базовой линии.
+
+Режимы:
+  * в процессе (по умолчанию): приложение создается в этом же процессе над
+    отдельной базой (--database-uri), синтетические данные загружаются при
+    первом запуске, запросы идут через тестовый клиент Flask по одному;
+    кэш отчетов выключен, чтобы сценарии report_* замеряли сами запросы;
+  * по HTTP (--base-url): запущенный сервер, данные в котором загружены
+    командой `flask seed-bench` с теми же --products/--depth/--fanout;
+    запросы идут в --concurrency потоков, Socket.IO - через python-socketio;
+    для замера отчетов сервер запускается с REPORT_CACHE_ENABLED = False.
+
+Запуск:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --scenarios scan history --requests 500
+    python benchmarks/bench_pipeline.py --save-baseline
+    flask seed-bench && python benchmarks/bench_pipeline.py --base-url http://localhost:5000 --concurrency 8
+"""
+
+import argparse
+import io
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openpyxl
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import synthetic_data  # noqa: E402
+
+REPORT_APIS = ['operator_performance', 'stage_duration', 'order_completion', 'defect_analysis',
+               'shift_throughput', 'wip', 'bottlenecks']
+SCENARIOS = ['scan', 'confirm_stage', 'confirm_stage_ws', 'api_parts', 'history'] + \
+    [f'report_{name}' for name in REPORT_APIS] + ['import']
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'pipeline.json')
+BENCH_USERNAME = 'bench'
+BENCH_PASSWORD = 'bench-password'
+
+CSRF_RE = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+CONFIRM_ACTION_RE = re.compile(r'action="([^"]*/confirm_stage/[^"]+)"')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS, metavar='SCENARIO',
+                        help="Сценарии (по умолчанию все): " + ', '.join(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=200, help="Запросов в каждом сценарии.")
+    parser.add_argument('--warmup', type=int, default=10, help="Неучитываемых запросов перед замером.")
+    parser.add_argument('--import-requests', type=int, default=10, help="Запросов в сценарии import.")
+    parser.add_argument('--import-rows', type=int, default=200, help="Деталей в импортируемом файле.")
+    parser.add_argument('--products', type=int, default=20, help="Синтетических изделий.")
+    parser.add_argument('--depth', type=int, default=3, help="Глубина дерева состава.")
+    parser.add_argument('--fanout', type=int, default=4, help="Узлов в каждой сборке.")
+    parser.add_argument('--history', type=int, default=6, help="Среднее число записей истории на деталь.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-uri', default='sqlite:///' + os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'bench_pipeline.db'),
+        help="База для режима в процессе (будет заполнена).")
+    parser.add_argument('--base-url', help="Адрес запущенного сервера (режим HTTP).")
+    parser.add_argument('--username', default=None, help="Пользователь с правами администратора (режим HTTP).")
+    parser.add_argument('--password', default=None, help="Пароль пользователя (режим HTTP).")
+    parser.add_argument('--concurrency', type=int, default=1, help="Параллельных клиентов (режим HTTP).")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Файл базовой линии.")
+    parser.add_argument('--save-baseline', action='store_true', help="Сохранить результаты как базовую линию.")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Допустимое ухудшение относительно базовой линии (доля).")
+    return parser.parse_args()
+
+
+# --- Клиенты ---
+
+class InProcessDriver:
+    """Запросы через тестовый клиент Flask и Socket.IO в том же процессе."""
+
+    def __init__(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        self.client = app.test_client()
+        self._socket = None
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get_data(as_text=True)
+
+    def post(self, path, data, files=None):
+        data = dict(data)
+        for name, (filename, content) in (files or {}).items():
+            data[name] = (io.BytesIO(content), filename)
+        response = self.client.post(path, data=data, content_type='multipart/form-data' if files else None)
+        return response.status_code, response.get_data(as_text=True)
+
+    def connect_socket(self):
+        self._socket = self.socketio.test_client(self.app, flask_test_client=self.client)
+
+    def wait_event(self, name, timeout=5.0):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            if any(message['name'] == name for message in self._socket.get_received()):
+                return True
+            time.sleep(0.001)
+        return False
+
+    def close(self):
+        if self._socket is not None and self._socket.is_connected():
+            self._socket.disconnect()
+
+
+class HttpDriver:
+    """Запросы к запущенному серверу по HTTP, события Socket.IO через python-socketio."""
+
+    def __init__(self, base_url):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        self._socket = None
+        self._events = {}
+        self._condition = threading.Condition()
+
+    def get(self, path):
+        response = self.session.get(self.base_url + path, allow_redirects=False)
+        return response.status_code, response.text
+
+    def post(self, path, data, files=None):
+        files = {name: (filename, content) for name, (filename, content) in (files or {}).items()}
+        response = self.session.post(self.base_url + path, data=data, files=files or None, allow_redirects=False)
+        return response.status_code, response.text
+
+    def connect_socket(self):
+        import socketio as socketio_client
+
+        self._socket = socketio_client.Client()
+        self._socket.on('update_dashboard', lambda data: self._received('update_dashboard'))
+        self._socket.connect(self.base_url, headers={'Cookie': '; '.join(
+            f"{name}={value}" for name, value in self.session.cookies.items())})
+
+    def _received(self, name):
+        with self._condition:
+            self._events[name] = self._events.get(name, 0) + 1
+            self._condition.notify_all()
+
+    def wait_event(self, name, timeout=5.0):
+        with self._condition:
+            received = self._condition.wait_for(lambda: self._events.get(name, 0) > 0, timeout)
+            if received:
+                self._events[name] -= 1
+            return received
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.disconnect()
+
+
+def login(driver, username, password):
+    _, page = driver.get('/admin/user/login')
+    token = CSRF_RE.search(page)
+    status, _ = driver.post('/admin/user/login', {
+        'csrf_token': token.group(1) if token else '', 'username': username, 'password': password})
+    if status != 302:
+        raise RuntimeError(f"Не удалось войти как {username} (код {status})")
+
+
+# --- Сценарии ---
+
+class Workload:
+    """
+    Синтетические изделия и детали, известные по правилам именования
+    synthetic_data (без запросов к БД). Итераторы общие для всех потоков.
+    """
+
+    def __init__(self, args):
+        self.designations = [synthetic_data.product_designation(i) for i in range(args.products)]
+        self.roots = [synthetic_data.root_part_id(i) for i in range(args.products)]
+        leaves = [part_id for i in range(args.products)
+                  for part_id in synthetic_data.leaf_part_ids(i, args.depth, args.fanout)]
+        self.import_rows = args.import_rows
+        self._leaves = itertools.cycle(leaves)
+        self._confirmable = iter(leaves)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self.run_id = f"{int(time.time()):x}"
+
+    def next_leaf(self):
+        with self._lock:
+            return next(self._leaves)
+
+    def next_confirmable(self):
+        """Следующая деталь для подтверждения этапа (каждая используется, пока у нее есть этапы)."""
+        with self._lock:
+            return next(self._confirmable, None)
+
+    def next_number(self):
+        with self._lock:
+            return next(self._counter)
+
+
+def _prepare_confirm(driver, workload, state):
+    """Форма подтверждения для детали, у которой остались этапы: (адрес, данные)."""
+    while True:
+        part_id = state.get('part_id') or workload.next_confirmable()
+        if part_id is None:
+            raise RuntimeError("Закончились детали с невыполненными этапами: увеличьте --products")
+        _, page = driver.get(f'/scan/{part_id}')
+        action = CONFIRM_ACTION_RE.search(page)
+        if action:
+            state['part_id'] = part_id
+            token = CSRF_RE.search(page)
+            return action.group(1), {'csrf_token': token.group(1) if token else '', 'quantity': 1,
+                                     'operator_name': 'Бенчмарк', 'action': 'completed'}
+        state['part_id'] = None
+
+
+def _build_import_file(workload) -> bytes:
+    number = workload.next_number()
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append([f"BENCH-IMPORT-{workload.run_id}-{number}"])
+    sheet.append(['Обозначение', 'Наименование', 'Кол-во', 'Прим.', 'Операции', 'Размер'])
+    prefix = f"BI-{workload.run_id}-{number}"
+    sheet.append([f"{prefix}-ASM", None])
+    for row in range(workload.import_rows):
+        sheet.append([f"{prefix}-{row:05d}", f"Деталь {row}", 2, 'Ст3', 'Резка, Сварка', '100x200'])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+# Сценарии, отвечающие перенаправлением после успешной отправки формы
+REDIRECTING_SCENARIOS = ('confirm_stage', 'confirm_stage_ws', 'import')
+
+
+def expected_status(name) -> int:
+    return 302 if name in REDIRECTING_SCENARIOS else 200
+
+
+def make_scenario(name, workload):
+    """
+    Сценарий как функция `prepare(driver, state)`: готовит данные без замера
+    и возвращает замеряемое действие (возвращает код ответа).
+    """
+    if name == 'scan':
+        return lambda driver, state: (lambda part_id=workload.next_leaf(): driver.get(f'/scan/{part_id}')[0])
+    if name == 'api_parts':
+        designations = itertools.cycle(workload.designations)
+        return lambda driver, state: (lambda d=next(designations): driver.get(f'/api/parts/{d}')[0])
+    if name == 'history':
+        roots = itertools.cycle(workload.roots)
+        return lambda driver, state: (lambda part_id=next(roots): driver.get(f'/history/{part_id}')[0])
+    if name.startswith('report_'):
+        path = f"/admin/report/api/reports/{name[len('report_'):]}"
+        return lambda driver, state: (lambda: driver.get(path)[0])
+    if name in ('confirm_stage', 'confirm_stage_ws'):
+        def prepare(driver, state):
+            path, data = _prepare_confirm(driver, workload, state)
+            if name == 'confirm_stage':
+                return lambda: driver.post(path, data)[0]
+
+            def confirm_and_wait():
+                status, _ = driver.post(path, data)
+                if not driver.wait_event('update_dashboard'):
+                    raise RuntimeError("Событие update_dashboard не получено")
+                return status
+            return confirm_and_wait
+        return prepare
+    if name == 'import':
+        def prepare(driver, state):
+            content = _build_import_file(workload)
+            _, page = driver.get('/admin/')
+            token = CSRF_RE.search(page)
+            data = {'csrf_token': token.group(1) if token else ''}
+            return lambda: driver.post('/admin/part/upload_excel', data, files={'file': ('bench.xlsx', content)})[0]
+        return prepare
+    raise ValueError(f"Неизвестный сценарий: {name}")
+
+
+# --- Замеры ---
+
+def percentile(values, q: float) -> float:
+    """Перцентиль по ближайшему рангу (q от 0 до 100)."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def run_scenario(name, drivers, workload, requests_count, warmup):
+    """Выполняет сценарий всеми клиентами параллельно: (задержки в секундах, ошибок, время)."""
+    prepare = make_scenario(name, workload)
+    expected = expected_status(name)
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    per_driver = [requests_count // len(drivers) + (i < requests_count % len(drivers)) for i in range(len(drivers))]
+
+    def worker(driver, count):
+        state = {}
+        for _ in range(warmup):
+            prepare(driver, state)()
+        local = []
+        failed = 0
+        for _ in range(count):
+            action = prepare(driver, state)
+            started = time.perf_counter()
+            try:
+                status = action()
+            except Exception:
+                status = None
+            local.append(time.perf_counter() - started)
+            if status != expected:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    if len(drivers) == 1:
+        worker(drivers[0], per_driver[0])
+    else:
+        with ThreadPoolExecutor(len(drivers)) as pool:
+            for future in [pool.submit(worker, driver, count) for driver, count in zip(drivers, per_driver)]:
+                future.result()
+    return latencies, errors[0], time.perf_counter() - started
+
+
+def summarize(latencies, errors, elapsed) -> dict:
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Регрессии относительно базовой линии и ошибки запросов: список строк с описанием."""
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if current['errors']:
+            expected = reference.get('errors', 0) if reference else 0
+            regressions.append(f"{name}: ошибок {current['errors']} (в базовой линии {expected})")
+        if not reference:
+            continue
+        for key in ('p50_ms', 'p99_ms'):
+            if reference[key] and current[key] > reference[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {current[key]} > {reference[key]} (+{tolerance:.0%})")
+        if reference['rps'] and current['rps'] < reference['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: rps {current['rps']} < {reference['rps']} (-{tolerance:.0%})")
+    return regressions
+
+
+def load_baseline(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, mode: str, results: dict):
+    baseline = load_baseline(path)
+    baseline[mode] = results
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+# --- Запуск ---
+
+def in_process_drivers(args):
+    from app import create_app, db
+    from app.models.models import Role, User
+    from config import Config
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database_uri
+        SECRET_KEY = 'benchmark'
+        DRAWING_GC_INTERVAL = 0
+        PARTITION_MAINTENANCE_INTERVAL = 0
+        # Иначе после прогрева отчеты отдаются из кэша и сами запросы отчетов не замеряются
+        REPORT_CACHE_ENABLED = False
+
+    app, socketio = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        if not synthetic_data.exists():
+            print("Загрузка синтетических данных...")
+            summary = synthetic_data.generate(args.products, args.depth, args.fanout, args.history, args.seed)
+            print('  ' + ', '.join(f"{name}: {rows}" for name, rows in summary.items()))
+        if User.query.filter_by(username=BENCH_USERNAME).first() is None:
+            user = User(username=BENCH_USERNAME, role=Role.query.filter_by(name='Administrator').first())
+            user.set_password(BENCH_PASSWORD)
+            db.session.add(user)
+            db.session.commit()
+    driver = InProcessDriver(app, socketio)
+    login(driver, BENCH_USERNAME, BENCH_PASSWORD)
+    return [driver]
+
+
+def http_drivers(args):
+    if not args.username or not args.password:
+        raise SystemExit("Для режима HTTP укажите --username и --password администратора.")
+    drivers = []
+    for _ in range(args.concurrency):
+        driver = HttpDriver(args.base_url)
+        login(driver, args.username, args.password)
+        drivers.append(driver)
+    return drivers
+
+
+def main():
+    args = parse_args()
+    mode = 'http' if args.base_url else 'in_process'
+    drivers = http_drivers(args) if args.base_url else in_process_drivers(args)
+    workload = Workload(args)
+    if 'confirm_stage_ws' in args.scenarios:
+        for driver in drivers:
+            driver.connect_socket()
+
+    results = {}
+    print(f"{'Сценарий':<30}{'запросов':>10}{'ошибок':>8}{'p50, мс':>10}{'p99, мс':>10}{'запр/с':>10}")
+    try:
+        for name in args.scenarios:
+            count = args.import_requests if name == 'import' else args.requests
+            warmup = min(args.warmup, 1) if name == 'import' else args.warmup
+            results[name] = summarize(*run_scenario(name, drivers, workload, count, warmup))
+            r = results[name]
+            print(f"{name:<30}{r['requests']:>10}{r['errors']:>8}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['rps']:>10}")
+    finally:
+        for driver in drivers:
+            driver.close()
+
+    if args.save_baseline:
+        save_baseline(args.baseline, mode, results)
+        print(f"\nБазовая линия сохранена: {args.baseline}")
+        baseline = {}
+    else:
+        baseline = load_baseline(args.baseline).get(mode)
+        if not baseline:
+            print(f"\nБазовой линии для режима {mode} нет: сохраните ее флагом --save-baseline.")
+            baseline = {}
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nРегрессии и ошибки запросов:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    if baseline:
+        print("\nРегрессий относительно базовой линии нет.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -21,6 +21,101 @@ class Config:
     # --- Статические настройки приложения ---
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # --- Кэш отчетов ---
+    # Время жизни (в секундах) закэшированных отчетов, затрагивающих текущий день.
+    # Отчеты за закрытые периоды хранятся до изменения истории за этот период.
+    REPORT_CACHE_ENABLED = True
+    REPORT_CACHE_TTL = 60
+
+    # --- Учет SQL-запросов (app/services/query_stats.py) ---
+    # Число запросов, время в БД и повторы одинаковых запросов (N+1) на каждый
+    # HTTP-запрос: заголовки X-Query-* и Server-Timing, предупреждение в логе
+    # при превышении бюджета или порога повторов.
+    QUERY_STATS_ENABLED = False
+    QUERY_BUDGET = 40
+    QUERY_REPEAT_THRESHOLD = 10
+
+    # --- Метрики (app/services/metrics.py) ---
+    # Метрики в текстовом формате Prometheus на /metrics; при заданном
+    # METRICS_TOKEN сборщик должен передать `Authorization: Bearer <токен>`.
+    # Без токена метрики включаются только при DEBUG или TESTING.
+    METRICS_ENABLED = True
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # --- Sentry (app/services/sampling.py) ---
+    # Трассируется доля запросов: SENTRY_TRACES_SAMPLE_RATE или своя доля эндпоинта
+    # из SENTRY_TRACES_ENDPOINT_RATES, не больше SENTRY_TRACES_MAX_PER_SECOND в секунду.
+    # Медленные (SENTRY_SLOW_REQUEST_MS) и упавшие запросы вне выборки отправляются
+    # событиями, не чаще SENTRY_SLOW_EVENTS_PER_MINUTE в минуту.
+    SENTRY_TRACES_SAMPLE_RATE = float(os.environ.get('SENTRY_TRACES_SAMPLE_RATE', 0.05))
+    SENTRY_TRACES_ENDPOINT_RATES = {'metrics': 0.0, 'static': 0.0}
+    SENTRY_TRACES_MAX_PER_SECOND = 10
+    SENTRY_SLOW_REQUEST_MS = 2000
+    SENTRY_SLOW_EVENTS_PER_MINUTE = 30
+    SENTRY_PROFILES_SAMPLE_RATE = float(os.environ.get('SENTRY_PROFILES_SAMPLE_RATE', 0.1))
+    # Интервал выборки стеков встроенного профилировщика (админ-панель, секунды)
+    PROFILER_INTERVAL = 0.01
+    # Как часто процесс сверяет версии своих кэшей с таблицей CacheVersions (секунды)
+    CACHE_VERSION_CHECK_INTERVAL = 5
+
+    # Каталог Parquet-выгрузки (`flask export-analytics`), из которого аналитический
+    # движок загружает историю при старте вместо полного чтения из БД. Необязателен.
+    ANALYTICS_PARQUET_DIR = os.environ.get('ANALYTICS_PARQUET_DIR')
+
+    # --- Кэш файлов OneDrive ---
+    # Скачанные Excel-файлы хранятся на диске и перед использованием сверяются
+    # с OneDrive по eTag/cTag. По умолчанию каталог `instance/onedrive_cache`.
+    ONEDRIVE_CACHE_ENABLED = True
+    ONEDRIVE_CACHE_DIR = os.environ.get('ONEDRIVE_CACHE_DIR')
+    ONEDRIVE_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+    # --- Чертежи ---
+    # Превью чертежей строятся в фоне после загрузки; WebP - если его поддерживает Pillow.
+    DRAWING_THUMBNAILS_ASYNC = True
+    DRAWING_WEBP_ENABLED = True
+    # Время кэширования в браузере (секунды): превью неизменны, оригинал проверяется чаще
+    DRAWING_THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+    DRAWING_ORIGINAL_MAX_AGE = 3600
+    # Хранилище файлов чертежей: 'local' (каталог `_blobs` в папке чертежей
+    # или DRAWING_BLOB_DIR) либо 's3' (любое S3-совместимое хранилище).
+    DRAWING_STORAGE_BACKEND = os.environ.get('DRAWING_STORAGE_BACKEND', 'local')
+    DRAWING_BLOB_DIR = os.environ.get('DRAWING_BLOB_DIR')
+    DRAWING_S3_ENDPOINT_URL = os.environ.get('DRAWING_S3_ENDPOINT_URL')
+    DRAWING_S3_BUCKET = os.environ.get('DRAWING_S3_BUCKET')
+    DRAWING_S3_ACCESS_KEY = os.environ.get('DRAWING_S3_ACCESS_KEY')
+    DRAWING_S3_SECRET_KEY = os.environ.get('DRAWING_S3_SECRET_KEY')
+    DRAWING_S3_REGION = os.environ.get('DRAWING_S3_REGION', 'us-east-1')
+    DRAWING_S3_PREFIX = os.environ.get('DRAWING_S3_PREFIX', 'drawings/')
+    # Сборщик мусора: период запуска (0 - не запускать в фоне) и сколько секунд
+    # файл без ссылок хранится до удаления
+    DRAWING_GC_INTERVAL = 3600
+    DRAWING_GC_GRACE_PERIOD = 24 * 3600
+
+    # --- Журнал аудита ---
+    # Информационные записи (QR-коды, примечания, правки деталей) пишутся в фоне
+    # пачками; записи категорий AUDIT_SYNC_CATEGORIES - в транзакции запроса.
+    AUDIT_ASYNC_ENABLED = True
+    AUDIT_SYNC_CATEGORIES = ('auth', 'management')
+    AUDIT_BATCH_SIZE = 200
+    AUDIT_FLUSH_INTERVAL = 1.0
+
+    # --- Секционирование AuditLogs и StatusHistory (только PostgreSQL) ---
+    # Разделы по месяцам создаются заранее на PARTITION_MONTHS_AHEAD месяцев вперед.
+    # `flask archive-partitions` выгружает разделы старше срока хранения (--keep-months
+    # или PARTITION_RETENTION_MONTHS, например {'AuditLogs': 24}) в сжатые CSV
+    # в PARTITION_ARCHIVE_DIR (по умолчанию instance/archive) и удаляет их. Фоновое
+    # обслуживание удаляет разделы только при PARTITION_AUTO_ARCHIVE = True.
+    PARTITION_MAINTENANCE_INTERVAL = 24 * 3600
+    PARTITION_MONTHS_AHEAD = 3
+    PARTITION_ARCHIVE_DIR = os.environ.get('PARTITION_ARCHIVE_DIR')
+    PARTITION_RETENTION_MONTHS = {}
+    PARTITION_AUTO_ARCHIVE = False
+
+    # --- Архив завершенных деталей ---
+    # `flask archive-parts` переносит в PartArchives детали, завершенные и не менявшиеся
+    # PART_ARCHIVE_AFTER_DAYS дней; страница истории возвращает их из архива.
+    PART_ARCHIVE_AFTER_DAYS = 365
+
 
 class DevelopmentConfig(Config):
     """
@@ -32,6 +127,7 @@ class DevelopmentConfig(Config):
     # Позволяет видеть все SQL-запросы в консоли.
     # В обычном режиме можно закомментировать.
     SQLALCHEMY_ECHO = True 
+    QUERY_STATS_ENABLED = True
 
 
 class TestingConfig(Config):
@@ -44,6 +140,13 @@ class TestingConfig(Config):
     SERVER_NAME = 'localhost.localdomain' # Для корректной генерации URL в тестах
     WTF_CSRF_ENABLED = False # Отключаем CSRF-защиту для упрощения тестов
     SECRET_KEY = 'a-secret-key-for-testing-purposes' # Используем постоянный ключ
+    REPORT_CACHE_ENABLED = False # Тесты проверяют отчеты на свежих данных; кэш включается точечно
+    ONEDRIVE_CACHE_ENABLED = False # Тесты не должны писать файлы в instance/
+    DRAWING_THUMBNAILS_ASYNC = False # Превью строятся сразу, чтобы тесты могли их проверить
+    DRAWING_GC_INTERVAL = 0 # Сборщик мусора чертежей вызывается в тестах напрямую
+    AUDIT_ASYNC_ENABLED = False # Тесты проверяют записи журнала сразу после запроса
+    PARTITION_MAINTENANCE_INTERVAL = 0 # Обслуживание разделов в тестах не запускается
+    QUERY_STATS_ENABLED = True # Тесты проверяют заголовки учета запросов
 
 
 class ProductionConfig(Config):
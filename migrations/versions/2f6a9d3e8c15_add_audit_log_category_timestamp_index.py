@@ -0,0 +1,26 @@
+"""Add composite AuditLogs (category, timestamp) index.
+
+Revision ID: 2f6a9d3e8c15
+Revises: 9b2e5f1c7a40
+Create Date: 2026-10-19 16:03:18.774920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f6a9d3e8c15'
+down_revision = '9b2e5f1c7a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('AuditLogs', schema=None) as batch_op:
+        batch_op.create_index('ix_AuditLogs_category_timestamp', ['category', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('AuditLogs', schema=None) as batch_op:
+        batch_op.drop_index('ix_AuditLogs_category_timestamp')
@@ -0,0 +1,37 @@
+"""Add archive table for completed parts.
+
+Revision ID: 3d9a7c1e5b62
+Revises: 5e8c4a7b2d90
+Create Date: 2026-10-19 18:40:12.617204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d9a7c1e5b62'
+down_revision = '5e8c4a7b2d90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('PartArchives',
+    sa.Column('part_id', sa.String(), nullable=False),
+    sa.Column('product_designation', sa.String(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.PrimaryKeyConstraint('part_id')
+    )
+    with op.batch_alter_table('PartArchives', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_PartArchives_archived_at'), ['archived_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_PartArchives_product_designation'), ['product_designation'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('PartArchives', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_PartArchives_product_designation'))
+        batch_op.drop_index(batch_op.f('ix_PartArchives_archived_at'))
+
+    op.drop_table('PartArchives')
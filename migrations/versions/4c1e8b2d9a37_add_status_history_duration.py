@@ -0,0 +1,62 @@
+"""Add StatusHistory.duration_seconds with backfill.
+
+Revision ID: 4c1e8b2d9a37
+Revises: 1a7614da432d
+Create Date: 2026-10-19 09:12:40.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1e8b2d9a37'
+down_revision = '1a7614da432d'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade():
+    with op.batch_alter_table('StatusHistory', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('duration_seconds', sa.Float(), nullable=True))
+
+    # Разовое заполнение: проходим историю каждой детали по времени и считаем
+    # разницу с предыдущей записью (или с датой создания детали).
+    history = sa.table('StatusHistory',
+                       sa.column('id', sa.Integer),
+                       sa.column('part_id', sa.String),
+                       sa.column('timestamp', sa.DateTime),
+                       sa.column('duration_seconds', sa.Float))
+    parts = sa.table('Parts',
+                     sa.column('part_id', sa.String),
+                     sa.column('date_added', sa.DateTime))
+
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(history.c.id, history.c.part_id, history.c.timestamp, parts.c.date_added)
+        .select_from(history.join(parts, parts.c.part_id == history.c.part_id))
+        .order_by(history.c.part_id, history.c.timestamp, history.c.id)
+    )
+
+    update_stmt = history.update().where(history.c.id == sa.bindparam('row_id')).values(
+        duration_seconds=sa.bindparam('duration')
+    )
+    batch, current_part, previous = [], None, None
+    for row in rows:
+        if row.part_id != current_part:
+            current_part, previous = row.part_id, row.date_added
+        if row.timestamp is not None and previous is not None:
+            batch.append({'row_id': row.id, 'duration': (row.timestamp - previous).total_seconds()})
+        previous = row.timestamp or previous
+        if len(batch) >= BATCH_SIZE:
+            bind.execute(update_stmt, batch)
+            batch = []
+    if batch:
+        bind.execute(update_stmt, batch)
+
+
+def downgrade():
+    with op.batch_alter_table('StatusHistory', schema=None) as batch_op:
+        batch_op.drop_column('duration_seconds')
@@ -0,0 +1,106 @@
+"""Partition AuditLogs and StatusHistory by month (PostgreSQL).
+
+Revision ID: 5e8c4a7b2d90
+Revises: 2f6a9d3e8c15
+Create Date: 2026-10-19 17:26:51.430118
+
+"""
+from datetime import date, datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8c4a7b2d90'
+down_revision = '2f6a9d3e8c15'
+branch_labels = None
+depends_on = None
+
+TABLES = ('AuditLogs', 'StatusHistory')
+# Сколько месяцев вперед создать разделы сразу (дальше их создает partition_service)
+MONTHS_AHEAD = 3
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(table: str, month: date) -> str:
+    # Та же схема имен, что и в app/services/partition_service.py
+    return f"{table}_p{month:%Y_%m}"
+
+
+def _table_layout(bind, table):
+    inspector = sa.inspect(bind)
+    return inspector.get_indexes(table), inspector.get_foreign_keys(table)
+
+
+def _recreate_indexes_and_foreign_keys(table, indexes, foreign_keys):
+    for index in indexes:
+        op.create_index(index['name'], table, index['column_names'], unique=index['unique'])
+    for fk in foreign_keys:
+        op.create_foreign_key(fk['name'], table, fk['referred_table'],
+                              fk['constrained_columns'], fk['referred_columns'])
+
+
+def _partition_table(bind, table):
+    indexes, foreign_keys = _table_layout(bind, table)
+    old = f"{table}_unpartitioned"
+    op.execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+    # Ключ раздела входит в первичный ключ, поэтому время обязательно
+    op.execute(f'UPDATE "{old}" SET "timestamp" = now() WHERE "timestamp" IS NULL')
+    op.execute(f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+               f'PARTITION BY RANGE ("timestamp")')
+    op.execute(f'ALTER TABLE "{table}" ALTER COLUMN "timestamp" SET NOT NULL')
+    op.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey_partitioned" PRIMARY KEY (id, "timestamp")')
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence(:t, 'id')"), {'t': f'"{old}"'}).scalar()
+    if sequence:
+        op.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{table}".id')
+
+    first = bind.execute(sa.text(f'SELECT min("timestamp") FROM "{old}"')).scalar()
+    today = datetime.now(timezone.utc).date()
+    month = (first.date() if first else today).replace(day=1)
+    last = _add_months(today.replace(day=1), MONTHS_AHEAD)
+    while month <= last:
+        op.execute(f'CREATE TABLE "{_partition_name(table, month)}" PARTITION OF "{table}" '
+                   f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')")
+        month = _add_months(month, 1)
+    # Строки вне созданных месяцев попадают в раздел по умолчанию, вставка не падает
+    op.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+    op.execute(f'INSERT INTO "{table}" SELECT * FROM "{old}"')
+    op.execute(f'DROP TABLE "{old}"')
+    _recreate_indexes_and_foreign_keys(table, indexes, foreign_keys)
+
+
+def _unpartition_table(bind, table):
+    indexes, foreign_keys = _table_layout(bind, table)
+    old = f"{table}_partitioned"
+    op.execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+    op.execute(f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    op.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY (id)')
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence(:t, 'id')"), {'t': f'"{old}"'}).scalar()
+    if sequence:
+        op.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{table}".id')
+    op.execute(f'INSERT INTO "{table}" SELECT * FROM "{old}"')
+    op.execute(f'DROP TABLE "{old}"')
+    _recreate_indexes_and_foreign_keys(table, indexes, foreign_keys)
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        # Секционирование есть только в PostgreSQL; в SQLite таблицы остаются обычными
+        return
+    for table in TABLES:
+        _partition_table(bind, table)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        _unpartition_table(bind, table)
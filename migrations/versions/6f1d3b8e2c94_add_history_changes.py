@@ -0,0 +1,31 @@
+"""Add history change log for the analytics engine.
+
+Revision ID: 6f1d3b8e2c94
+Revises: 8c5f2e1a9d47
+Create Date: 2026-10-20 10:14:52.518306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f1d3b8e2c94'
+down_revision = '8c5f2e1a9d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('HistoryChanges',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('part_id', sa.String(), nullable=True),
+    sa.Column('period_start', sa.DateTime(), nullable=True),
+    sa.Column('period_end', sa.DateTime(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('HistoryChanges')
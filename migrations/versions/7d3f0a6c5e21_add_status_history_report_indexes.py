@@ -0,0 +1,38 @@
+"""Add composite StatusHistory indexes for reports.
+
+Revision ID: 7d3f0a6c5e21
+Revises: 4c1e8b2d9a37
+Create Date: 2026-10-19 11:40:02.531877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3f0a6c5e21'
+down_revision = '4c1e8b2d9a37'
+branch_labels = None
+depends_on = None
+
+
+def _has_status_type():
+    # Колонка status_type в части баз создана через db.create_all(), а не миграцией
+    columns = sa.inspect(op.get_bind()).get_columns('StatusHistory')
+    return any(column['name'] == 'status_type' for column in columns)
+
+
+def upgrade():
+    has_status_type = _has_status_type()
+    with op.batch_alter_table('StatusHistory', schema=None) as batch_op:
+        if has_status_type:
+            batch_op.create_index('ix_StatusHistory_status_type_timestamp', ['status_type', 'timestamp'], unique=False)
+        batch_op.create_index('ix_StatusHistory_part_id_timestamp', ['part_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    indexes = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('StatusHistory')}
+    with op.batch_alter_table('StatusHistory', schema=None) as batch_op:
+        batch_op.drop_index('ix_StatusHistory_part_id_timestamp')
+        if 'ix_StatusHistory_status_type_timestamp' in indexes:
+            batch_op.drop_index('ix_StatusHistory_status_type_timestamp')
@@ -0,0 +1,29 @@
+"""Add version stamps for process-local caches.
+
+Revision ID: 8c5f2e1a9d47
+Revises: 3d9a7c1e5b62
+Create Date: 2026-10-19 21:05:37.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c5f2e1a9d47'
+down_revision = '3d9a7c1e5b62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    cache_versions = op.create_table('CacheVersions',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(cache_versions, [{'name': 'identity', 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('CacheVersions')
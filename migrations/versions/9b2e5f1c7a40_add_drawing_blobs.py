@@ -0,0 +1,36 @@
+"""Add content-addressed drawing blobs table.
+
+Revision ID: 9b2e5f1c7a40
+Revises: 7d3f0a6c5e21
+Create Date: 2026-10-19 15:12:47.208314
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b2e5f1c7a40'
+down_revision = '7d3f0a6c5e21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('DrawingBlobs',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('orphaned_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+    with op.batch_alter_table('DrawingBlobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_DrawingBlobs_orphaned_at'), ['orphaned_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('DrawingBlobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_DrawingBlobs_orphaned_at'))
+
+    op.drop_table('DrawingBlobs')
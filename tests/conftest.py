@@ -12,6 +12,11 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from app import create_app, db as _db
 from config import TestingConfig
 from app.models.models import User, Stage, RouteTemplate, RouteStage, Part, Role
+from app.services import cache_versions, reference_cache
+from app.services.analytics_service import history_analytics
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'postgres: тест требует PostgreSQL (TEST_POSTGRES_URI)')
 
 @pytest.fixture(scope='session')
 def app():
@@ -25,6 +30,11 @@ def db(app):
     """Создает и очищает базу данных для каждого теста."""
     with app.app_context():
         _db.create_all()
+        # Версии кэшей в новой базе начинаются заново: копия процесса перечитывается
+        cache_versions.versions.expire()
+        reference_cache.cache.clear()
+        # Водяные знаки аналитического движка относятся к прежней базе
+        history_analytics.reset()
         yield _db
         _db.session.remove()
         _db.drop_all()
@@ -91,4 +101,14 @@ def clean_auth_client(client, app):
             user = User.query.filter_by(username=username).first()
             login_user(user)
         return client
-    return login
\ No newline at end of file
+    return login
+
+
+@pytest.fixture(scope='function')
+def query_budget(db):
+    """
+    Бюджет SQL-запросов для блока теста: `with query_budget(max_queries=5, max_repeats=1): ...`.
+    Превышение бюджета валит тест с отчетом о самых частых запросах.
+    """
+    from app.services.query_stats import query_budget as budget
+    return budget
@@ -1,5 +1,9 @@
 # tests/test_admin_report_routes.py
 
+import pytest
+import zipfile
+import openpyxl
+from docx import Document
 from flask import url_for
 from unittest.mock import patch
 from io import BytesIO
@@ -17,6 +21,7 @@ class TestReportRoutes:
         assert client.get(url_for('admin.report.report_operator_performance')).status_code == 200
         assert client.get(url_for('admin.report.report_stage_duration')).status_code == 200
         assert client.get(url_for('admin.report.generate_from_cloud')).status_code == 200
+        assert client.get(url_for('admin.report.generate_batch_from_cloud')).status_code == 200
         assert client.get(url_for('admin.report.report_order_completion')).status_code == 200
         assert client.get(url_for('admin.report.report_defect_analysis')).status_code == 200
 
@@ -53,6 +58,74 @@ class TestReportRoutes:
         assert response.status_code == 200
         assert "Ошибка генерации отчета: Mocked Not Found" in response.data.decode('utf-8')
 
+    @patch('app.services.graph_service.download_file_from_onedrive')
+    def test_generate_batch_from_cloud_returns_zip(self, mock_download, client, auth_client, database):
+        """Тест: Пакетная генерация возвращает ZIP с документом на каждую строку."""
+        client = auth_client('admin', 'password123')
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['№ бирки', 'Изделие'])
+        for index in range(1, 4):
+            workbook.active.append([f'B-{index}', f'Изделие {index}'])
+        excel_stream = BytesIO()
+        workbook.save(excel_stream)
+        mock_download.return_value = excel_stream.getvalue()
+
+        template = Document()
+        template.add_paragraph('Бирка {{№ бирки}}: {{Изделие}}')
+        template_stream = BytesIO()
+        template.save(template_stream)
+        template_stream.seek(0)
+
+        response = client.post(url_for('admin.report.generate_batch_from_cloud'), data={
+            'excel_path': '/test.xlsx', 'rows': '2-3, 4', 'word_template': (template_stream, 'template.docx')
+        })
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/zip'
+        with zipfile.ZipFile(BytesIO(response.data)) as archive:
+            assert archive.namelist() == ['B-1.docx', 'B-2.docx', 'B-3.docx']
+            document = Document(BytesIO(archive.read('B-3.docx')))
+            assert document.paragraphs[0].text == 'Бирка B-3: Изделие 3'
+
+    @patch('app.services.graph_service.download_file_from_onedrive')
+    def test_generate_batch_from_cloud_row_out_of_range(self, mock_download, client, auth_client, database):
+        """Тест: Строка вне диапазона отклоняется до начала отправки архива."""
+        client = auth_client('admin', 'password123')
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['Header'])
+        workbook.active.append(['Data'])
+        excel_stream = BytesIO()
+        workbook.save(excel_stream)
+        mock_download.return_value = excel_stream.getvalue()
+
+        response = client.post(url_for('admin.report.generate_batch_from_cloud'), data={
+            'excel_path': '/test.xlsx', 'rows': '2-5', 'word_template': (BytesIO(b't'), 't.docx')
+        }, follow_redirects=True)
+
+        assert response.status_code == 200
+        assert "вне допустимого диапазона" in response.data.decode('utf-8')
+
+    @patch('app.services.document_service.generate_word_from_data')
+    @patch('app.services.graph_service.download_file_from_onedrive')
+    def test_generate_batch_from_cloud_rejects_bad_template(self, mock_download, mock_render, client,
+                                                            auth_client, database):
+        """Тест: Неверный шаблон отклоняется разбором, без пробного рендеринга документа."""
+        client = auth_client('admin', 'password123')
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['Header'])
+        workbook.active.append(['Data'])
+        excel_stream = BytesIO()
+        workbook.save(excel_stream)
+        mock_download.return_value = excel_stream.getvalue()
+
+        response = client.post(url_for('admin.report.generate_batch_from_cloud'), data={
+            'excel_path': '/test.xlsx', 'rows': '2', 'word_template': (BytesIO(b'not a docx'), 't.docx')
+        }, follow_redirects=True)
+
+        assert response.status_code == 200
+        assert "Не удалось прочитать шаблон Word" in response.data.decode('utf-8')
+        mock_render.assert_not_called()
+
     def test_api_operator_performance(self, client, auth_client, database):
         """Тест: API для производительности операторов возвращает корректный JSON."""
         client = auth_client('manager', 'password123')
@@ -83,4 +156,24 @@ class TestReportRoutes:
         assert 'labels' in data
         assert 'datasets' in data
         assert data['labels'][0] == 'Резка'
-        assert data['datasets'][0]['data'][0] > 0
\ No newline at end of file
+        assert data['datasets'][0]['data'][0] > 0
+
+    def test_api_stage_duration_percentiles_and_date_filter(self, client, auth_client, database):
+        """Тест: p50/p90 считаются по сохраненной длительности, фильтр по датам ограничивает выборку."""
+        client = auth_client('manager', 'password123')
+        start = datetime.datetime(2025, 3, 1, 8, 0, 0)
+        for index, hours in enumerate([1, 2, 3, 4, 10]):
+            part = Part(part_id=f'DUR-{index}', product_designation='Изделие', name='Деталь', material='Ст3', date_added=start)
+            db.session.add(part)
+            db.session.add(StatusHistory(part_id=part.part_id, status='Резка', operator_name='Иванов',
+                                         timestamp=start + datetime.timedelta(hours=hours)))
+        db.session.commit()
+
+        data = client.get(url_for('admin.report.api_report_stage_duration')).get_json()
+        assert data['labels'] == ['Резка']
+        assert data['datasets'][0]['data'][0] == pytest.approx(4.0)
+        assert data['datasets'][1]['data'][0] == pytest.approx(3.0)
+        assert data['datasets'][2]['data'][0] == pytest.approx(7.6)
+
+        data = client.get(url_for('admin.report.api_report_stage_duration', date_from='2025-04-01')).get_json()
+        assert data['labels'] == []
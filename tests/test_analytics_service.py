@@ -0,0 +1,152 @@
+# tests/test_analytics_service.py
+
+import datetime
+import threading
+
+from flask import url_for
+
+from app import db
+from app.models.models import Part, StatusHistory, StatusType, User
+from app.services import export_service, part_service
+from app.services.analytics_service import HistoryAnalytics, history_analytics
+
+START = datetime.datetime(2025, 5, 5, 0, 0)
+
+
+def _add_history(part_id, status, hours, quantity=1, status_type=StatusType.COMPLETED):
+    entry = StatusHistory(part_id=part_id, status=status, operator_name='Оператор', quantity=quantity,
+                          status_type=status_type, timestamp=START + datetime.timedelta(hours=hours))
+    db.session.add(entry)
+    db.session.commit()
+    return entry
+
+
+class TestHistoryAnalytics:
+    """Тесты векторного аналитического движка."""
+
+    def test_throughput_by_shift(self, database):
+        """Тест: Записи раскладываются по сменам; ночная смена относится к дню своего начала."""
+        db.session.get(Part, 'TEST-001').date_added = START
+        _add_history('TEST-001', 'Резка', hours=7, quantity=2)       # 07:00 -> смена 1
+        _add_history('TEST-001', 'Сверловка', hours=15, quantity=3)  # 15:00 -> смена 2
+        _add_history('TEST-001', 'Резка', hours=27, quantity=4)      # 03:00 следующего дня -> смена 3
+        _add_history('TEST-001', 'Резка', hours=8, quantity=5, status_type=StatusType.SCRAPPED)
+
+        result = HistoryAnalytics().load_from_db().throughput_by_shift()
+
+        rows = {(row.shift_day.date(), row.shift): row.quantity for row in result.itertuples()}
+        assert rows == {(START.date(), 1): 2, (START.date(), 2): 3, (START.date(), 3): 4}
+
+    def test_wip_and_bottlenecks(self, database):
+        """Тест: WIP растет при старте детали и падает при ее завершении; узкое место — самый долгий этап."""
+        part = db.session.get(Part, 'TEST-001')
+        part.date_added = START
+        db.session.commit()
+        _add_history('TEST-001', 'Резка', hours=1)
+        _add_history('TEST-001', 'Сверловка', hours=49)
+        part.quantity_completed = part.quantity_total
+        db.session.commit()
+
+        engine = HistoryAnalytics().load_from_db()
+        wip = engine.wip_over_time('D')
+        assert list(wip.to_numpy()) == [1, 1, 0]
+
+        bottlenecks = engine.bottlenecks()
+        assert list(bottlenecks.index) == ['Сверловка', 'Резка']
+        assert bottlenecks.loc['Сверловка', 'p50_seconds'] == 48 * 3600
+
+    def test_incremental_refresh_and_patch_after_delete(self, database):
+        """Тест: refresh дочитывает новые строки, а после удаления строки убирает ее из фрейма."""
+        first = _add_history('TEST-001', 'Резка', hours=1)
+        engine = HistoryAnalytics().load_from_db()
+        assert len(engine.history) == 1
+
+        _add_history('TEST-001', 'Сверловка', hours=2)
+        engine.refresh()
+        assert len(engine.history) == 2
+
+        db.session.delete(first)
+        db.session.commit()
+        engine.refresh()
+        assert list(engine.history['status']) == ['Сверловка']
+
+    def test_cancel_stage_rereads_only_changed_part(self, database, monkeypatch):
+        """Тест: после отмены этапа перечитываются строки только этой детали, с пересчитанной длительностью."""
+        db.session.add(Part(part_id='OTHER-1', product_designation='Изделие', name='Другая', material='Ст3',
+                            date_added=START))
+        db.session.get(Part, 'TEST-001').date_added = START
+        first = _add_history('TEST-001', 'Резка', hours=1)
+        _add_history('TEST-001', 'Сверловка', hours=3)
+        _add_history('OTHER-1', 'Резка', hours=2)
+        engine = HistoryAnalytics().load_from_db()
+        reads = []
+        read_history = engine._read_history
+        monkeypatch.setattr(engine, '_read_history', lambda *criteria: reads.append(criteria) or read_history(*criteria))
+
+        part_service.cancel_stage_by_history_id(first.id, User.query.filter_by(username='admin').one())
+        engine.refresh()
+
+        assert all(reads) and len(reads) == 2
+        rows = engine.history.set_index('status')
+        assert list(engine.history['part_id']) == ['TEST-001', 'OTHER-1']
+        assert rows.loc['Сверловка', 'duration_seconds'] == 3 * 3600
+        assert list(engine.history['id']) == sorted(engine.history['id'])
+
+    def test_refresh_returns_current_data_while_another_refresh_runs(self, database):
+        """Тест: пока другой поток обновляет данные, refresh не ждет его и не читает БД."""
+        _add_history('TEST-001', 'Резка', hours=1)
+        engine = HistoryAnalytics().load_from_db()
+        _add_history('TEST-001', 'Сверловка', hours=2)
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with engine._refresh_lock:
+                locked.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        locked.wait()
+        try:
+            assert len(engine.refresh().history) == 1
+        finally:
+            release.set()
+            holder.join()
+        assert len(engine.refresh().history) == 2
+
+    def test_load_from_parquet_then_catch_up_from_db(self, database, tmp_path):
+        """Тест: Снимок из Parquet дополняется строками, появившимися после выгрузки."""
+        _add_history('TEST-001', 'Резка', hours=1)
+        export_service.export_analytics(str(tmp_path))
+        _add_history('TEST-001', 'Сверловка', hours=2)
+
+        engine = HistoryAnalytics().load_from_parquet(str(tmp_path))
+
+        assert len(engine.history) == 2
+        assert engine.operator_performance().to_dict() == {'Оператор': 2}
+
+    def test_parquet_snapshot_applies_changes_after_export(self, database, tmp_path):
+        """Тест: строки, удаленные после выгрузки, не попадают в историю, загруженную из Parquet."""
+        first = _add_history('TEST-001', 'Резка', hours=1)
+        _add_history('TEST-001', 'Сверловка', hours=2)
+        export_service.export_analytics(str(tmp_path))
+        db.session.delete(first)
+        db.session.commit()
+        export_service.export_analytics(str(tmp_path))
+
+        engine = HistoryAnalytics().load_from_parquet(str(tmp_path))
+
+        assert list(engine.history['status']) == ['Сверловка']
+
+    def test_analytics_api_endpoints(self, client, auth_client, database):
+        """Тест: API отчетов движка возвращают данные в формате графиков."""
+        history_analytics.reset()
+        client = auth_client('manager', 'password123')
+        _add_history('TEST-001', 'Резка', hours=7, quantity=2)
+
+        data = client.get(url_for('admin.report.api_report_shift_throughput')).get_json()
+        assert data['labels'] == ['2025-05-05']
+        assert data['datasets'][0]['data'] == [2]
+        assert client.get(url_for('admin.report.api_report_wip')).status_code == 200
+        assert client.get(url_for('admin.report.api_report_bottlenecks')).get_json()['labels'] == ['Резка']
+        history_analytics.reset()
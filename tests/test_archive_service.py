@@ -0,0 +1,175 @@
+# tests/test_archive_service.py
+
+import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from click.testing import CliRunner
+from flask import url_for
+from sqlalchemy import update
+
+from app.models.models import (Part, PartArchive, StatusHistory, PartNote, ResponsibleHistory,
+                               AssemblyComponent, Stage, User, StatusType)
+from app.services import archive_service, part_service
+from app.services.analytics_service import HistoryAnalytics
+
+OLD = datetime.datetime(2020, 1, 10, 12, 0)
+
+
+def _make_finished_assembly(db):
+    """Завершенная сборка ASM-1 с узлом NODE-1, не менявшаяся с 2020 года."""
+    operator = User.query.filter_by(username='operator').first()
+    stage = Stage.query.filter_by(name='Резка').first()
+    route_id = db.session.get(Part, 'TEST-001').route_template_id
+    for part_id in ('ASM-1', 'NODE-1'):
+        db.session.add(Part(part_id=part_id, product_designation='Архивное изделие', name=part_id,
+                            material='Ст3', route_template_id=route_id, responsible_id=operator.id,
+                            quantity_total=1, quantity_completed=1, date_added=OLD))
+    db.session.add(AssemblyComponent(parent_id='ASM-1', child_id='NODE-1', quantity=2))
+    db.session.add(StatusHistory(part_id='NODE-1', status='Резка', operator_name='operator',
+                                 timestamp=OLD + datetime.timedelta(hours=2), status_type=StatusType.COMPLETED))
+    db.session.add(StatusHistory(part_id='ASM-1', status='Резка', operator_name='operator',
+                                 timestamp=OLD + datetime.timedelta(hours=5), status_type=StatusType.SCRAPPED))
+    db.session.add(PartNote(part_id='NODE-1', user_id=operator.id, stage_id=stage.id, text='Без замечаний',
+                            timestamp=OLD))
+    db.session.add(ResponsibleHistory(part_id='NODE-1', user_id=operator.id, timestamp=OLD))
+    db.session.commit()
+    db.session.execute(update(Part).where(Part.part_id.in_(['ASM-1', 'NODE-1'])).values(last_update=OLD))
+    db.session.commit()
+
+
+class TestArchiveCompletedParts:
+    """Тесты для переноса завершенных деталей в архив."""
+
+    def test_archives_finished_group_with_dependent_rows(self, app, database):
+        """Тест: сборка и узел уходят в архив вместе с историей, примечаниями и связями."""
+        _make_finished_assembly(database)
+
+        assert archive_service.archive_completed_parts(older_than_days=30) == 2
+
+        assert {a.part_id for a in PartArchive.query.all()} == {'ASM-1', 'NODE-1'}
+        assert Part.query.filter(Part.part_id.in_(['ASM-1', 'NODE-1'])).count() == 0
+        assert StatusHistory.query.count() == 0
+        assert PartNote.query.count() == 0
+        assert ResponsibleHistory.query.count() == 0
+        assert AssemblyComponent.query.count() == 0
+        # Незавершенная деталь остается в рабочих таблицах
+        assert database.session.get(Part, 'TEST-001') is not None
+
+    def test_recent_or_unfinished_parts_stay(self, app, database):
+        """Тест: недавно измененные детали и группы с незавершенной деталью не архивируются."""
+        _make_finished_assembly(database)
+        database.session.add(AssemblyComponent(parent_id='TEST-001', child_id='ASM-1', quantity=1))
+        database.session.commit()
+
+        assert archive_service.archive_completed_parts(older_than_days=30) == 0
+        assert archive_service.archive_completed_parts(older_than_days=100000) == 0
+        assert PartArchive.query.count() == 0
+
+    def test_payload_is_compressed_json(self, app, database):
+        """Тест: архивный документ хранится сжатым и содержит все строки детали."""
+        _make_finished_assembly(database)
+        archive_service.archive_completed_parts(older_than_days=30)
+
+        document = archive_service.decode_payload(database.session.get(PartArchive, 'NODE-1').payload)
+        assert document['part']['part_id'] == 'NODE-1'
+        assert document['history'][0]['status_type'] == 'COMPLETED'
+        assert len(document['notes']) == 1
+        assert document['components'][0]['quantity'] == 2
+
+    def test_command(self, app, database):
+        """Тест: команда `archive-parts` сообщает число перенесенных деталей."""
+        _make_finished_assembly(database)
+        result = CliRunner().invoke(app.cli.get_command(None, 'archive-parts'), ['--days', '30'])
+        assert result.exit_code == 0
+        assert 'Перенесено в архив деталей: 2' in result.output
+
+
+class TestRehydration:
+    """Тесты для возврата деталей из архива."""
+
+    def test_history_page_rehydrates_group(self, app, database, auth_client):
+        """Тест: открытие истории архивной детали возвращает всю группу с исходными данными."""
+        _make_finished_assembly(database)
+        history_before = {(h.id, h.part_id, h.status_type, h.duration_seconds) for h in StatusHistory.query.all()}
+        archive_service.archive_completed_parts(older_than_days=30)
+        client = auth_client('operator', 'password123')
+
+        with app.test_request_context():
+            response = client.get(url_for('main.history', part_id='NODE-1'))
+
+        assert response.status_code == 200
+        assert PartArchive.query.count() == 0
+        node = database.session.get(Part, 'NODE-1')
+        assert node.last_update > OLD
+        assert node.responsible.username == 'operator'
+        assert {(h.id, h.part_id, h.status_type, h.duration_seconds)
+                for h in StatusHistory.query.all()} == history_before
+        assert PartNote.query.one().stage.name == 'Резка'
+        link = AssemblyComponent.query.one()
+        assert (link.parent_id, link.child_id, link.quantity) == ('ASM-1', 'NODE-1', 2)
+
+    def test_anonymous_request_does_not_rehydrate(self, app, database, client):
+        """Тест: анонимный запрос истории архивной детали ведет на вход и не трогает архив."""
+        _make_finished_assembly(database)
+        archive_service.archive_completed_parts(older_than_days=30)
+
+        with app.test_request_context():
+            response = client.get(url_for('main.history', part_id='NODE-1'))
+
+        assert response.status_code == 302
+        assert '/login' in response.headers['Location']
+        assert {a.part_id for a in PartArchive.query.all()} == {'ASM-1', 'NODE-1'}
+        assert database.session.get(Part, 'NODE-1') is None
+
+    def test_rehydrated_group_is_not_archived_again(self, app, database):
+        """Тест: восстановленная группа не уходит в архив при следующем запуске."""
+        _make_finished_assembly(database)
+        archive_service.archive_completed_parts(older_than_days=30)
+
+        archive_service.rehydrate_part('NODE-1')
+
+        assert archive_service.archive_completed_parts(older_than_days=30) == 0
+        assert PartArchive.query.count() == 0
+
+    def test_analytics_engine_sees_rehydrated_history(self, app, database):
+        """Тест: аналитический движок подхватывает историю, восстановленную с исходными id."""
+        _make_finished_assembly(database)
+        archive_service.archive_completed_parts(older_than_days=30)
+        engine = HistoryAnalytics().load_from_db()
+
+        archive_service.rehydrate_part('NODE-1')
+        engine.refresh()
+
+        assert set(engine.history['part_id']) == {'ASM-1', 'NODE-1'}
+
+    def test_missing_part_is_404(self, app, database, client):
+        """Тест: деталь, которой нет ни в таблицах, ни в архиве, дает 404."""
+        with app.test_request_context():
+            response = client.get(url_for('main.history', part_id='NO-SUCH'))
+        assert response.status_code == 404
+
+    def test_removed_references_are_cleared(self, app, database):
+        """Тест: ссылки на удаленных пользователей обнуляются, их примечания пропускаются."""
+        _make_finished_assembly(database)
+        archive_service.archive_completed_parts(older_than_days=30)
+        operator = User.query.filter_by(username='operator').first()
+        database.session.delete(operator)
+        database.session.commit()
+
+        part = archive_service.rehydrate_part('NODE-1')
+
+        assert part.responsible_id is None
+        assert PartNote.query.count() == 0
+        assert ResponsibleHistory.query.one().user_id is None
+
+    def test_archived_part_id_cannot_be_reused(self, app, database):
+        """Тест: нельзя создать новую деталь с артикулом архивной."""
+        _make_finished_assembly(database)
+        archive_service.archive_completed_parts(older_than_days=30)
+        form = MagicMock()
+        form.part_id.data = 'ASM-1'
+        form.drawing.data = None
+
+        with pytest.raises(ValueError):
+            part_service.create_single_part(form, User.query.first(), app.config)
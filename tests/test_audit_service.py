@@ -0,0 +1,228 @@
+# tests/test_audit_service.py
+
+import datetime
+
+import pytest
+from flask import url_for
+from sqlalchemy import event
+
+from app import db
+from app.models.models import AuditLog, User
+from app.services import audit_service
+
+
+def _add_logs(count, category='part', timestamp=None):
+    """Добавляет `count` записей журнала; по умолчанию - с разным временем (минута на запись)."""
+    admin = User.query.filter_by(username='admin').first()
+    base = datetime.datetime(2025, 1, 1, 8, 0)
+    for i in range(count):
+        db.session.add(AuditLog(user_id=admin.id, action=f"Действие {i}", category=category,
+                                timestamp=timestamp or base + datetime.timedelta(minutes=i)))
+    db.session.commit()
+
+
+def _ids(page):
+    return [log.id for log in page.items]
+
+
+class TestAuditLogPagination:
+    """Тесты постраничной навигации по журналу аудита по курсору."""
+
+    def test_forward_pages_cover_log_without_gaps(self, database):
+        """Тест: Переход по курсорам вперед проходит весь журнал от новых записей к старым без пропусков."""
+        _add_logs(23)
+        _add_logs(5, category='auth')
+        criteria = AuditLog.category == 'part'
+
+        seen, page = [], audit_service.paginate_audit_log(criteria, per_page=10)
+        assert not page.has_prev
+        while True:
+            seen += _ids(page)
+            if not page.has_next:
+                break
+            page = audit_service.paginate_audit_log(criteria, after=page.next_cursor, per_page=10)
+
+        expected = [log.id for log in AuditLog.query.filter(criteria)
+                    .order_by(AuditLog.timestamp.desc(), AuditLog.id.desc())]
+        assert seen == expected
+
+    def test_backward_returns_previous_page(self, database):
+        """Тест: Курсор "назад" возвращает ту же страницу, с которой пришли."""
+        _add_logs(30)
+        first = audit_service.paginate_audit_log(per_page=10)
+        second = audit_service.paginate_audit_log(after=first.next_cursor, per_page=10)
+        third = audit_service.paginate_audit_log(after=second.next_cursor, per_page=10)
+
+        back = audit_service.paginate_audit_log(before=third.prev_cursor, per_page=10)
+        assert _ids(back) == _ids(second)
+        assert back.has_prev and back.has_next
+        assert not audit_service.paginate_audit_log(before=second.prev_cursor, per_page=10).has_prev
+
+    def test_equal_timestamps_are_ordered_by_id(self, database):
+        """Тест: Записи с одинаковым временем не теряются и не повторяются на границе страниц."""
+        _add_logs(7, timestamp=datetime.datetime(2025, 1, 1, 8, 0))
+        first = audit_service.paginate_audit_log(per_page=4)
+        second = audit_service.paginate_audit_log(after=first.next_cursor, per_page=4)
+
+        assert sorted(_ids(first) + _ids(second), reverse=True) == _ids(first) + _ids(second)
+        assert len(set(_ids(first) + _ids(second))) == 7
+        assert not second.has_next
+
+    def test_invalid_cursor_opens_first_page(self, database):
+        """Тест: Некорректный курсор в адресе открывает первую страницу."""
+        _add_logs(3)
+        page = audit_service.paginate_audit_log(after='garbage')
+
+        assert len(page.items) == 3
+        assert not page.has_prev
+
+    def test_no_approximate_count_on_sqlite(self, database):
+        """Тест: Для SQLite оценка числа записей не считается."""
+        _add_logs(3)
+        assert audit_service.paginate_audit_log().approximate_total is None
+
+    @pytest.mark.parametrize('direction', ['after', 'before'])
+    def test_cursor_bounds_index_range(self, database, direction):
+        """Тест: Курсор ограничивает поиск по индексу (category, timestamp) диапазоном времени."""
+        _add_logs(30)
+        cursor = audit_service.paginate_audit_log(AuditLog.category == 'part', per_page=10).next_cursor
+        statements = []
+
+        def before_cursor_execute(conn, cursor_, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            audit_service.paginate_audit_log(AuditLog.category == 'part', **{direction: cursor})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        statement, parameters = next((statement, parameters) for statement, parameters in statements
+                                     if 'FROM "AuditLogs"' in statement)
+        rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+        plan = ' | '.join(row[-1] for row in rows)
+
+        bound = '<' if direction == 'after' else '>'
+        assert f'ix_AuditLogs_category_timestamp (category=? AND timestamp{bound}' in plan, plan
+        # Граница по времени задана отдельным условием: PostgreSQL не берет ее из сравнения кортежей
+        assert f'"AuditLogs".timestamp {bound}= ?' in statement, statement
+
+    def test_log_page_navigation_links(self, client, auth_client, database):
+        """Тест: Страница журнала показывает ссылку на следующую страницу по курсору и открывает ее."""
+        _add_logs(30)
+        client = auth_client('admin', 'password123')
+
+        response = client.get(url_for('admin.user.audit_log'))
+        next_cursor = audit_service.paginate_audit_log(AuditLog.category == 'part').next_cursor
+        assert f'after={next_cursor}' in response.data.decode('utf-8')
+
+        response = client.get(url_for('admin.user.audit_log', after=next_cursor))
+        assert response.status_code == 200
+        assert 'Действие 4' in response.data.decode('utf-8')
+        assert 'Действие 5' not in response.data.decode('utf-8')
+
+
+@pytest.fixture
+def async_audit(app, monkeypatch):
+    """Включает фоновую запись журнала на время теста и дописывает очередь после него."""
+    monkeypatch.setitem(app.config, 'AUDIT_ASYNC_ENABLED', True)
+    yield audit_service.audit_writer
+    audit_service.audit_writer.stop()
+
+
+def _entry(admin_id, i):
+    return {'user_id': admin_id, 'part_id': None, 'action': f"Событие {i}", 'details': None,
+            'category': 'part', 'timestamp': datetime.datetime(2025, 1, 1, 8, 0)}
+
+
+class TestAuditWriter:
+    """Тесты синхронной и фоновой записи журнала аудита."""
+
+    def test_sync_record_joins_request_transaction(self, database):
+        """Тест: При выключенной фоновой записи запись добавляется в текущую сессию."""
+        admin = User.query.filter_by(username='admin').first()
+        assert audit_service.record("Генерация QR", user_id=admin.id, part_id='TEST-001', category='part')
+        db.session.rollback()
+        assert AuditLog.query.filter_by(action="Генерация QR").count() == 0
+
+    def test_informational_record_is_written_in_background(self, database, async_audit):
+        """Тест: Информационная запись уходит в очередь и записывается фоновым потоком."""
+        admin = User.query.filter_by(username='admin').first()
+        assert not audit_service.record("Генерация QR", user_id=admin.id, part_id='TEST-001', category='part')
+        db.session.commit()
+        async_audit.flush()
+
+        db.session.expire_all()
+        log = AuditLog.query.filter_by(action="Генерация QR").one()
+        assert log.part_id == 'TEST-001'
+        assert log.timestamp is not None
+
+    def test_background_record_waits_for_commit(self, database, async_audit):
+        """Тест: Фоновая запись уходит в очередь только после коммита и отбрасывается при откате."""
+        admin = User.query.filter_by(username='admin').first()
+        audit_service.record("Генерация QR", user_id=admin.id, part_id='TEST-001', category='part')
+        assert async_audit.stats()['queued'] == 0
+        db.session.rollback()
+        db.session.commit()
+        async_audit.flush()
+
+        db.session.expire_all()
+        assert AuditLog.query.filter_by(action="Генерация QR").count() == 0
+
+    def test_security_record_stays_synchronous(self, database, async_audit):
+        """Тест: Записи категории входа пишутся в транзакции запроса даже при фоновой записи."""
+        admin = User.query.filter_by(username='admin').first()
+        assert audit_service.record("Вход в систему", user_id=admin.id, category='auth')
+        assert audit_service.record("Примечание", user_id=admin.id, category='part',
+                                    durability=audit_service.SYNC)
+
+    def test_entries_are_written_in_batches(self, app, database):
+        """Тест: Накопившиеся записи пишутся многострочными INSERT пачками до batch_size."""
+        admin_id = User.query.filter_by(username='admin').first().id
+        writer = audit_service.AuditWriter(batch_size=50, flush_interval=0.05)
+        writer.init_app(app)
+        writer.batch_size = 50  # init_app берет размер пачки из конфигурации
+        for i in range(120):
+            writer._queue.put(_entry(admin_id, i))
+        writer._ensure_started()
+        writer.flush()
+        writer.stop()
+
+        assert writer.stats()['written'] == 120
+        assert writer.stats()['batches'] == 3
+        assert AuditLog.query.filter(AuditLog.action.like("Событие %")).count() == 120
+
+    def test_broken_entry_does_not_lose_batch(self, app, database):
+        """Тест: Ошибочная запись отбрасывается, остальные записи пачки сохраняются."""
+        admin_id = User.query.filter_by(username='admin').first().id
+        writer = audit_service.AuditWriter(flush_interval=0.05)
+        writer.init_app(app)
+        broken = dict(_entry(admin_id, 'x'), user_id=None)
+        for entry in (_entry(admin_id, 1), broken, _entry(admin_id, 2)):
+            writer._queue.put(entry)
+        writer._ensure_started()
+        writer.flush()
+        writer.stop()
+
+        assert writer.stats()['written'] == 2
+        assert writer.stats()['dropped'] == 1
+
+    def test_stop_drains_queue(self, app, database):
+        """Тест: При остановке очередь дописывается полностью."""
+        admin_id = User.query.filter_by(username='admin').first().id
+        writer = audit_service.AuditWriter(flush_interval=0.05)
+        writer.init_app(app)
+        for i in range(10):
+            writer.enqueue(_entry(admin_id, i))
+        writer.stop()
+
+        assert AuditLog.query.filter(AuditLog.action.like("Событие %")).count() == 10
+
+    def test_qr_download_does_not_commit_in_request(self, client, auth_client, database, async_audit):
+        """Тест: Загрузка QR-кода пишет журнал через фоновую очередь."""
+        client = auth_client('admin', 'password123')
+        response = client.post(url_for('admin.part.generate_single_qr', part_id='TEST-001'))
+        assert response.status_code == 200
+        async_audit.flush()
+
+        db.session.expire_all()
+        assert AuditLog.query.filter_by(action="Генерация QR", part_id='TEST-001').count() == 1
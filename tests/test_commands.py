@@ -98,4 +98,60 @@ class TestSeedCypressCommand:
         assert User.query.filter_by(username='admin').first() is not None
         assert db.session.get(Part, 'CY-TEST-001') is not None
         assert Stage.query.filter_by(name='Резка').first() is not None
-        assert RouteTemplate.query.filter_by(is_default=True).first() is not None
\ No newline at end of file
+        assert RouteTemplate.query.filter_by(is_default=True).first() is not None
+
+class TestExportAnalyticsCommand:
+    """Тесты для команды `flask export-analytics`."""
+
+    def test_export_analytics_writes_parquet(self, runner, app, database, tmp_path):
+        """Тест: `export-analytics` выгружает наборы данных в указанный каталог."""
+        result = runner.invoke(app.cli.get_command(None, 'export-analytics'), ['--output', str(tmp_path)])
+
+        assert result.exit_code == 0
+        assert 'Выгрузка завершена.' in result.output
+        assert (tmp_path / '_watermark.json').exists()
+        assert (tmp_path / 'parts').is_dir()
+
+    def test_help_describes_incremental_limits(self, runner, app):
+        """Тест: справка команды предупреждает, что удаления попадают в выгрузку только с --full."""
+        result = runner.invoke(app.cli.get_command(None, 'export-analytics'), ['--help'])
+
+        assert result.exit_code == 0
+        help_text = ' '.join(result.output.split())
+        assert 'Отмененные этапы' in help_text
+        assert 'с --full' in help_text
+
+
+class TestSeedBenchCommand:
+    """Тесты для команды `flask seed-bench`."""
+
+    def test_seed_bench_loads_and_reloads_synthetic_data(self, runner, app, database):
+        """Тест: `seed-bench` загружает данные, повторный запуск требует --clear."""
+        command = app.cli.get_command(None, 'seed-bench')
+        options = ['--products', '2', '--depth', '1', '--fanout', '2']
+
+        result = runner.invoke(command, options)
+        assert result.exit_code == 0
+        assert 'parts: 6 строк' in result.output
+
+        result = runner.invoke(command, options)
+        assert result.exit_code != 0
+        assert '--clear' in result.output
+
+        result = runner.invoke(command, options + ['--clear'])
+        assert result.exit_code == 0
+        assert Part.query.filter(Part.part_id.like('SYN-%')).count() == 6
+
+
+class TestSeedScaleCommand:
+    """Тесты для команды `flask seed-scale`."""
+
+    def test_seed_scale_generates_requested_parts(self, runner, app, database):
+        """Тест: `seed-scale` создает заданное число деталей и сообщает о вставленных строках."""
+        result = runner.invoke(app.cli.get_command(None, 'seed-scale'), [
+            '--parts', '50', '--stages', '6', '--routes', '3', '--users', '4', '--days', '20',
+            '--until', '2026-06-01'])
+
+        assert result.exit_code == 0, result.output
+        assert 'parts: 50 строк' in result.output
+        assert Part.query.filter(Part.part_id.like('SYN-%')).count() == 50
@@ -0,0 +1,51 @@
+# tests/test_export_service.py
+
+import datetime
+import pandas as pd
+
+from app import db
+from app.models.models import StatusHistory, AuditLog, User
+from app.services import export_service
+
+
+class TestExportService:
+    """Тесты выгрузки аналитических данных в Parquet."""
+
+    def _add_history(self, timestamp, operator_name='Тестер'):
+        db.session.add(StatusHistory(part_id='TEST-001', status='Резка', operator_name=operator_name,
+                                     quantity=1, timestamp=timestamp))
+        db.session.commit()
+
+    def test_export_is_partitioned_by_month(self, database, tmp_path):
+        """Тест: Строки истории раскладываются по месячным разделам и читаются pandas."""
+        self._add_history(datetime.datetime(2025, 1, 15, 10, 0))
+        self._add_history(datetime.datetime(2025, 2, 3, 10, 0))
+        admin = User.query.filter_by(username='admin').first()
+        db.session.add(AuditLog(part_id='TEST-001', user_id=admin.id, action='Создание', category='part'))
+        db.session.commit()
+
+        summary = export_service.export_analytics(str(tmp_path), batch_size=1)
+
+        assert summary == {'status_history': 2, 'audit_log': 1, 'parts': 1}
+        assert (tmp_path / 'status_history' / 'month=2025-01').is_dir()
+        assert (tmp_path / 'status_history' / 'month=2025-02').is_dir()
+        history_df = pd.read_parquet(tmp_path / 'status_history')
+        assert sorted(history_df['status_type'].unique()) == ['completed']
+        assert len(history_df) == 2
+
+    def test_incremental_export_uses_watermark(self, database, tmp_path):
+        """Тест: Повторная выгрузка добавляет только новые строки, --full пересобирает набор."""
+        self._add_history(datetime.datetime(2025, 1, 15, 10, 0))
+        export_service.export_analytics(str(tmp_path))
+
+        self._add_history(datetime.datetime(2025, 1, 20, 10, 0), operator_name='Новый')
+        summary = export_service.export_analytics(str(tmp_path))
+
+        assert summary['status_history'] == 1
+        history_df = pd.read_parquet(tmp_path / 'status_history')
+        assert len(history_df) == 2
+        assert export_service.read_watermarks(str(tmp_path))['status_history'] == int(history_df['id'].max())
+
+        summary = export_service.export_analytics(str(tmp_path), full=True)
+        assert summary['status_history'] == 2
+        assert len(pd.read_parquet(tmp_path / 'status_history')) == 2
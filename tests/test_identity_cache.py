@@ -0,0 +1,134 @@
+# tests/test_identity_cache.py
+
+from flask import g, url_for
+from sqlalchemy import text
+
+from app.models.models import Permission, Role, User
+from app.services import cache_versions, identity_cache, query_stats
+
+
+def _identity_queries(stats) -> list:
+    return [shape for shape in stats.shapes if '"Users"' in shape or '"Roles"' in shape]
+
+
+def _get(client, url):
+    """
+    GET в новом запросе. Фикстура db держит один контекст приложения на весь тест,
+    и Flask-Login запомнил бы пользователя в g между запросами.
+    """
+    g.pop('_login_user', None)
+    return client.get(url)
+
+
+def _snapshot(client) -> dict:
+    with client.session_transaction() as session:
+        return session.get(identity_cache.SESSION_KEY)
+
+
+class TestIdentityCache:
+    """Тесты для кэша пользователя и прав в сессии."""
+
+    def test_login_stores_snapshot(self, database, auth_client):
+        """Тест: вход сохраняет в сессии снимок пользователя и прав роли."""
+        client = auth_client('manager', 'password123')
+        data = _snapshot(client)
+        manager = User.query.filter_by(username='manager').first()
+        assert data['id'] == manager.id
+        assert data['role_name'] == 'Manager'
+        assert data['permissions'] == manager.role.permissions
+
+    def test_page_view_without_identity_queries(self, app, database, auth_client):
+        """Тест: страница авторизованного пользователя не запрашивает пользователя и роль из БД."""
+        client = auth_client('admin', 'password123')
+        _get(client, '/')
+        with app.test_request_context():
+            url = url_for('admin.management.admin_page')
+        with query_stats.collect() as stats:
+            response = _get(client, url)
+        assert response.status_code == 200
+        assert _identity_queries(stats) == []
+
+    def test_user_load_is_single_joined_query(self, app, database, client):
+        """Тест: без снимка пользователь и роль загружаются одним запросом."""
+        admin = User.query.filter_by(username='admin').first()
+        with app.test_request_context():
+            with query_stats.collect() as stats:
+                user = identity_cache.load_user(str(admin.id))
+                assert user.is_admin()
+        assert len(_identity_queries(stats)) == 1
+
+    def test_user_restored_from_snapshot(self, app, database):
+        """Тест: при актуальном снимке пользователь и роль восстанавливаются без запросов."""
+        admin = User.query.filter_by(username='admin').first()
+        with app.test_request_context():
+            identity_cache.remember(admin)
+            database.session.expunge_all()
+            with query_stats.collect() as stats:
+                user = identity_cache.load_user(str(admin.id))
+                assert user.username == 'admin'
+                assert user.is_admin()
+            assert stats.count == 0
+            # Незагруженные поля догружаются из БД
+            assert user.check_password('password123')
+
+    def test_role_change_applies_on_next_request(self, app, database, auth_client):
+        """Тест: изменение прав роли действует со следующего запроса."""
+        client = auth_client('manager', 'password123')
+        with app.test_request_context():
+            url = url_for('admin.report.reports_index')
+        assert _get(client, url).status_code == 200
+
+        role = Role.query.filter_by(name='Manager').first()
+        role.permissions = Permission.GENERATE_QR
+        database.session.commit()
+
+        assert _get(client, url).status_code == 302
+        assert _snapshot(client)['permissions'] == Permission.GENERATE_QR
+
+    def test_edit_role_route_invalidates_snapshot(self, app, database, auth_client):
+        """Тест: редактирование роли в админ-панели сбрасывает снимки ее пользователей."""
+        client = auth_client('admin', 'password123')
+        role = Role.query.filter_by(name='Administrator').first()
+        version = cache_versions.current(identity_cache.VERSION_NAME)
+        with app.test_request_context():
+            url = url_for('admin.user.edit_role', role_id=role.id)
+        client.post(url, data={'name': 'Administrator',
+                               'permissions': [Permission.ADMIN, Permission.VIEW_REPORTS]})
+        assert cache_versions.current(identity_cache.VERSION_NAME) == version + 1
+        _get(client, '/')
+        assert _snapshot(client)['version'] == version + 1
+
+    def test_version_change_in_other_process(self, app, database, auth_client):
+        """Тест: версия, увеличенная другим процессом, замечается после перепроверки."""
+        client = auth_client('manager', 'password123')
+        old_version = _snapshot(client)['version']
+        # Запись в обход ORM, как ее увидел бы процесс, не выполнявший изменение
+        database.session.execute(text('DELETE FROM "CacheVersions" WHERE name = :name'),
+                                 {'name': identity_cache.VERSION_NAME})
+        database.session.execute(text('INSERT INTO "CacheVersions" (name, version) VALUES (:name, :version)'),
+                                 {'name': identity_cache.VERSION_NAME, 'version': old_version + 5})
+        database.session.commit()
+        cache_versions.versions.expire()
+
+        _get(client, '/')
+        assert _snapshot(client)['version'] == old_version + 5
+
+    def test_deleted_user_is_logged_out(self, app, database, auth_client):
+        """Тест: удаленный пользователь теряет сессию, несмотря на снимок."""
+        client = auth_client('operator', 'password123')
+        operator = User.query.filter_by(username='operator').first()
+        database.session.delete(operator)
+        database.session.commit()
+        with app.test_request_context():
+            url = url_for('admin.management.admin_page')
+        response = _get(client, url)
+        assert response.status_code in (302, 401, 403)
+        assert _snapshot(client) is None
+
+    def test_logout_clears_snapshot(self, app, database, auth_client):
+        """Тест: выход удаляет снимок из сессии."""
+        client = auth_client('admin', 'password123')
+        with app.test_request_context():
+            logout_url = url_for('admin.user.logout')
+        _get(client, logout_url)
+        assert _snapshot(client) is None
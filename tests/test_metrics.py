@@ -0,0 +1,111 @@
+# tests/test_metrics.py
+
+import pytest
+from flask import Flask, url_for
+
+from app import socketio
+from app.services import metrics
+from app.utils import generate_qr_code, qr_cache_info
+
+
+class TestMetricTypes:
+    """Тесты для счетчиков, показателей и гистограмм."""
+
+    def test_histogram_renders_cumulative_buckets(self):
+        """Тест: гистограмма экспортирует накопительные корзины, сумму и число наблюдений."""
+        histogram = metrics.Histogram('test_latency_seconds', 'Тестовая гистограмма.', ('kind',), buckets=(0.1, 1.0))
+        try:
+            histogram.observe(0.05, kind='a')
+            histogram.observe(0.5, kind='a')
+            histogram.observe(5, kind='a')
+            lines = histogram.render()
+        finally:
+            metrics._registry.remove(histogram)
+
+        assert '# TYPE test_latency_seconds histogram' in lines
+        assert 'test_latency_seconds_bucket{kind="a",le="0.1"} 1' in lines
+        assert 'test_latency_seconds_bucket{kind="a",le="1.0"} 2' in lines
+        assert 'test_latency_seconds_bucket{kind="a",le="+Inf"} 3' in lines
+        assert 'test_latency_seconds_sum{kind="a"} 5.55' in lines
+        assert 'test_latency_seconds_count{kind="a"} 3' in lines
+
+    def test_labels_are_escaped_and_checked(self):
+        """Тест: значения меток экранируются, неверный набор меток отклоняется."""
+        counter = metrics.Counter('test_events_total', 'Тестовый счетчик.', ('name',))
+        try:
+            counter.inc(name='a "b"\nc')
+            assert 'test_events_total{name="a \\"b\\"\\nc"} 1' in counter.render()
+            with pytest.raises(ValueError):
+                counter.inc(other='x')
+        finally:
+            metrics._registry.remove(counter)
+
+    def test_track_job_counts_failures(self):
+        """Тест: ошибка фоновой задачи учитывается и пробрасывается дальше."""
+        before = metrics.job_failures.value(job='test_job')
+        with pytest.raises(RuntimeError):
+            with metrics.track_job('test_job'):
+                raise RuntimeError('сбой')
+        assert metrics.job_failures.value(job='test_job') == before + 1
+        assert metrics.job_duration.count(job='test_job') >= 1
+
+
+class TestMetricsEndpoint:
+    """Тесты для эндпоинта /metrics."""
+
+    def test_request_latency_is_exported(self, app, database, client):
+        """Тест: запрос страницы попадает в счетчик и гистограмму по эндпоинту."""
+        with app.test_request_context():
+            client.get(url_for('main.dashboard'))
+            response = client.get(url_for('metrics'))
+
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain; version=0.0.4')
+        body = response.get_data(as_text=True)
+        assert 'http_requests_total{blueprint="main",endpoint="main.dashboard",method="GET",status="200"}' in body
+        assert 'http_request_duration_seconds_bucket{blueprint="main",endpoint="main.dashboard",le="+Inf"}' in body
+        assert 'db_query_duration_seconds_count' in body
+        # Сам сбор метрик в счетчики запросов не попадает
+        assert 'endpoint="metrics"' not in body
+
+    def test_token_required_when_configured(self, app, database, client, monkeypatch):
+        """Тест: при METRICS_TOKEN метрики отдаются только с верным токеном."""
+        monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'secret')
+        with app.test_request_context():
+            url = url_for('metrics')
+        assert client.get(url).status_code == 401
+        assert client.get(url, headers={'Authorization': 'Bearer wrong'}).status_code == 401
+        assert client.get(url, headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+    def test_not_exposed_without_token_in_production(self):
+        """Тест: без METRICS_TOKEN вне отладки и тестов /metrics не регистрируется."""
+        production = Flask(__name__)
+        production.config.update(METRICS_ENABLED=True, METRICS_TOKEN=None)
+
+        metrics.init_app(production)
+
+        assert 'metrics' not in production.view_functions
+        assert not production.before_request_funcs
+
+    def test_socketio_clients_and_emits(self, app, database):
+        """Тест: подключения Socket.IO и отправленные события учитываются."""
+        connected = metrics.socketio_connected.value()
+        emitted = metrics.socketio_emits.value(event='notification')
+
+        socket_client = socketio.test_client(app)
+        assert metrics.socketio_connected.value() == connected + 1
+        with app.test_request_context():
+            metrics.emit('notification', {'message': 'тест'})
+        socket_client.disconnect()
+
+        assert metrics.socketio_connected.value() == connected
+        assert metrics.socketio_emits.value(event='notification') == emitted + 1
+
+    def test_qr_cache_hits(self):
+        """Тест: повторный QR-код для той же детали берется из кэша."""
+        hits = qr_cache_info().hits
+        first = generate_qr_code('METRICS-QR-1').getvalue()
+        second = generate_qr_code('METRICS-QR-1').getvalue()
+        assert first == second
+        assert qr_cache_info().hits == hits + 1
+        assert f'qr_cache_requests_total{{result="hit"}} {hits + 1}' in metrics.render()
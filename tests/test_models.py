@@ -1,7 +1,9 @@
 # tests/test_models.py
 
+from datetime import datetime, timedelta
+
 from app import db
-from app.models.models import Role, Permission, User
+from app.models.models import Role, Permission, User, Part, StatusHistory
 
 def test_role_permission_management(database):
     """Тест: Проверяет добавление, проверку и удаление прав у роли."""
@@ -90,4 +92,21 @@ def test_user_default_role(database):
     
     # Проверяем, что права соответствуют роли по умолчанию
     assert new_user.can(Permission.GENERATE_QR)
-    assert not new_user.can(Permission.ADD_PARTS)
\ No newline at end of file
+    assert not new_user.can(Permission.ADD_PARTS)
+
+def test_status_history_duration_is_stored_on_insert(database):
+    """Тест: Длительность этапа вычисляется при вставке от даты создания и от предыдущего этапа."""
+    part = db.session.get(Part, 'TEST-001')
+    start = datetime(2025, 1, 1, 8, 0, 0)
+    part.date_added = start
+    db.session.commit()
+
+    first = StatusHistory(part_id='TEST-001', status='Резка', operator_name='Op', timestamp=start + timedelta(hours=2))
+    db.session.add(first)
+    db.session.commit()
+    second = StatusHistory(part_id='TEST-001', status='Сверловка', operator_name='Op', timestamp=start + timedelta(hours=5))
+    db.session.add(second)
+    db.session.commit()
+
+    assert first.duration_seconds == 2 * 3600
+    assert second.duration_seconds == 3 * 3600
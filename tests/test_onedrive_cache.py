@@ -0,0 +1,137 @@
+# tests/test_onedrive_cache.py
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+
+from app.services import graph_service
+from app.services.onedrive_cache import OneDriveFileCache
+
+ITEM_PREFIX = '/v1.0/users/test_user_id/drive/root:'
+
+
+class _StubOneDriveHandler(BaseHTTPRequestHandler):
+    """
+    Заглушка Graph API для одного диска: `server.files` = {путь: (содержимое, eTag, cTag)}.
+    Метаданные поддерживают If-None-Match, содержимое отдается по `:/content`.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body=b'', content_type='application/octet-stream'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0][len(ITEM_PREFIX):]
+        is_content = path.endswith(':/content')
+        if is_content:
+            path = path[:-len(':/content')]
+        if path not in self.server.files:
+            return self._send(404)
+        content, etag, ctag = self.server.files[path]
+        if is_content:
+            self.server.downloads.append(path)
+            return self._send(200, content)
+        self.server.metadata_requests.append(path)
+        if self.headers.get('If-None-Match') == etag:
+            return self._send(304)
+        body = json.dumps({'eTag': etag, 'cTag': ctag, 'size': len(content)}).encode()
+        return self._send(200, body, 'application/json')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_onedrive(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubOneDriveHandler)
+    server.files = {}
+    server.downloads = []
+    server.metadata_requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("MS_GRAPH_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1.0")
+    monkeypatch.setenv("MS_ONEDRIVE_USER_ID", "test_user_id")
+    with patch('app.services.graph_service._get_access_token', return_value='fake_token'):
+        yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestOneDriveFileCache:
+    """Тесты дискового кэша файлов OneDrive против заглушки Graph API."""
+
+    def test_unchanged_file_is_served_from_disk(self, stub_onedrive, tmp_path):
+        """Тест: Повторный запрос неизмененного файла обходится проверкой метаданных (304)."""
+        stub_onedrive.files['/book.xlsx'] = (b'v1', '"etag-1"', '"ctag-1"')
+        cache = OneDriveFileCache(str(tmp_path), max_bytes=1024)
+
+        assert cache.get('/book.xlsx') == b'v1'
+        assert cache.get('/book.xlsx') == b'v1'
+
+        assert stub_onedrive.downloads == ['/book.xlsx']
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 1
+
+    def test_changed_content_is_downloaded_again(self, stub_onedrive, tmp_path):
+        """Тест: При новом cTag файл скачивается заново."""
+        stub_onedrive.files['/book.xlsx'] = (b'v1', '"etag-1"', '"ctag-1"')
+        cache = OneDriveFileCache(str(tmp_path), max_bytes=1024)
+        cache.get('/book.xlsx')
+
+        stub_onedrive.files['/book.xlsx'] = (b'v2', '"etag-2"', '"ctag-2"')
+        assert cache.get('/book.xlsx') == b'v2'
+        assert len(stub_onedrive.downloads) == 2
+
+    def test_metadata_only_change_keeps_cached_content(self, stub_onedrive, tmp_path):
+        """Тест: Изменение только метаданных (новый eTag, прежний cTag) не вызывает скачивания."""
+        stub_onedrive.files['/book.xlsx'] = (b'v1', '"etag-1"', '"ctag-1"')
+        cache = OneDriveFileCache(str(tmp_path), max_bytes=1024)
+        cache.get('/book.xlsx')
+
+        stub_onedrive.files['/book.xlsx'] = (b'v1', '"etag-2"', '"ctag-1"')
+        assert cache.get('/book.xlsx') == b'v1'
+        assert cache.get('/book.xlsx') == b'v1'
+        assert stub_onedrive.downloads == ['/book.xlsx']
+
+    def test_lru_eviction_by_size(self, stub_onedrive, tmp_path):
+        """Тест: При превышении лимита удаляется файл, к которому дольше всего не обращались."""
+        for name in ('a', 'b', 'c'):
+            stub_onedrive.files[f'/{name}.xlsx'] = (name.encode() * 40, f'"e-{name}"', f'"c-{name}"')
+        cache = OneDriveFileCache(str(tmp_path), max_bytes=100)
+
+        cache.get('/a.xlsx')
+        cache.get('/b.xlsx')
+        cache.get('/a.xlsx')  # "a" становится самым свежим
+        cache.get('/c.xlsx')  # 120 байт > 100: вытесняется "b"
+
+        keys = list(cache._entries)
+        assert keys == [cache.make_key('/a.xlsx'), cache.make_key('/c.xlsx')]
+        assert cache.stats()['evictions'] == 1
+        assert len([f for f in tmp_path.iterdir() if f.name != 'index.json']) == 2
+
+    def test_index_survives_restart(self, stub_onedrive, tmp_path):
+        """Тест: Новый экземпляр кэша в том же каталоге использует ранее скачанные файлы."""
+        stub_onedrive.files['/book.xlsx'] = (b'v1', '"etag-1"', '"ctag-1"')
+        OneDriveFileCache(str(tmp_path), max_bytes=1024).get('/book.xlsx')
+
+        assert OneDriveFileCache(str(tmp_path), max_bytes=1024).get('/book.xlsx') == b'v1'
+        assert stub_onedrive.downloads == ['/book.xlsx']
+
+    def test_missing_file_raises_not_found(self, stub_onedrive, tmp_path):
+        """Тест: Отсутствующий в OneDrive файл дает FileNotFoundError."""
+        cache = OneDriveFileCache(str(tmp_path), max_bytes=1024)
+        with pytest.raises(FileNotFoundError):
+            cache.get('/missing.xlsx')
+
+    def test_metadata_not_modified_returns_none(self, stub_onedrive):
+        """Тест: Метаданные с совпадающим If-None-Match возвращают None."""
+        stub_onedrive.files['/book.xlsx'] = (b'v1', '"etag-1"', '"ctag-1"')
+        assert graph_service.get_onedrive_item_metadata('/book.xlsx')['cTag'] == '"ctag-1"'
+        assert graph_service.get_onedrive_item_metadata('/book.xlsx', etag='"etag-1"') is None
@@ -2,12 +2,17 @@
 
 import pytest
 import io
+import os
+import datetime
 from unittest.mock import patch, MagicMock
+from sqlalchemy import event
 from werkzeug.datastructures import FileStorage
 
 from app import db
 from app.services import part_service
-from app.models.models import Part, RouteTemplate, Stage, User, StatusHistory, AuditLog, AssemblyComponent
+from app.services.report_cache import report_cache
+from app.models.models import (Part, RouteTemplate, Stage, User, StatusHistory, AuditLog, AssemblyComponent,
+                               PartNote, ResponsibleHistory)
 
 
 @pytest.fixture
@@ -79,7 +84,7 @@ class TestPartService:
         with pytest.raises(ValueError, match="Не удалось прочитать файл. Убедитесь, что он не поврежден."):
             part_service.import_parts_from_excel(unsupported_file, admin_user, {})
 
-    @patch('app.services.part_service.socketio.emit')
+    @patch('app.services.metrics.socketio.emit')
     def test_websocket_notification_on_create(self, mock_emit, database):
         """Тест: Проверяет, что при создании детали отправляется WebSocket-уведомление."""
         admin_user = User.query.filter_by(username='admin').first()
@@ -148,4 +153,94 @@ class TestPartService:
         RouteTemplate.query.filter_by(is_default=True).delete()
         db.session.commit()
         with pytest.raises(ValueError, match="Не найден маршрут по умолчанию"):
-            part_service.import_parts_from_excel(mock_csv_file, admin_user, {})
\ No newline at end of file
+            part_service.import_parts_from_excel(mock_csv_file, admin_user, {})
+
+
+def _add_parts(count, prefix='BULK'):
+    """Создает детали с историей, примечанием и сменой ответственного."""
+    route = RouteTemplate.query.first()
+    admin = User.query.filter_by(username='admin').first()
+    part_ids = [f"{prefix}-{i:04d}" for i in range(count)]
+    for part_id in part_ids:
+        db.session.add(Part(part_id=part_id, product_designation='Изделие', name='Деталь', material='Ст3',
+                            route_template_id=route.id))
+        db.session.add(StatusHistory(part_id=part_id, status='Резка', operator_name='Оп',
+                                     timestamp=datetime.datetime(2025, 1, 10, 12, 0)))
+        db.session.add(PartNote(part_id=part_id, user_id=admin.id, text='Примечание'))
+        db.session.add(ResponsibleHistory(part_id=part_id, user_id=admin.id))
+    db.session.commit()
+    return part_ids
+
+
+def _count_statements(fn):
+    """Число SQL-запросов, выполненных за время вызова `fn`."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements)
+
+
+class TestBulkDelete:
+    """Тесты массового удаления деталей."""
+
+    def test_deletes_parts_with_dependent_rows(self, database):
+        """Тест: Удаляются детали, их история, примечания, ответственные и связи сборок; журнал пишется по каждой."""
+        admin = User.query.filter_by(username='admin').first()
+        part_ids = _add_parts(3)
+        db.session.add(AssemblyComponent(parent_id='TEST-001', child_id=part_ids[0], quantity=1))
+        db.session.commit()
+
+        assert part_service.delete_multiple_parts(part_ids + ['MISSING'], admin, {}) == 3
+
+        assert Part.query.filter(Part.part_id.in_(part_ids)).count() == 0
+        assert StatusHistory.query.filter(StatusHistory.part_id.in_(part_ids)).count() == 0
+        assert PartNote.query.count() == 0
+        assert ResponsibleHistory.query.count() == 0
+        assert AssemblyComponent.query.count() == 0
+        assert db.session.get(Part, 'TEST-001') is not None
+        logged = {log.part_id for log in AuditLog.query.filter_by(action='Массовое удаление')}
+        assert logged == set(part_ids)
+
+    def test_statement_count_does_not_grow_with_parts(self, database):
+        """Тест: Число запросов не зависит от количества удаляемых деталей."""
+        admin = User.query.filter_by(username='admin').first()
+        few = _add_parts(3, 'FEW')
+        many = _add_parts(60, 'MANY')
+
+        few_statements = _count_statements(lambda: part_service.delete_multiple_parts(few, admin, {}))
+        many_statements = _count_statements(lambda: part_service.delete_multiple_parts(many, admin, {}))
+
+        assert many_statements == few_statements
+
+    def test_legacy_drawings_are_removed(self, database, tmp_path):
+        """Тест: Файлы чертежей старого формата удаляются после коммита."""
+        admin = User.query.filter_by(username='admin').first()
+        drawing_path = tmp_path / '20240101120000_plan.png'
+        drawing_path.write_bytes(b'legacy')
+        part = db.session.get(Part, 'TEST-001')
+        part.drawing_filename = drawing_path.name
+        db.session.commit()
+
+        part_service.delete_multiple_parts(['TEST-001'], admin, {'DRAWING_UPLOAD_FOLDER': str(tmp_path),
+                                                                 'DRAWING_THUMBNAILS_ASYNC': False})
+
+        assert not os.path.exists(drawing_path)
+
+    def test_invalidates_report_cache_for_history_days(self, app, database):
+        """Тест: Удаление истории за прошлый день сбрасывает закэшированные отчеты за этот день."""
+        admin = User.query.filter_by(username='admin').first()
+        part_ids = _add_parts(2)
+        report_cache.clear()
+        report_cache.get_or_compute('r', lambda: 1, datetime.date(2025, 1, 1), datetime.date(2025, 1, 31))
+
+        part_service.delete_multiple_parts(part_ids, admin, {})
+
+        assert report_cache.stats()['entries'] == 0
+        report_cache.clear()
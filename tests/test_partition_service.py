@@ -0,0 +1,162 @@
+# tests/test_partition_service.py
+
+import datetime
+import gzip
+import os
+
+import flask_migrate
+import pytest
+from click.testing import CliRunner
+from sqlalchemy import text
+
+from app import create_app, db
+from app.models.models import AuditLog, Role, User
+from app.services import partition_service
+from config import TestingConfig
+
+
+class TestPartitionHelpers:
+    """Тесты для вспомогательных функций секционирования."""
+
+    def test_add_months_crosses_year_boundary(self):
+        """Тест: сдвиг по месяцам корректно переходит через границу года."""
+        assert partition_service.add_months(datetime.date(2025, 11, 1), 3) == datetime.date(2026, 2, 1)
+        assert partition_service.add_months(datetime.date(2025, 1, 1), -1) == datetime.date(2024, 12, 1)
+        assert partition_service.add_months(datetime.date(2025, 1, 1), 0) == datetime.date(2025, 1, 1)
+
+    def test_partition_name(self):
+        """Тест: имя раздела содержит год и месяц с ведущим нулем."""
+        assert partition_service.partition_name('AuditLogs', datetime.date(2025, 3, 1)) == 'AuditLogs_p2025_03'
+
+    def test_parse_bound(self):
+        """Тест: границы разбираются из выражения pg_get_expr, раздел по умолчанию дает None."""
+        bound = partition_service.parse_bound(
+            "FOR VALUES FROM ('2025-03-01 00:00:00') TO ('2025-04-01 00:00:00')")
+        assert bound == (datetime.date(2025, 3, 1), datetime.date(2025, 4, 1))
+        assert partition_service.parse_bound('DEFAULT') is None
+
+
+class TestPartitionServiceOnSqlite:
+    """Тесты: вне PostgreSQL обслуживание разделов ничего не делает."""
+
+    def test_not_supported_on_sqlite(self, app, db):
+        """Тест: SQLite не поддерживает секционирование."""
+        assert partition_service.is_supported() is False
+
+    def test_ensure_future_partitions_is_noop(self, app, db):
+        """Тест: создание разделов в SQLite ничего не создает."""
+        assert partition_service.ensure_future_partitions() == []
+
+    def test_archive_partitions_is_noop(self, app, db, tmp_path):
+        """Тест: архивация в SQLite не создает файлов."""
+        assert partition_service.archive_partitions('AuditLogs', 12, str(tmp_path)) == []
+        assert list(tmp_path.iterdir()) == []
+
+    def test_archive_rejects_unknown_table(self, app, db, tmp_path):
+        """Тест: архивировать можно только секционированные таблицы и хотя бы с одним месяцем."""
+        with pytest.raises(ValueError):
+            partition_service.archive_partitions('Parts', 12, str(tmp_path))
+        with pytest.raises(ValueError):
+            partition_service.archive_partitions('AuditLogs', 0, str(tmp_path))
+
+    def test_maintainer_not_started_without_postgresql(self, app):
+        """Тест: фоновое обслуживание не запускается для SQLite."""
+        assert partition_service.start_maintainer(app) is None
+
+    def test_commands_report_unsupported_database(self, app, db):
+        """Тест: CLI-команды сообщают, что секционирование требует PostgreSQL."""
+        runner = CliRunner()
+        for name in ('create-partitions', 'archive-partitions'):
+            result = runner.invoke(app.cli.get_command(None, name))
+            assert result.exit_code == 0
+            assert 'только в PostgreSQL' in result.output
+
+
+# Отдельная пустая база PostgreSQL для тестов секционирования: схема public пересоздается
+POSTGRES_URI = os.environ.get('TEST_POSTGRES_URI')
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), '..', 'migrations')
+
+
+def _reset_schema():
+    db.session.remove()
+    with db.engine.begin() as connection:
+        connection.execute(text('DROP SCHEMA public CASCADE'))
+        connection.execute(text('CREATE SCHEMA public'))
+
+
+@pytest.fixture(scope='module')
+def pg_app():
+    """Приложение над базой TEST_POSTGRES_URI с примененными миграциями."""
+    config = type('PostgresTestingConfig', (TestingConfig,), {'SQLALCHEMY_DATABASE_URI': POSTGRES_URI})
+    flask_app, _ = create_app(config)
+    with flask_app.app_context():
+        _reset_schema()
+        flask_migrate.upgrade(directory=MIGRATIONS_DIR)
+        yield flask_app
+        _reset_schema()
+
+
+@pytest.fixture
+def pg_user(pg_app):
+    Role.insert_roles()
+    user = User.query.filter_by(username='partition-test').first()
+    if user is None:
+        user = User(username='partition-test')
+        db.session.add(user)
+        db.session.commit()
+    return user
+
+
+@pytest.mark.postgres
+@pytest.mark.skipif(not POSTGRES_URI, reason="Нужна база PostgreSQL: TEST_POSTGRES_URI")
+class TestPartitionServiceOnPostgres:
+    """Тесты миграции 5e8c4a7b2d90 и обслуживания разделов в PostgreSQL."""
+
+    def test_migration_partitions_tables(self, pg_app):
+        """Тест: после миграции журналы секционированы и есть раздел текущего месяца."""
+        for table in partition_service.PARTITIONED_TABLES:
+            assert partition_service.is_partitioned(table)
+        partition_service.ensure_future_partitions()
+        months = {start for _, start, _ in partition_service.list_partitions('AuditLogs')}
+        assert partition_service.current_month() in months
+
+    def test_ensure_future_partitions_is_idempotent(self, pg_app):
+        """Тест: повторное создание разделов ничего не создает."""
+        partition_service.ensure_future_partitions(months_ahead=2)
+        assert partition_service.ensure_future_partitions(months_ahead=2) == []
+
+    def test_rows_move_from_default_partition(self, pg_app, pg_user):
+        """Тест: строки месяца без раздела попадают в раздел по умолчанию и переносятся в новый раздел."""
+        db.session.add(AuditLog(user_id=pg_user.id, action='Старое событие',
+                                timestamp=datetime.datetime(2020, 1, 15, 10, 0)))
+        db.session.commit()
+        assert partition_service.ensure_partitions_between(datetime.date(2020, 1, 1), datetime.date(2020, 1, 31)) \
+            == ['AuditLogs_p2020_01', 'StatusHistory_p2020_01']
+        count = db.session.execute(text('SELECT COUNT(*) FROM "AuditLogs_p2020_01"')).scalar()
+        assert count == 1
+
+    def test_maintainer_keeps_old_partitions_by_default(self, pg_app):
+        """Тест: фоновое обслуживание без PARTITION_AUTO_ARCHIVE не удаляет разделы."""
+        partition_service.ensure_partitions_between(datetime.date(2020, 2, 1), datetime.date(2020, 2, 1))
+        maintainer = partition_service.PartitionMaintainer(pg_app, interval=0)
+        maintainer.run_once()
+        assert maintainer.stats()['failures'] == 0
+        names = [name for name, _, _ in partition_service.list_partitions('AuditLogs')]
+        assert 'AuditLogs_p2020_02' in names
+
+    def test_archive_partitions(self, pg_app, pg_user, tmp_path):
+        """Тест: старый раздел выгружается в CSV.gz и удаляется вместе со строками."""
+        partition_service.ensure_partitions_between(datetime.date(2020, 3, 1), datetime.date(2020, 3, 1))
+        db.session.add(AuditLog(user_id=pg_user.id, action='Архивное событие',
+                                timestamp=datetime.datetime(2020, 3, 10, 9, 0)))
+        db.session.commit()
+
+        archived = partition_service.archive_partitions('AuditLogs', 12, str(tmp_path))
+
+        paths = {os.path.basename(path) for path in archived}
+        assert 'AuditLogs_p2020_03.csv.gz' in paths
+        with gzip.open(tmp_path / 'AuditLogs_p2020_03.csv.gz', 'rt', encoding='utf-8') as f:
+            assert 'Архивное событие' in f.read()
+        names = [name for name, _, _ in partition_service.list_partitions('AuditLogs')]
+        assert not any(name.startswith('AuditLogs_p2020') for name in names)
+        assert AuditLog.query.filter_by(action='Архивное событие').count() == 0
@@ -0,0 +1,121 @@
+# tests/test_query_stats.py
+
+import pytest
+from flask import url_for
+
+from app.models.models import Part, StatusHistory, AssemblyComponent, StatusType
+from app.services import query_stats
+from app.services.query_stats import QueryBudgetExceeded
+
+
+def _add_product_parts(db, count, route_id):
+    """Верхнеуровневые детали изделия 'Бюджет' с историей по этапу 'Резка'."""
+    for i in range(count):
+        part_id = f"BUDGET-{i:03d}"
+        db.session.add(Part(part_id=part_id, product_designation='Бюджет', name=f"Деталь {i}",
+                            material='Ст3', route_template_id=route_id))
+        db.session.add(StatusHistory(part_id=part_id, status='Резка', operator_name='operator',
+                                     status_type=StatusType.COMPLETED, quantity=1))
+    db.session.commit()
+
+
+class TestNormalizeStatement:
+    """Тесты для приведения запросов к форме."""
+
+    def test_values_and_in_lists_are_collapsed(self):
+        """Тест: запросы, отличающиеся значениями и длиной IN, дают одну форму."""
+        first = query_stats.normalize_statement("SELECT * FROM t WHERE a = 'x' AND b IN (?, ?) LIMIT 10")
+        second = query_stats.normalize_statement("SELECT *\n FROM t WHERE a = 'yy' AND b IN (?, ?, ?, ?) LIMIT 5")
+        assert first == second == "SELECT * FROM t WHERE a = ? AND b IN (...) LIMIT ?"
+
+    def test_postgres_parameters(self):
+        """Тест: именованные параметры psycopg2 заменяются на `?`."""
+        shape = query_stats.normalize_statement('SELECT * FROM "Parts" WHERE part_id = %(pk_1)s')
+        assert shape == 'SELECT * FROM "Parts" WHERE part_id = ?'
+
+
+class TestQueryBudget:
+    """Тесты для подсчета запросов и бюджета."""
+
+    def test_collect_counts_statements_and_repeats(self, database):
+        """Тест: счетчик видит число запросов и повторы одной формы."""
+        with query_stats.collect() as stats:
+            for part_id in ('A', 'B', 'C'):
+                database.session.get(Part, part_id)
+        assert stats.count == 3
+        assert stats.max_repeats == 3
+        assert stats.total_time > 0
+        assert stats.repeated(3)[0][1] == 3
+
+    def test_budget_exceeded_fails(self, database, query_budget):
+        """Тест: превышение бюджета бросает AssertionError с отчетом."""
+        with pytest.raises(AssertionError) as excinfo:
+            with query_budget(max_queries=1):
+                Part.query.all()
+                Part.query.all()
+        assert isinstance(excinfo.value, QueryBudgetExceeded)
+        assert 'запросов 2 при бюджете 1' in str(excinfo.value)
+
+    def test_budget_as_decorator(self, database):
+        """Тест: бюджет работает как декоратор функции."""
+        @query_stats.query_budget(max_repeats=1)
+        def n_plus_one():
+            for part_id in ('A', 'B'):
+                database.session.get(Part, part_id)
+
+        with pytest.raises(QueryBudgetExceeded):
+            n_plus_one()
+
+    def test_response_headers(self, app, database, client):
+        """Тест: ответ содержит счетчики запросов в заголовках."""
+        with app.test_request_context():
+            response = client.get(url_for('main.dashboard'))
+        assert int(response.headers['X-Query-Count']) >= 1
+        assert float(response.headers['X-Query-Time-Ms']) >= 0
+        assert 'X-Query-Max-Repeats' in response.headers
+        assert response.headers['Server-Timing'].startswith('db;dur=')
+
+
+class TestEndpointBudgets:
+    """Тесты: горячие страницы не выполняют запросов на каждую деталь."""
+
+    def test_api_parts_for_product_has_no_n_plus_one(self, app, database, client, query_budget):
+        """Тест: список деталей изделия выполняет постоянное число запросов."""
+        route_id = database.session.get(Part, 'TEST-001').route_template_id
+        _add_product_parts(database, 20, route_id)
+        database.session.expunge_all()
+
+        with app.test_request_context():
+            url = url_for('main.api_parts_for_product', product_designation='Бюджет')
+        with query_budget(max_queries=2, max_repeats=1):
+            response = client.get(url)
+
+        assert response.status_code == 200
+        parts = response.get_json()['parts']
+        assert len(parts) == 20
+        assert parts[0]['route_stages'][0] == {'name': 'Резка', 'status': 'completed', 'qty_done': 1}
+
+    def test_history_hierarchy_loads_per_level(self, app, database, client, query_budget):
+        """Тест: дерево состава на странице истории грузится по запросу на уровень, а не на узел."""
+        route_id = database.session.get(Part, 'TEST-001').route_template_id
+        for i in range(6):
+            child_id = f"NODE-{i}"
+            database.session.add(Part(part_id=child_id, product_designation='Тестовое изделие',
+                                      name=f"Узел {i}", material='Ст3', route_template_id=route_id))
+            database.session.add(AssemblyComponent(parent_id='TEST-001', child_id=child_id, quantity=1))
+            database.session.add(Part(part_id=f"{child_id}-1", product_designation='Тестовое изделие',
+                                      name=f"Деталь {i}", material='Ст3', route_template_id=route_id))
+            database.session.add(AssemblyComponent(parent_id=child_id, child_id=f"{child_id}-1", quantity=2))
+        database.session.commit()
+        database.session.expunge_all()
+
+        with app.test_request_context():
+            url = url_for('main.history', part_id='TEST-001')
+        # Уровней дерева два: запрос на каждый и еще один, возвращающий пустой уровень
+        with query_budget(max_queries=10, max_repeats=3):
+            response = client.get(url)
+
+        assert response.status_code == 200
+        html = response.get_data(as_text=True)
+        assert 'Компоненты (6)' in html
+        assert 'NODE-5-1' in html
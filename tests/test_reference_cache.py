@@ -0,0 +1,89 @@
+# tests/test_reference_cache.py
+
+from flask import url_for
+
+from app.admin.forms import get_route_templates, get_stages, get_roles, get_all_users
+from app.models.models import Stage, RouteTemplate
+from app.services import cache_versions, query_stats, reference_cache
+from app.services.part_service import _get_or_create_route_from_operations
+
+
+class TestReferenceCache:
+    """Тесты для кэша справочников."""
+
+    def test_factories_query_once(self, app, database):
+        """Тест: фабрики форм читают справочники из БД один раз."""
+        with app.test_request_context():
+            get_stages(), get_route_templates(), get_roles(), get_all_users()
+            database.session.expunge_all()
+            with query_stats.collect() as stats:
+                stages = get_stages()
+                users = get_all_users()
+            assert stats.count == 0
+            assert [stage.name for stage in stages] == sorted(stage.name for stage in Stage.query)
+            assert 'admin' in [user.username for user in users]
+            # Объекты из кэша привязаны к сессии: связи догружаются
+            admin = next(user for user in users if user.username == 'admin')
+            assert admin.is_admin()
+
+    def test_attach_keeps_loaded_instance(self, app, database):
+        """Тест: объект, уже загруженный в сессию, не перезаписывается значениями из кэша."""
+        with app.test_request_context():
+            get_stages()
+            stage = Stage.query.filter_by(name='Резка').first()
+            stage.name = 'Резка лазером'
+            assert stage in get_stages()
+            assert stage.name == 'Резка лазером'
+
+    def test_invalidate_after_commit(self, app, database):
+        """Тест: invalidate сбрасывает кэш после коммита, но не после отката."""
+        with app.test_request_context():
+            get_stages()
+            database.session.add(Stage(name='Отмененный'))
+            reference_cache.invalidate()
+            database.session.rollback()
+            assert 'Отмененный' not in [stage['name'] for stage in reference_cache.rows('stages')]
+
+            database.session.add(Stage(name='Гибка'))
+            reference_cache.invalidate()
+            database.session.commit()
+            assert 'Гибка' in [stage['name'] for stage in reference_cache.rows('stages')]
+
+    def test_add_stage_route_invalidates(self, app, database, auth_client):
+        """Тест: добавление этапа в админ-панели сразу видно в формах."""
+        client = auth_client('admin', 'password123')
+        with app.test_request_context():
+            assert 'Покраска' not in [stage.name for stage in get_stages()]
+            client.post(url_for('admin.management.add_stage'), data={'name': 'Покраска'})
+            assert 'Покраска' in [stage.name for stage in get_stages()]
+
+    def test_change_without_invalidate_waits_for_version(self, app, database):
+        """Тест: изменение без invalidate не видно, пока не сменится версия справочников."""
+        with app.test_request_context():
+            get_stages()
+            database.session.add(Stage(name='Шлифовка'))
+            database.session.commit()
+            assert 'Шлифовка' not in [stage.name for stage in get_stages()]
+
+            cache_versions.bump(reference_cache.VERSION_NAME)
+            database.session.commit()
+            assert 'Шлифовка' in [stage.name for stage in get_stages()]
+
+    def test_import_resolver_uses_cache(self, app, database):
+        """Тест: маршрут импорта создается один раз и затем находится в кэше без запросов."""
+        with app.test_request_context():
+            route = _get_or_create_route_from_operations('Резка, Сверловка, Гибка')
+            assert _get_or_create_route_from_operations('Резка, Сверловка, Гибка') is route
+            database.session.commit()
+            assert RouteTemplate.query.filter_by(name='Резка -> Сверловка -> Гибка').count() == 1
+            assert Stage.query.filter(Stage.name.in_(['Резка', 'Гибка'])).count() == 2
+
+            route_id = route.id
+            reference_cache.rows('route_templates')
+            database.session.expunge_all()
+            with query_stats.collect() as stats:
+                found = _get_or_create_route_from_operations('Резка, Сверловка, Гибка')
+                default = _get_or_create_route_from_operations('nan')
+            assert stats.count == 0
+            assert found.id == route_id
+            assert default.name == 'Стандартный маршрут'
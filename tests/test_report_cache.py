@@ -0,0 +1,91 @@
+# tests/test_report_cache.py
+
+import datetime
+import pytest
+from flask import url_for
+
+from app import db
+from app.models.models import StatusHistory
+from app.services.report_cache import ReportCache, report_cache
+
+
+@pytest.fixture
+def enabled_report_cache(app):
+    """Включает кэш отчетов на время теста и очищает его до и после."""
+    app.config['REPORT_CACHE_ENABLED'] = True
+    report_cache.clear()
+    yield report_cache
+    report_cache.clear()
+    app.config['REPORT_CACHE_ENABLED'] = False
+
+
+class TestReportCacheUnit:
+    """Модульные тесты класса ReportCache."""
+
+    def test_key_is_normalized_to_days_and_sorted_filters(self):
+        """Тест: Время внутри дня и порядок фильтров не влияют на ключ."""
+        key1 = ReportCache.make_key('r', datetime.datetime(2025, 1, 1, 10, 30), None, b=2, a=1)
+        key2 = ReportCache.make_key('r', datetime.date(2025, 1, 1), None, a=1, b=2)
+        assert key1 == key2
+
+    def test_hits_misses_and_hit_rate(self):
+        """Тест: Повторный запрос отдается из кэша, метрики считаются корректно."""
+        cache = ReportCache()
+        calls = []
+        compute = lambda: calls.append(1) or {'value': len(calls)}
+
+        assert cache.get_or_compute('r', compute) == {'value': 1}
+        assert cache.get_or_compute('r', compute) == {'value': 1}
+        assert len(calls) == 1
+        stats = cache.stats()
+        assert stats['hits'] == 1 and stats['misses'] == 1
+        assert stats['hit_rate'] == 0.5
+
+    def test_open_period_expires_closed_period_is_permanent(self):
+        """Тест: Период с текущим днем живет TTL, закрытый период не истекает."""
+        cache = ReportCache()
+        cache.get_or_compute('open', lambda: 1, ttl=-1)
+        cache.get_or_compute('closed', lambda: 1, date_to=datetime.date(2020, 1, 31), ttl=-1)
+
+        assert cache.get_or_compute('open', lambda: 2, ttl=-1) == 2
+        assert cache.get_or_compute('closed', lambda: 2, date_to=datetime.date(2020, 1, 31), ttl=-1) == 1
+
+    def test_invalidate_days_removes_only_overlapping_entries(self):
+        """Тест: Инвалидация затрагивает только записи, чей период содержит измененный день."""
+        cache = ReportCache()
+        cache.get_or_compute('jan', lambda: 1, datetime.date(2020, 1, 1), datetime.date(2020, 1, 31))
+        cache.get_or_compute('feb', lambda: 1, datetime.date(2020, 2, 1), datetime.date(2020, 2, 29))
+
+        assert cache.invalidate_days([datetime.date(2020, 1, 15)]) == 1
+        assert cache.stats()['entries'] == 1
+
+
+class TestReportCacheIntegration:
+    """Тесты кэширования эндпоинтов отчетов и инвалидации при записи истории."""
+
+    def test_past_history_write_invalidates_closed_period(self, client, auth_client, database, enabled_report_cache):
+        """Тест: Запись в историю за прошлый период сбрасывает закэшированный отчет за этот период."""
+        client = auth_client('manager', 'password123')
+        params = {'date_from': '2025-01-01', 'date_to': '2025-01-31'}
+        url = url_for('admin.report.api_report_operator_performance', **params)
+
+        assert client.get(url).get_json()['labels'] == []
+
+        db.session.add(StatusHistory(part_id='TEST-001', status='Резка', operator_name='Петров',
+                                     timestamp=datetime.datetime(2025, 1, 10, 12, 0)))
+        db.session.commit()
+
+        assert client.get(url).get_json()['labels'] == ['Петров']
+        assert enabled_report_cache.stats()['invalidations'] >= 1
+
+    def test_cache_stats_endpoint(self, client, auth_client, database, enabled_report_cache):
+        """Тест: Эндпоинт метрик кэша возвращает долю попаданий."""
+        client = auth_client('manager', 'password123')
+        before = enabled_report_cache.stats()
+        client.get(url_for('admin.report.api_report_defect_analysis'))
+        client.get(url_for('admin.report.api_report_defect_analysis'))
+
+        stats = client.get(url_for('admin.report.api_report_cache_stats')).get_json()
+        assert stats['hits'] - before['hits'] == 1
+        assert stats['misses'] - before['misses'] == 1
+        assert 0 < stats['hit_rate'] <= 1
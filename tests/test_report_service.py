@@ -0,0 +1,126 @@
+# tests/test_report_service.py
+
+import datetime
+
+import pytest
+from flask import url_for
+from sqlalchemy import event
+
+from app import db
+from app.models.models import Part, StatusHistory, StatusType
+from app.services import report_service
+
+DAY = datetime.datetime(2025, 6, 10, 9, 0)
+
+
+def _add_part(part_id, product):
+    part = Part(part_id=part_id, product_designation=product, name='Деталь', material='Ст3',
+                date_added=DAY - datetime.timedelta(days=2), quantity_total=1)
+    db.session.add(part)
+    return part
+
+
+def _add_history(part_id, timestamp, status='Резка', operator='Иванов', status_type=StatusType.COMPLETED,
+                 quantity=1):
+    db.session.add(StatusHistory(part_id=part_id, status=status, operator_name=operator, timestamp=timestamp,
+                                 status_type=status_type, quantity=quantity))
+
+
+def _capture_statements(fn):
+    """Выполняет `fn` и возвращает выполненные им SQL-запросы с параметрами."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def _query_plan(statement, parameters):
+    """План запроса SQLite в виде одной строки (детали узлов через ' | ')."""
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    return ' | '.join(row[-1] for row in rows)
+
+
+class TestReportFilters:
+    """Тесты фильтров отчетов по периоду и изделию."""
+
+    @pytest.fixture
+    def history(self, database):
+        _add_part('A-1', 'Изделие А')
+        _add_part('B-1', 'Изделие Б')
+        db.session.flush()
+        _add_history('A-1', DAY, operator='Иванов')
+        _add_history('A-1', DAY + datetime.timedelta(hours=23), operator='Иванов', status='Сверловка')
+        _add_history('B-1', DAY + datetime.timedelta(days=1), operator='Петров')
+        _add_history('B-1', DAY, operator='Петров', status_type=StatusType.SCRAPPED, quantity=3)
+        db.session.commit()
+
+    def test_date_to_includes_whole_day(self, history):
+        """Тест: Конец периода включает весь последний день."""
+        rows = report_service.get_operator_performance(DAY, DAY)
+        assert {row.operator_name: row.stages_completed for row in rows} == {'Иванов': 2, 'Петров': 1}
+
+    def test_product_filter(self, history):
+        """Тест: Фильтр по изделию ограничивает отчеты деталями этого изделия."""
+        rows = report_service.get_operator_performance(product='Изделие Б')
+        assert [(row.operator_name, row.stages_completed) for row in rows] == [('Петров', 2)]
+        assert report_service.get_defect_analysis(product='Изделие А') == []
+        assert [row.scrapped_qty for row in report_service.get_defect_analysis(product='Изделие Б')] == [3]
+
+    def test_order_completion_by_period(self, history):
+        """Тест: С периодом учитываются детали, завершенные в периоде, время - по всей истории."""
+        for part in db.session.query(Part).filter(Part.part_id.in_(['A-1', 'B-1'])):
+            part.quantity_completed = part.quantity_total
+        db.session.commit()
+
+        rows = {row.part_id: row.days_taken for row in report_service.get_order_completion(DAY, DAY)}
+        assert rows == {'A-1': pytest.approx(2 + 23 / 24)}
+
+        rows = {row.part_id: row.days_taken for row in
+                report_service.get_order_completion(DAY, DAY + datetime.timedelta(days=1))}
+        assert rows['A-1'] == pytest.approx(2 + 23 / 24)
+        assert rows['B-1'] == pytest.approx(3)
+
+    def test_api_passes_filters(self, client, auth_client, history):
+        """Тест: API отчетов принимает date_from, date_to и product."""
+        client = auth_client('manager', 'password123')
+
+        data = client.get(url_for('admin.report.api_report_operator_performance',
+                                  date_from='2025-06-11', date_to='2025-06-11',
+                                  product='Изделие Б')).get_json()
+        assert data['labels'] == ['Петров']
+        data = client.get(url_for('admin.report.api_report_defect_analysis', product='Изделие А')).get_json()
+        assert data['labels'] == []
+
+    def test_api_rejects_malformed_date(self, client, auth_client, history):
+        """Тест: Дата не в формате ГГГГ-ММ-ДД - ответ 400, а не ошибка сервера."""
+        client = auth_client('manager', 'password123')
+        response = client.get(url_for('admin.report.api_report_order_completion', date_from='11.06.2025'))
+        assert response.status_code == 400
+
+
+class TestReportQueryPlans:
+    """Тесты: запросы отчетов за период используют индексы, а не полный просмотр истории."""
+
+    @pytest.mark.parametrize('report', [
+        report_service.get_operator_performance,
+        report_service.get_stage_duration_stats,
+        report_service.get_order_completion,
+        report_service.get_defect_analysis,
+    ])
+    def test_history_is_searched_by_index(self, database, report):
+        """Тест: Каждое обращение отчета к StatusHistory — поиск по индексу (EXPLAIN QUERY PLAN)."""
+        statements = _capture_statements(lambda: report(DAY, DAY + datetime.timedelta(days=7)))
+        history_plans = [_query_plan(statement, parameters) for statement, parameters in statements
+                         if '"StatusHistory"' in statement]
+
+        assert history_plans
+        for plan in history_plans:
+            assert 'SCAN StatusHistory' not in plan, plan
+            assert 'SEARCH StatusHistory USING' in plan, plan
@@ -0,0 +1,151 @@
+# tests/test_sampling.py
+
+import threading
+import time
+from types import SimpleNamespace
+
+from flask import url_for
+
+from app.services import profiler, sampling
+
+
+class TestTokenBucket:
+    """Тесты для ограничителя частоты."""
+
+    def test_allows_burst_then_refills(self, monkeypatch):
+        """Тест: после исчерпания запаса разрешение появляется по мере пополнения."""
+        now = [100.0]
+        monkeypatch.setattr(sampling.time, 'monotonic', lambda: now[0])
+        bucket = sampling.TokenBucket(rate=2, burst=2)
+
+        assert bucket.allow() and bucket.allow()
+        assert not bucket.allow()
+        now[0] += 0.5
+        assert bucket.allow()
+        assert not bucket.allow()
+
+    def test_zero_rate_never_allows(self):
+        """Тест: нулевая частота ничего не пропускает."""
+        assert not sampling.TokenBucket(rate=0).allow()
+
+
+class TestSamplingPolicy:
+    """Тесты для политики выборки трассировок."""
+
+    def test_parent_decision_is_respected(self):
+        """Тест: решение родительской трассировки соблюдается независимо от доли."""
+        policy = sampling.SamplingPolicy(default_rate=0.0)
+        assert policy.traces_sampler({'parent_sampled': True}) == 1.0
+        assert policy.traces_sampler({'parent_sampled': False}) == 0.0
+
+    def test_endpoint_rate_overrides_default(self, app):
+        """Тест: для эндпоинта из SENTRY_TRACES_ENDPOINT_RATES действует своя доля."""
+        policy = sampling.SamplingPolicy(default_rate=1.0, endpoint_rates={'main.dashboard': 0.0},
+                                         url_map=app.url_map)
+        dashboard = {'PATH_INFO': '/', 'REQUEST_METHOD': 'GET', 'SERVER_NAME': 'localhost',
+                     'SERVER_PORT': '80', 'wsgi.url_scheme': 'http'}
+        login = dict(dashboard, PATH_INFO='/admin/login')
+
+        assert policy.endpoint_for(dashboard) == 'main.dashboard'
+        assert policy.traces_sampler({'wsgi_environ': dashboard}) == 0.0
+        assert policy.traces_sampler({'wsgi_environ': login}) == 1.0
+        assert policy.stats()['dropped'] == 1 and policy.stats()['sampled'] == 1
+
+    def test_sampled_traces_are_rate_limited(self):
+        """Тест: трассировки сверх SENTRY_TRACES_MAX_PER_SECOND отбрасываются."""
+        policy = sampling.SamplingPolicy(default_rate=1.0, max_per_second=2)
+        decisions = [policy.traces_sampler({}) for _ in range(5)]
+
+        assert decisions.count(1.0) == 2
+        assert policy.stats()['rate_limited'] == 3
+
+    def test_slow_unsampled_requests_are_reported(self, monkeypatch):
+        """Тест: медленные и упавшие запросы отправляются событиями с ограничением частоты."""
+        messages = []
+        monkeypatch.setattr(sampling.sentry_sdk, 'capture_message', lambda message, **kw: messages.append(message))
+        policy = sampling.SamplingPolicy(slow_threshold_ms=100, slow_events_per_minute=6)
+
+        assert not policy.is_notable(0.05, 200)
+        assert policy.is_notable(0.2, 200) and policy.is_notable(0.01, 500)
+        assert policy.report_unsampled('main.history', 0.2, 200)
+        assert not policy.report_unsampled('main.history', 0.3, 200)
+        assert len(messages) == 1 and 'main.history' in messages[0]
+
+
+class TestProfiler:
+    """Тесты для встроенного профилировщика."""
+
+    def test_collapse_stack_is_root_first(self):
+        """Тест: свернутый стек начинается с внешнего кадра и кончается текущим."""
+        def inner():
+            import sys
+            return profiler.collapse_stack(sys._getframe())
+
+        stack = inner().split(';')
+        assert stack[-1].startswith('inner (test_sampling.py:')
+        assert stack[-2].startswith('test_collapse_stack_is_root_first ')
+
+    def test_profile_is_written_in_folded_format(self, app, tmp_path, monkeypatch):
+        """Тест: профилирование пишет файл `стек число` со стеками работающих потоков."""
+        monkeypatch.setattr(profiler, 'profiles_dir', lambda app: str(tmp_path))
+        stop = threading.Event()
+
+        def busy_worker():
+            while not stop.is_set():
+                time.sleep(0.001)
+
+        worker = threading.Thread(target=busy_worker)
+        worker.start()
+        try:
+            path = profiler.start(app, 0.2, interval=0.01, wait=True)
+        finally:
+            stop.set()
+            worker.join()
+
+        lines = open(path, encoding='utf-8').read().splitlines()
+        assert lines and all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+        assert any('busy_worker' in line for line in lines)
+        assert not profiler.is_running()
+        assert [name for name, _, _ in profiler.list_profiles(app)] == [path.rsplit('/', 1)[1]]
+
+    def test_profiler_excludes_own_os_thread(self, app, tmp_path, monkeypatch):
+        """Тест: поток профилировщика исключается по идентификатору потока ОС, а не green-потока."""
+        monkeypatch.setattr(profiler, 'profiles_dir', lambda app: str(tmp_path))
+        # Под eventlet пропатченный threading.get_ident возвращает id green-потока
+        monkeypatch.setattr(profiler, 'threading', SimpleNamespace(get_ident=lambda: -1))
+        monkeypatch.setattr(profiler, '_os_primitives', lambda: (threading, time))
+
+        path = profiler.start(app, 0.1, interval=0.01, wait=True)
+
+        lines = open(path, encoding='utf-8').read().splitlines()
+        assert not any('run (profiler.py:' in line for line in lines)
+
+    def test_only_one_profile_at_a_time(self, app, tmp_path, monkeypatch):
+        """Тест: второй запуск во время профилирования отклоняется."""
+        monkeypatch.setattr(profiler, 'profiles_dir', lambda app: str(tmp_path))
+        monkeypatch.setattr(profiler, '_running', object())
+        try:
+            profiler.start(app, 1)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError('Ожидался RuntimeError')
+
+    def test_profiler_page_requires_admin(self, app, database, auth_client, tmp_path, monkeypatch):
+        """Тест: страница профилировщика доступна только администратору."""
+        monkeypatch.setattr(profiler, 'profiles_dir', lambda app: str(tmp_path))
+        (tmp_path / 'profile-20260101-000000.folded').write_text('main (x.py:1) 3\n', encoding='utf-8')
+        with app.test_request_context():
+            page_url = url_for('admin.management.profiler_page')
+            file_url = url_for('admin.management.download_profile', filename='profile-20260101-000000.folded')
+            logout_url = url_for('admin.user.logout')
+
+        client = auth_client('operator', 'password123')
+        assert client.get(page_url).status_code in (302, 403)
+        client.get(logout_url)
+
+        client = auth_client('admin', 'password123')
+        response = client.get(page_url)
+        assert response.status_code == 200
+        assert 'profile-20260101-000000.folded' in response.get_data(as_text=True)
+        assert client.get(file_url).data == b'main (x.py:1) 3\n'
@@ -2,8 +2,13 @@
 
 import pytest
 import io
+import json
+import threading
+import time
+import zipfile
 import openpyxl
 import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch, MagicMock
 from docx import Document
 
@@ -58,6 +63,97 @@ class TestDocumentService:
         assert result_table.cell(0, 1).text == "Еще один ключ: ЗНАЧЕНИЕ"
 
 
+class TestCompiledTemplate:
+    """Тесты скомпилированного Word-шаблона."""
+
+    @staticmethod
+    def _save(doc) -> io.BytesIO:
+        stream = io.BytesIO()
+        doc.save(stream)
+        stream.seek(0)
+        return stream
+
+    def test_placeholder_split_across_runs_keeps_formatting(self):
+        """Тест: Плейсхолдер, разбитый на несколько "runs", заменяется, форматирование соседних "runs" сохраняется."""
+        doc = Document()
+        paragraph = doc.add_paragraph()
+        paragraph.add_run("Изделие: ").bold = True
+        paragraph.add_run("{{Наиме")
+        paragraph.add_run("нование}}").italic = True
+        paragraph.add_run(" шт.").underline = True
+
+        result = Document(document_service.CompiledTemplate(self._save(doc)).render({"{{Наименование}}": "Крышка"}))
+
+        runs = result.paragraphs[0].runs
+        assert result.paragraphs[0].text == "Изделие: Крышка шт."
+        assert runs[0].bold and runs[0].text == "Изделие: "
+        assert runs[3].underline and runs[3].text == " шт."
+
+    def test_headers_footers_and_unknown_placeholders(self):
+        """Тест: Замена работает в колонтитулах; неизвестные плейсхолдеры остаются как есть."""
+        doc = Document()
+        doc.sections[0].header.paragraphs[0].text = "Заказ {{Заказ}}"
+        doc.sections[0].footer.paragraphs[0].text = "Стр. {{Неизвестно}}"
+        doc.add_paragraph("{{Заказ}}-{{Заказ}}")
+
+        template = document_service.CompiledTemplate(self._save(doc))
+        result = Document(template.render({"{{Заказ}}": "42"}))
+
+        assert template.placeholders == {"{{Заказ}}", "{{Неизвестно}}"}
+        assert result.sections[0].header.paragraphs[0].text == "Заказ 42"
+        assert result.sections[0].footer.paragraphs[0].text == "Стр. {{Неизвестно}}"
+        assert result.paragraphs[0].text == "42-42"
+
+    def test_render_many_times(self):
+        """Тест: Один скомпилированный шаблон рендерится многократно без накопления изменений."""
+        doc = Document()
+        doc.add_table(rows=1, cols=1).cell(0, 0).text = "Бирка {{№}}"
+        template = document_service.CompiledTemplate(self._save(doc))
+
+        first = Document(template.render({"{{№}}": "1"}))
+        second = Document(template.render({"{{№}}": "2"}))
+
+        assert first.tables[0].cell(0, 0).text == "Бирка 1"
+        assert second.tables[0].cell(0, 0).text == "Бирка 2"
+
+    def test_invalid_template(self):
+        """Тест: Поврежденный шаблон дает ValueError."""
+        with pytest.raises(ValueError):
+            document_service.CompiledTemplate(io.BytesIO(b'not a docx'))
+
+
+class TestBatchDocumentGeneration:
+    """Тесты пакетной генерации Word-документов."""
+
+    def test_parse_row_numbers(self):
+        """Тест: Диапазоны и отдельные номера объединяются и сортируются."""
+        assert document_service.parse_row_numbers('5, 2-3, 3') == [2, 3, 5]
+        assert document_service.parse_row_numbers('4-2') == [2, 3, 4]
+
+    @pytest.mark.parametrize('spec', ['', '1-3', 'a-b', '2-1000'])
+    def test_parse_row_numbers_invalid(self, spec):
+        """Тест: Пустой список, строка заголовков, мусор и слишком большой диапазон отклоняются."""
+        with pytest.raises(ValueError):
+            document_service.parse_row_numbers(spec)
+
+    def test_generate_word_zip_keeps_row_order_and_unique_names(self):
+        """Тест: Документы пишутся в архив в порядке строк, совпадающие имена не затирают друг друга."""
+        template = Document()
+        template.add_paragraph("Значение: {{V}}")
+        template_stream = io.BytesIO()
+        template.save(template_stream)
+        rows = [(row, {'{{№ бирки}}': 'B' if row < 5 else f'B{row}', '{{V}}': str(row)}) for row in range(2, 12)]
+
+        archive_bytes = b''.join(document_service.generate_word_zip(template_stream.getvalue(), rows, workers=3))
+
+        with zipfile.ZipFile(io.BytesIO(archive_bytes)) as archive:
+            names = archive.namelist()
+            assert names[:3] == ['B.docx', 'B_3.docx', 'B_4.docx']
+            assert len(names) == 10
+            texts = [Document(io.BytesIO(archive.read(name))).paragraphs[0].text for name in names]
+        assert texts == [f"Значение: {row}" for row in range(2, 12)]
+
+
 class TestGraphService:
     """Тесты для сервиса работы с Excel-файлами (парсинг)."""
 
@@ -108,10 +204,27 @@ class TestGraphService:
             graph_service.read_row_from_excel_bytes(excel_bytes, row_number=1)
 
 
+@pytest.fixture
+def graph_credentials(monkeypatch):
+    """Учетные данные Graph API для тестов и пустой кэш токена."""
+    monkeypatch.setenv("MS_CLIENT_ID", "test_client_id")
+    monkeypatch.setenv("MS_CLIENT_SECRET", "test_client_secret")
+    monkeypatch.setenv("MS_TENANT_ID", "test_tenant_id")
+    graph_service.token_provider.clear()
+    yield
+    graph_service.token_provider.clear()
+
+
 class TestGraphServiceWithMocks:
     """Тесты для сетевой части graph_service с использованием "моков"."""
 
-    @patch('app.services.graph_service.requests.post')
+    @pytest.fixture(autouse=True)
+    def _clear_token_cache(self):
+        graph_service.token_provider.clear()
+        yield
+        graph_service.token_provider.clear()
+
+    @patch('app.services.graph_service.graph_client.session.request')
     def test_get_access_token_success(self, mock_post, monkeypatch):
         """Тест: Проверяет успешное получение токена доступа."""
         monkeypatch.setenv("MS_CLIENT_ID", "test_client_id")
@@ -126,7 +239,7 @@ class TestGraphServiceWithMocks:
         token = graph_service._get_access_token()
         assert token == 'fake_token'
 
-    @patch('app.services.graph_service.requests.post')
+    @patch('app.services.graph_service.graph_client.session.request')
     def test_get_access_token_failure(self, mock_post, monkeypatch):
         """Тест: Проверяет обработку ошибки при получении токена."""
         monkeypatch.setenv("MS_CLIENT_ID", "test_client_id")
@@ -142,30 +255,240 @@ class TestGraphServiceWithMocks:
         assert "Ошибка сети при получении токена доступа" in str(excinfo.value)
 
     @patch('app.services.graph_service._get_access_token')
-    @patch('app.services.graph_service.requests.get')
-    def test_download_file_from_onedrive_success(self, mock_get, mock_get_token, monkeypatch):
+    @patch('app.services.graph_service.graph_client.session.request')
+    def test_download_file_from_onedrive_success(self, mock_request, mock_get_token, monkeypatch):
         """Тест: Проверяет успешное скачивание файла."""
         monkeypatch.setenv("MS_ONEDRIVE_USER_ID", "test_user_id")
         mock_get_token.return_value = 'fake_token'
         
-        mock_response = MagicMock()
-        mock_response.content = b'excel file content'
+        mock_response = MagicMock(status_code=200)
+        mock_response.__enter__.return_value = mock_response
+        mock_response.iter_content.return_value = [b'excel ', b'file content']
         mock_response.raise_for_status.return_value = None
-        mock_get.return_value = mock_response
+        mock_request.return_value = mock_response
         
         file_content = graph_service.download_file_from_onedrive('/test.xlsx')
         assert file_content == b'excel file content'
+        assert mock_request.call_args.kwargs['stream'] is True
+        assert mock_request.call_args.kwargs['timeout'] == graph_service.graph_client.timeout
 
     @patch('app.services.graph_service._get_access_token')
-    @patch('app.services.graph_service.requests.get')
-    def test_download_file_from_onedrive_not_found(self, mock_get, mock_get_token, monkeypatch):
+    @patch('app.services.graph_service.graph_client.session.request')
+    def test_download_file_from_onedrive_not_found(self, mock_request, mock_get_token, monkeypatch):
         """Тест: Проверяет обработку ошибки 404 (файл не найден)."""
         monkeypatch.setenv("MS_ONEDRIVE_USER_ID", "test_user_id")
         mock_get_token.return_value = 'fake_token'
         
-        mock_response = MagicMock()
-        mock_response.status_code = 404
-        mock_get.return_value = mock_response
+        mock_response = MagicMock(status_code=404)
+        mock_response.__enter__.return_value = mock_response
+        mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError(response=mock_response)
+        mock_request.return_value = mock_response
         
         with pytest.raises(FileNotFoundError):
-            graph_service.download_file_from_onedrive('/not_found.xlsx')
\ No newline at end of file
+            graph_service.download_file_from_onedrive('/not_found.xlsx')
+
+
+class _StubTokenHandler(BaseHTTPRequestHandler):
+    """Локальная заглушка OAuth-эндпоинта: выдает пронумерованные токены с задержкой."""
+
+    def do_POST(self):
+        server = self.server
+        with server.lock:
+            server.requests_count += 1
+            number = server.requests_count
+        time.sleep(server.delay)
+        body = json.dumps({'access_token': f'token-{number}', 'expires_in': server.expires_in}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_token_server(monkeypatch, graph_credentials):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubTokenHandler)
+    server.lock = threading.Lock()
+    server.requests_count = 0
+    server.delay = 0.2
+    server.expires_in = 3599
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("MS_AUTHORITY_HOST", f"http://127.0.0.1:{server.server_port}")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestTokenProvider:
+    """Тесты кэша токена доступа Graph API."""
+
+    def test_token_is_cached_until_refresh_margin(self, graph_credentials):
+        """Тест: Токен переиспользуется до `expires_in - запас`, затем запрашивается заново."""
+        now = [1000.0]
+        provider = graph_service.TokenProvider(refresh_margin=300, clock=lambda: now[0])
+        with patch('app.services.graph_service._request_access_token',
+                   side_effect=[('first', 3600), ('second', 3600)]) as mock_request:
+            assert provider.get_token() == 'first'
+            now[0] += 3299
+            assert provider.get_token() == 'first'
+            now[0] += 1
+            assert provider.get_token() == 'second'
+
+        assert mock_request.call_count == 2
+        stats = provider.stats()
+        assert stats['hits'] == 1
+        assert stats['refreshes'] == 2
+
+    def test_credentials_change_requests_new_token(self, graph_credentials, monkeypatch):
+        """Тест: Смена учетных данных не отдает токен, выданный для прежних."""
+        provider = graph_service.TokenProvider()
+        with patch('app.services.graph_service._request_access_token',
+                   side_effect=[('first', 3600), ('second', 3600)]):
+            assert provider.get_token() == 'first'
+            monkeypatch.setenv("MS_TENANT_ID", "other_tenant")
+            assert provider.get_token() == 'second'
+
+    def test_failure_is_counted_and_not_cached(self, graph_credentials):
+        """Тест: Ошибка получения токена пробрасывается и не попадает в кэш."""
+        provider = graph_service.TokenProvider()
+        with patch('app.services.graph_service._request_access_token',
+                   side_effect=[GraphAPIError("нет сети"), ('token', 3600)]):
+            with pytest.raises(GraphAPIError):
+                provider.get_token()
+            assert provider.get_token() == 'token'
+        assert provider.stats()['failures'] == 1
+
+    def test_concurrent_requests_share_single_refresh(self, stub_token_server):
+        """Тест: Параллельные потоки при пустом кэше делают один запрос к эндпоинту токенов."""
+        provider = graph_service.TokenProvider()
+        barrier = threading.Barrier(10)
+        tokens = []
+
+        def worker():
+            barrier.wait()
+            tokens.append(provider.get_token())
+
+        threads = [threading.Thread(target=worker) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert stub_token_server.requests_count == 1
+        assert tokens == ['token-1'] * 10
+        assert provider.stats()['refreshes'] == 1
+
+
+class _StubGraphHandler(BaseHTTPRequestHandler):
+    """
+    Локальная заглушка Graph API. Ответы задаются очередью `server.responses`
+    из кортежей (статус, заголовки, тело); последний ответ повторяется.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.seen.append({'path': self.path, 'headers': dict(self.headers),
+                                'client_port': self.client_address[1]})
+            status, headers, body = server.responses[0]
+            if len(server.responses) > 1:
+                server.responses.pop(0)
+        time.sleep(server.delay)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_graph_server(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubGraphHandler)
+    server.lock = threading.Lock()
+    server.responses = [(200, {}, b'')]
+    server.seen = []
+    server.delay = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("MS_GRAPH_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1.0")
+    monkeypatch.setenv("MS_ONEDRIVE_USER_ID", "test_user_id")
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestGraphClient:
+    """Тесты HTTP-клиента Graph API против локальной заглушки."""
+
+    @pytest.fixture(autouse=True)
+    def _fake_token(self):
+        with patch('app.services.graph_service._get_access_token', return_value='fake_token') as mock_token:
+            yield mock_token
+
+    def test_connections_are_reused(self, stub_graph_server):
+        """Тест: Последовательные запросы идут через одно keep-alive соединение."""
+        stub_graph_server.responses = [(200, {}, b'ok')]
+        client = graph_service.GraphClient()
+        for _ in range(3):
+            assert client.download(stub_graph_server.url + '/file') == b'ok'
+        client.close()
+
+        assert len({request['client_port'] for request in stub_graph_server.seen}) == 1
+        assert stub_graph_server.seen[0]['headers']['Authorization'] == 'Bearer fake_token'
+
+    def test_retry_after_is_honoured(self, stub_graph_server):
+        """Тест: Ответы 429/503 повторяются с ожиданием из заголовка Retry-After."""
+        stub_graph_server.responses = [(429, {'Retry-After': '2'}, b''), (503, {}, b''), (200, {}, b'data')]
+        delays = []
+        client = graph_service.GraphClient(sleep=delays.append, backoff_factor=0.5)
+
+        assert client.download(stub_graph_server.url + '/file') == b'data'
+        assert delays == [2.0, 1.0]
+
+    def test_too_long_retry_after_is_not_awaited(self, stub_graph_server):
+        """Тест: Слишком долгий Retry-After не занимает воркер: запрос сразу завершается ошибкой."""
+        stub_graph_server.responses = [(503, {'Retry-After': '3600'}, b'')]
+        delays = []
+        client = graph_service.GraphClient(sleep=delays.append)
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            client.download(stub_graph_server.url + '/file')
+        assert delays == []
+
+    def test_read_timeout(self, stub_graph_server):
+        """Тест: Медленный ответ прерывается по таймауту чтения."""
+        stub_graph_server.delay = 0.5
+        client = graph_service.GraphClient(timeout=(1, 0.1), max_retries=0)
+
+        with pytest.raises(requests.exceptions.Timeout):
+            client.request('GET', stub_graph_server.url + '/slow')
+
+    def test_download_streams_into_file(self, stub_graph_server, tmp_path):
+        """Тест: Содержимое пишется в файл частями."""
+        stub_graph_server.responses = [(200, {}, b'x' * 10000)]
+        client = graph_service.GraphClient()
+        with open(tmp_path / 'file.bin', 'wb') as f:
+            written = client.download(stub_graph_server.url + '/file', destination=f, chunk_size=1024)
+
+        assert written == 10000
+        assert (tmp_path / 'file.bin').read_bytes() == b'x' * 10000
+
+    def test_onedrive_download_retries_once_after_401(self, stub_graph_server, _fake_token):
+        """Тест: При ответе 401 токен сбрасывается, а запрос повторяется с новым токеном."""
+        _fake_token.side_effect = ['old_token', 'new_token']
+        stub_graph_server.responses = [(401, {}, b''), (200, {}, b'data')]
+
+        assert graph_service.download_file_from_onedrive('/test.xlsx') == b'data'
+        assert [request['headers']['Authorization'] for request in stub_graph_server.seen] == [
+            'Bearer old_token', 'Bearer new_token']
+        assert stub_graph_server.seen[0]['path'] == '/v1.0/users/test_user_id/drive/root:/test.xlsx:/content'
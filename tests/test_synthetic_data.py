@@ -0,0 +1,135 @@
+# tests/test_synthetic_data.py
+
+from datetime import datetime
+
+import pytest
+
+from app.models.models import (AssemblyComponent, AuditLog, Part, RouteTemplate, Stage, StatusHistory,
+                               StatusType, User, calculate_stage_duration)
+from app.services import synthetic_data
+
+
+class TestSyntheticData:
+    """Тесты для генератора синтетических данных."""
+
+    def test_generate_builds_bom_tree_and_history(self, database):
+        """Тест: у изделия дерево состава заданной формы, история согласована с прогрессом деталей."""
+        summary = synthetic_data.generate(products=2, bom_depth=2, fanout=3, history_per_part=4, seed=1)
+
+        # 1 + 3 + 9 деталей на изделие
+        assert summary['parts'] == 26 and summary['components'] == 24 and summary['audit'] == 26
+        assert StatusHistory.query.filter(StatusHistory.part_id.like('SYN-%')).count() == summary['history']
+        leaves = synthetic_data.leaf_part_ids(1, bom_depth=2, fanout=3)
+        assert len(leaves) == 9 and all(database.session.get(Part, part_id) for part_id in leaves)
+        assert AssemblyComponent.query.filter_by(parent_id='SYN-0001-0.2', child_id='SYN-0001-0.2.1').count() == 1
+        # Существующие этапы переиспользуются
+        assert Stage.query.filter_by(name='Резка').count() == 1
+
+        for part in Part.query.filter(Part.part_id.like('SYN-%')):
+            completed = {}
+            for record in part.history:
+                assert record.duration_seconds > 0
+                if record.status_type == StatusType.COMPLETED:
+                    completed[record.status] = completed.get(record.status, 0) + record.quantity
+            assert all(quantity <= part.quantity_total for quantity in completed.values())
+            if len(completed) < len(synthetic_data.STAGE_NAMES):
+                assert part.quantity_completed == 0
+
+    def test_generation_is_reproducible(self, database):
+        """Тест: при одном seed данные совпадают."""
+        def snapshot():
+            return [(h.part_id, h.status, h.quantity, h.timestamp) for h in
+                    StatusHistory.query.filter(StatusHistory.part_id.like('SYN-%')).order_by(StatusHistory.id)]
+
+        synthetic_data.generate(products=2, bom_depth=1, fanout=2, seed=7)
+        first = snapshot()
+        with pytest.raises(ValueError):
+            synthetic_data.generate(products=2, bom_depth=1, fanout=2, seed=7)
+        synthetic_data.clear()
+        assert not synthetic_data.exists()
+        assert AuditLog.query.filter(AuditLog.part_id.like('SYN-%')).count() == 0
+
+        synthetic_data.generate(products=2, bom_depth=1, fanout=2, seed=7)
+        assert snapshot() == first
+
+
+class TestSyntheticScaleData:
+    """Тесты для генератора данных производственного масштаба (`flask seed-scale`)."""
+
+    UNTIL = datetime(2026, 6, 1)
+
+    def test_generate_scale_respects_sizes_and_distributions(self, database):
+        """Тест: ровно `parts` деталей, заданные справочники, история в рабочее время и в пределах периода."""
+        summary = synthetic_data.generate_scale(parts=300, bom_depth=2, fanout=4, stages=10, routes=5,
+                                                users=8, days=60, seed=3, until=self.UNTIL, chunk_size=500)
+
+        assert summary['parts'] == 300 == Part.query.filter(Part.part_id.like('SYN-%')).count()
+        assert summary['components'] == AssemblyComponent.query.count()
+        assert RouteTemplate.query.filter(RouteTemplate.name.like(f'{synthetic_data.ROUTE_NAME} %')).count() == 5
+        assert User.query.filter(User.username.like('synthetic-%')).count() == 8
+        assert Stage.query.filter_by(name='Операция 8').count() == 1
+
+        history = StatusHistory.query.filter(StatusHistory.part_id.like('SYN-%')).all()
+        assert {record.status_type for record in history} == set(StatusType)
+        assert all(record.timestamp <= self.UNTIL for record in history)
+        assert all(synthetic_data.WORK_START_HOUR <= record.timestamp.hour < synthetic_data.WORK_END_HOUR
+                   and record.timestamp.weekday() < 5 for record in history)
+        for part in Part.query.filter(Part.part_id.like('SYN-%')):
+            assert 0 <= part.quantity_completed <= part.quantity_total
+        actions = {action for (action,) in database.session.query(AuditLog.action).distinct()}
+        assert {'Создание', 'Вход в систему'} <= actions
+
+    def test_scale_durations_match_stage_duration_rule(self, database):
+        """Тест: длительность записи - время от предыдущей записи детали или от ее создания."""
+        synthetic_data.generate_scale(parts=300, bom_depth=2, fanout=4, stages=10, routes=5,
+                                      users=8, days=60, seed=3, until=self.UNTIL, chunk_size=500)
+
+        connection = database.session.connection()
+        history = StatusHistory.query.filter(StatusHistory.part_id.like('SYN-%')).all()
+        assert history
+        for record in history:
+            assert record.duration_seconds == pytest.approx(
+                calculate_stage_duration(connection, record.part_id, record.timestamp))
+
+    def test_generate_scale_is_reproducible(self, database):
+        """Тест: при одних параметрах, seed и until данные совпадают после повторной загрузки."""
+        def snapshot():
+            return [(h.part_id, h.status, h.quantity, h.status_type, h.timestamp) for h in
+                    StatusHistory.query.filter(StatusHistory.part_id.like('SYN-%')).order_by(StatusHistory.id)]
+
+        options = dict(parts=120, bom_depth=3, fanout=3, stages=8, routes=4, users=5, days=30,
+                       seed=11, until=self.UNTIL)
+        synthetic_data.generate_scale(**options)
+        first = snapshot()
+        synthetic_data.clear()
+        synthetic_data.generate_scale(**options)
+        assert snapshot() == first
+
+    def test_clear_removes_login_audit(self, database):
+        """Тест: очистка удаляет и входы синтетических пользователей, не трогая остальные записи журнала."""
+        own = AuditLog(user_id=User.query.filter_by(username='admin').one().id, action='Вход в систему',
+                       category='auth')
+        database.session.add(own)
+        database.session.commit()
+        synthetic_data.generate_scale(parts=30, bom_depth=2, fanout=3, stages=4, routes=2, users=3, days=14,
+                                      seed=5, until=self.UNTIL)
+
+        synthetic_data.clear()
+
+        assert AuditLog.query.all() == [own]
+
+    def test_copy_path_formats_rows(self, database, monkeypatch):
+        """Тест: в режиме COPY строки уходят в _copy_rows, NULL, перечисления и даты приводятся к тексту."""
+        copied = {}
+        monkeypatch.setattr(synthetic_data, '_copy_rows',
+                            lambda table, rows: copied.setdefault(table.name, []).extend(rows))
+        writer = synthetic_data.BulkWriter(chunk_size=10, use_copy=True)
+        writer.add({'history': [{'part_id': 'TEST-001', 'status': 'Резка', 'operator_name': 'Оператор 1',
+                                 'timestamp': self.UNTIL, 'quantity': 1, 'status_type': StatusType.REWORK,
+                                 'duration_seconds': None}]})
+        writer.flush()
+
+        assert writer.summary['history'] == 1 and len(copied['StatusHistory']) == 1
+        assert synthetic_data._copy_value(None) == synthetic_data.COPY_NULL
+        assert synthetic_data._copy_value(StatusType.REWORK) == 'REWORK'
+        assert synthetic_data._copy_value(self.UNTIL) == '2026-06-01 00:00:00'
@@ -0,0 +1,91 @@
+# tests/test_workbook_cache.py
+
+import io
+from unittest.mock import patch
+
+import openpyxl
+import pytest
+
+from app.services import graph_service
+from app.services.workbook_cache import WorkbookIndex, WorkbookIndexCache
+
+
+def _make_workbook(rows) -> bytes:
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(row)
+    stream = io.BytesIO()
+    workbook.save(stream)
+    return stream.getvalue()
+
+
+class TestWorkbookIndex:
+    """Тесты разбора книги в компактный индекс строк."""
+
+    def test_headers_are_normalized_and_short_rows_padded(self):
+        """Тест: Заголовки очищаются от лишних пробелов, недостающие ячейки становятся пустыми строками."""
+        excel_bytes = _make_workbook([['  № ', 'Наименование   изделия', 'Кол-во'], [1, 'Крышка'], [2, None, 3]])
+
+        index = WorkbookIndex.parse(excel_bytes)
+
+        assert index.headers == ['№', 'Наименование изделия', 'Кол-во']
+        assert index.max_row == 3
+        assert index.row_placeholders(2) == {'{{№}}': '1', '{{Наименование изделия}}': 'Крышка', '{{Кол-во}}': ''}
+        assert index.row_placeholders(3)['{{Кол-во}}'] == '3'
+
+    def test_invalid_bytes_raise_value_error(self):
+        """Тест: Поврежденный файл дает ValueError, как и прежде."""
+        with pytest.raises(ValueError):
+            WorkbookIndex.parse(b'not an excel file')
+
+
+class TestWorkbookIndexCache:
+    """Тесты кэша разобранных книг."""
+
+    def test_same_content_is_parsed_once(self):
+        """Тест: Повторные обращения к той же книге не разбирают ее заново."""
+        excel_bytes = _make_workbook([['A'], ['1'], ['2']])
+        cache = WorkbookIndexCache()
+
+        with patch.object(WorkbookIndex, 'parse', wraps=WorkbookIndex.parse) as mock_parse:
+            assert cache.get(excel_bytes).row_placeholders(2) == {'{{A}}': '1'}
+            assert cache.get(excel_bytes).row_placeholders(3) == {'{{A}}': '2'}
+            cache.get(_make_workbook([['A'], ['other']]))
+
+        assert mock_parse.call_count == 2
+        assert cache.stats()['hits'] == 1
+
+    def test_failed_parse_releases_lock(self):
+        """Тест: Поврежденная книга не оставляет блокировку разбора в кэше."""
+        cache = WorkbookIndexCache()
+
+        with pytest.raises(ValueError):
+            cache.get(b'not an excel file')
+
+        assert cache._parse_locks == {}
+        assert cache._entries == {}
+
+    def test_eviction_by_memory_budget(self):
+        """Тест: При превышении бюджета памяти вытесняется давно не использованная книга."""
+        first, second, third = (_make_workbook([['A'], [str(i) * 100]]) for i in range(3))
+        budget = WorkbookIndex.parse(first).size_bytes * 2 + 10
+        cache = WorkbookIndexCache(max_bytes=budget)
+
+        cache.get(first)
+        cache.get(second)
+        cache.get(first)
+        cache.get(third)
+
+        assert list(cache._entries) == [cache.make_key(first), cache.make_key(third)]
+        assert cache.stats()['evictions'] == 1
+
+    def test_read_row_uses_shared_cache(self):
+        """Тест: read_row_from_excel_bytes берет книгу из общего кэша."""
+        excel_bytes = _make_workbook([['A'], ['1']])
+        graph_service.workbook_cache.clear()
+
+        graph_service.read_row_from_excel_bytes(excel_bytes, 2)
+
+        assert graph_service.workbook_cache.make_key(excel_bytes) in graph_service.workbook_cache._entries
+        graph_service.workbook_cache.clear()